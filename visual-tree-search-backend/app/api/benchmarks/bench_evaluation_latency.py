@@ -0,0 +1,101 @@
+"""Benchmark per-evaluation latency of the trajectory scoring modes.
+
+Runs the same synthetic trajectory through each evaluation mode against the
+live OpenAI API and reports mean / p50 / p95 wall time per evaluation, plus the
+time until overall_score was parsed for the streaming modes.
+
+    cd visual-tree-search-backend/app/api
+    python benchmarks/bench_evaluation_latency.py --model gpt-4o-mini --repeats 10
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+from dotenv import load_dotenv
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+load_dotenv()
+
+from openai import OpenAI
+from lwats.agents_async.SearchAgents.trajectory_score import (
+    EVALUATION_MODES,
+    create_llm_prompt,
+    evaluate_trajectory,
+)
+
+GOAL = "search running shoes, click on the first result"
+TRAJECTORY = [
+    {
+        "natural_language_description": "Click on the search box",
+        "action": "click('227')",
+        "feedback": "The search box is focused",
+    },
+    {
+        "natural_language_description": "Type running shoes into the search box",
+        "action": "fill('227', 'running shoes')",
+        "feedback": "The search box contains 'running shoes'",
+    },
+    {
+        "natural_language_description": "Press Enter to submit the search",
+        "action": "press('227', 'Enter')",
+        "feedback": "The search results page for 'running shoes' is displayed",
+    },
+    {
+        "natural_language_description": "Click on the first search result",
+        "action": "click('1289')",
+        "feedback": "The product page of the first result is displayed",
+    },
+]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def run_mode(client, prompt, model, mode, repeats):
+    latencies = []
+    time_to_score = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = evaluate_trajectory(prompt, client, model=model, mode=mode)
+        latencies.append((time.perf_counter() - start) * 1000)
+        metadata = result.get("metadata", {})
+        if "error" in metadata:
+            print(f"  {mode}: evaluation failed: {metadata['error']}")
+        if "time_to_score_ms" in metadata:
+            time_to_score.append(metadata["time_to_score_ms"])
+    return latencies, time_to_score
+
+
+def main(args):
+    client = OpenAI()
+    prompt = create_llm_prompt(TRAJECTORY, GOAL)
+    modes = args.modes or list(EVALUATION_MODES)
+
+    # one warm-up call so connection setup is not charged to the first mode
+    evaluate_trajectory(prompt, client, model=args.model, mode="score")
+
+    print(f"model={args.model} repeats={args.repeats}")
+    print(f"{'mode':<10}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'score ms':>10}")
+    for mode in modes:
+        latencies, time_to_score = run_mode(client, prompt, args.model, mode, args.repeats)
+        score_ms = f"{statistics.mean(time_to_score):.0f}" if time_to_score else "-"
+        print(
+            f"{mode:<10}"
+            f"{statistics.mean(latencies):>10.0f}"
+            f"{percentile(latencies, 50):>10.0f}"
+            f"{percentile(latencies, 95):>10.0f}"
+            f"{score_ms:>10}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark trajectory evaluation latency")
+    parser.add_argument("--model", type=str, default="gpt-4o-mini")
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--modes", type=str, nargs="*", choices=EVALUATION_MODES)
+    main(parser.parse_args())
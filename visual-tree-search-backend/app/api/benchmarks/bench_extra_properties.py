@@ -0,0 +1,218 @@
+"""Benchmark extract_dom_extra_properties on large DOM snapshots.
+
+Compares the NumPy implementation against the previous dict-based one (kept below as
+the reference) on synthetic DOMSnapshot payloads with many nodes and nested iframes,
+and checks that both produce the same properties. Saved snapshots (the "dom" entry of a
+page_info dict, as json) can be benchmarked as well.
+
+    cd visual-tree-search-backend/app/api
+    python benchmarks/bench_extra_properties.py
+    python benchmarks/bench_extra_properties.py --snapshots log/dom_snapshot_*.json
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lwats.webagent_utils_async.browser_env.constants import BROWSERGYM_ID_ATTRIBUTE as BID_ATTR
+from lwats.webagent_utils_async.browser_env.constants import BROWSERGYM_SETOFMARKS_ATTRIBUTE as SOM_ATTR
+from lwats.webagent_utils_async.browser_env.constants import BROWSERGYM_VISIBILITY_ATTRIBUTE as VIS_ATTR
+from lwats.webagent_utils_async.browser_env.extra_properties import extract_dom_extra_properties
+
+# the duplicate bid warnings of the synthetic snapshots are expected
+logging.disable(logging.WARNING)
+
+SIZES = (10_000, 50_000, 200_000)
+
+
+def reference_extract_dom_extra_properties(dom_snapshot):
+    """The dict-based implementation replaced by extra_properties.extract_dom_extra_properties."""
+    def to_string(idx):
+        if idx == -1:
+            return None
+        else:
+            return dom_snapshot["strings"][idx]
+
+    try:
+        bid_string_id = dom_snapshot["strings"].index(BID_ATTR)
+    except ValueError:
+        bid_string_id = -1
+    try:
+        vis_string_id = dom_snapshot["strings"].index(VIS_ATTR)
+    except ValueError:
+        vis_string_id = -1
+    try:
+        som_string_id = dom_snapshot["strings"].index(SOM_ATTR)
+    except ValueError:
+        som_string_id = -1
+
+    doc_properties = {0: {"parent": None}}
+    docs_to_process = [0]
+    while docs_to_process:
+        doc = docs_to_process.pop(-1)
+
+        children = dom_snapshot["documents"][doc]["nodes"]["contentDocumentIndex"]
+        for node, child_doc in zip(children["index"], children["value"]):
+            doc_properties[child_doc] = {"parent": {"doc": doc, "node": node}}
+            docs_to_process.append(child_doc)
+
+        parent = doc_properties[doc]["parent"]
+        if parent:
+            parent_doc = parent["doc"]
+            parent_node = parent["node"]
+            try:
+                node_layout_idx = dom_snapshot["documents"][parent_doc]["layout"]["nodeIndex"].index(parent_node)
+            except ValueError:
+                node_layout_idx = -1
+            if node_layout_idx >= 0:
+                node_bounds = dom_snapshot["documents"][parent_doc]["layout"]["bounds"][node_layout_idx]
+                parent_node_abs_x = doc_properties[parent_doc]["abs_pos"]["x"] + node_bounds[0]
+                parent_node_abs_y = doc_properties[parent_doc]["abs_pos"]["y"] + node_bounds[1]
+            else:
+                parent_node_abs_x = 0
+                parent_node_abs_y = 0
+        else:
+            parent_node_abs_x = 0
+            parent_node_abs_y = 0
+
+        doc_properties[doc]["abs_pos"] = {
+            "x": parent_node_abs_x - dom_snapshot["documents"][doc]["scrollOffsetX"],
+            "y": parent_node_abs_y - dom_snapshot["documents"][doc]["scrollOffsetY"],
+        }
+
+        document = dom_snapshot["documents"][doc]
+        doc_properties[doc]["nodes"] = [
+            {"bid": None, "visibility": None, "bbox": None, "clickable": False, "set_of_marks": None}
+            for _ in enumerate(document["nodes"]["parentIndex"])
+        ]
+
+        for node_idx in document["nodes"]["isClickable"]["index"]:
+            doc_properties[doc]["nodes"][node_idx]["clickable"] = True
+
+        for node_idx, node_attrs in enumerate(document["nodes"]["attributes"]):
+            for i in range(0, len(node_attrs), 2):
+                name_string_id = node_attrs[i]
+                value_string_id = node_attrs[i + 1]
+                if name_string_id == bid_string_id:
+                    doc_properties[doc]["nodes"][node_idx]["bid"] = to_string(value_string_id)
+                if name_string_id == vis_string_id:
+                    doc_properties[doc]["nodes"][node_idx]["visibility"] = float(to_string(value_string_id))
+                if name_string_id == som_string_id:
+                    doc_properties[doc]["nodes"][node_idx]["set_of_marks"] = to_string(value_string_id) == "1"
+
+        for node_idx, bounds, client_rect in zip(
+            document["layout"]["nodeIndex"],
+            document["layout"]["bounds"],
+            document["layout"]["clientRects"],
+        ):
+            if not client_rect:
+                doc_properties[doc]["nodes"][node_idx]["bbox"] = None
+            else:
+                doc_properties[doc]["nodes"][node_idx]["bbox"] = bounds.copy()
+                doc_properties[doc]["nodes"][node_idx]["bbox"][0] += doc_properties[doc]["abs_pos"]["x"]
+                doc_properties[doc]["nodes"][node_idx]["bbox"][1] += doc_properties[doc]["abs_pos"]["y"]
+
+    extra_properties = {}
+    for doc in doc_properties.keys():
+        for node in doc_properties[doc]["nodes"]:
+            bid = node["bid"]
+            if bid:
+                extra_properties[bid] = {
+                    extra_prop: node[extra_prop]
+                    for extra_prop in ("visibility", "bbox", "clickable", "set_of_marks")
+                }
+    return extra_properties
+
+
+def build_dom_snapshot(num_nodes: int, num_frames: int = 8, seed: int = 0):
+    """A synthetic DOMSnapshot with num_nodes nodes spread over a top document and nested iframes."""
+    rng = random.Random(seed)
+    strings = ["", "html", "div", "iframe", "class", "item", "0", "1", "1.0", "0.5", "0.0", BID_ATTR, VIS_ATTR, SOM_ATTR]
+    string_ids = {value: i for i, value in enumerate(strings)}
+
+    def string_id(value):
+        if value not in string_ids:
+            string_ids[value] = len(strings)
+            strings.append(value)
+        return string_ids[value]
+
+    documents = []
+    per_document = num_nodes // (num_frames + 1)
+    for doc in range(num_frames + 1):
+        parent_index, attributes, clickable = [], [], []
+        layout_node_index, bounds, client_rects = [], [], []
+        frame_node = None
+        for node in range(per_document):
+            parent_index.append(-1 if node == 0 else rng.randrange(max(0, node - 20), node))
+            attrs = [string_id("class"), string_id("item")]
+            if rng.random() < 0.8:
+                attrs += [string_id(BID_ATTR), string_id(f"{doc}-{node}")]
+                attrs += [string_id(VIS_ATTR), string_id(rng.choice(["1.0", "0.5", "0.0"]))]
+                attrs += [string_id(SOM_ATTR), string_id(rng.choice(["0", "1"]))]
+            attributes.append(attrs)
+            if rng.random() < 0.2:
+                clickable.append(node)
+            if rng.random() < 0.9:
+                layout_node_index.append(node)
+                box = [rng.uniform(0, 1200), rng.uniform(0, 9000), rng.uniform(1, 300), rng.uniform(1, 80)]
+                bounds.append(box)
+                client_rects.append([box] if rng.random() < 0.95 else [])
+            if node == per_document // 2 and doc < num_frames:
+                frame_node = node
+        documents.append({
+            "nodes": {
+                "parentIndex": parent_index,
+                "attributes": attributes,
+                "isClickable": {"index": clickable},
+                "contentDocumentIndex": {
+                    "index": [frame_node] if frame_node is not None else [],
+                    "value": [doc + 1] if frame_node is not None else [],
+                },
+            },
+            "layout": {"nodeIndex": layout_node_index, "bounds": bounds, "clientRects": client_rects},
+            "scrollOffsetX": 0,
+            "scrollOffsetY": rng.choice([0, 120.5, 800]),
+        })
+    return {"documents": documents, "strings": strings}
+
+
+def median_ms(func, snapshot, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func(snapshot)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), result
+
+
+def report(label, snapshot, args):
+    num_nodes = sum(len(doc["nodes"]["parentIndex"]) for doc in snapshot["documents"])
+    reference_ms, expected = median_ms(reference_extract_dom_extra_properties, snapshot, args.repeats)
+    vectorized_ms, extra_properties = median_ms(extract_dom_extra_properties, snapshot, args.repeats)
+    if extra_properties.to_dict() != expected:
+        raise AssertionError(f"{label}: vectorized output differs from the reference implementation")
+    print(f"{label:<28}{num_nodes:>10}{len(extra_properties):>10}"
+          f"{reference_ms:>14.1f}{vectorized_ms:>14.1f}{reference_ms / vectorized_ms:>9.1f}x")
+
+
+def main(args):
+    print(f"{'snapshot':<28}{'nodes':>10}{'bids':>10}{'reference ms':>14}{'numpy ms':>14}{'speedup':>10}")
+    for size in SIZES:
+        report(f"synthetic {size // 1000}k", build_dom_snapshot(size), args)
+    for path in args.snapshots:
+        with open(path, encoding="utf8") as f:
+            report(os.path.basename(path), json.load(f), args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark extract_dom_extra_properties")
+    parser.add_argument("--snapshots", type=str, nargs="*", default=[],
+                        help="saved DOMSnapshot json files")
+    parser.add_argument("--repeats", type=int, default=5)
+    main(parser.parse_args())
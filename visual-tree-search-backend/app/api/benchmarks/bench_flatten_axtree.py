@@ -0,0 +1,110 @@
+"""Benchmark flatten_axtree_to_str on large accessibility trees.
+
+Builds deterministic shop-like AXTree fixtures of 1k, 10k and 50k nodes (deeply nested
+product grids with links, buttons, prices and descriptions) and times flattening with the
+full output and with a token budget. Recorded trees can be benchmarked as well, from
+json files with the "axtree" and "extra_properties" keys of a page_info dict.
+
+    cd visual-tree-search-backend/app/api
+    python benchmarks/bench_flatten_axtree.py
+    python benchmarks/bench_flatten_axtree.py --fixtures log/page_info_*.json --max-tokens 4000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lwats.webagent_utils_async.browser_env.obs import flatten_axtree_to_str
+
+SIZES = (1_000, 10_000, 50_000)
+
+PRODUCT_NAMES = ["Running shoes", "Dining table", "Wireless earbuds", "Coffee maker", "Backpack"]
+
+
+def build_shop_axtree(num_nodes: int, seed: int = 0):
+    """A synthetic product listing page with about num_nodes nodes."""
+    rng = random.Random(seed)
+    nodes = []
+    extra_properties = {}
+
+    def add(role, name, parent, bid=True, visible=True, clickable=False):
+        node_id = str(len(nodes))
+        node = {"nodeId": node_id, "role": {"value": role}, "name": {"value": name}, "childIds": [], "properties": []}
+        if bid:
+            node["properties"].append({"name": "browsergym_id", "value": {"value": node_id}})
+            extra_properties[node_id] = {
+                "visibility": 1.0 if visible else 0.0,
+                "bbox": [rng.randint(0, 1200), rng.randint(0, 8000), 120, 40],
+                "clickable": clickable,
+                "set_of_marks": clickable and visible,
+            }
+        nodes.append(node)
+        if parent is not None:
+            nodes[parent]["childIds"].append(node_id)
+        return len(nodes) - 1
+
+    root = add("RootWebArea", "One Stop Market", None)
+    add("searchbox", "Search entire store here...", root, clickable=True)
+    container = root
+    # nested layout wrappers, as produced by component frameworks
+    for depth in range(12):
+        container = add("generic", "", container, bid=False)
+        nodes[container]["properties"].append({"name": "live", "value": {"value": "polite"}})
+    product = 0
+    while len(nodes) < num_nodes:
+        visible = product < 40
+        item = add("listitem", "", container, visible=visible)
+        add("img", PRODUCT_NAMES[product % len(PRODUCT_NAMES)], item, visible=visible)
+        link = add("link", f"{PRODUCT_NAMES[product % len(PRODUCT_NAMES)]} {product}", item, visible=visible, clickable=True)
+        add("StaticText", f"{PRODUCT_NAMES[product % len(PRODUCT_NAMES)]} {product}", link, bid=False)
+        add("StaticText", f"${rng.randint(5, 500)}.{rng.randint(0, 99):02d}", item, bid=False)
+        description = add("paragraph", "", item, visible=visible)
+        for sentence in range(rng.randint(1, 4)):
+            add("StaticText", f"Product detail sentence {sentence} for item {product}.", description, bid=False)
+        add("button", "Add to Cart", item, visible=visible, clickable=True)
+        product += 1
+    return {"nodes": nodes}, extra_properties
+
+
+def time_flatten(axtree, extra_properties, repeats, **kwargs):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        tree_str = flatten_axtree_to_str(axtree, extra_properties=extra_properties, **kwargs)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), tree_str
+
+
+def report(label, axtree, extra_properties, args):
+    full_ms, full_str = time_flatten(axtree, extra_properties, args.repeats)
+    budget_ms, budget_str = time_flatten(axtree, extra_properties, args.repeats, max_tokens=args.max_tokens)
+    print(
+        f"{label:<24}{len(axtree['nodes']):>8}"
+        f"{full_ms:>12.1f}{len(full_str) // 4:>12}"
+        f"{budget_ms:>12.1f}{len(budget_str) // 4:>12}"
+    )
+
+
+def main(args):
+    print(f"{'fixture':<24}{'nodes':>8}{'full ms':>12}{'~tokens':>12}{'budget ms':>12}{'~tokens':>12}")
+    for size in SIZES:
+        axtree, extra_properties = build_shop_axtree(size)
+        report(f"synthetic shop {size // 1000}k", axtree, extra_properties, args)
+    for path in args.fixtures:
+        with open(path, encoding="utf8") as f:
+            page_info = json.load(f)
+        report(os.path.basename(path), page_info["axtree"], page_info.get("extra_properties", {}), args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark flatten_axtree_to_str")
+    parser.add_argument("--fixtures", type=str, nargs="*", default=[],
+                        help="recorded page_info json files with axtree and extra_properties")
+    parser.add_argument("--max-tokens", type=int, default=4000)
+    parser.add_argument("--repeats", type=int, default=5)
+    main(parser.parse_args())
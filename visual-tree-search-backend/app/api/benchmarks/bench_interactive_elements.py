@@ -0,0 +1,168 @@
+"""Benchmark extract_interactive_elements in headless Chromium.
+
+Loads HTML fixtures (a synthetic product listing of increasing size, and any saved pages
+given with --html), marks them like extract_page_info does, and times the interactive
+element extraction against the previous implementation (kept below as the reference).
+The reference looked the items up by id instead of by bid, so its nested item filter was
+mostly a no-op: the comparison applies the intended filter (only keep inner items) to the
+reference output and checks both agree.
+
+    cd visual-tree-search-backend/app/api
+    python benchmarks/bench_interactive_elements.py
+    python benchmarks/bench_interactive_elements.py --html fixtures/shop_home.html --sizes
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from playwright.async_api import async_playwright
+
+from lwats.webagent_utils_async.browser_env.constants import BROWSERGYM_ID_ATTRIBUTE as BID_ATTR
+from lwats.webagent_utils_async.browser_env.extract_elements import extract_interactive_elements
+from lwats.webagent_utils_async.browser_env.observation import _pre_extract
+
+SIZES = (500, 2_000, 8_000)
+
+REFERENCE_JS = """
+(browsergymIdAttribute) => {
+    function isInteractive(element) {
+        const interactiveTags = [
+            'a', 'button', 'input', 'select', 'textarea', 'summary', 'video', 'audio',
+            'iframe', 'embed', 'object', 'menu', 'label', 'fieldset', 'datalist', 'output',
+            'details', 'dialog', 'option'
+        ];
+        const interactiveRoles = [
+            'button', 'link', 'checkbox', 'radio', 'menuitem', 'menuitemcheckbox', 'menuitemradio',
+            'option', 'listbox', 'textbox', 'combobox', 'slider', 'spinbutton', 'scrollbar',
+            'tabpanel', 'treeitem', 'switch', 'searchbox', 'grid', 'gridcell', 'row',
+            'rowgroup', 'rowheader', 'columnheader', 'tab', 'tooltip', 'application',
+            'dialog', 'alertdialog', 'progressbar'
+        ];
+        return interactiveTags.includes(element.tagName.toLowerCase()) ||
+               interactiveRoles.includes(element.getAttribute('role')) ||
+               element.onclick != null || element.onkeydown != null || element.onkeyup != null ||
+               element.onkeypress != null || element.onchange != null || element.onfocus != null ||
+               element.onblur != null || element.getAttribute('tabindex') !== null ||
+               element.getAttribute('contenteditable') === 'true';
+    }
+    var vw = Math.max(document.documentElement.clientWidth || 0, window.innerWidth || 0);
+    var vh = Math.max(document.documentElement.clientHeight || 0, window.innerHeight || 0);
+    var items = Array.prototype.slice
+        .call(document.querySelectorAll("*"))
+        .map(function (element) {
+            var bid = element.getAttribute(browsergymIdAttribute) || "";
+            if (bid === "" || !isInteractive(element)) {
+                return null;
+            }
+            var rects = [...element.getClientRects()]
+                .filter((bb) => {
+                    var elAtCenter = document.elementFromPoint(bb.left + bb.width / 2, bb.top + bb.height / 2);
+                    return elAtCenter === element || element.contains(elAtCenter);
+                })
+                .map((bb) => {
+                    const rect = {
+                        left: Math.max(0, bb.left),
+                        top: Math.max(0, bb.top),
+                        right: Math.min(vw, bb.right),
+                        bottom: Math.min(vh, bb.bottom),
+                    };
+                    return {...rect, width: rect.right - rect.left, height: rect.bottom - rect.top};
+                });
+            var area = rects.reduce((acc, rect) => acc + rect.width * rect.height, 0);
+            return {
+                include: true, area: area, rects: rects,
+                text: element.textContent.trim().replace(/\\s{2,}/g, " "),
+                type: element.tagName.toLowerCase(), ariaLabel: element.getAttribute("aria-label") || "",
+                bid: bid, tag: element.tagName.toLowerCase(), id: element.id || null,
+                class: typeof element.className === 'string' ? element.className : null,
+                href: element.getAttribute("href") || null, title: element.getAttribute("title") || null
+            };
+        })
+        .filter((item) => item !== null && item.area >= 20);
+    items = items.filter(
+        (x) => !items.some((y) => x !== y && document.querySelector(`[id="${y.bid}"]`) && document.querySelector(`[id="${y.bid}"]`).contains(document.querySelector(`[id="${x.bid}"]`)))
+    );
+    return items;
+}
+"""
+
+# the filter the reference meant to apply, with elements looked up by bid
+KEEP_INNER_JS = """
+([items, browsergymIdAttribute]) => {
+    const element = (item) => document.querySelector(`[${browsergymIdAttribute}="${item.bid}"]`);
+    return items.filter((x) => !items.some((y) => x.bid !== y.bid && element(x).contains(element(y))));
+}
+"""
+
+
+def build_shop_html(num_elements: int, seed: int = 0) -> str:
+    """A product listing with nested interactive elements, about num_elements elements."""
+    rng = random.Random(seed)
+    cards = []
+    product = 0
+    while len(cards) * 9 < num_elements:
+        cards.append(f"""
+        <li class="product" tabindex="0">
+          <a href="/product/{product}" class="product-link"><img alt="Product {product}" width="120" height="90">
+            <span>Product {product}</span></a>
+          <div class="price">${rng.randint(5, 500)}.{rng.randint(0, 99):02d}</div>
+          <label>Qty <input type="number" value="1"></label>
+          <div role="button" class="actions"><button>Add to Cart</button><button aria-label="Wish list">&#9825;</button></div>
+        </li>""")
+        product += 1
+    return f"""<!DOCTYPE html><html><head><title>Shop</title>
+    <style>li.product {{ display: inline-block; width: 220px; margin: 4px; }}</style></head>
+    <body><nav><a href="/">Home</a><input type="search" placeholder="Search"></nav>
+    <ul class="grid">{''.join(cards)}</ul></body></html>"""
+
+
+async def median_ms(func, repeats):
+    timings = []
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = await func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), result
+
+
+async def report(page, label, html, args):
+    await page.set_content(html)
+    await _pre_extract(page)
+    # injects the scrollbar style, so both implementations see the same layout
+    await extract_interactive_elements(page)
+    num_elements = await page.evaluate("() => document.querySelectorAll('*').length")
+    reference_ms, reference = await median_ms(lambda: page.evaluate(REFERENCE_JS, BID_ATTR), args.repeats)
+    new_ms, items = await median_ms(lambda: extract_interactive_elements(page), args.repeats)
+    expected = await page.evaluate(KEEP_INNER_JS, [reference, BID_ATTR])
+    if items != expected:
+        raise AssertionError(f"{label}: extracted items differ from the reference with the inner item filter")
+    print(f"{label:<28}{num_elements:>10}{len(items):>8}{reference_ms:>14.1f}{new_ms:>12.1f}{reference_ms / new_ms:>9.1f}x")
+
+
+async def main(args):
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        page = await browser.new_page(viewport={"width": 1280, "height": 720})
+        print(f"{'fixture':<28}{'elements':>10}{'items':>8}{'reference ms':>14}{'new ms':>12}{'speedup':>10}")
+        for size in args.sizes:
+            await report(page, f"synthetic shop {size}", build_shop_html(size), args)
+        for path in args.html:
+            with open(path, encoding="utf8") as f:
+                await report(page, os.path.basename(path), f.read(), args)
+        await browser.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark extract_interactive_elements in headless Chromium")
+    parser.add_argument("--html", type=str, nargs="*", default=[], help="saved html pages")
+    parser.add_argument("--sizes", type=int, nargs="*", default=list(SIZES),
+                        help="synthetic page sizes, pass no value to skip them")
+    parser.add_argument("--repeats", type=int, default=5)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,84 @@
+"""Replay a recorded search from its cassette, to time and profile the search code alone.
+
+A cassette holds the LLM responses and browser observations of one search (see
+lwats/agents_async/SearchAgents/cassette.py). Replaying it runs the same agent with the same
+config without a browser, network access or API keys, so the wall time is the CPU time of
+the search loop, the prompt building and the parsing. Record one with --cassette on a real
+run, then replay it after a change: a CassetteMiss means the change altered the requests
+the search makes.
+
+    cd visual-tree-search-backend/app/api
+    python benchmarks/bench_replay.py log/cassettes/shop.jsonl
+    python benchmarks/bench_replay.py log/cassettes/shop.jsonl --repeat 10 --profile --top 30
+"""
+import argparse
+import asyncio
+import cProfile
+import dataclasses
+import os
+import pstats
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# the agents create their OpenAI clients at import time, the cassette replaces them
+os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+
+from lwats.agents_async.SearchAgents.cassette import REPLAY, Cassette
+from lwats.core_async.agent_factory import setup_search_agent
+from lwats.core_async.config import AgentConfig
+
+
+def replay_config(header: dict, path: str) -> AgentConfig:
+    """The recorded config, replaying from path. Fields this version no longer has are dropped."""
+    names = {field.name for field in dataclasses.fields(AgentConfig)}
+    recorded = {name: value for name, value in header["config"].items() if name in names}
+    return AgentConfig(**{**recorded, "cassette": path, "cassette_mode": REPLAY,
+                          "log_folder": tempfile.mkdtemp(prefix="bench_replay_")})
+
+
+async def replay(path: str, header: dict) -> tuple[float, dict]:
+    config = replay_config(header, path)
+    start = time.perf_counter()
+    agent, _ = await setup_search_agent(header["agent_type"], header["starting_url"], header["goal"], [], config)
+    result = await agent.run()
+    wall_seconds = time.perf_counter() - start
+    return wall_seconds, {
+        "score": result.value if result is not None else None,
+        "phases": agent.tracer.breakdown()["phases"],
+    }
+
+
+async def main(args):
+    header = Cassette(args.cassette, REPLAY).header
+    print(f"{header['agent_type']} recorded {header['timestamp']}: {header['goal']}")
+    profiler = cProfile.Profile() if args.profile else None
+    timings = []
+    for _ in range(args.repeat):
+        if profiler:
+            profiler.enable()
+        wall_seconds, summary = await replay(args.cassette, header)
+        if profiler:
+            profiler.disable()
+        timings.append(wall_seconds)
+
+    print(f"{'runs':>6}{'median s':>11}{'min s':>9}{'max s':>9}{'score':>8}")
+    print(f"{len(timings):>6}{statistics.median(timings):>11.3f}{min(timings):>9.3f}{max(timings):>9.3f}"
+          f"{summary['score'] if summary['score'] is not None else '-':>8}")
+    for name, phase in summary["phases"].items():
+        print(f"  {name:<24}{phase['count']:>6}{phase['total_seconds']:>10.3f}s{phase['share']:>8.1%}")
+    if profiler:
+        pstats.Stats(profiler).sort_stats(args.sort).print_stats(args.top)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("cassette", help="cassette file recorded with --cassette")
+    parser.add_argument("--repeat", type=int, default=1, help="number of replays")
+    parser.add_argument("--profile", action="store_true", help="profile the replays with cProfile")
+    parser.add_argument("--sort", default="cumulative", help="pstats sort key of the profile")
+    parser.add_argument("--top", type=int, default=25, help="functions of the profile to print")
+    asyncio.run(main(parser.parse_args()))
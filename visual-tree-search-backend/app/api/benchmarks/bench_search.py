@@ -0,0 +1,152 @@
+"""Benchmark the search algorithms offline, on a local fixture shop with a mock LLM.
+
+Serves benchmarks/fixtures/shop from a local HTTP server and runs BFS, DFS, LATS and MCTS
+in headless Chromium, with every LLM request answered by MockLLMClient (see mock_llm.py)
+after a configurable latency. The runs are deterministic: the same actions are proposed
+and the same scores given for the same pages, so changes to the search loop, the browser
+handling or the prompts can be compared on wall time, browser steps, LLM calls and memory
+without network access or API keys.
+
+Browser steps are the actions replayed to restore a node (replay_steps_total) and the
+actions taken by simulations (action_execution spans), browser launches are the resets.
+
+    cd visual-tree-search-backend/app/api
+    python benchmarks/bench_search.py
+    python benchmarks/bench_search.py --algorithms lats mcts --latency 0.5 --trace-memory
+    python benchmarks/bench_search.py --responses recorded_responses.json --json results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# the agents create their OpenAI clients at import time, the mock client replaces them
+os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+
+from benchmarks.fixture_site import serve_fixture_site
+from benchmarks.mock_llm import MockLLMClient, ScriptedTask
+from lwats.core_async.agent_factory import setup_search_agent
+from lwats.core_async.config import AgentConfig
+from lwats.webagent_utils_async.utils.metrics import browser_launches, replay_steps
+
+ALGORITHMS = ("bfs", "dfs", "lats", "mcts")
+
+AGENT_TYPES = {"bfs": "SimpleSearchAgent", "dfs": "SimpleSearchAgent", "lats": "LATSAgent", "mcts": "MCTSAgent"}
+
+# goal, milestones of the scripted task
+SCENARIOS = {
+    "add_to_cart": ("Add the trail running shoes to the shopping cart", ["Shoes", "Trail Running Shoes", "Add to Cart"]),
+    "find_boots": ("Open the product page of the hiking boots", ["Shoes", "Hiking Boots"]),
+}
+
+
+def _replayed_steps() -> float:
+    return sum(replay_steps.value(outcome=outcome) for outcome in ("ok", "wait_failed", "action_failed"))
+
+
+async def run_scenario(algorithm: str, scenario: str, base_url: str, args) -> dict:
+    goal, milestones = SCENARIOS[scenario]
+    client_kwargs = {"task": ScriptedTask(milestones, seed=args.seed), "latency": args.latency}
+    if args.responses:
+        client = MockLLMClient.from_file(args.responses, **client_kwargs)
+    else:
+        client = MockLLMClient(**client_kwargs)
+    log_folder = tempfile.mkdtemp(prefix=f"bench_{algorithm}_")
+    config = AgentConfig(
+        headless=True,
+        browser_mode="chromium",
+        storage_state=None,
+        account_reset=False,
+        page_settle_seconds=args.page_settle_seconds,
+        search_algorithm=algorithm if algorithm in ("bfs", "dfs") else "bfs",
+        branching_factor=args.branching_factor,
+        max_depth=args.max_depth,
+        iterations=args.iterations,
+        log_folder=log_folder,
+    )
+
+    replayed_before = _replayed_steps()
+    launches_before = browser_launches.value(mode="chromium", outcome="ok")
+    if args.trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    agent, playwright_manager = await setup_search_agent(AGENT_TYPES[algorithm], base_url, goal, [], config)
+    agent.llm_client = client
+    try:
+        result = await agent.run()
+    finally:
+        await agent.playwright_manager.close()
+        await playwright_manager.close()
+    wall_seconds = time.perf_counter() - start
+    traced_peak = None
+    if args.trace_memory:
+        traced_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    phases = agent.tracer.stats.as_dict()
+    trajectory = result.get_trajectory() if result is not None else []
+    descriptions = " ".join(step["natural_language_description"] or "" for step in trajectory)
+    return {
+        "algorithm": algorithm,
+        "scenario": scenario,
+        "solved": client.task.progress(descriptions) == len(milestones),
+        "wall_seconds": round(wall_seconds, 3),
+        "browser_steps": int(_replayed_steps() - replayed_before + phases.get("action_execution", {}).get("count", 0)),
+        "browser_launches": int(browser_launches.value(mode="chromium", outcome="ok") - launches_before),
+        "llm_calls": sum(client.calls.values()),
+        "llm_calls_by_kind": dict(client.calls),
+        "llm_prompt_tokens": sum(client.prompt_tokens.values()),
+        "traced_peak_mb": round(traced_peak / 2**20, 1) if traced_peak is not None else None,
+        # peak resident memory of the whole process so far, kilobytes on linux
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10, 1),
+        "phases": phases,
+    }
+
+
+async def main(args):
+    results = []
+    with serve_fixture_site("shop") as base_url:
+        print(f"fixture shop at {base_url}, latency={args.latency}s, branching_factor={args.branching_factor}, "
+              f"max_depth={args.max_depth}, iterations={args.iterations}")
+        for scenario in args.scenarios:
+            for algorithm in args.algorithms:
+                results.append(await run_scenario(algorithm, scenario, base_url, args))
+
+    print(f"{'scenario':<14}{'algorithm':<11}{'solved':>7}{'wall s':>9}{'steps':>7}{'launches':>10}"
+          f"{'llm calls':>11}{'tokens':>9}{'peak mb':>9}{'rss mb':>9}")
+    for r in results:
+        peak = f"{r['traced_peak_mb']:.1f}" if r["traced_peak_mb"] is not None else "-"
+        print(f"{r['scenario']:<14}{r['algorithm']:<11}{str(r['solved']):>7}{r['wall_seconds']:>9.2f}"
+              f"{r['browser_steps']:>7}{r['browser_launches']:>10}{r['llm_calls']:>11}{r['llm_prompt_tokens']:>9}"
+              f"{peak:>9}{r['max_rss_mb']:>9.1f}")
+    for r in results:
+        calls = ", ".join(f"{kind}={count}" for kind, count in sorted(r["llm_calls_by_kind"].items()))
+        print(f"{r['scenario']}/{r['algorithm']} llm calls: {calls}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf8") as file:
+            json.dump(results, file, indent=2)
+        print(f"results written to {args.json}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--algorithms", nargs="+", choices=ALGORITHMS, default=list(ALGORITHMS))
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=["add_to_cart"])
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per mock LLM request")
+    parser.add_argument("--responses", help="json file of recorded responses by request kind, see mock_llm.py")
+    parser.add_argument("--branching-factor", type=int, default=3)
+    parser.add_argument("--max-depth", type=int, default=3)
+    parser.add_argument("--iterations", type=int, default=3, help="iterations of lats and mcts")
+    parser.add_argument("--page-settle-seconds", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the distractor actions")
+    parser.add_argument("--trace-memory", action="store_true", help="also report the peak of python allocations, slows the runs down")
+    parser.add_argument("--json", help="write the results to this file")
+    asyncio.run(main(parser.parse_args()))
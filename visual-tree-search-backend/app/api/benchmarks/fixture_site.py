@@ -0,0 +1,47 @@
+"""Local HTTP server for the static fixture websites of the benchmarks.
+
+    with serve_fixture_site("shop") as base_url:
+        ...  # base_url is like http://127.0.0.1:53127/
+
+The sites live in benchmarks/fixtures/<site>. The shop has categories (Shoes, Bags,
+Jackets), product pages with an "Add to Cart" button and a cart page listing what was
+added. The cart is kept in localStorage, so every new browser context starts empty.
+"""
+import functools
+import os
+import threading
+from contextlib import contextmanager
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def serve_fixture_site(site: str = "shop", port: int = 0):
+    """
+    Serve a fixture site from a background thread.
+
+    Args:
+        site: Directory of the site in benchmarks/fixtures
+        port: Port to listen on, 0 picks a free one
+
+    Yields:
+        str: Base url of the site, ending with a slash
+    """
+    directory = os.path.join(FIXTURES_DIR, site)
+    if not os.path.isdir(directory):
+        raise FileNotFoundError(f"No fixture site {site} in {FIXTURES_DIR}")
+    server = ThreadingHTTPServer(("127.0.0.1", port), functools.partial(_QuietHandler, directory=directory))
+    thread = threading.Thread(target=server.serve_forever, name=f"fixture-site-{site}", daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/"
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
@@ -0,0 +1,22 @@
+// The cart lives in localStorage, so it starts empty in every new browser context.
+function cartItems() {
+    return JSON.parse(localStorage.getItem("cart") || "[]");
+}
+
+function addToCart(name) {
+    const items = cartItems();
+    items.push(name);
+    localStorage.setItem("cart", JSON.stringify(items));
+    location.href = "cart.html";
+}
+
+function renderCart() {
+    const items = cartItems();
+    document.getElementById("cart-count").textContent = `${items.length} item(s) in your cart`;
+    const list = document.getElementById("cart-items");
+    for (const name of items) {
+        const item = document.createElement("li");
+        item.textContent = name;
+        list.appendChild(item);
+    }
+}
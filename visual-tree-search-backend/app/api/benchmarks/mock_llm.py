@@ -0,0 +1,364 @@
+"""Deterministic stand-in for the OpenAI client, to run searches offline.
+
+MockLLMClient has the two methods the searches call, chat.completions.create (also
+streamed) and beta.chat.completions.parse, and returns real openai response objects, so
+the parsing code of the agents runs unchanged. Each request is classified by its shape
+(see classify_request) and answered either with a recorded response of its kind or by a
+ScriptedTask:
+
+    client = MockLLMClient(ScriptedTask(["Shoes", "Trail Running Shoes", "Add to Cart"]), latency=0.2)
+    agent.llm_client = client
+    ...
+    client.calls  # Counter of requests by kind
+
+A ScriptedTask is solved by acting on the page elements named by its milestones, in order.
+Action generation proposes the element of the next milestone, found by name in the
+accessibility tree of the prompt, along with a few seeded distractors. Scores, goal checks,
+MCTS selection and reflection all follow from how many milestones a trajectory has reached,
+read from the quoted element names of the action descriptions ("Click the link 'Shoes'").
+
+Recorded responses are a json file mapping request kinds to lists of response contents,
+replayed in order before falling back to the scripted task:
+
+    {"action_generation": [["{\\"content\\": \\"click('12')\\", ...}", ...]], "scoring": ["{\\"overall_score\\": 8}"]}
+
+This module only depends on openai and pydantic, so tests can use it without the agents.
+"""
+import json
+import math
+import random
+import re
+import time
+from collections import Counter, defaultdict
+from types import SimpleNamespace
+from typing import Optional, Union
+
+from openai.types.chat import ChatCompletion, ChatCompletionChunk, ParsedChatCompletion
+
+# request kinds, see classify_request
+ACTION_GENERATION = "action_generation"
+SCORING = "scoring"
+BATCH_SCORING = "batch_scoring"
+VERBOSE_SCORING = "verbose_scoring"
+GOAL_CHECK = "goal_check"
+FEEDBACK = "feedback"
+SELECTION = "selection"
+REFLECTION = "reflection"
+OTHER = "other"
+
+# logprob of the sampled action choices, the target action is the likely one
+TARGET_LOGPROB = math.log(0.9)
+DISTRACTOR_LOGPROB = math.log(0.3)
+# confidence of goal checks, parse_oai_logprob turns it back into a probability
+GOAL_CHECK_LOGPROB = math.log(0.95)
+
+# "[12] link 'Shoes'" lines of a flattened accessibility tree
+_AXTREE_ELEMENT = re.compile(r"\[(\w+)\] (link|button|menuitem|tab|checkbox|radio|option) '([^']*)'")
+_ACTION_MESSAGE = re.compile(r"^action is: (.*)$", re.IGNORECASE | re.MULTILINE)
+
+
+def _text_of(content) -> str:
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "\n".join(part.get("text", "") for part in content if isinstance(part, dict) and part.get("type") == "text")
+    return ""
+
+
+def prompt_text(messages: list[dict]) -> str:
+    """The text parts of all messages, images left out."""
+    return "\n".join(_text_of(message.get("content")) for message in messages)
+
+
+def classify_request(kwargs: dict, parsed: bool = False) -> str:
+    """The kind of an LLM request of the agents, from its arguments."""
+    messages = kwargs.get("messages", [])
+    if parsed:
+        fields = getattr(kwargs.get("response_format"), "model_fields", {})
+        if "goal_finished" in fields:
+            return GOAL_CHECK
+        if "is_done" in fields:
+            return FEEDBACK
+        return OTHER
+    if kwargs.get("stream"):
+        return SCORING
+    text = prompt_text(messages)
+    if kwargs.get("response_format") is None:
+        return FEEDBACK
+    if kwargs.get("logprobs") or kwargs.get("n", 1) > 1:
+        return ACTION_GENERATION
+    if "selected_child_index" in text:
+        return SELECTION
+    if "backtrack_to_step" in text:
+        return REFLECTION
+    if "Candidate 1:" in text:
+        return BATCH_SCORING
+    if "efficiency_score" in text:
+        return VERBOSE_SCORING
+    return OTHER
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class ScriptedTask:
+    """
+    A task solved by acting on the elements named by milestones, in order.
+
+    Args:
+        milestones: Names of the elements to act on
+        seed: Seeds the distractor actions and the noise
+        score_noise: Scores are off by up to this many points, seeded by the trajectory
+        miss_rate: Chance that an action choice is a distractor even though the next milestone is on the page
+    """
+
+    def __init__(self, milestones: list[str], seed: int = 0, score_noise: float = 0.0, miss_rate: float = 0.0):
+        self.milestones = list(milestones)
+        self.seed = seed
+        self.score_noise = score_noise
+        self.miss_rate = miss_rate
+        # (previous actions, action) -> description, to read the goal checks that only list actions
+        self.descriptions: dict[tuple, str] = {}
+
+    def progress(self, text: str) -> int:
+        """Number of leading milestones whose quoted element name appears in text."""
+        reached = 0
+        for name in self.milestones:
+            if f"'{name}'" not in text:
+                break
+            reached += 1
+        return reached
+
+    def score(self, text: str, steps: int) -> float:
+        """0-10: the share of milestones reached, minus a point per step that reached none."""
+        reached = self.progress(text)
+        score = 10 * reached / len(self.milestones) - max(0, steps - reached)
+        if self.score_noise:
+            score += random.Random(f"{self.seed}:{text}").uniform(-self.score_noise, self.score_noise)
+        return round(min(10.0, max(0.0, score)), 1)
+
+    def describe_actions(self, actions: list[str]) -> str:
+        return "\n".join(self.descriptions.get((tuple(actions[:i]), action), action)
+                         for i, action in enumerate(actions))
+
+    def generate_actions(self, text: str, n: int) -> list[tuple[dict, float]]:
+        """n sampled choices of the action generation, with the logprob of each."""
+        history, _, axtree = text.partition("Current Accessibility Tree")
+        reached = self.progress(history)
+        if reached == len(self.milestones):
+            finished = {"content": "noop()", "natural_language_description": "The goal is finished", "finished": True}
+            return [(finished, TARGET_LOGPROB)] * n
+
+        elements = [(bid, role, name) for bid, role, name in _AXTREE_ELEMENT.findall(axtree) if name]
+        target = next((element for element in elements if element[2] == self.milestones[reached]), None)
+        distractors = [element for element in elements if element[2] not in self.milestones]
+        rng = random.Random(f"{self.seed}:{reached}:{len(elements)}")
+        previous = re.findall(r"'action': \"([^\"]*)\"", history)
+
+        choices = []
+        for i in range(n):
+            if target is not None and i < (n + 1) // 2 and (not self.miss_rate or rng.random() >= self.miss_rate):
+                element, logprob = target, TARGET_LOGPROB
+            elif distractors:
+                element, logprob = rng.choice(distractors), DISTRACTOR_LOGPROB
+            else:
+                continue
+            bid, role, name = element
+            action = f"click('{bid}')"
+            description = f"Click the {role} '{name}'"
+            self.descriptions[(tuple(previous), action)] = description
+            choices.append(({"content": action, "natural_language_description": description, "finished": False}, logprob))
+        return choices
+
+
+class _Completions:
+    def __init__(self, client: "MockLLMClient"):
+        self._client = client
+
+    def create(self, **kwargs):
+        return self._client._respond(kwargs, parsed=False)
+
+    def parse(self, **kwargs):
+        return self._client._respond(kwargs, parsed=True)
+
+
+class MockLLMClient:
+    """
+    OpenAI client replaying recorded responses or answering for a ScriptedTask.
+
+    Args:
+        task: Scripted task answering the requests without a recorded response
+        responses: Recorded response contents by request kind, replayed in order
+        latency: Seconds every request takes, or seconds by request kind
+        model: Model name of the responses
+    """
+
+    def __init__(self, task: Optional[ScriptedTask] = None, responses: Optional[dict[str, list]] = None,
+                 latency: Union[float, dict[str, float]] = 0.0, model: str = "mock"):
+        self.task = task
+        self.responses = {kind: list(contents) for kind, contents in (responses or {}).items()}
+        self.latency = latency
+        self.model = model
+        self.calls: Counter = Counter()
+        self.prompt_tokens: Counter = Counter()
+        self._replayed: defaultdict = defaultdict(int)
+        self._created = 0
+        self.chat = SimpleNamespace(completions=_Completions(self))
+        self.beta = SimpleNamespace(chat=SimpleNamespace(completions=_Completions(self)))
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> "MockLLMClient":
+        with open(path, encoding="utf8") as file:
+            return cls(responses=json.load(file), **kwargs)
+
+    def _respond(self, kwargs: dict, parsed: bool):
+        kind = classify_request(kwargs, parsed=parsed)
+        text = prompt_text(kwargs.get("messages", []))
+        self.calls[kind] += 1
+        self.prompt_tokens[kind] += _estimate_tokens(text)
+        latency = self.latency.get(kind, 0.0) if isinstance(self.latency, dict) else self.latency
+        if latency:
+            time.sleep(latency)
+
+        choices = self._recorded(kind)
+        if choices is None:
+            choices = self._scripted(kind, text, kwargs)
+        if parsed:
+            return self._parsed_completion(choices, kwargs, text)
+        if kwargs.get("stream"):
+            return self._stream(choices[0][0])
+        return self._completion(choices, kwargs, text)
+
+    def _recorded(self, kind: str) -> Optional[list[tuple[str, Optional[float]]]]:
+        contents = self.responses.get(kind, [])
+        index = self._replayed[kind]
+        if index >= len(contents):
+            return None
+        self._replayed[kind] += 1
+        content = contents[index]
+        logprob = TARGET_LOGPROB if kind in (ACTION_GENERATION, GOAL_CHECK) else None
+        if isinstance(content, list):
+            return [(choice, logprob) for choice in content]
+        return [(content, logprob)]
+
+    def _scripted(self, kind: str, text: str, kwargs: dict) -> list[tuple[str, Optional[float]]]:
+        task = self.task
+        if task is None:
+            raise LookupError(f"No recorded {kind} response left and no scripted task")
+
+        if kind == ACTION_GENERATION:
+            choices = task.generate_actions(text, kwargs.get("n", 1))
+            return [(json.dumps(choice), logprob) for choice, logprob in choices]
+
+        if kind == GOAL_CHECK:
+            actions = _ACTION_MESSAGE.findall(text)
+            finished = task.progress(text + "\n" + task.describe_actions(actions)) == len(task.milestones)
+            return [(json.dumps({"goal_finished": finished}), GOAL_CHECK_LOGPROB)]
+
+        if kind == FEEDBACK:
+            description = _action_description(text)
+            if kwargs.get("response_format") is not None:
+                done = task.progress(description) == len(task.milestones)
+                return [(json.dumps({"is_done": done, "explanation": f"After: {description}"}), None)]
+            return [(f"The page shows the result of the action: {description}", None)]
+
+        if kind in (SCORING, VERBOSE_SCORING):
+            trajectory = text.split("Current Page State:")[0]
+            score = task.score(trajectory, trajectory.count("Action:"))
+            if kind == SCORING:
+                evaluation = {"overall_score": score, "reason": f"{task.progress(trajectory)} of {len(task.milestones)} steps done"}
+            else:
+                evaluation = {
+                    "overall_score": score, "efficiency_score": score, "accuracy_score": score, "robustness_score": score,
+                    "detailed_explanation": f"{task.progress(trajectory)} of {len(task.milestones)} steps done",
+                    "improvement_suggestions": [], "key_achievements": [], "potential_issues": [],
+                }
+            return [(json.dumps(evaluation), None)]
+
+        if kind == BATCH_SCORING:
+            shared = text.partition("Shared previous steps:")[2].partition("Candidates:")[0]
+            candidates = re.split(r"^Candidate \d+:$", text.partition("Candidates:")[2], flags=re.MULTILINE)[1:]
+            scores = []
+            for number, candidate in enumerate(candidates, start=1):
+                candidate = candidate.partition("Please score all")[0]
+                steps = shared.count("Action:") + candidate.count("Action:")
+                scores.append({"candidate": number, "overall_score": task.score(shared + candidate, steps)})
+            return [(json.dumps({"scores": scores}), None)]
+
+        if kind == SELECTION:
+            trajectory, _, children = text.partition("Available Children:")
+            target = task.milestones[min(task.progress(trajectory), len(task.milestones) - 1)]
+            children = json.loads(children[:children.rindex("]") + 1])
+            index = next((i for i, child in enumerate(children) if f"'{target}'" in child["description"]), 0)
+            return [(json.dumps({"selected_child_index": index, "explanation": f"Next is '{target}'"}), None)]
+
+        if kind == REFLECTION:
+            trajectory = json.loads(text.partition("Current Trajectory:")[2].partition("Score:")[0])
+            # back to the last step that reached a milestone
+            reached = task.progress(" ".join(step["natural_language_description"] or "" for step in trajectory))
+            return [(json.dumps({
+                "backtrack_to_step": reached,
+                "reason": f"The first {reached} steps reach the milestones",
+                "suggested_improvements": [f"Look for '{task.milestones[min(reached, len(task.milestones) - 1)]}'"],
+            }), None)]
+
+        raise LookupError(f"No scripted {kind} response")
+
+    def _next_id(self) -> str:
+        self._created += 1
+        return f"chatcmpl-mock-{self._created}"
+
+    def _usage(self, text: str, choices: list) -> dict:
+        prompt_tokens = _estimate_tokens(text)
+        completion_tokens = sum(_estimate_tokens(content) for content, _ in choices)
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens}
+
+    def _choices(self, choices: list, with_logprobs: bool, parsed_model=None) -> list[dict]:
+        result = []
+        for index, (content, logprob) in enumerate(choices):
+            message = {"role": "assistant", "content": content}
+            if parsed_model is not None:
+                message["parsed"] = parsed_model.model_validate_json(content)
+            logprobs = None
+            if with_logprobs:
+                logprobs = {"content": [{"token": content[:1], "logprob": logprob or 0.0, "bytes": None, "top_logprobs": []}]}
+            result.append({"index": index, "finish_reason": "stop", "message": message, "logprobs": logprobs})
+        return result
+
+    def _completion(self, choices: list, kwargs: dict, text: str) -> ChatCompletion:
+        return ChatCompletion.model_validate({
+            "id": self._next_id(), "object": "chat.completion", "created": int(time.time()), "model": self.model,
+            "choices": self._choices(choices, bool(kwargs.get("logprobs"))),
+            "usage": self._usage(text, choices),
+        })
+
+    def _parsed_completion(self, choices: list, kwargs: dict, text: str) -> ParsedChatCompletion:
+        response_format = kwargs["response_format"]
+        return ParsedChatCompletion[response_format].model_validate({
+            "id": self._next_id(), "object": "chat.completion", "created": int(time.time()), "model": self.model,
+            "choices": self._choices(choices, bool(kwargs.get("logprobs")), parsed_model=response_format),
+            "usage": self._usage(text, choices),
+        })
+
+    def _stream(self, content: str):
+        completion_id = self._next_id()
+        created = int(time.time())
+        # a few tokens per chunk, like the API
+        for start in range(0, len(content), 4):
+            yield ChatCompletionChunk.model_validate({
+                "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": self.model,
+                "choices": [{"index": 0, "delta": {"content": content[start:start + 4]}, "finish_reason": None}],
+            })
+
+
+def _action_description(text: str) -> str:
+    """The description of the action a feedback request is about."""
+    match = re.search(r"# Action description:\s*\n\s*(.+)", text)
+    if match:
+        return match.group(1).strip()
+    match = re.search(r"'natural_language_description': (\"[^\"]*\"|'[^']*')", text)
+    if match:
+        return match.group(1)[1:-1]
+    return ""
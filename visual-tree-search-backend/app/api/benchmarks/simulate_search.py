@@ -0,0 +1,169 @@
+"""Compare the search algorithms and sweep their parameters on a simulated site.
+
+Runs episodes of BFS, DFS, LATS and MCTS over a state graph (see
+lwats/agents_async/SearchAgents/simulator.py) instead of a browser, with every LLM request
+answered by a ScriptedTask (see mock_llm.py) whose milestones are the elements along the
+shortest path to the goal. Each episode has its own seed: on the synthetic shop it picks the
+product to add to the cart, and it seeds the distractor actions and the noise of the scripted
+task, so that --score-noise and --miss-rate make the LLM as unreliable as needed to tell the
+algorithms apart. An episode is solved when the actions of the search result lead to a goal
+state of the graph.
+
+--set runs every combination of the given AgentConfig values. The report has, per algorithm
+and combination, the success rate and the mean cost of an episode: LLM calls, estimated
+prompt tokens, browser steps (replayed and executed actions) and browser launches.
+
+    cd visual-tree-search-backend/app/api
+    python benchmarks/simulate_search.py --episodes 200
+    python benchmarks/simulate_search.py --algorithms lats mcts --set exploration_weight=0.5,1.41,2 \\
+        --set branching_factor=2,3 --score-noise 3 --miss-rate 0.3 --json sweep.json
+    python benchmarks/simulate_search.py --cassette log/cassettes/shop.jsonl --goal-url cart
+"""
+import argparse
+import asyncio
+import contextlib
+import dataclasses
+import io
+import itertools
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# the agents create their OpenAI clients at import time, the mock client replaces them
+os.environ.setdefault("OPENAI_API_KEY", "offline-benchmark")
+
+from benchmarks.mock_llm import MockLLMClient, ScriptedTask
+from lwats.agents_async.SearchAgents.cassette import REPLAY, Cassette
+from lwats.agents_async.SearchAgents.lats_agent import LATSAgent
+from lwats.agents_async.SearchAgents.mcts_agent import MCTSAgent
+from lwats.agents_async.SearchAgents.simple_search_agent import SimpleSearchAgent
+from lwats.agents_async.SearchAgents.simulator import StateGraph, run_episode, synthetic_shop
+from lwats.core_async.config import AgentConfig
+
+ALGORITHMS = ("bfs", "dfs", "lats", "mcts")
+AGENT_CLASSES = {"bfs": SimpleSearchAgent, "dfs": SimpleSearchAgent, "lats": LATSAgent, "mcts": MCTSAgent}
+
+
+def parse_sweep(assignments: list[str]) -> list[dict]:
+    """Every combination of --set name=value,value,... as AgentConfig keyword arguments."""
+    defaults = AgentConfig()
+    names, values = [], []
+    for assignment in assignments:
+        name, _, raw = assignment.partition("=")
+        if not hasattr(defaults, name):
+            raise SystemExit(f"AgentConfig has no field {name}")
+        default = getattr(defaults, name)
+        if isinstance(default, bool):
+            cast = lambda value: value.lower() in ("1", "true", "yes")
+        elif default is None:
+            cast = int
+        else:
+            cast = type(default)
+        names.append(name)
+        values.append([cast(value) for value in raw.split(",")])
+    return [dict(zip(names, combination)) for combination in itertools.product(*values)]
+
+
+def episode_sites(args):
+    """Function of the episode seed returning the state graph and goal of the episode."""
+    if args.cassette:
+        goal = Cassette(args.cassette, REPLAY).header["goal"]
+        graph = StateGraph.from_cassette(args.cassette, goal_url=args.goal_url)
+        return lambda seed: (graph, goal)
+    return lambda seed: synthetic_shop(args.categories, args.products, seed=seed)
+
+
+async def run_episodes(algorithm: str, params: dict, episode_site, args) -> dict:
+    config = AgentConfig(
+        storage_state=None,
+        account_reset=False,
+        page_settle_seconds=0,
+        search_algorithm=algorithm if algorithm in ("bfs", "dfs") else "bfs",
+        branching_factor=args.branching_factor,
+        max_depth=args.max_depth,
+        iterations=args.iterations,
+        log_folder=tempfile.mkdtemp(prefix=f"simulate_{algorithm}_"),
+    )
+    config = dataclasses.replace(config, **params)
+    episodes = []
+    start = time.perf_counter()
+    for seed in range(args.episodes):
+        graph, goal = episode_site(seed)
+        client = MockLLMClient(ScriptedTask(graph.milestones(), seed=seed, score_noise=args.score_noise,
+                                            miss_rate=args.miss_rate))
+        output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+        with output:
+            episode = await run_episode(AGENT_CLASSES[algorithm], graph, goal, config, client)
+        if episode["error"]:
+            print(f"{algorithm} episode {seed} failed: {episode['error']}", file=sys.stderr)
+        episode["llm_calls"] = sum(client.calls.values())
+        episode["llm_prompt_tokens"] = sum(client.prompt_tokens.values())
+        episodes.append(episode)
+    wall_seconds = time.perf_counter() - start
+
+    def mean(key):
+        return round(statistics.mean(episode[key] for episode in episodes), 2)
+
+    return {
+        "algorithm": algorithm,
+        "params": params,
+        "episodes": len(episodes),
+        "success_rate": round(sum(episode["solved"] for episode in episodes) / len(episodes), 3),
+        "errors": sum(episode["error"] is not None for episode in episodes),
+        "llm_calls": mean("llm_calls"),
+        "llm_prompt_tokens": mean("llm_prompt_tokens"),
+        "browser_steps": mean("browser_steps"),
+        "browser_launches": mean("browser_launches"),
+        "episodes_per_minute": round(60 * len(episodes) / wall_seconds, 1),
+    }
+
+
+async def main(args):
+    if not args.verbose:
+        logging.disable(logging.INFO)
+    site = args.cassette or f"synthetic shop, {args.categories} categories of {args.products} products"
+    print(f"{site}, {args.episodes} episodes, score_noise={args.score_noise}, miss_rate={args.miss_rate}")
+    episode_site = episode_sites(args)
+    results = []
+    for params in parse_sweep(args.set):
+        for algorithm in args.algorithms:
+            results.append(await run_episodes(algorithm, params, episode_site, args))
+
+    print(f"{'algorithm':<11}{'params':<36}{'success':>9}{'errors':>8}{'llm calls':>11}{'tokens':>9}"
+          f"{'steps':>8}{'launches':>10}{'ep/min':>9}")
+    for r in results:
+        params = " ".join(f"{name}={value}" for name, value in r["params"].items()) or "-"
+        print(f"{r['algorithm']:<11}{params:<36}{r['success_rate']:>9.1%}{r['errors']:>8}{r['llm_calls']:>11.1f}"
+              f"{r['llm_prompt_tokens']:>9.0f}{r['browser_steps']:>8.1f}{r['browser_launches']:>10.1f}"
+              f"{r['episodes_per_minute']:>9.0f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf8") as file:
+            json.dump(results, file, indent=2)
+        print(f"results written to {args.json}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--algorithms", nargs="+", choices=ALGORITHMS, default=list(ALGORITHMS))
+    parser.add_argument("--episodes", type=int, default=100, help="episodes per algorithm and combination")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE,...",
+                        help="AgentConfig values to sweep, repeat for a grid")
+    parser.add_argument("--cassette", help="simulate the pages recorded in this cassette instead of the synthetic shop")
+    parser.add_argument("--goal-url", help="states of the cassette whose url contains this are goal states")
+    parser.add_argument("--categories", type=int, default=3, help="categories of the synthetic shop")
+    parser.add_argument("--products", type=int, default=4, help="products per category of the synthetic shop")
+    parser.add_argument("--score-noise", type=float, default=0.0, help="scores are off by up to this many points")
+    parser.add_argument("--miss-rate", type=float, default=0.0, help="chance an action choice misses the next milestone")
+    parser.add_argument("--branching-factor", type=int, default=3)
+    parser.add_argument("--max-depth", type=int, default=3)
+    parser.add_argument("--iterations", type=int, default=3, help="iterations of lats and mcts")
+    parser.add_argument("--verbose", action="store_true", help="keep the output of the agents")
+    parser.add_argument("--json", help="write the results to this file")
+    asyncio.run(main(parser.parse_args()))
@@ -8,17 +8,24 @@ from dotenv import load_dotenv
 load_dotenv()
 
 from .lats_node import LATSNode, Observation
+from .browser_backend import PlaywrightBackend
+from .cassette import attach_cassette
 from ...core_async.config import AgentConfig
 
-from ...webagent_utils_async.action.highlevel import HighLevelActionSet
+from ...webagent_utils_async.action.highlevel import get_action_set
 from ...webagent_utils_async.utils.playwright_manager import AsyncPlaywrightManager, setup_playwright
 from .tree_vis import RED, better_print, print_trajectory, collect_all_nodes, GREEN, RESET, print_entire_tree
-from .trajectory_score import create_llm_prompt, score_trajectory_with_openai
+from .trajectory_score import create_llm_prompt, score_trajectory_with_openai, evaluate_trajectory, score_trajectories_batch
+from .value_function import normalized_entropy, select_for_escalation, prior_value
 from ...replay_async import generate_feedback, playwright_step_execution, locate_element_from_action
 from ...webagent_utils_async.browser_env.observation import extract_page_info, observe_features
+from ...webagent_utils_async.browser_env.observation_diff import ObservationDiffer, axtree_state_hash
+from ...webagent_utils_async.browser_env.perceptual_hash import screenshot_dhash, hamming_distance
 from ...webagent_utils_async.action.prompt_functions import generate_actions_with_observation
 from ...webagent_utils_async.evaluation.feedback import generate_feedback_with_screenshot
 from ...webagent_utils_async.utils.utils import urls_to_images
+from ...webagent_utils_async.utils.tracing import Tracer, traced
+from ...webagent_utils_async.utils.metrics import instrument_openai_client
 from ...webagent_utils_async.utils.utils import parse_function_args, locate_element
 from ...evaluation_async.evaluators import goal_finished_evaluator
 from ...webagent_utils_async.action.prompt_functions import extract_top_actions
@@ -31,7 +38,7 @@ from ...webagent_utils_async.action.prompt_functions import extract_top_actions,
 from ...webagent_utils_async.browser_env.observation import extract_page_info
 from ...webagent_utils_async.evaluation.feedback import capture_post_action_feedback
 
-openai_client = OpenAI()
+openai_client = instrument_openai_client(OpenAI())
 
 
 class BaseAgent:
@@ -59,12 +66,29 @@ class BaseAgent:
             self.messages.append({"role": "user", "content": f"The goal is: {self.goal}"})
 
         self.playwright_manager = playwright_manager
+        # previous observation of the current browser session, for the observation delta
+        self.observation_differ = ObservationDiffer()
 
         self.config = config
+        # pause and resume from the session running this search, see services/search_sessions.py
+        self.control = None
+        # SearchCheckpointer saving the tree between search steps, see checkpoint.py
+        self.checkpointer = None
+        # iterations done before this run, when resumed from a checkpoint
+        self.resumed_iterations = 0
+        self.completed_iterations = 0
+        # time spent per search phase, sent with search_complete
+        self.tracer = Tracer(name=type(self).__name__)
+        # client of every LLM request of the search, the benchmarks put a mock client here
+        self.llm_client = openai_client
+        # browser operations of the search, the cassette records or replays them
+        self.browser_backend = PlaywrightBackend()
+        # Cassette recording or replaying the search, see cassette.py
+        self.cassette = None
 
         # set bid, only click, fill, hoover, drag and draw
         self.agent_type = ["bid"]
-        self.action_set = HighLevelActionSet(
+        self.action_set = get_action_set(
             subsets=self.agent_type, strict=False, multiaction=False, demo_mode="default"
         )
         self.root_node = LATSNode(
@@ -81,7 +105,9 @@ class BaseAgent:
         self.root_node.is_terminal = False
         self.goal_finished = False
         self.result_node = None
-        self.reset_url = os.environ["ACCOUNT_RESET_URL"]
+        self.reset_url = os.getenv("ACCOUNT_RESET_URL")
+        if config.cassette:
+            attach_cassette(self, config.cassette, config.cassette_mode)
 
     def get_path_to_root(self, node: LATSNode) -> List[LATSNode]:
         path = []
@@ -97,8 +123,8 @@ class BaseAgent:
 
         for node in nodes:
             node_data = {
-                "id": id(node),
-                "parent_id": id(node.parent) if node.parent else None,
+                "id": node.node_id,
+                "parent_id": node.parent.node_id if node.parent else None,
                 "action": node.action if node.action else "ROOT",
                 "description": node.natural_language_description,
                 "depth": node.depth,
@@ -106,6 +132,7 @@ class BaseAgent:
                 "value": node.value,
                 "visits": node.visits,
                 "feedback": node.feedback,
+                "likely_noop": node.likely_noop,
                 # "reward": node.reward
             }
             tree_data.append(node_data)
@@ -127,7 +154,7 @@ class BaseAgent:
         # Process nodes in order from root to terminal
         for level, node in enumerate(reversed(path)):
             node_data = {
-                "id": id(node),
+                "id": node.node_id,
                 "level": level,
                 "action": node.action if node.action else "ROOT",
                 "description": node.natural_language_description,
@@ -157,7 +184,7 @@ class BaseAgent:
         # Process nodes in order from root to terminal
         for level, node in enumerate(reversed(path)):
             node_data = {
-                "id": id(node),
+                "id": node.node_id,
                 "level": level,
                 "action": node.action if node.action else "ROOT",
                 "description": node.natural_language_description,
@@ -174,8 +201,10 @@ class BaseAgent:
         return trajectory_data
 
 
+    @traced("browser_reset")
     async def _reset_browser(self, websocket=None) -> Optional[str]:
         await self.playwright_manager.close()
+        self.observation_differ.reset()
 
         ## reset account using api-based account reset
         if self.config.account_reset:
@@ -217,7 +246,7 @@ class BaseAgent:
 
         try:
             # Create new playwright manager
-            self.playwright_manager = await setup_playwright(
+            self.playwright_manager = await self.browser_backend.launch(
                 storage_state=self.config.storage_state,
                 headless=self.config.headless,
                 mode=self.config.browser_mode
@@ -290,15 +319,15 @@ class BaseAgent:
         if websocket:
             await websocket.send_json({
                 "type":type,
-                "node_id": id(node),
-                "parent_id": id(node.parent),
+                "node_id": node.node_id,
+                "parent_id": node.parent.node_id if node.parent else None,
                 "action": node.action,
                 "description": node.natural_language_description,
                 "timestamp": datetime.utcnow().isoformat()
             })
         else:
-            print(f"{type}: {GREEN}{id(node)}{RESET}")
-            print(f"Node parent: {GREEN}{id(node.parent)}{RESET}")
+            print(f"{type}: {GREEN}{node.node_id}{RESET}")
+            print(f"Node parent: {GREEN}{node.parent.node_id if node.parent else None}{RESET}")
             print(f"Node action: {GREEN}{node.action}{RESET}")
             print(f"Node description: {GREEN}{node.natural_language_description}{RESET}")
 
@@ -316,15 +345,15 @@ class BaseAgent:
         if websocket:
             await websocket.send_json({
                 "type": "node_created",
-                "node_id": id(child),
-                "parent_id": id(node),
+                "node_id": child.node_id,
+                "parent_id": node.node_id,
                 "action": child.action,
                 "description": child.natural_language_description,
                 "timestamp": datetime.utcnow().isoformat()
             })
         else:
-            print(f"Node created: {GREEN}{id(child)}{RESET}")
-            print(f"Node parent: {GREEN}{id(node)}{RESET}")
+            print(f"Node created: {GREEN}{child.node_id}{RESET}")
+            print(f"Node parent: {GREEN}{node.node_id}{RESET}")
             print(f"Node action: {GREEN}{child.action}{RESET}")
             print(f"Node description: {GREEN}{child.natural_language_description}{RESET}")
 
@@ -334,15 +363,15 @@ class BaseAgent:
         if websocket:
             await websocket.send_json({
                 "type": "node_simulated",
-                "node_id": id(child),
-                "parent_id": id(node),
+                "node_id": child.node_id,
+                "parent_id": node.node_id,
                 "action": child.action,
                 "description": child.natural_language_description,
                 "timestamp": datetime.utcnow().isoformat()
             })
         else:
-            print(f"Node simulated: {GREEN}{id(child)}{RESET}")
-            print(f"Node parent: {GREEN}{id(node)}{RESET}")
+            print(f"Node simulated: {GREEN}{child.node_id}{RESET}")
+            print(f"Node parent: {GREEN}{node.node_id}{RESET}")
             print(f"Node action: {GREEN}{child.action}{RESET}")
             print(f"Node description: {GREEN}{child.natural_language_description}{RESET}")
         ## but different color for the link
@@ -362,8 +391,8 @@ class BaseAgent:
             await websocket.send_json({
                 "type": "simulation_result",
                 "reward": reward,
-                "terminal_node_id": id(terminal_node),
-                "terminal_node_parent_id": id(terminal_node.parent),
+                "terminal_node_id": terminal_node.node_id,
+                "terminal_node_parent_id": terminal_node.parent.node_id if terminal_node.parent else None,
                 "terminal_node_action": terminal_node.action,
                 "terminal_node_description": terminal_node.natural_language_description,
                 "timestamp": datetime.utcnow().isoformat()
@@ -373,24 +402,85 @@ class BaseAgent:
             print(f"Simulation terminal node: {GREEN}{terminal_node}{RESET}")
 
     async def websocket_search_complete(self, status, score, path, websocket=None):
+        evaluation = self.evaluate_final_path(path)
+        timings = self.tracer.finish()
         if websocket:
-            await websocket.send_json({
+            message = {
                     "type": "search_complete",
                     "status": status,
                     "score": score,
                     "path": path,
+                    "timings": timings,
                     "timestamp": datetime.utcnow().isoformat()
-                })
+                }
+            if evaluation is not None:
+                message["evaluation"] = evaluation
+            await websocket.send_json(message)
         else:
             print(f"Search complete: {GREEN}{status}{RESET}")
             print(f"Search score: {GREEN}{score}{RESET}")
             print(f"Search path: {GREEN}{path}{RESET}")
+            if evaluation is not None:
+                print(f"Search evaluation: {GREEN}{evaluation}{RESET}")
+            print(f"Search timings: {GREEN}{timings}{RESET}")
+
+    @traced("scoring")
+    def score_trajectory(self, trajectory: list[dict]) -> dict:
+        """Score a trajectory with the configured evaluation mode."""
+        prompt = create_llm_prompt(trajectory, self.goal)
+        return evaluate_trajectory(
+            prompt,
+            self.llm_client,
+            model=self.config.evaluation_model,
+            mode=self.config.evaluation_mode
+        )
+
+    @traced("final_evaluation")
+    def evaluate_final_path(self, path) -> Optional[dict]:
+        """Run the verbose evaluation on the final best path, if enabled."""
+        if not self.config.verbose_final_evaluation or not path:
+            return None
+        prompt = create_llm_prompt(path, self.goal)
+        return score_trajectory_with_openai(prompt, self.llm_client, model=self.config.evaluation_model)
+
+    def resume_from_checkpoint(self, checkpoint) -> None:
+        """Continue the search of a SearchCheckpoint, with its tree and completed iterations."""
+        self.root_node = checkpoint.root
+        self.resumed_iterations = checkpoint.completed_iterations
+        self.completed_iterations = checkpoint.completed_iterations
+
+    def save_checkpoint(self) -> None:
+        if self.checkpointer is not None:
+            self.checkpointer.save(self.root_node, self.completed_iterations)
+
+    async def step_boundary(self) -> None:
+        """Called between search steps: saves a checkpoint, then blocks while the session controlling this search is paused."""
+        with self.tracer.span("checkpoint"):
+            self.save_checkpoint()
+        if self.control is not None:
+            with self.tracer.span("paused"):
+                await self.control.wait_if_paused()
+
+    async def iteration_boundary(self, iteration: int) -> bool:
+        """
+        Called before each search iteration, saves a checkpoint and waits while paused.
+
+        Args:
+            iteration: Iteration of this run, counted from 0 also when resumed from a checkpoint
+
+        Returns:
+            bool: Whether the iteration is within the iteration budget, which can change during the search
+        """
+        self.completed_iterations = self.resumed_iterations + iteration
+        await self.step_boundary()
+        return self.completed_iterations < self.config.iterations
 
     # shared, not implemented, BFS, DFS and LATS has its own node selection logic
     async def node_selection(self, node, websocket = None):
         NotImplemented
 
 
+    @traced("node_expansion")
     async def node_expansion(self, node: LATSNode, websocket = None) -> None:
         if websocket:
             node_info = {
@@ -403,7 +493,7 @@ class BaseAgent:
             }
             await websocket.send_json({
                 "type": "node_expansion_start",
-                "node_id": id(node),
+                "node_id": node.node_id,
                 "node_info": node_info,
                 "timestamp": datetime.utcnow().isoformat()
             })
@@ -422,8 +512,8 @@ class BaseAgent:
                 child.is_terminal = True
             node.children.append(child)
             children_data.append({
-                "id": id(child),
-                "parent_id": id(node),
+                "id": child.node_id,
+                "parent_id": node.node_id,
                 "action": child.action,
                 "description": child.natural_language_description,
                 "is_terminal": child.is_terminal,
@@ -434,7 +524,7 @@ class BaseAgent:
         if websocket:
             await websocket.send_json({
                 "type": "node_expansion_complete",
-                "node_id": id(node),
+                "node_id": node.node_id,
                 "node_info": node_info,
                 "children": children_data,
                 "timestamp": datetime.utcnow().isoformat()
@@ -443,35 +533,25 @@ class BaseAgent:
 
      # node evaluation
      # change the node evaluation to use the new prompt
+    @traced("node_children_evaluation")
     async def node_children_evaluation(self, node: LATSNode, websocket = None) -> None:
+        if self.config.value_function == "logprob":
+            return await self.node_children_evaluation_logprob(node, websocket)
         if websocket:
             await websocket.send_json({
                 "type": "evaluation_start",
-                "node_id": id(node),
+                "node_id": node.node_id,
                 "children_count": len(node.children),
                 "timestamp": datetime.utcnow().isoformat()
             })
-        scores = []
         print(f"{GREEN}-- total {len(node.children)} children to evaluate:{RESET}")
-        for i, child in enumerate(node.children):
-            print(f"{GREEN}--- evaluating child {i+1}...{RESET}")
-            # if child.is_terminal:
-            #     score = 0
-            # else:
-            trajectory = child.get_trajectory()
-            if len(trajectory) == 0:
-                score = 0
-            else:
-                prompt = create_llm_prompt(trajectory, self.goal)
-                # , child.observation.image
-                result = score_trajectory_with_openai(prompt, openai_client, self.config.evaluation_model)
-                score = result["overall_score"]
-            scores.append(score)
+        scores = self.score_children(node.children)
+        for child, score in zip(node.children, scores):
             if websocket:
                 await websocket.send_json({
                     "type": "child_evaluated",
-                    "node_id": id(child),
-                    "parent_id": id(node),
+                    "node_id": child.node_id,
+                    "parent_id": node.node_id,
                     "score": score,
                     "timestamp": datetime.utcnow().isoformat()
                 })
@@ -480,8 +560,91 @@ class BaseAgent:
             child.value = score
             # child.reward = score
 
+    def score_child(self, child: LATSNode) -> float:
+        trajectory = child.get_trajectory()
+        if len(trajectory) == 0:
+            return 0
+        # , child.observation.image
+        result = self.score_trajectory(trajectory)
+        return result["overall_score"]
+
+    def score_children(self, children: list[LATSNode]) -> list[float]:
+        """Score sibling children, in one batched request if enabled."""
+        trajectories = [child.get_trajectory() for child in children]
+        if self.config.batch_evaluation and len(children) > 1 and all(trajectories):
+            print(f"{GREEN}--- evaluating {len(children)} children in one batch...{RESET}")
+            with self.tracer.span("scoring"):
+                scores = score_trajectories_batch(
+                    trajectories,
+                    self.goal,
+                    self.llm_client,
+                    model=self.config.evaluation_model
+                )
+            if scores is not None:
+                return scores
+        scores = []
+        for i, child in enumerate(children):
+            print(f"{GREEN}--- evaluating child {i+1}...{RESET}")
+            # if child.is_terminal:
+            #     score = 0
+            # else:
+            scores.append(self.score_child(child))
+        return scores
+
+    async def node_children_evaluation_logprob(self, node: LATSNode, websocket = None) -> None:
+        """Value children from the action sampling distribution, inside the
+        node_children_evaluation span of its caller.
+
+        Only the top-k children and close calls get an LLM scoring call, the
+        rest are valued relative to the lowest-prob escalated sibling.
+        """
+        # children restored from an older checkpoint may have no prob
+        probs = [child.prob or 0.0 for child in node.children]
+        entropy = normalized_entropy(probs)
+        escalated = select_for_escalation(
+            probs,
+            top_k=self.config.value_escalation_top_k,
+            margin=self.config.value_escalation_margin
+        )
+        if websocket:
+            await websocket.send_json({
+                "type": "evaluation_start",
+                "node_id": node.node_id,
+                "children_count": len(node.children),
+                "escalated_count": len(escalated),
+                "prior_entropy": entropy,
+                "timestamp": datetime.utcnow().isoformat()
+            })
+        print(f"{GREEN}-- total {len(node.children)} children, {len(escalated)} escalated to llm scoring, entropy {entropy:.3f}{RESET}")
+
+        scores = [None] * len(node.children)
+        escalated_scores = self.score_children([node.children[i] for i in escalated])
+        for i, score in zip(escalated, escalated_scores):
+            scores[i] = score
+
+        if escalated:
+            anchor = escalated[-1]
+            for i, score in enumerate(scores):
+                if score is None:
+                    scores[i] = prior_value(probs[i], probs[anchor], scores[anchor])
+
+        for child, score in zip(node.children, scores):
+            child.value = score
+            if websocket:
+                await websocket.send_json({
+                    "type": "child_evaluated",
+                    "node_id": child.node_id,
+                    "parent_id": node.node_id,
+                    "score": score,
+                    "timestamp": datetime.utcnow().isoformat()
+                })
+
+    @traced("node_evaluation")
     async def node_evaluation(self, node: LATSNode, websocket = None) -> None:
         """Evaluate the current node and assign its score."""
+        if node.evaluated:
+            # scored before the search was resumed from a checkpoint
+            return
         if websocket:
             node_info = {
                 "action": node.action if node.action else "ROOT",
@@ -493,7 +656,7 @@ class BaseAgent:
             }
             await websocket.send_json({
                 "type": "node_evaluation_start",
-                "node_id": id(node),
+                "node_id": node.node_id,
                 "node_info": node_info,
                 "timestamp": datetime.utcnow().isoformat()
             })
@@ -515,30 +678,28 @@ class BaseAgent:
                 # if node.is_terminal:
                 #     score = 0
                 # else:
-                if len(trajectory) == 0:
+                if node.likely_noop and self.config.prune_noop_actions:
+                    score = self.config.noop_value
+                elif len(trajectory) == 0:
                     score = 0
                 else:
-                    prompt = create_llm_prompt(trajectory, self.goal)
-                    result = score_trajectory_with_openai(
-                        prompt,
-                        openai_client,
-                        model=self.config.evaluation_model
-                    )
+                    result = self.score_trajectory(trajectory)
                     score = result["overall_score"]
 
             except Exception as e:
-                error_msg = f"Error scoring node {id(node)}: {str(e)}"
+                error_msg = f"Error scoring node {node.node_id}: {str(e)}"
                 print(error_msg)
                 score = float('-inf')
 
             # Assign the score to the node
             node.value = score
+            node.evaluated = True
             # node.reward = score
 
             if websocket:
                 await websocket.send_json({
                     "type": "node_evaluation_complete",
-                    "node_id": id(node),
+                    "node_id": node.node_id,
                     "node_info": node_info,
                     "score": score,
                     "trajectory": trajectory,
@@ -551,6 +712,7 @@ class BaseAgent:
 
     # shared
     ## TODO: check the logic of updating value/ reward, is the input value?
+    @traced("backpropagation")
     def backpropagate(self, node: LATSNode, value: float) -> None:
         while node:
             if node.depth != 0:
@@ -560,6 +722,7 @@ class BaseAgent:
             node = node.parent
 
     # shared
+    @traced("simulation")
     async def simulation(self, node: LATSNode, websocket=None) -> tuple[float, LATSNode]:
         depth = node.depth
         num_simulations = self.config.num_simulations
@@ -583,26 +746,29 @@ class BaseAgent:
         messages = []
         trajectory = []
 
-        for n in path[1:]:  # Skip root node
-            success = await playwright_step_execution(
-                n,
-                self.goal,
-                self.playwright_manager,
-                is_replay=False,
-                log_folder=self.config.log_folder
-            )
-            if not success:
-                return 0, n
-            if not n.feedback:
-                n.feedback = await generate_feedback(
+        with self.tracer.span("path_replay"):
+            for n in path[1:]:  # Skip root node
+                success = await self.browser_backend.replay_step(
+                    n,
                     self.goal,
-                    n.natural_language_description,
                     self.playwright_manager,
+                    log_folder=self.config.log_folder
                 )
-                trajectory.append({
-                    "action": n.action,
-                    "feedback": n.feedback
-                })
+                if not success:
+                    return 0, n
+                if not n.feedback:
+                    with self.tracer.span("feedback"):
+                        n.feedback = await generate_feedback(
+                            self.goal,
+                            n.natural_language_description,
+                            self.playwright_manager,
+                            openai_client=self.llm_client,
+                            settle_seconds=self.config.page_settle_seconds,
+                        )
+                    trajectory.append({
+                        "action": n.action,
+                        "feedback": n.feedback
+                    })
         print("current depth: ", len(path) - 1)
         print("max depth: ", self.config.max_depth)
 
@@ -613,15 +779,17 @@ class BaseAgent:
         print_entire_tree(self.root_node)
 
         page = await self.playwright_manager.get_page()
-        page_info = await extract_page_info(page, self.config.fullpage, self.config.log_folder)
+        with self.tracer.span("extract_page_info"):
+            page_info = await self.browser_backend.observe(page, self.config.fullpage, self.config.log_folder)
 
         messages = [{"role": "user", "content": f"Action is: {n.action}"} for n in path[1:]]
-        goal_finished, confidence_score = goal_finished_evaluator(
-            messages,
-            openai_client,
-            self.goal,
-            page_info['screenshot']
-        )
+        with self.tracer.span("scoring"):
+            goal_finished, confidence_score = goal_finished_evaluator(
+                messages,
+                self.llm_client,
+                self.goal,
+                page_info['screenshot']
+            )
         print("evaluating")
 
         score = confidence_score if goal_finished else 0
@@ -631,7 +799,7 @@ class BaseAgent:
 
 
     # TODO: decide whether to keep the tree update
-    async def send_completion_request(self, plan, depth, node, trajectory=[], websocket=None):
+    async def send_completion_request(self, plan, depth, node, trajectory=[], websocket=None, page_info=None):
         print("print the trajectory")
         print_trajectory(node)
         print("print the entire tree")
@@ -649,16 +817,26 @@ class BaseAgent:
 
         context = await self.playwright_manager.get_context()
         page = await self.playwright_manager.get_page()
-        # Extract page information
-        time.sleep(3)
-        page_info = await extract_page_info(page, fullpage=True, log_folder=self.config.log_folder)
-        updated_actions = await extract_top_actions(
-            trajectory, self.goal, self.images, page_info, self.action_set, openai_client,
-            features=["axtree"], elements_filter="som", branching_factor=self.config.branching_factor,
-            log_folder=self.config.log_folder, fullpage=True,
-            action_generation_model=self.config.action_generation_model,
-            action_grounding_model=self.config.action_grounding_model
-        )
+        # Extract page information, unless the previous step already observed the page after its action
+        if page_info is None:
+            with self.tracer.span("page_settle"):
+                time.sleep(self.config.page_settle_seconds)
+            with self.tracer.span("extract_page_info"):
+                page_info = await self.browser_backend.observe(page, fullpage=True, log_folder=self.config.log_folder)
+            if self.config.observation_delta:
+                self.observation_differ.observe(page_info)
+        with self.tracer.span("extract_top_actions"):
+            updated_actions = await extract_top_actions(
+                trajectory, self.goal, self.images, page_info, self.action_set, self.llm_client,
+                features=["axtree"], elements_filter="som", branching_factor=self.config.branching_factor,
+                log_folder=self.config.log_folder, fullpage=True,
+                action_generation_model=self.config.action_generation_model,
+                action_grounding_model=self.config.action_grounding_model,
+                axtree_max_tokens=self.config.axtree_max_tokens
+            )
+        if not updated_actions or updated_actions[0]["action"] == "FINISH":
+            # nothing left to simulate, retrying would ask for the same actions again
+            return trajectory, node
         next_action = updated_actions[0]
         retry_count = self.config.retry_count if hasattr(self.config, 'retry_count') else 1  # Default retries if not set
 
@@ -669,15 +847,31 @@ class BaseAgent:
 
                 # Locate element
                 if len(function_calls) == 1:
-                    for function_name, function_args in function_calls:
-                        extracted_number = parse_function_args(function_args)
-                        element = await locate_element(page, extracted_number)
-                        next_action["element"] = element
+                    with self.tracer.span("grounding"):
+                        for function_name, function_args in function_calls:
+                            extracted_number = parse_function_args(function_args)
+                            element = await self.browser_backend.locate(page, extracted_number)
+                            next_action["element"] = element
 
                 # Execute action
-                await execute_action(next_action, self.action_set, page, context, self.goal, page_info['interactive_elements'],
-                            self.config.log_folder)
-                feedback = await capture_post_action_feedback(page, next_action, self.goal, self.config.log_folder)
+                with self.tracer.span("action_execution"):
+                    await self.browser_backend.execute(next_action, self.action_set, page, context, self.goal,
+                                                       page_info['interactive_elements'], self.config.log_folder)
+                post_action_page_info = None
+                observation_delta = None
+                if self.config.observation_delta:
+                    with self.tracer.span("page_settle"):
+                        time.sleep(self.config.page_settle_seconds)
+                    with self.tracer.span("extract_page_info"):
+                        post_action_page_info = await self.browser_backend.observe(page, fullpage=True, log_folder=self.config.log_folder)
+                    delta = self.observation_differ.observe(post_action_page_info)
+                    if delta is not None:
+                        observation_delta = delta.to_prompt_str()
+                with self.tracer.span("feedback"):
+                    feedback = await capture_post_action_feedback(page, next_action, self.goal, self.config.log_folder,
+                                                                  observation_delta=observation_delta,
+                                                                  openai_client=self.llm_client,
+                                                                  settle_seconds=self.config.page_settle_seconds)
                 trajectory.append({'action': next_action['action'], 'feedback': feedback})
                 action_str = next_action["action"]
 
@@ -691,7 +885,8 @@ class BaseAgent:
                     messages.append({"role": "user", "content": 'action is: {}'.format(action)})
                     messages.append({"role": "user", "content": 'action feedback is: {}'.format(feedback)})
 
-                goal_finished = await is_goal_finished(messages, openai_client)
+                with self.tracer.span("goal_check"):
+                    goal_finished = await is_goal_finished(messages, self.llm_client)
 
                 new_node = LATSNode(
                     natural_language_description=next_action["natural_language_description"],
@@ -710,7 +905,8 @@ class BaseAgent:
                 if goal_finished:
                     return trajectory, new_node
 
-                return await self.send_completion_request(plan, depth + 1, new_node, trajectory, websocket)
+                return await self.send_completion_request(plan, depth + 1, new_node, trajectory, websocket,
+                                                          page_info=post_action_page_info)
 
             except Exception as e:
                 print(f"Attempt {attempt + 1} failed with error: {e}")
@@ -724,55 +920,102 @@ class BaseAgent:
 
 
 
+    def observe_page_state(self, node: LATSNode, url: str, page_info: dict) -> bool:
+        """
+        Store the perceptual hash of the screenshot and the hash of the AXTree of the page
+        observed after the node's action.
+
+        The AXTree decides: toggling a checkbox or a radio button barely changes the screenshot
+        but changes the checked property of the element. The screenshot hash only short-cuts
+        pages that visibly changed.
+
+        Returns:
+            bool: Whether the page is the one observed after the parent's action,
+                  in which case the node is marked as a likely no-op
+        """
+        node.screenshot_hash = screenshot_dhash(page_info['screenshot'])
+        node.axtree_hash = axtree_state_hash(page_info)
+        node.observed_url = url
+        parent = node.parent
+        if parent is None or parent.screenshot_hash is None or parent.observed_url != url:
+            return False
+        if hamming_distance(node.screenshot_hash, parent.screenshot_hash) > self.config.noop_hash_distance:
+            return False
+        node.likely_noop = node.axtree_hash == parent.axtree_hash
+        return node.likely_noop
+
     # # simple search agent generate children method
     # TODO: clean up generate children, no need to put so much information in the websocket
     async def generate_children(self, node: LATSNode, websocket=None) -> list[dict]:
+        if node.likely_noop and self.config.prune_noop_actions:
+            return []
         # Reset browser and get live URL
         live_browser_url, session_id = await self._reset_browser(websocket)
         path = self.get_path_to_root(node)
 
         # Execute path
-        for n in path[1:]:  # Skip root node
-            success = await playwright_step_execution(
-                n,
-                self.goal,
-                self.playwright_manager,
-                is_replay=False,
-                log_folder=self.config.log_folder
-            )
-            if not success:
-                n.is_terminal = True
-                return []
-
-            if not n.feedback:
-                n.feedback = await generate_feedback(
+        with self.tracer.span("path_replay"):
+            for n in path[1:]:  # Skip root node
+                success = await self.browser_backend.replay_step(
+                    n,
                     self.goal,
-                    n.natural_language_description,
                     self.playwright_manager,
+                    log_folder=self.config.log_folder
                 )
+                if not success:
+                    n.is_terminal = True
+                    return []
 
-        time.sleep(3)
+                if not n.feedback:
+                    with self.tracer.span("feedback"):
+                        n.feedback = await generate_feedback(
+                            self.goal,
+                            n.natural_language_description,
+                            self.playwright_manager,
+                            openai_client=self.llm_client,
+                            settle_seconds=self.config.page_settle_seconds,
+                        )
+
+        with self.tracer.span("page_settle"):
+            time.sleep(self.config.page_settle_seconds)
         page = await self.playwright_manager.get_page()
-        page_info = await extract_page_info(page, self.config.fullpage, self.config.log_folder)
+        with self.tracer.span("extract_page_info"):
+            page_info = await self.browser_backend.observe(page, self.config.fullpage, self.config.log_folder)
+
+        if self.observe_page_state(node, page.url, page_info) and self.config.prune_noop_actions:
+            # the action changed nothing on the page, no need to generate and score actions on the same page again
+            node.is_terminal = True
+            node.value = self.config.noop_value
+            print(f"{RED}Pruning likely no-op action: {node.action}{RESET}")
+            if websocket:
+                await websocket.send_json({
+                    "type": "node_terminal",
+                    "node_id": node.node_id,
+                    "reason": "noop_action",
+                    "timestamp": datetime.utcnow().isoformat()
+                })
+            return []
 
         messages = [{"role": "user", "content": f"Action is: {n.action}"} for n in path[1:]]
 
 
-        next_actions = await extract_top_actions(
-            [{"natural_language_description": n.natural_language_description, "action": n.action, "feedback": n.feedback} for n in path[1:]],
-            self.goal,
-            self.images,
-            page_info,
-            self.action_set,
-            openai_client,
-            features=self.config.features,
-            elements_filter=self.config.elements_filter,
-            branching_factor=self.config.branching_factor,
-            log_folder=self.config.log_folder,
-            fullpage=self.config.fullpage,
-            action_generation_model=self.config.action_generation_model,
-            action_grounding_model=self.config.action_grounding_model
-        )
+        with self.tracer.span("extract_top_actions"):
+            next_actions = await extract_top_actions(
+                [{"natural_language_description": n.natural_language_description, "action": n.action, "feedback": n.feedback} for n in path[1:]],
+                self.goal,
+                self.images,
+                page_info,
+                self.action_set,
+                self.llm_client,
+                features=self.config.features,
+                elements_filter=self.config.elements_filter,
+                branching_factor=self.config.branching_factor,
+                log_folder=self.config.log_folder,
+                fullpage=self.config.fullpage,
+                action_generation_model=self.config.action_generation_model,
+                action_grounding_model=self.config.action_grounding_model,
+                axtree_max_tokens=self.config.axtree_max_tokens
+            )
 
         children = []
         for action in next_actions:
@@ -782,7 +1025,7 @@ class BaseAgent:
                     if websocket:
                         await websocket.send_json({
                             "type": "node_terminal",
-                            "node_id": id(node),
+                            "node_id": node.node_id,
                             "reason": "finish_action",
                             "timestamp": datetime.utcnow().isoformat()
                         })
@@ -794,10 +1037,11 @@ class BaseAgent:
 
             if len(function_calls) == 1:
                 try:
-                    for function_name, function_args in function_calls:
-                        extracted_number = parse_function_args(function_args)
-                        element = await locate_element(page, extracted_number)
-                        action["element"] = element
+                    with self.tracer.span("grounding"):
+                        for function_name, function_args in function_calls:
+                            extracted_number = parse_function_args(function_args)
+                            element = await self.browser_backend.locate(page, extracted_number)
+                            action["element"] = element
                 except Exception as e:
                     action["element"] = None
                 children.append(action)
@@ -0,0 +1,34 @@
+"""Browser operations of the search agents.
+
+The agents launch browsers, replay the path to a node, observe pages, locate elements and
+act on them through a browser backend, so the browser can be swapped for recorded
+observations (see cassette.py). PlaywrightBackend runs them on a real browser.
+"""
+
+from ...replay_async import playwright_step_execution
+from ...webagent_utils_async.action.utils import execute_action
+from ...webagent_utils_async.browser_env.observation import extract_page_info
+from ...webagent_utils_async.utils.playwright_manager import setup_playwright
+from ...webagent_utils_async.utils.utils import locate_element
+
+
+class PlaywrightBackend:
+    async def launch(self, storage_state, headless, mode):
+        """A new browser, returns its playwright manager."""
+        return await setup_playwright(storage_state=storage_state, headless=headless, mode=mode)
+
+    async def replay_step(self, node, goal, playwright_manager, log_folder) -> bool:
+        """Replay the action of a node on the current page, returns whether it succeeded."""
+        return await playwright_step_execution(node, goal, playwright_manager, is_replay=False, log_folder=log_folder)
+
+    async def observe(self, page, fullpage, log_folder) -> dict:
+        """The page info of the current page: screenshots, DOM, AXTree and interactive elements."""
+        return await extract_page_info(page, fullpage, log_folder)
+
+    async def locate(self, page, bid) -> dict:
+        """Information about the element with this bid, including a unique selector."""
+        return await locate_element(page, bid)
+
+    async def execute(self, action, action_set, page, context, goal, interactive_elements, log_folder):
+        """Execute a generated action, raises if it fails."""
+        return await execute_action(action, action_set, page, context, goal, interactive_elements, log_folder)
@@ -0,0 +1,352 @@
+"""Record and replay the LLM requests and browser observations of a search.
+
+A cassette is a JSON lines file, laid out like a checkpoint (see checkpoint.py): a header
+record with the agent type, goal, starting url and config, followed by one record per
+interaction in the order they happened:
+- llm: the response of a chat completion, keyed by the sha256 of the request. Images are
+  left out of the key, the screenshots of a replay only have to come from the cassette
+- observation: the page info observed after a path of actions from the starting url, its
+  screenshots and the rest of it (DOM, AXTree, ...) gzipped are blobs stored once per hash
+- locate, step and execute: the located elements and the outcomes of the actions
+
+Recording wraps the LLM client and the real browser backend of an agent. Replaying answers
+from the cassette instead, without a browser or network access and with the page settle
+waits set to 0, so the search runs at full CPU speed for profiling and regression tests.
+The search makes the same requests in the same order as long as its code and config are
+unchanged, a request missing from the cassette raises CassetteMiss. Interactions recorded
+several times with the same key are replayed in order, the last one repeats.
+
+    attach_cassette(agent, "log/cassettes/shop.jsonl", RECORD)  # or config.cassette
+    ...
+    python benchmarks/bench_replay.py log/cassettes/shop.jsonl --profile
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import defaultdict
+from dataclasses import asdict, replace
+from datetime import datetime
+from types import SimpleNamespace
+
+from openai.types.chat import ChatCompletion, ChatCompletionChunk, ParsedChatCompletion
+
+from ...webagent_utils_async.browser_env.extra_properties import BidProperties
+from ...webagent_utils_async.utils.metrics import instrument_openai_client
+from .browser_backend import PlaywrightBackend
+from .checkpoint import _read_records, _save_blob, blob_dir_for
+
+CASSETTE_VERSION = 1
+
+RECORD = "record"
+REPLAY = "replay"
+CASSETTE_MODES = (RECORD, REPLAY)
+
+
+class CassetteMiss(KeyError):
+    """The replayed search made a request that is not in the cassette."""
+
+
+def _hashable(key):
+    """Record keys read back from JSON, with their lists as tuples."""
+    if isinstance(key, list):
+        return tuple(_hashable(item) for item in key)
+    return key
+
+
+def request_key(method: str, kwargs: dict) -> str:
+    """sha256 of an LLM request, without its images."""
+    request = dict(kwargs)
+    response_format = request.get("response_format")
+    if isinstance(response_format, type):
+        request["response_format"] = response_format.model_json_schema()
+    request["messages"] = [_without_images(message) for message in request.get("messages", [])]
+    text = json.dumps({"method": method, **request}, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _without_images(message: dict) -> dict:
+    content = message.get("content")
+    if not isinstance(content, list):
+        return message
+    return {**message, "content": [part for part in content if part.get("type") != "image_url"]}
+
+
+class Cassette:
+    """The interactions of one search, appended to a file when recording, read back when replaying."""
+
+    def __init__(self, path: str, mode: str = RECORD):
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"Unknown cassette mode: {mode}. Expected one of {CASSETTE_MODES}")
+        self.path = path
+        self.mode = mode
+        self.blob_dir = blob_dir_for(path)
+        self.header = None
+        self._lock = threading.Lock()
+        # (kind, key) -> recorded records, and how many of them were replayed
+        self._records: dict[tuple, list] = defaultdict(list)
+        self._replayed: dict[tuple, int] = defaultdict(int)
+        if mode == RECORD:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._file = open(path, "w", encoding="utf-8")
+        else:
+            for record in _read_records(path):
+                if record["kind"] == "header":
+                    self.header = record
+                else:
+                    self._records[(record["kind"], _hashable(record["key"]))].append(record)
+            if self.header is None:
+                raise ValueError(f"{path} has no cassette header")
+
+    def write_header(self, agent_type: str, goal: str, starting_url: str, config: dict):
+        self.header = {
+            "kind": "header",
+            "version": CASSETTE_VERSION,
+            "agent_type": agent_type,
+            "goal": goal,
+            "starting_url": starting_url,
+            "config": config,
+            "timestamp": datetime.utcnow().isoformat(),
+        }
+        self._append(self.header)
+
+    def _append(self, record: dict):
+        with self._lock:
+            self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+
+    def record(self, kind: str, key, **data):
+        self._append({"kind": kind, "key": key, **data})
+
+    def take(self, kind: str, key) -> dict:
+        """The next recorded record of this kind and key, the last one once they are all replayed."""
+        key = _hashable(key)
+        with self._lock:
+            records = self._records.get((kind, key))
+            if not records:
+                raise CassetteMiss(f"No {kind} recorded for {key!r} in {self.path}")
+            index = min(self._replayed[(kind, key)], len(records) - 1)
+            self._replayed[(kind, key)] += 1
+            return records[index]
+
+    def recorded(self, kind: str) -> dict:
+        """The records of a kind by key, as read when replaying."""
+        return {key: records for (record_kind, key), records in self._records.items() if record_kind == kind}
+
+    def save_blob(self, data: bytes) -> str:
+        return _save_blob(self.blob_dir, data)
+
+    def load_blob(self, digest: str) -> bytes:
+        with open(os.path.join(self.blob_dir, digest), "rb") as f:
+            return f.read()
+
+    def save_page_info(self, page_info: dict) -> dict:
+        """Store a page info as blobs: its screenshots as they are, the rest as gzipped JSON."""
+        images = {name: self.save_blob(value) for name, value in page_info.items() if isinstance(value, bytes)}
+        # without the caches kept on the page info, such as the AXTree signature of observation_diff
+        rest = {name: value for name, value in page_info.items() if name not in images and not name.startswith("_")}
+        if isinstance(rest.get("extra_properties"), BidProperties):
+            rest["extra_properties"] = rest["extra_properties"].to_dict()
+        data = gzip.compress(json.dumps(rest).encode("utf-8"), mtime=0)
+        return {"page_info": self.save_blob(data), "images": images}
+
+    def load_page_info(self, record: dict) -> dict:
+        page_info = json.loads(gzip.decompress(self.load_blob(record["page_info"])))
+        if page_info.get("extra_properties") is not None:
+            page_info["extra_properties"] = BidProperties.from_dict(page_info["extra_properties"])
+        for name, digest in record["images"].items():
+            page_info[name] = self.load_blob(digest)
+        return page_info
+
+    def close(self):
+        if self.mode == RECORD:
+            with self._lock:
+                if not self._file.closed:
+                    self._file.close()
+
+
+class _CassetteCompletions:
+    def __init__(self, client: "CassetteLLMClient", inner):
+        self._client = client
+        self._inner = inner
+
+    def create(self, **kwargs):
+        return self._client._call(self._inner, "create", kwargs)
+
+    def parse(self, **kwargs):
+        return self._client._call(self._inner, "parse", kwargs)
+
+
+class CassetteLLMClient:
+    """OpenAI client recording the responses of another client to a cassette, or replaying them."""
+
+    def __init__(self, cassette: Cassette, inner=None):
+        self.cassette = cassette
+        self.chat = SimpleNamespace(completions=_CassetteCompletions(self, inner.chat.completions if inner else None))
+        self.beta = SimpleNamespace(chat=SimpleNamespace(
+            completions=_CassetteCompletions(self, inner.beta.chat.completions if inner else None)
+        ))
+
+    def _call(self, completions, method: str, kwargs: dict):
+        key = request_key(method, kwargs)
+        if self.cassette.mode == REPLAY:
+            record = self.cassette.take("llm", key)
+            if "chunks" in record:
+                return iter([ChatCompletionChunk.model_validate(chunk) for chunk in record["chunks"]])
+            if method == "parse":
+                return ParsedChatCompletion[kwargs["response_format"]].model_validate(record["response"])
+            return ChatCompletion.model_validate(record["response"])
+
+        response = getattr(completions, method)(**kwargs)
+        if kwargs.get("stream"):
+            # read to the end, the caller may stop reading as soon as it has what it needs
+            chunks = list(response)
+            self.cassette.record("llm", key, chunks=[chunk.model_dump(mode="json") for chunk in chunks])
+            return iter(chunks)
+        self.cassette.record("llm", key, response=response.model_dump(mode="json"))
+        return response
+
+
+class RecordingBackend:
+    """Browser backend recording the observations and action outcomes of another backend."""
+
+    def __init__(self, cassette: Cassette, inner=None):
+        self.cassette = cassette
+        self.inner = inner or PlaywrightBackend()
+        # actions taken since the browser was launched, the key of the current page
+        self.path: list[str] = []
+
+    async def launch(self, storage_state, headless, mode):
+        self.path = []
+        return await self.inner.launch(storage_state, headless, mode)
+
+    async def replay_step(self, node, goal, playwright_manager, log_folder) -> bool:
+        success = await self.inner.replay_step(node, goal, playwright_manager, log_folder)
+        self.cassette.record("step", [self.path, node.action], success=success)
+        if success:
+            self.path.append(node.action)
+        return success
+
+    async def observe(self, page, fullpage, log_folder) -> dict:
+        page_info = await self.inner.observe(page, fullpage, log_folder)
+        self.cassette.record("observation", self.path, url=page.url, **self.cassette.save_page_info(page_info))
+        return page_info
+
+    async def locate(self, page, bid) -> dict:
+        element = await self.inner.locate(page, bid)
+        self.cassette.record("locate", [self.path, bid], element=element)
+        return element
+
+    async def execute(self, action, action_set, page, context, goal, interactive_elements, log_folder):
+        try:
+            result = await self.inner.execute(action, action_set, page, context, goal, interactive_elements, log_folder)
+        except Exception as e:
+            self.cassette.record("execute", [self.path, action["action"]], error=str(e))
+            raise
+        self.cassette.record("execute", [self.path, action["action"]], error=None)
+        self.path.append(action["action"])
+        return result
+
+
+class _ReplayPage:
+    """The page of a replayed browser: its url and screenshot are the recorded ones of the current path."""
+
+    def __init__(self):
+        self.url = "about:blank"
+        self.screenshot_bytes = b""
+
+    async def goto(self, url, **kwargs):
+        self.url = url
+
+    async def wait_for_timeout(self, timeout):
+        pass
+
+    async def screenshot(self, **kwargs):
+        return self.screenshot_bytes
+
+
+class ReplayPlaywrightManager:
+    """Stands in for AsyncPlaywrightManager when the browser is replayed from a cassette."""
+
+    def __init__(self):
+        self.page = _ReplayPage()
+        self.context = None
+
+    async def get_browser(self):
+        return None
+
+    async def get_context(self):
+        return self.context
+
+    async def get_page(self):
+        return self.page
+
+    async def get_live_browser_url(self):
+        return None
+
+    async def get_session_id(self):
+        return None
+
+    async def close(self):
+        pass
+
+
+class ReplayBackend:
+    """Browser backend answering from the recorded observations and action outcomes, without a browser."""
+
+    def __init__(self, cassette: Cassette):
+        self.cassette = cassette
+        self.path: list[str] = []
+
+    async def launch(self, storage_state, headless, mode):
+        self.path = []
+        return ReplayPlaywrightManager()
+
+    async def replay_step(self, node, goal, playwright_manager, log_folder) -> bool:
+        success = self.cassette.take("step", [self.path, node.action])["success"]
+        if success:
+            self.path.append(node.action)
+        return success
+
+    async def observe(self, page, fullpage, log_folder) -> dict:
+        record = self.cassette.take("observation", self.path)
+        page.url = record["url"]
+        page_info = self.cassette.load_page_info(record)
+        page.screenshot_bytes = page_info.get("screenshot", b"")
+        return page_info
+
+    async def locate(self, page, bid) -> dict:
+        return self.cassette.take("locate", [self.path, bid])["element"]
+
+    async def execute(self, action, action_set, page, context, goal, interactive_elements, log_folder):
+        error = self.cassette.take("execute", [self.path, action["action"]])["error"]
+        if error is not None:
+            raise RuntimeError(error)
+        self.path.append(action["action"])
+
+
+def attach_cassette(agent, path: str, mode: str = RECORD) -> Cassette:
+    """
+    Record the LLM requests and browser observations of an agent to a cassette, or replay them.
+
+    Args:
+        agent: The search agent, before it runs
+        path: Cassette file, overwritten when recording
+        mode: RECORD or REPLAY
+
+    Returns:
+        Cassette: Close it once the search is done when recording
+    """
+    cassette = Cassette(path, mode)
+    if mode == RECORD:
+        cassette.write_header(type(agent).__name__, agent.goal, agent.starting_url, asdict(agent.config))
+        agent.llm_client = CassetteLLMClient(cassette, inner=agent.llm_client)
+        agent.browser_backend = RecordingBackend(cassette, inner=agent.browser_backend)
+    else:
+        agent.llm_client = instrument_openai_client(CassetteLLMClient(cassette))
+        agent.browser_backend = ReplayBackend(cassette)
+        agent.config = replace(agent.config, page_settle_seconds=0)
+    agent.cassette = cassette
+    return cassette
@@ -0,0 +1,279 @@
+"""Append-only checkpoints of a search tree.
+
+A checkpoint is a JSON lines file. It starts with a header record holding the search request,
+followed by node records (the state of one node, the last record of a node wins), progress
+records (the completed iterations) and event records (the websocket messages sent to the
+client). Only nodes that changed since the last save are written, and observation images are
+stored once per content hash in a directory next to the file and referenced by that hash.
+
+A checkpoint is enough to resume the search with a fresh browser, the browser state is
+rebuilt by replaying the path to the next selected node, and to replay the event stream to
+a client that reconnects.
+"""
+
+import base64
+import hashlib
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Iterator, Optional
+
+from ...webagent_utils_async.evaluation.feedback import Feedback
+from .lats_node import LATSNode, Observation
+from .tree_vis import collect_all_nodes
+
+CHECKPOINT_VERSION = 1
+
+# node attributes written as they are
+NODE_FIELDS = (
+    "natural_language_description", "action", "prob", "element", "goal", "feedback", "visits",
+    "value", "depth", "is_terminal", "exhausted", "em", "screenshot_hash", "axtree_hash",
+    "observed_url", "likely_noop", "evaluated",
+)
+
+
+def _save_blob(blob_dir: str, data: bytes) -> str:
+    """Store the bytes under their sha1, once. Returns the sha1."""
+    digest = hashlib.sha1(data).hexdigest()
+    path = os.path.join(blob_dir, digest)
+    if not os.path.exists(path):
+        os.makedirs(blob_dir, exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+    return digest
+
+
+def _observation_blob(node: LATSNode, blob_dir: str, digests: Optional[dict]) -> Optional[str]:
+    """sha1 of the image of the node's observation, stored once. digests caches it per node_id."""
+    observation = node.observation
+    source = observation.image if observation.image is not None else observation.image_base64
+    if source is None:
+        return None
+    cached = digests.get(node.node_id) if digests is not None else None
+    # the same image object as on the last save, no need to decode and hash it again
+    if cached is not None and cached[0] is source:
+        return cached[1]
+    digest = _save_blob(blob_dir, source if isinstance(source, bytes) else base64.b64decode(source))
+    if digests is not None:
+        digests[node.node_id] = (source, digest)
+    return digest
+
+
+def node_record(node: LATSNode, blob_dir: str, digests: Optional[dict] = None) -> dict:
+    """
+    Checkpoint record of one node, without its children.
+
+    Args:
+        node: The node
+        blob_dir: Directory the observation image is stored in
+        digests: node_id -> (image, sha1) of the images already stored, updated
+    """
+    record = {"kind": "node", "node_id": node.node_id,
+              "parent_id": node.parent.node_id if node.parent else None}
+    for name in NODE_FIELDS:
+        record[name] = getattr(node, name)
+    record["goal_finish_feedback"] = (
+        node.goal_finish_feedback.model_dump() if node.goal_finish_feedback is not None else None
+    )
+    if node.observation is not None:
+        record["observation"] = {
+            "text": node.observation.text,
+            "image": _observation_blob(node, blob_dir, digests),
+        }
+    return record
+
+
+def _apply_record(node: LATSNode, record: dict, blob_dir: str):
+    for name in NODE_FIELDS:
+        if name in record:
+            setattr(node, name, record[name])
+    feedback = record.get("goal_finish_feedback")
+    node.goal_finish_feedback = Feedback(**feedback) if feedback is not None else None
+    observation = record.get("observation")
+    if observation is not None:
+        image = None
+        if observation["image"] is not None:
+            with open(os.path.join(blob_dir, observation["image"]), "rb") as f:
+                image = f.read()
+        node.observation = Observation(text=observation["text"], image=image)
+
+
+def blob_dir_for(path: str) -> str:
+    return path + ".blobs"
+
+
+class SearchCheckpointer:
+    """Appends the changes of a search tree, its progress and its events to a checkpoint file."""
+
+    def __init__(self, path: str, written: Optional[dict] = None):
+        """
+        Args:
+            path: Checkpoint file, appended to if it exists
+            written: Last record of every node already in the file, from load_checkpoint
+        """
+        self.path = path
+        self.blob_dir = blob_dir_for(path)
+        # node_id -> last record written, nodes whose record is unchanged are skipped on save
+        self._written = dict(written or {})
+        # node_id -> (image, sha1) of the observation images already stored
+        self._digests = {}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def _append(self, record: dict):
+        self._append_line(json.dumps(record, default=str))
+
+    def _append_line(self, line: str):
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def write_header(self, message: dict):
+        """First record of a new checkpoint, the request the search was started with."""
+        self._append({
+            "kind": "header",
+            "version": CHECKPOINT_VERSION,
+            "message": message,
+            "timestamp": datetime.utcnow().isoformat(),
+        })
+
+    def record_event(self, text: str):
+        """Record a websocket event, already serialized to JSON."""
+        self._append_line('{"kind": "event", "event": ' + text + '}')
+
+    def save(self, root: LATSNode, completed_iterations: int = 0) -> int:
+        """
+        Append the nodes that changed since the last save, parents before children.
+
+        Unchanged nodes are only compared with their last record, their images are not hashed
+        again. The file is synced to disk when nodes were written, a save with progress only
+        is flushed: a crash then loses at most the iterations since the last changed node.
+
+        Returns:
+            int: Number of node records written
+        """
+        changed = []
+        for node in collect_all_nodes(root):
+            record = node_record(node, self.blob_dir, self._digests)
+            if self._written.get(node.node_id) != record:
+                self._written[node.node_id] = record
+                changed.append(record)
+        lines = [json.dumps(record, default=str) for record in changed]
+        lines.append(json.dumps({
+            "kind": "progress",
+            "completed_iterations": completed_iterations,
+            "timestamp": datetime.utcnow().isoformat(),
+        }))
+        with self._lock:
+            self._file.write("\n".join(lines) + "\n")
+            self._file.flush()
+            if changed:
+                os.fsync(self._file.fileno())
+        return len(changed)
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+@dataclass
+class SearchCheckpoint:
+    header: dict
+    root: LATSNode
+    completed_iterations: int = 0
+    # number of recorded events, the seq of the next one
+    event_count: int = 0
+    # last record of every node, to continue appending with SearchCheckpointer(written=...)
+    records: dict = field(default_factory=dict)
+
+
+def _read_records(path: str) -> Iterator[dict]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            # a record cut short by a crash is dropped
+            if not line.endswith("\n"):
+                break
+            yield json.loads(line)
+
+
+def load_checkpoint(path: str) -> SearchCheckpoint:
+    """
+    Rebuild the search tree from the latest state of every node in a checkpoint file.
+
+    Raises:
+        FileNotFoundError: There is no checkpoint file
+        ValueError: The file has no header or no root node
+    """
+    header = None
+    records = {}
+    completed_iterations = 0
+    event_count = 0
+    for record in _read_records(path):
+        kind = record["kind"]
+        if kind == "header":
+            header = record
+        elif kind == "node":
+            # dict order stays the order nodes were first written, parents before children
+            records[record["node_id"]] = record
+        elif kind == "progress":
+            completed_iterations = record["completed_iterations"]
+        elif kind == "event":
+            event_count += 1
+    if header is None:
+        raise ValueError(f"{path} has no checkpoint header")
+
+    blob_dir = blob_dir_for(path)
+    nodes = {}
+    root = None
+    for node_id, record in records.items():
+        parent = nodes.get(record["parent_id"])
+        node = LATSNode(
+            natural_language_description=record["natural_language_description"],
+            action=record["action"],
+            prob=record["prob"],
+            element=record["element"],
+            goal=record["goal"],
+            parent=parent,
+        )
+        node.node_id = node_id
+        _apply_record(node, record, blob_dir)
+        if parent is not None:
+            parent.children.append(node)
+        elif root is None:
+            root = node
+        nodes[node_id] = node
+    if root is None:
+        raise ValueError(f"{path} has no root node")
+    return SearchCheckpoint(header=header, root=root, completed_iterations=completed_iterations,
+                            event_count=event_count, records=records)
+
+
+def read_events(path: str, after: int = 0) -> list[dict]:
+    """The websocket events recorded in a checkpoint file, skipping the first `after` of them."""
+    events = [record["event"] for record in _read_records(path) if record["kind"] == "event"]
+    return events[after:]
+
+
+class RecordingWebSocket:
+    """
+    Websocket wrapper that numbers every message sent to the client and records it in the checkpoint.
+
+    Each message is serialized once, with its "seq" (its index among the recorded events), and
+    the same text is recorded and passed on with send_text.
+    """
+
+    def __init__(self, websocket, checkpointer: SearchCheckpointer, first_seq: int = 0):
+        self.websocket = websocket
+        self.checkpointer = checkpointer
+        self.seq = first_seq
+
+    async def send_json(self, data):
+        text = json.dumps({**data, "seq": self.seq}, default=str)
+        self.seq += 1
+        self.checkpointer.record_event(text)
+        await self.websocket.send_text(text)
@@ -1,3 +1,4 @@
+import itertools
 from typing import Any, Optional, Tuple, List
 from datetime import datetime
 from dotenv import load_dotenv
@@ -6,6 +7,7 @@ load_dotenv()
 from .tree_vis import RED, better_print, print_trajectory, collect_all_nodes, GREEN, RESET, print_entire_tree
 from .lats_node import LATSNode
 from .base_agent import BaseAgent
+from ...webagent_utils_async.utils.tracing import traced
 
 class LATSAgent(BaseAgent):
     async def run(self, websocket=None) -> list[LATSNode]:
@@ -24,7 +26,9 @@ class LATSAgent(BaseAgent):
     async def lats_search(self, websocket=None):
         terminal_nodes = []
 
-        for i in range(self.config.iterations):
+        for i in itertools.count():
+            if not await self.iteration_boundary(i):
+                break
             await self.websocket_iteration_start(i, websocket=websocket)
             
             print(f"Iteration {i}/{self.config.iterations} ...")
@@ -45,6 +49,10 @@ class LATSAgent(BaseAgent):
             await self.websocket_step_start(step=2, step_name="node_expansion", websocket=websocket)
             if node.depth < self.config.max_depth :
                 await self.node_expansion(node, websocket)
+                if node.likely_noop and self.config.prune_noop_actions:
+                    # nothing to evaluate or simulate, the replay found the action did not change the page
+                    self.backpropagate(node, self.config.noop_value)
+                    continue
                 if node is None:
                     # all the nodes are terminal, stop the search
                     print(f"{RED}All nodes are terminal, stopping search{RESET}")
@@ -55,6 +63,9 @@ class LATSAgent(BaseAgent):
                 else:
                     print_entire_tree(self.root_node)
 
+            if not node.children:
+                # no actions on this page, the node is terminal now and the next selection skips it
+                continue
 
             # Step 3: Evaluation
             print(f"{GREEN}Step 3: node chilren evaluation{RESET}")
@@ -113,6 +124,7 @@ class LATSAgent(BaseAgent):
             
         return best_child if best_child is not None else self.root_node
 
+    @traced("node_selection")
     async def node_selection(self, node: LATSNode, websocket=None) -> Optional[LATSNode]:   
         if node.is_terminal:
             return None
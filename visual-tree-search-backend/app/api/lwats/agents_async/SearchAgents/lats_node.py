@@ -3,6 +3,7 @@ from dataclasses import dataclass
 from typing import Optional
 from pydantic import BaseModel
 import base64
+import uuid
 from ...webagent_utils_async.evaluation.feedback import Feedback
 
 @dataclass
@@ -53,6 +54,12 @@ class LATSNode:
         reward (float): Reward received at this node
         exhausted (bool): Whether all children have been explored
         em (float): Exact match score for evaluation
+        screenshot_hash (Optional[int]): Perceptual hash of the page after this node's action
+        axtree_hash (Optional[str]): Hash of the AXTree of the page after this node's action
+        observed_url (Optional[str]): Page url after this node's action
+        likely_noop (bool): Whether the action left the page as its parent's
+        node_id (str): Id of the node that stays the same across checkpoints
+        evaluated (bool): Whether node_evaluation already scored this node
     """
     
     def __init__(
@@ -94,6 +101,13 @@ class LATSNode:
         self.exhausted = False  # If all children are terminal
         self.em = 0.0  # Exact match, evaluation metric
         self.observation: Optional[Observation] = None
+        # set when the page is observed after replaying the path to this node
+        self.screenshot_hash: Optional[int] = None
+        self.axtree_hash: Optional[str] = None
+        self.observed_url: Optional[str] = None
+        self.likely_noop = False
+        self.node_id = uuid.uuid4().hex
+        self.evaluated = False
 
     def uct(self) -> float:
         """
@@ -1,9 +1,9 @@
+import itertools
 from typing import Any, Optional, Tuple, List
 from datetime import datetime
 import logging
 import json
 import time
-from openai import OpenAI
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -15,10 +15,9 @@ from ...replay_async import generate_feedback, playwright_step_execution
 from ...webagent_utils_async.browser_env.observation import extract_page_info
 from ...webagent_utils_async.action.prompt_functions import extract_top_actions
 from ...webagent_utils_async.utils.utils import parse_function_args, locate_element
+from ...webagent_utils_async.utils.tracing import traced
 from ...evaluation_async.evaluators import goal_finished_evaluator
 
-openai_client = OpenAI()
-
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
@@ -54,6 +53,7 @@ class MCTSAgent(BaseAgent):
         
         return best_node
     
+    @traced("node_selection")
     async def node_selection(self, node: LATSNode, websocket=None) -> Optional[LATSNode]:
         if node.is_terminal:
             return None
@@ -99,7 +99,7 @@ class MCTSAgent(BaseAgent):
                 "explanation": str  # Brief explanation of the selection
             }}"""
             
-            response = openai_client.chat.completions.create(
+            response = self.llm_client.chat.completions.create(
                 model=self.config.evaluation_model,
                 messages=[
                     {"role": "system", "content": "You are an expert at selecting promising paths in a search tree."},
@@ -145,20 +145,17 @@ class MCTSAgent(BaseAgent):
         if len(trajectory) == 0:
             score = 0
             return score
-        prompt = create_llm_prompt(trajectory, self.goal)
-        print(f"prompt: {prompt}")
-        result = score_trajectory_with_openai(
-            prompt, 
-            openai_client, 
-            model=self.config.evaluation_model
-        )
+        result = self.score_trajectory(trajectory)
         print(f"result: {result}")
         score = result["overall_score"]
         print(f"Simulation Results, evaluate selected path:")
         print(f"Overall Score: {score:.3f}")
-        print(f"Efficiency Score: {result['efficiency_score']:.3f}")
-        print(f"Accuracy Score: {result['accuracy_score']:.3f}")
-        print(f"Robustness Score: {result['robustness_score']:.3f}")
+        # the detailed scores are only returned by the verbose evaluation mode
+        for key in ("efficiency_score", "accuracy_score", "robustness_score"):
+            if key in result:
+                print(f"{key.replace('_', ' ').title()}: {result[key]:.3f}")
+        if "reason" in result:
+            print(f"Reason: {result['reason']}")
         return score
     
     async def websocket_reflection_backtracking(self, path, selected_node, websocket=None):
@@ -168,13 +165,14 @@ class MCTSAgent(BaseAgent):
                 "path": [{
                     "natural_language_description": node.natural_language_description,
                     "action": node.action} for node in path if node.action is not None],
-                "node_id": id(selected_node),
-                "parent_id": id(selected_node.parent),
+                "node_id": selected_node.node_id,
+                "parent_id": selected_node.parent.node_id if selected_node.parent else None,
                 "action": selected_node.action,
                 "description": selected_node.natural_language_description,
                 "trajectory": selected_node.get_trajectory()
             })
 
+    @traced("reflection")
     async def reflection_backtracking(self, path) -> List[LATSNode]:
         """
         Implement reflection-based backtracking to improve search trajectory.
@@ -215,7 +213,7 @@ class MCTSAgent(BaseAgent):
             "suggested_improvements": [str]  # List of suggested improvements specific to current websites
         }}"""
         
-        reflection = openai_client.chat.completions.create(
+        reflection = self.llm_client.chat.completions.create(
             model=self.config.evaluation_model,
             messages=[
                 {"role": "system", "content": "You are an expert at analyzing and improving search trajectories."},
@@ -254,7 +252,9 @@ class MCTSAgent(BaseAgent):
         best_node = None
         print(f"iterations: {self.config.iterations}")
         
-        for i in range(self.config.iterations):
+        for i in itertools.count():
+            if not await self.iteration_boundary(i):
+                break
             await self.websocket_iteration_start(i, websocket=websocket)
             
             print(f"\n{'='*50}")
@@ -282,6 +282,10 @@ class MCTSAgent(BaseAgent):
             await self.websocket_step_start(step=2, step_name="node_expansion", websocket=websocket)
             if selected_node.depth < self.config.max_depth :
                 await self.node_expansion(selected_node, websocket)
+                if selected_node.likely_noop and self.config.prune_noop_actions:
+                    # skip the simulation, the replay found the action did not change the page
+                    self.backpropagate(selected_node, self.config.noop_value)
+                    continue
                 if selected_node is None:
                     # all the nodes are terminal, stop the search
                     print(f"{RED}All nodes are terminal, stopping search{RESET}")
@@ -38,6 +38,7 @@ class SimpleSearchAgent(BaseAgent):
         current_level = 0  # Track current level for BFS
         
         while queue:
+            await self.step_boundary()
             # Process all nodes at current level
             level_size = len(queue)
             current_level += 1
@@ -93,7 +94,7 @@ class SimpleSearchAgent(BaseAgent):
                     best_node = current_node
 
                     
-                print(f"Node {id(current_node)} score: {score}")
+                print(f"Node {current_node.node_id} score: {score}")
                 
                 # If we've found a satisfactory solution, return it
                 if score >= 0.75:
@@ -134,6 +135,7 @@ class SimpleSearchAgent(BaseAgent):
         visited = set()  # Track visited nodes to avoid cycles
         
         while stack:
+            await self.step_boundary()
             # Get the top node from the stack
             current_node = stack.pop()
             stack_set.remove(current_node)  # Remove from stack tracking
@@ -170,7 +172,7 @@ class SimpleSearchAgent(BaseAgent):
                 best_path = path
                 best_node = current_node
                 
-            print(f"Node {id(current_node)} score: {score}")
+            print(f"Node {current_node.node_id} score: {score}")
             
             # If we've found a satisfactory solution, return it
             if score >= 0.75:
@@ -0,0 +1,342 @@
+"""Simulate the browser of a search over a recorded state graph.
+
+The states of a StateGraph are observed pages (page info and url), its edges are the actions
+taken on them. SimulatorBackend stands in for the browser backend of an agent (see
+browser_backend.py) and walks the graph instead of a site: launching goes back to the start
+state, replaying or executing an action follows its edge, observing returns the page info of
+the current state. An action on an element of the page without a recorded edge leaves the
+page as it is, an action on an element that is not on the page fails.
+
+Graphs are built from the observations of a recorded cassette (see cassette.py), states being
+identified by their content so that pages reached by different paths are merged, or from a
+map of synthetic pages, like the shop of synthetic_shop. The goal states of a graph tell
+whether the actions of a search result solved the task. A cassette only has the pages the
+recorded search observed, the leaves of its tree are not, so record with a max_depth one
+deeper than the goal page.
+
+With a scripted LLM client (benchmarks/mock_llm.py) a search over a graph takes tens of
+milliseconds, which is enough to compare the search algorithms and sweep their parameters
+over thousands of episodes, see benchmarks/simulate_search.py:
+
+    graph = StateGraph.from_cassette("log/cassettes/shop.jsonl", goal_url="checkout")
+    episode = await run_episode(LATSAgent, graph, goal, config, llm_client)
+    episode["solved"], episode["browser_steps"]
+"""
+
+import functools
+import io
+import random
+import re
+import time
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+from typing import Optional
+
+import PIL.Image
+
+from ...webagent_utils_async.browser_env.extra_properties import BidProperties
+from ...webagent_utils_async.browser_env.observation_diff import axtree_nodes_by_bid
+from .cassette import REPLAY, Cassette, ReplayPlaywrightManager
+
+# the element an action acts on, the first argument of click('12'), fill('12', 'shoes'), ...
+_ACTION_BID = re.compile(r"^\s*\w+\(\s*['\"]([^'\"]+)['\"]")
+
+
+def action_bid(action: str) -> Optional[str]:
+    """The bid an action acts on, None for actions without one such as noop() or scroll(0, 200)."""
+    match = _ACTION_BID.match(action or "")
+    return match.group(1) if match else None
+
+
+@dataclass
+class State:
+    id: str
+    url: str
+    page_info: dict
+    # bid -> (role, name) of the named elements of the page
+    elements: dict = field(default_factory=dict)
+
+
+def _elements(page_info: dict) -> dict:
+    nodes = axtree_nodes_by_bid(page_info.get("axtree") or {})
+    return {bid: (role, name) for bid, (role, name, _, _) in nodes.items() if name}
+
+
+def _slug(title: str) -> str:
+    return re.sub(r"\W+", "-", title.lower()).strip("-")
+
+
+def page_info_for(title: str, elements: list[tuple[str, str]]) -> dict:
+    """
+    Page info of a synthetic page, as extract_page_info returns it.
+
+    Args:
+        title: Name of the page, also seeds its screenshot
+        elements: (role, name) of the clickable elements of the page, their bids are 1, 2, ...
+
+    Returns:
+        dict: AXTree, extra properties and screenshots of the page
+    """
+    nodes = [{"nodeId": "0", "role": {"value": "RootWebArea"}, "name": {"value": title}, "childIds": [], "properties": []}]
+    extra_properties = {}
+    for i, (role, name) in enumerate(elements, start=1):
+        bid = str(i)
+        nodes[0]["childIds"].append(bid)
+        nodes.append({"nodeId": bid, "role": {"value": role}, "name": {"value": name}, "childIds": [],
+                      "properties": [{"name": "browsergym_id", "value": {"value": bid}}]})
+        extra_properties[bid] = {"visibility": 1.0, "bbox": [0, 40 * i, 200, 40], "clickable": True, "set_of_marks": 1}
+    screenshot = _screenshot(title)
+    return {"axtree": {"nodes": nodes}, "extra_properties": BidProperties.from_dict(extra_properties),
+            "interactive_elements": [], "screenshot": screenshot, "screenshot_som": screenshot}
+
+
+@functools.lru_cache(maxsize=1024)
+def _screenshot(title: str) -> bytes:
+    # seeded noise, so that every page has its own perceptual hash
+    rng = random.Random(title)
+    image = PIL.Image.frombytes("L", (64, 48), bytes(rng.randrange(256) for _ in range(64 * 48)))
+    screenshot = io.BytesIO()
+    image.save(screenshot, format="PNG")
+    return screenshot.getvalue()
+
+
+class StateGraph:
+    """Observed pages and the actions between them."""
+
+    def __init__(self):
+        self.states: dict[str, State] = {}
+        # (state id, action) -> state id reached, None when the action failed
+        self.edges: dict[tuple[str, str], Optional[str]] = {}
+        self.start: Optional[str] = None
+        self.goals: set[str] = set()
+
+    def add_state(self, state_id: str, url: str, page_info: dict) -> State:
+        if state_id not in self.states:
+            self.states[state_id] = State(state_id, url, page_info, _elements(page_info))
+            if self.start is None:
+                self.start = state_id
+        return self.states[state_id]
+
+    def add_edge(self, state_id: str, action: str, target_id: Optional[str]):
+        self.edges[(state_id, action)] = target_id
+
+    def step(self, state_id: str, action: str) -> Optional[str]:
+        """The state reached by taking action in state_id, None if the action fails."""
+        if (state_id, action) in self.edges:
+            return self.edges[(state_id, action)]
+        bid = action_bid(action)
+        if bid is not None and bid not in self.states[state_id].elements:
+            return None
+        return state_id
+
+    def walk(self, actions: list[str]) -> Optional[str]:
+        """The state reached by taking actions from the start, None if one of them fails."""
+        state_id = self.start
+        for action in actions:
+            state_id = self.step(state_id, action)
+            if state_id is None:
+                return None
+        return state_id
+
+    def solves(self, actions: list[str]) -> bool:
+        return self.walk(actions) in self.goals
+
+    def shortest_path(self) -> list[str]:
+        """The fewest actions from the start to a goal state."""
+        successors = defaultdict(list)
+        for (source, action), target in self.edges.items():
+            if target is not None:
+                successors[source].append((action, target))
+        paths = {self.start: []}
+        queue = deque([self.start])
+        while queue:
+            state_id = queue.popleft()
+            if state_id in self.goals:
+                return paths[state_id]
+            for action, target in successors[state_id]:
+                if target not in paths:
+                    paths[target] = paths[state_id] + [action]
+                    queue.append(target)
+        raise ValueError("No goal state is reachable from the start")
+
+    def milestones(self) -> list[str]:
+        """Names of the elements acted on along the shortest path, the milestones of a ScriptedTask."""
+        names = []
+        state_id = self.start
+        for action in self.shortest_path():
+            names.append(self.states[state_id].elements[action_bid(action)][1])
+            state_id = self.step(state_id, action)
+        return names
+
+    @classmethod
+    def from_cassette(cls, path: str, goal_url: Optional[str] = None) -> "StateGraph":
+        """
+        The pages observed while recording a cassette and the actions between them.
+
+        Args:
+            path: Cassette file
+            goal_url: States whose url contains it are goal states
+
+        Returns:
+            StateGraph: States identified by the hash of their page info
+        """
+        cassette = Cassette(path, REPLAY)
+        graph = cls()
+        # action path since launch -> state id
+        observed = {}
+        for key, records in cassette.recorded("observation").items():
+            record = records[0]
+            graph.add_state(record["page_info"], record["url"], cassette.load_page_info(record))
+            observed[key] = record["page_info"]
+        graph.start = observed[()]
+        for key, state_id in observed.items():
+            if key and key[:-1] in observed:
+                graph.add_edge(observed[key[:-1]], key[-1], state_id)
+        failed = [key for key, records in cassette.recorded("step").items() if not records[-1]["success"]]
+        failed += [key for key, records in cassette.recorded("execute").items() if records[-1]["error"]]
+        for path, action in failed:
+            if path in observed:
+                graph.add_edge(observed[path], action, None)
+        if goal_url:
+            graph.goals = {state.id for state in graph.states.values() if goal_url in state.url}
+        return graph
+
+    @classmethod
+    def from_pages(cls, pages: dict, start: str, goals: list[str]) -> "StateGraph":
+        """
+        A graph of synthetic pages.
+
+        Args:
+            pages: Title of each page -> (role, name, title of the page it leads to) of its elements
+            start: Title of the start page
+            goals: Titles of the goal pages
+
+        Returns:
+            StateGraph: One state per page, clicking element i follows its link
+        """
+        graph = cls()
+        for title in [start] + [title for title in pages if title != start]:
+            elements = [(role, name) for role, name, _ in pages[title]]
+            graph.add_state(title, f"https://simulated.test/{_slug(title)}", page_info_for(title, elements))
+        for title, elements in pages.items():
+            for i, (_, _, target) in enumerate(elements, start=1):
+                graph.add_edge(title, f"click('{i}')", target)
+        graph.goals = set(goals)
+        return graph
+
+
+def synthetic_shop(categories: int = 3, products: int = 4, seed: int = 0) -> tuple[StateGraph, str]:
+    """
+    A shop with category pages, product pages and one cart page per product.
+
+    Args:
+        categories: Number of categories, linked from the home page
+        products: Number of products per category
+        seed: Picks the product to add to the cart
+
+    Returns:
+        tuple[StateGraph, str]: The shop, its goal is the cart holding the picked product
+    """
+    rng = random.Random(seed)
+    pages = {"Home": [("link", f"Category {c}", f"Category {c}") for c in range(categories)]}
+    for c in range(categories):
+        pages[f"Category {c}"] = [("link", f"Product {c}-{p}", f"Product {c}-{p}") for p in range(products)]
+        pages[f"Category {c}"].append(("link", "Home", "Home"))
+        for p in range(products):
+            pages[f"Product {c}-{p}"] = [("button", "Add to Cart", f"Cart with Product {c}-{p}"),
+                                         ("link", f"Category {c}", f"Category {c}")]
+            pages[f"Cart with Product {c}-{p}"] = [("link", "Home", "Home")]
+    product = f"Product {rng.randrange(categories)}-{rng.randrange(products)}"
+    graph = StateGraph.from_pages(pages, "Home", [f"Cart with {product}"])
+    return graph, f"Add {product} to the shopping cart"
+
+
+class SimulatorBackend:
+    """Browser backend walking a state graph, counting what a real browser would have done."""
+
+    def __init__(self, graph: StateGraph):
+        self.graph = graph
+        self.state_id = graph.start
+        self.launches = 0
+        self.steps = 0
+        self.observations = 0
+
+    async def launch(self, storage_state, headless, mode):
+        self.state_id = self.graph.start
+        self.launches += 1
+        return ReplayPlaywrightManager()
+
+    def _take(self, action: str) -> bool:
+        self.steps += 1
+        state_id = self.graph.step(self.state_id, action)
+        if state_id is None:
+            return False
+        self.state_id = state_id
+        return True
+
+    async def replay_step(self, node, goal, playwright_manager, log_folder) -> bool:
+        return self._take(node.action)
+
+    async def observe(self, page, fullpage, log_folder) -> dict:
+        self.observations += 1
+        state = self.graph.states[self.state_id]
+        page.url = state.url
+        page.screenshot_bytes = state.page_info["screenshot"]
+        return state.page_info
+
+    async def locate(self, page, bid) -> dict:
+        element = self.graph.states[self.state_id].elements.get(bid)
+        if element is None:
+            raise ValueError(f"No element with bid {bid} on {self.graph.states[self.state_id].url}")
+        role, name = element
+        return {"bid": bid, "role": role, "name": name, "unique_selector": f"[bid='{bid}']"}
+
+    async def execute(self, action, action_set, page, context, goal, interactive_elements, log_folder):
+        if not self._take(action["action"]):
+            raise RuntimeError(f"{action['action']} failed on {self.graph.states[self.state_id].url}")
+
+
+async def run_episode(agent_class, graph: StateGraph, goal: str, config, llm_client) -> dict:
+    """
+    Run one search over a state graph.
+
+    Args:
+        agent_class: SimpleSearchAgent, LATSAgent or MCTSAgent
+        graph: The simulated site
+        goal: Goal of the search
+        config: AgentConfig of the search, page_settle_seconds should be 0
+        llm_client: OpenAI client of the agent, usually a scripted one
+
+    Returns:
+        dict: Whether the result solves the task, its actions, the error the search raised if any,
+            and the browser work of the search
+    """
+    backend = SimulatorBackend(graph)
+    agent = agent_class(
+        starting_url=graph.states[graph.start].url,
+        messages=[],
+        goal=goal,
+        images=[],
+        playwright_manager=ReplayPlaywrightManager(),
+        config=config,
+    )
+    agent.browser_backend = backend
+    agent.llm_client = llm_client
+    start = time.perf_counter()
+    error = None
+    try:
+        result = await agent.run()
+    except Exception as e:
+        # a crashed search is a failed episode, what it cost so far still counts
+        result, error = None, repr(e)
+    wall_seconds = time.perf_counter() - start
+    actions = [step["action"] for step in result.get_trajectory()] if result is not None else []
+    return {
+        "solved": graph.solves(actions),
+        "error": error,
+        "actions": actions,
+        "browser_steps": backend.steps,
+        "browser_launches": backend.launches,
+        "observations": backend.observations,
+        "wall_seconds": wall_seconds,
+    }
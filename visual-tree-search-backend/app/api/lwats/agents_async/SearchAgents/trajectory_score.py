@@ -2,6 +2,8 @@
 
 import base64
 import json
+import re
+import time
 import datetime
 from typing import Any, Optional, List, Dict, TypedDict
 from openai import OpenAI
@@ -45,6 +47,56 @@ Example format:
 }
 """
 
+LEAN_SYSTEM_PROMPT = \
+"""You are an expert web task completion evaluator. Analyze the provided trajectory against the desired goal
+and score how well the goal has been accomplished.
+
+Return a JSON response whose FIRST key is overall_score (float 0-10){reason_instruction}. Do not return any other keys.
+
+Example format:
+{example}
+"""
+
+LEAN_REASON_INSTRUCTION = ", followed by reason (string, at most 20 words)"
+
+LEAN_SCORE_EXAMPLE = """{"overall_score": 7.5}"""
+
+LEAN_REASON_EXAMPLE = """{"overall_score": 7.5, "reason": "Search results for the product are shown, but no result was opened."}"""
+
+# evaluation modes understood by evaluate_trajectory
+# - score: compact schema, the stream is closed as soon as overall_score is parsed
+# - reason: compact schema with a short reason
+# - verbose: the full TrajectoryMetrics evaluation
+EVALUATION_MODES = ("score", "reason", "verbose")
+
+# a score is complete once it is followed by a delimiter, so "7" is never mistaken for "7.5"
+_STREAMED_SCORE_PATTERN = re.compile(r'"overall_score"\s*:\s*(-?\d+(?:\.\d+)?)\s*[,}\s]')
+# the reason as far as it was streamed, the closing quote is missing when max_tokens cut it
+_STREAMED_REASON_PATTERN = re.compile(r'"reason"\s*:\s*"((?:[^"\\]|\\.)*)')
+
+BATCH_SYSTEM_PROMPT = \
+"""You are an expert web task completion evaluator. You are given several candidate trajectories for the same goal.
+The candidates share the same previous steps and differ only in the steps that follow.
+Score each candidate independently on how well it accomplishes the goal.
+
+Return a JSON response with a single key scores, a list with exactly one entry per candidate, in candidate order.
+Each entry has candidate (int, the candidate number) and overall_score (float 0-10). Do not return any other keys.
+
+Example format for 2 candidates:
+{"scores": [{"candidate": 1, "overall_score": 7.5}, {"candidate": 2, "overall_score": 3.0}]}
+"""
+
+BATCH_USER_PROMPT_TEMPLATE = \
+"""Goal: {goal}
+
+Shared previous steps:
+{shared_str}
+
+Candidates:
+{candidates_str}
+
+Please score all {count} candidates."""
+
 USER_PROMPT_TEMPLATE = \
 """Goal: {goal}
 
@@ -99,6 +151,74 @@ def create_llm_prompt(
     )
     return prompt
 
+def shared_prefix_length(trajectories: List[List[Dict[str, Any]]]) -> int:
+    """Number of leading steps that are identical across all trajectories."""
+    if not trajectories:
+        return 0
+    length = min(len(t) for t in trajectories)
+    for i in range(length):
+        step = trajectories[0][i]
+        if any(t[i]['action'] != step['action'] or
+               t[i]['natural_language_description'] != step['natural_language_description']
+               for t in trajectories[1:]):
+            return i
+    return length
+
+def create_batch_llm_prompt(trajectories: List[List[Dict[str, Any]]], goal: str) -> str:
+    """
+    Creates a single prompt scoring several sibling trajectories.
+
+    The shared prefix is written once, followed by the remaining steps of each candidate.
+
+    Args:
+        trajectories: List of trajectories, usually the children of one node
+        goal: The goal of the trajectories
+
+    Returns:
+        str: Formatted prompt string
+    """
+    prefix = shared_prefix_length(trajectories)
+    shared_str = "\n\n".join(
+        format_trajectory_step(step, i+1)
+        for i, step in enumerate(trajectories[0][:prefix])
+    ) or "No previous steps"
+
+    candidates = []
+    for candidate, trajectory in enumerate(trajectories, start=1):
+        steps_str = "\n\n".join(
+            format_trajectory_step(step, prefix+i+1)
+            for i, step in enumerate(trajectory[prefix:])
+        ) or "No further steps"
+        candidates.append(f"Candidate {candidate}:\n{steps_str}")
+
+    return BATCH_USER_PROMPT_TEMPLATE.format(
+        goal=goal,
+        shared_str=shared_str,
+        candidates_str="\n\n".join(candidates),
+        count=len(trajectories)
+    )
+
+def parse_batch_scores(evaluation: Dict[str, Any], count: int) -> List[float]:
+    """
+    Validate a batch evaluation and return the normalized scores in candidate order.
+
+    Raises:
+        ValueError: If the response does not score every candidate exactly once
+    """
+    entries = evaluation.get("scores")
+    if not isinstance(entries, list) or len(entries) != count:
+        raise ValueError(f"Expected {count} scores, got {entries!r}")
+    scores = [None] * count
+    for entry in entries:
+        candidate = entry.get("candidate") if isinstance(entry, dict) else None
+        score = entry.get("overall_score") if isinstance(entry, dict) else None
+        if not isinstance(candidate, int) or not 1 <= candidate <= count or scores[candidate-1] is not None:
+            raise ValueError(f"Invalid or duplicate candidate: {entry!r}")
+        if isinstance(score, bool) or not isinstance(score, (int, float)) or not 0 <= score <= 10:
+            raise ValueError(f"Invalid overall_score: {entry!r}")
+        scores[candidate-1] = score / 10.0
+    return scores
+
 def validate_evaluation(evaluation: Dict[str, Any]) -> bool:
     """Validate the evaluation output has all required fields and correct types."""
     required_fields = {
@@ -131,6 +251,22 @@ def normalize_scores(evaluation: Dict[str, Any]) -> Dict[str, Any]:
             evaluation[field] = evaluation[field] / 10.0
     return evaluation
 
+def build_evaluation_content(prompt: str, screenshot: Optional[bytes] = None) -> List[Dict[str, Any]]:
+    """Build the user message content for an evaluation request, with an optional screenshot."""
+    content = [
+        {"type": "text", "text": prompt},
+    ]
+    if screenshot is not None:
+        base64_image = base64.b64encode(screenshot).decode('utf-8')
+        content.append({
+            "type": "image_url",
+            "image_url": {
+                "url": f"data:image/jpeg;base64,{base64_image}",
+                "detail": "high"
+            }
+        })
+    return content
+
 def score_trajectory_with_openai(
     prompt: str,
     openai_client: OpenAI,
@@ -152,18 +288,7 @@ def score_trajectory_with_openai(
     system_message = SYSTEM_PROMPT
     
     try:
-        content = [
-            {"type": "text", "text": prompt},
-        ]
-        if screenshot is not None:
-            base64_image = base64.b64encode(screenshot).decode('utf-8')
-            content.append({
-                "type": "image_url", 
-                "image_url": {
-                    "url": f"data:image/jpeg;base64,{base64_image}", 
-                    "detail": "high"
-                }
-            })
+        content = build_evaluation_content(prompt, screenshot)
 
         response = openai_client.chat.completions.create(
             model=model,
@@ -206,4 +331,199 @@ def score_trajectory_with_openai(
                 "error": str(e),
                 "timestamp": datetime.datetime.now().isoformat()
             }
-        }
\ No newline at end of file
+        }
+
+def parse_streamed_score(text: str) -> Optional[float]:
+    """
+    Extract overall_score from a (possibly incomplete) JSON response.
+
+    Returns:
+        float: The raw 0-10 score, or None if the score has not been fully streamed yet
+    """
+    match = _STREAMED_SCORE_PATTERN.search(text)
+    if match is None:
+        return None
+    return float(match.group(1))
+
+def parse_streamed_reason(text: str) -> str:
+    """
+    Extract reason from a (possibly truncated) JSON response.
+
+    Returns:
+        str: The reason, the part that was streamed if it was cut off, or "" if there is none
+    """
+    try:
+        reason = json.loads(text).get("reason")
+        return reason if isinstance(reason, str) else ""
+    except (ValueError, AttributeError):
+        pass
+    match = _STREAMED_REASON_PATTERN.search(text)
+    if match is None:
+        return ""
+    try:
+        return json.loads(f'"{match.group(1)}"')
+    except ValueError:
+        return match.group(1)
+
+def score_trajectory_lean(
+    prompt: str,
+    openai_client: OpenAI,
+    model: str = "gpt-4o",
+    screenshot: Optional[bytes] = None,
+    with_reason: bool = False
+) -> Dict[str, Any]:
+    """
+    Scores the trajectory with a compact schema, streaming the response.
+
+    Without a reason, the stream is closed as soon as overall_score has been parsed,
+    so only a handful of output tokens are paid for.
+
+    Args:
+        prompt: The prompt to send to OpenAI
+        openai_client: OpenAI client instance
+        model: OpenAI model to use
+        screenshot: Screenshot of the current page
+        with_reason: Whether to also ask for a short reason
+
+    Returns:
+        dict: overall_score normalized to 0-1, the reason if requested, and timing metadata
+    """
+    system_message = LEAN_SYSTEM_PROMPT.format(
+        reason_instruction=LEAN_REASON_INSTRUCTION if with_reason else "",
+        example=LEAN_REASON_EXAMPLE if with_reason else LEAN_SCORE_EXAMPLE
+    )
+    start_time = time.perf_counter()
+
+    try:
+        stream = openai_client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": system_message},
+                {"role": "user", "content": build_evaluation_content(prompt, screenshot)}
+            ],
+            response_format={"type": "json_object"},
+            max_tokens=120 if with_reason else 20,
+            stream=True
+        )
+
+        text = ""
+        score = None
+        time_to_score = None
+        early_terminated = False
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            text += delta
+            if score is None:
+                score = parse_streamed_score(text)
+                if score is not None:
+                    time_to_score = time.perf_counter() - start_time
+                    if not with_reason:
+                        early_terminated = True
+                        break
+        if early_terminated and hasattr(stream, "close"):
+            stream.close()
+
+        reason = None
+        if score is None:
+            evaluation = json.loads(text)
+            score = evaluation["overall_score"]
+            reason = evaluation.get("reason")
+        elif with_reason:
+            # a reason cut off by max_tokens does not discard the streamed score
+            reason = parse_streamed_reason(text)
+        if not isinstance(score, (int, float)) or not 0 <= score <= 10:
+            raise ValueError(f"Invalid overall_score: {score}")
+
+        latency = time.perf_counter() - start_time
+        result = {
+            "overall_score": score / 10.0,
+            "metadata": {
+                "model_used": model,
+                "timestamp": datetime.datetime.now().isoformat(),
+                "has_screenshot": screenshot is not None,
+                "latency_ms": round(latency * 1000, 1),
+                "time_to_score_ms": round((time_to_score or latency) * 1000, 1),
+                "early_terminated": early_terminated
+            }
+        }
+        if with_reason:
+            result["reason"] = reason or ""
+        return result
+
+    except Exception as e:
+        result = {
+            "overall_score": 0.0,
+            "metadata": {
+                "error": str(e),
+                "timestamp": datetime.datetime.now().isoformat()
+            }
+        }
+        if with_reason:
+            result["reason"] = f"Error occurred during evaluation: {str(e)}"
+        return result
+
+def evaluate_trajectory(
+    prompt: str,
+    openai_client: OpenAI,
+    model: str = "gpt-4o",
+    screenshot: Optional[bytes] = None,
+    mode: str = "score"
+) -> Dict[str, Any]:
+    """
+    Scores the trajectory using the given evaluation mode.
+
+    Args:
+        prompt: The prompt to send to OpenAI
+        openai_client: OpenAI client instance
+        model: OpenAI model to use
+        screenshot: Screenshot of the current page
+        mode: One of EVALUATION_MODES
+
+    Returns:
+        dict: Evaluation result, always containing a normalized overall_score
+    """
+    if mode == "verbose":
+        return score_trajectory_with_openai(prompt, openai_client, model=model, screenshot=screenshot)
+    if mode in ("score", "reason"):
+        return score_trajectory_lean(prompt, openai_client, model=model, screenshot=screenshot,
+                                     with_reason=mode == "reason")
+    raise ValueError(f"Unknown evaluation mode: {mode}. Expected one of {EVALUATION_MODES}")
+
+def score_trajectories_batch(
+    trajectories: List[List[Dict[str, Any]]],
+    goal: str,
+    openai_client: OpenAI,
+    model: str = "gpt-4o"
+) -> Optional[List[float]]:
+    """
+    Scores sibling trajectories in a single request.
+
+    Args:
+        trajectories: List of trajectories sharing the same goal
+        goal: The goal of the trajectories
+        openai_client: OpenAI client instance
+        model: OpenAI model to use
+
+    Returns:
+        list: Normalized overall scores in the order of trajectories, or None if the
+            response failed the consistency checks and the caller should score individually
+    """
+    try:
+        response = openai_client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": BATCH_SYSTEM_PROMPT},
+                {"role": "user", "content": create_batch_llm_prompt(trajectories, goal)}
+            ],
+            response_format={"type": "json_object"},
+            max_tokens=30 * len(trajectories) + 20
+        )
+        evaluation = json.loads(response.choices[0].message.content)
+        return parse_batch_scores(evaluation, len(trajectories))
+    except Exception as e:
+        print(f"Batch evaluation failed, falling back to individual scoring: {e}")
+        return None
@@ -96,7 +96,7 @@ def print_entire_tree(root: LATSNode) -> None:
         
         # Prepare node statistics
         action = node.action
-        node_id = f"id: {id(node)}"
+        node_id = f"id: {node.node_id}"
         visits = f"visits: {node.visits}"
         value = f"value: {node.value:.3f}" if hasattr(node, 'value') else "value: N/A"
         reward = f"reward: {node.reward:.3f}" if hasattr(node, 'reward') else "reward: N/A"
@@ -0,0 +1,59 @@
+"""Cheap child value estimation from the action sampling distribution.
+
+extract_top_actions samples n completions and turns them into weighted action
+counts, normalized into each child's prob. This module derives child values from
+that distribution and picks the few children that are still worth a full LLM
+scoring call: the top-k candidates and any close calls right behind them.
+"""
+
+import math
+from typing import List
+
+VALUE_FUNCTIONS = ("llm", "logprob")
+
+
+def normalized_entropy(probs: List[float]) -> float:
+    """Entropy of the sibling distribution scaled to [0, 1].
+
+    0 means all mass is on a single action, 1 means the samples were spread
+    evenly over every candidate.
+    """
+    total = sum(probs)
+    if len(probs) < 2 or total <= 0:
+        return 0.0
+    entropy = 0.0
+    for p in probs:
+        if p > 0:
+            p = p / total
+            entropy -= p * math.log(p)
+    return entropy / math.log(len(probs))
+
+
+def select_for_escalation(probs: List[float], top_k: int = 1, margin: float = 0.1) -> List[int]:
+    """Return indices of the children that should get an LLM scoring call.
+
+    The top_k children by prob are always escalated. Any other child whose prob
+    is within margin of the k-th one is a close call and is escalated as well.
+    When the distribution is flat every child ends up being a close call. The
+    most likely child is escalated even when top_k < 1, the other children are
+    valued relative to an escalated sibling.
+    """
+    if not probs:
+        return []
+    top_k = max(top_k, 1)
+    order = sorted(range(len(probs)), key=lambda i: probs[i], reverse=True)
+    cutoff = probs[order[min(top_k, len(order)) - 1]] - margin
+    return [i for i in order if i in order[:top_k] or probs[i] >= cutoff]
+
+
+def prior_value(prob: float, anchor_prob: float, anchor_score: float) -> float:
+    """Value estimate for a child that is not escalated.
+
+    The child is scored relative to the lowest-prob escalated sibling (the
+    anchor): its LLM score scaled by the likelihood ratio of the two actions.
+    Since every non-escalated child is less likely than the anchor, its value
+    never exceeds a sibling that was actually scored.
+    """
+    if anchor_prob <= 0:
+        return 0.0
+    return anchor_score * min(prob / anchor_prob, 1.0)
@@ -8,15 +8,17 @@ from .config import AgentConfig
 from ..agents_async.SearchAgents.simple_search_agent import SimpleSearchAgent
 from ..agents_async.SearchAgents.lats_agent import LATSAgent
 from ..agents_async.SearchAgents.mcts_agent import MCTSAgent
+from ..agents_async.SearchAgents.cassette import REPLAY, ReplayPlaywrightManager
 from ..webagent_utils_async.utils.utils import setup_logger
 from ..webagent_utils_async.utils.playwright_manager import setup_playwright
+from ..webagent_utils_async.utils.metrics import instrument_openai_client
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 _ = load_dotenv()
 
 logger = logging.getLogger(__name__)
-openai_client = OpenAI()
+openai_client = instrument_openai_client(OpenAI())
 
 # Define the default features
 DEFAULT_FEATURES = ['screenshot', 'dom', 'axtree', 'focused_element', 'extra_properties', 'interactive_elements']
@@ -55,11 +57,15 @@ async def setup_search_agent(
         file.write(goal + '\n')
         file.write(starting_url + '\n')
 
-    playwright_manager = await setup_playwright(
-        headless=agent_config.headless, 
-        mode=agent_config.browser_mode,
-        storage_state=agent_config.storage_state
-    )
+    if agent_config.cassette and agent_config.cassette_mode == REPLAY:
+        # the pages come from the cassette, no browser needed
+        playwright_manager = ReplayPlaywrightManager()
+    else:
+        playwright_manager = await setup_playwright(
+            headless=agent_config.headless,
+            mode=agent_config.browser_mode,
+            storage_state=agent_config.storage_state
+        )
     # storage_state='state.json', headless=False, mode="chromium"
 
     page = await playwright_manager.get_page()
@@ -15,6 +15,10 @@ class AgentConfig:
     planning_model: str = "gpt-4o"
     action_grounding_model: str = "gpt-4o"
     evaluation_model: str = "gpt-4o"
+    # score, reason or verbose, see trajectory_score.EVALUATION_MODES
+    evaluation_mode: str = "score"
+    # run the verbose evaluation once on the final best path
+    verbose_final_evaluation: bool = False
     
     # Search settings
     search_algorithm: str = "bfs"
@@ -24,6 +28,20 @@ class AgentConfig:
     max_depth: int = 3
     num_simulations: int = 1
     account_reset: bool = True
+    # seconds to wait for a page to settle after loading or acting, before observing it
+    page_settle_seconds: float = 3.0
+    # llm scores every child, logprob derives values from the action samples
+    # and only scores the top-k children and close calls with the llm
+    value_function: str = "llm"
+    value_escalation_top_k: int = 1
+    value_escalation_margin: float = 0.1
+    # score sibling children in a single llm request
+    batch_evaluation: bool = False
+    # stop expanding nodes whose action left the page as the parent's page: same url and
+    # AXTree, and screenshots within noop_hash_distance bits of perceptual hash
+    prune_noop_actions: bool = False
+    noop_hash_distance: int = 0
+    noop_value: float = 0.0
 
     # for LATS
     simulation_score: float = 0.75
@@ -36,9 +54,18 @@ class AgentConfig:
     features: List[str] = field(default_factory=lambda: ['axtree'])
     fullpage: bool = False
     elements_filter: str = "som"
+    # cut the accessibility tree down to roughly this many tokens, None keeps the full tree
+    axtree_max_tokens: Optional[int] = None
+    # show the changes of the accessibility tree since the last step in the action feedback
+    observation_delta: bool = False
 
     # Logging
     log_folder: str = "log"
+    # record the LLM requests and browser observations of the search to this file,
+    # or replay them from it, see agents_async/SearchAgents/cassette.py
+    cassette: Optional[str] = None
+    # record or replay
+    cassette_mode: str = "record"
 
 def add_agent_config_arguments(parser):
     # Environment
@@ -57,6 +84,10 @@ def add_agent_config_arguments(parser):
                         help="action grounding model, right now only supports openai models")
     parser.add_argument("--evaluation_model", type=str, required=False,
                         help="evaluation model, right now only supports openai models")
+    parser.add_argument("--evaluation_mode", type=str, required=False,
+                        help="score, reason or verbose")
+    parser.add_argument("--verbose_final_evaluation", action="store_true", default=None,
+                        help="run the verbose evaluation on the final best path")
     # Search
     parser.add_argument("--search_algorithm", type=str, required=False,
                         help="bfs or dfs")
@@ -70,6 +101,22 @@ def add_agent_config_arguments(parser):
                         help="max depth of rollout")
     parser.add_argument("--num_simulations", type=int, required=False,
                         help="Number of simulations to run")
+    parser.add_argument("--page_settle_seconds", type=float, required=False,
+                        help="seconds to wait for a page to settle before observing it")
+    parser.add_argument("--value_function", type=str, required=False,
+                        help="llm or logprob")
+    parser.add_argument("--value_escalation_top_k", type=int, required=False,
+                        help="number of children scored by the llm in logprob mode")
+    parser.add_argument("--value_escalation_margin", type=float, required=False,
+                        help="prob margin for close calls that are also scored by the llm")
+    parser.add_argument("--batch_evaluation", action="store_true", default=None,
+                        help="score sibling children in a single llm request")
+    parser.add_argument("--prune_noop_actions", action="store_true", default=None,
+                        help="prune actions that leave the page unchanged")
+    parser.add_argument("--noop_hash_distance", type=int, required=False,
+                        help="max bits between screenshot hashes for an action to count as a no-op, negative never prunes")
+    parser.add_argument("--noop_value", type=float, required=False,
+                        help="value given to pruned no-op nodes")
     
     # Features
     parser.add_argument("--features", type=str, required=False,
@@ -78,10 +125,18 @@ def add_agent_config_arguments(parser):
                         help="fullpage")
     parser.add_argument("--elements_filter", type=str, required=False,
                         help="elements filter")
+    parser.add_argument("--axtree_max_tokens", type=int, required=False,
+                        help="token budget for the accessibility tree in prompts")
+    parser.add_argument("--observation_delta", action="store_true", default=None,
+                        help="describe the page changes caused by each action in its feedback")
 
     # Logging
     parser.add_argument("--log_folder", type=str, required=False,
                         help="log folder")
+    parser.add_argument("--cassette", type=str, required=False,
+                        help="cassette file to record the llm requests and browser observations to, or to replay them from")
+    parser.add_argument("--cassette_mode", type=str, required=False,
+                        help="record or replay")
     
 def filter_valid_config_args(args_dict):
     valid_fields = {field.name for field in fields(AgentConfig)}
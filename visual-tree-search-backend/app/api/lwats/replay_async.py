@@ -19,6 +19,7 @@ import os
 import re
 import json
 from .webagent_utils_async.utils.utils import encode_image, locate_element
+from .webagent_utils_async.utils.metrics import instrument_openai_client, replay_steps
 from dotenv import load_dotenv
 _ = load_dotenv()
 from elevenlabs.client import ElevenLabs
@@ -26,7 +27,7 @@ from elevenlabs import play
 
 # Initialize the Eleven Labs client
 elevenlabs_client = ElevenLabs(api_key=os.getenv("ELEVEN_API_KEY"))
-openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+openai_client = instrument_openai_client(OpenAI(api_key=os.getenv("OPENAI_API_KEY")))
 import argparse
 from .webagent_utils_async.action.highlevel import HighLevelActionSet
 from .webagent_utils_async.utils.playwright_manager import AsyncPlaywrightManager
@@ -154,6 +155,7 @@ async def playwright_step_execution(node, goal, playwright_manager, is_replay, l
         debug_screenshot_path = os.path.join(log_folder, 'screenshots', 'error_wait.png')
         await page.screenshot(path=debug_screenshot_path)
         logger.error(f"Saved debug screenshot: {debug_screenshot_path}")
+        replay_steps.inc(outcome="wait_failed")
         return False
     
     # Await the count() method
@@ -165,12 +167,14 @@ async def playwright_step_execution(node, goal, playwright_manager, is_replay, l
     try:
         action_name, args, kwargs = parse_action(action)
         await execute_action(page, element, action_name, args, kwargs)
+        replay_steps.inc(outcome="ok")
         return True
     except Exception as e:
         logger.error(f"Error occurred during execution: {e}")
         debug_screenshot_path = os.path.join(log_folder, 'screenshots', 'error_action.png')
         await page.screenshot(path=debug_screenshot_path)
         logger.error(f"Saved debug screenshot: {debug_screenshot_path}")
+        replay_steps.inc(outcome="action_failed")
         return False
 
 BID_ACTIONS = [
@@ -343,10 +347,11 @@ async def execute_action(page, element, action_name, args, kwargs):
 
 
 
-async def generate_feedback(goal, action_description, playwright_manager, model="gpt-4o"):
+async def generate_feedback(goal, action_description, playwright_manager, model="gpt-4o",
+                            openai_client=openai_client, settle_seconds=3):
     page = await playwright_manager.get_page()
 
-    await page.wait_for_timeout(3000)
+    await page.wait_for_timeout(settle_seconds * 1000)
 
     screenshot_bytes = await page.screenshot()
     base64_image = base64.b64encode(screenshot_bytes).decode('utf-8')
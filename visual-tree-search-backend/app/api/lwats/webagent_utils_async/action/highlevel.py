@@ -35,6 +35,7 @@ async def new_tab():
 
 import inspect
 import random
+import threading
 
 from dataclasses import dataclass
 from typing import Literal, Optional
@@ -162,6 +163,8 @@ class HighLevelActionSet(AbstractActionSet):
         super().__init__(strict)
         self.multiaction = multiaction
         self.demo_mode = demo_mode
+        # the action space never changes after construction, so generated texts are cached
+        self._text_cache = {}
 
         if not subsets:
             raise ValueError(f"'action_subsets' is empty.")
@@ -269,6 +272,12 @@ demo_mode={repr(demo_mode)}
         """
         Returns an example action as a string.
         """
+        key = ("example_action", abstract, max_examples)
+        if key not in self._text_cache:
+            self._text_cache[key] = self._example_action(abstract, max_examples)
+        return self._text_cache[key]
+
+    def _example_action(self, abstract: bool, max_examples: int) -> str:
         if abstract:
             if self.multiaction:
                 return """\
@@ -302,6 +311,12 @@ One single action to be executed. You can only use one action at a time."""
         """
         Returns a textual description of this action space.
         """
+        key = ("describe", with_long_description, with_examples)
+        if key not in self._text_cache:
+            self._text_cache[key] = self._describe(with_long_description, with_examples)
+        return self._text_cache[key]
+
+    def _describe(self, with_long_description: bool, with_examples: bool):
         description = f"""
 {len(self.action_set)} different types of actions are available.
 
@@ -521,4 +536,39 @@ async def execute_action(action: str):
             python_code += (
                     "await " + function_name + "(" + ", ".join([repr(arg) for arg in function_args]) + ")\n"
             )
-        return python_code, function_calls
\ No newline at end of file
+        return python_code, function_calls
+
+
+_action_set_registry: dict[tuple, HighLevelActionSet] = {}
+_action_set_registry_lock = threading.Lock()
+
+
+def get_action_set(
+        subsets: HighLevelActionSet.ActionSubset | list[HighLevelActionSet.ActionSubset],
+        multiaction: bool = True,
+        demo_mode: Literal["off", "default", "all_blue", "only_visible_elements"] = "off",
+        strict: bool = False,
+) -> HighLevelActionSet:
+    """
+    Returns the process-wide HighLevelActionSet for these settings, building it on first use.
+
+    Building an action set reads the source of every action and helper function and parses
+    every docstring, so agents share one instance per configuration. The shared instance has
+    its prompt descriptions and examples precomputed. Custom actions are not interned, build
+    those with HighLevelActionSet directly.
+    """
+    if isinstance(subsets, str):
+        subsets = [subsets]
+    key = (tuple(subsets), multiaction, demo_mode, strict)
+    action_set = _action_set_registry.get(key)
+    if action_set is None:
+        with _action_set_registry_lock:
+            action_set = _action_set_registry.get(key)
+            if action_set is None:
+                action_set = HighLevelActionSet(
+                    subsets=list(subsets), multiaction=multiaction, demo_mode=demo_mode, strict=strict
+                )
+                action_set.describe(with_long_description=False, with_examples=True)
+                action_set.describe(with_long_description=True, with_examples=True)
+                _action_set_registry[key] = action_set
+    return action_set
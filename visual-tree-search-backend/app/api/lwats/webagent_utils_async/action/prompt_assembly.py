@@ -0,0 +1,136 @@
+"""Assembly of action generation prompts, ordered for provider-side prompt caching.
+
+Providers cache the longest previously seen prefix of a request, so the messages are
+laid out stable-first: the instructions and the action space description (identical
+for every request with the same action set), then the goal and goal images (identical
+within a search), and only then the trajectory, page features and screenshot, which
+change on every call.
+"""
+
+import threading
+
+ACTION_GENERATION_INSTRUCTIONS = \
+"""
+# Instructions
+Review the current state of the page and all other information to find the best
+possible next action and a natural language description of the action (example of natural language description is like)
+"click the navbar button" or "select the portrait option" etc) to accomplish your goal.
+Your answer will be interpreted and executed by a program, make sure to follow the formatting instructions.
+
+Respond using valid JSON format, which can be parsed by python json.loads(), with keys:
+- context (containing the action)
+- natural_language_description
+- finished (boolean: IMPORTANT - must be False if content field contains an action.
+        Only set to True when NO more actions are needed and content field is empty)
+
+Example response format:
+{
+    "content": "action here",
+    "natural_language_description": "description here",
+    "finished": false  # Must be false because content contains an action
+}
+
+# Rules for finished field:
+- If content field contains any action: finished MUST be False
+- Only set finished to True when:
+    1. The goal is completely achieved
+    2. No more actions are needed
+    3. Content field is empty
+
+Provide ONLY ONE action. Do not suggest multiple actions or a sequence of actions.
+"""
+
+ACTION_SPACE_TEMPLATE = \
+"""
+# Action Space
+{action_set_description}
+
+# Screenshot
+The image provided is a screenshot of the current application state, corresponding to the Accessibility Tree.
+
+Here is an example with chain of thought of a valid action when clicking on a button:
+"
+In order to accomplish my goal I need to click on the button with bid 12
+```click('12')```
+"
+"""
+
+GOAL_TEMPLATE = \
+"""
+# Goal:
+{goal}
+"""
+
+OBSERVATION_TEMPLATE = \
+"""
+Previous actions and action results are: {trajectory}
+
+{feature_text}
+
+Please analyze the screenshot and the Accessibility Tree to determine the next appropriate action. Refer to visual elements from the screenshot if relevant to your decision.
+Provide ONLY ONE action. Do not suggest multiple actions or a sequence of actions.
+"""
+
+_cache_stats_lock = threading.Lock()
+_cache_stats = {"requests": 0, "prompt_tokens": 0, "cached_tokens": 0}
+
+
+def build_system_message(action_set) -> str:
+    """The stable prefix: instructions followed by the action space description."""
+    return ACTION_GENERATION_INSTRUCTIONS + ACTION_SPACE_TEMPLATE.format(
+        action_set_description=action_set.describe(with_long_description=False, with_examples=True)
+    )
+
+
+def build_action_generation_messages(action_set, goal, trajectory, feature_text, screenshot_base64,
+                                     goal_image_content=None) -> list[dict]:
+    """
+    Build the messages for an action generation request, stable content first.
+
+    Args:
+        action_set: The action set, described in the system message
+        goal: The goal of the search
+        trajectory: Previous actions and action results
+        feature_text: Flattened page features (AXTree, DOM, interactive elements)
+        screenshot_base64: Base64 encoded screenshot of the current page
+        goal_image_content: Optional content parts with the goal images
+
+    Returns:
+        list: Chat completion messages
+    """
+    goal_text = GOAL_TEMPLATE.format(goal=goal)
+    if goal_image_content:
+        goal_text = goal_text.rstrip("\n") + ", and here are the input images\n"
+    messages = [
+        {"role": "system", "content": build_system_message(action_set)},
+        {"role": "user", "content": [{"type": "text", "text": goal_text}] + list(goal_image_content or [])},
+        {"role": "user", "content": [
+            {"type": "text", "text": OBSERVATION_TEMPLATE.format(trajectory=trajectory, feature_text=feature_text)},
+            {"type": "image_url", "image_url": {
+                "url": f"data:image/jpeg;base64,{screenshot_base64}",
+                "detail": "high"
+            }}
+        ]}
+    ]
+    return messages
+
+
+def record_prompt_cache_usage(response) -> int:
+    """Record the prompt and cached token counts of a response, returns the cached tokens."""
+    usage = getattr(response, "usage", None)
+    prompt_tokens = getattr(usage, "prompt_tokens", None) or 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached_tokens = getattr(details, "cached_tokens", None) or 0
+    with _cache_stats_lock:
+        _cache_stats["requests"] += 1
+        _cache_stats["prompt_tokens"] += prompt_tokens
+        _cache_stats["cached_tokens"] += cached_tokens
+    return cached_tokens
+
+
+def get_prompt_cache_stats() -> dict:
+    """Totals of the recorded responses, with the share of prompt tokens served from cache."""
+    with _cache_stats_lock:
+        stats = dict(_cache_stats)
+    stats["cache_hit_ratio"] = stats["cached_tokens"] / stats["prompt_tokens"] if stats["prompt_tokens"] else 0.0
+    return stats
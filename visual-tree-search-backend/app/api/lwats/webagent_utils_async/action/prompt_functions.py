@@ -5,6 +5,7 @@ import os
 from litellm import OpenAI
 from ..utils.utils import url_to_b64
 from .utils import prepare_prompt
+from .prompt_assembly import build_action_generation_messages, record_prompt_cache_usage
 from .utils import build_highlevel_action_parser
 from collections import defaultdict
 from PIL import Image
@@ -29,84 +30,15 @@ async def is_goal_finished(messages, openai_client: OpenAI):
 
 # TODO: make this consistent with https://github.com/PathOnAI/LiteWebAgent/blob/main/litewebagent/agents/PromptAgents/PromptAgent.py
 async def extract_top_actions(trajectory, goal, images, page_info, action_set, openai_client: OpenAI,
-                        features, elements_filter, branching_factor, log_folder, fullpage=True, action_generation_model="gpt-4o", action_grounding_model="gpt-4o"):
+                        features, elements_filter, branching_factor, log_folder, fullpage=True, action_generation_model="gpt-4o", action_grounding_model="gpt-4o",
+                        axtree_max_tokens=None):
+    goal_image_content = []
     if len(images) == 0:
         print("the input is just text")
-        system_msg = f"""
-            # Instructions
-            Review the current state of the page and all other information to find the best
-            possible next action and a natural language description of the action (example of natural language description is like)
-            "click the navbar button" or "select the portrait option" etc) to accomplish your goal.
-            Your answer will be interpreted and executed by a program, make sure to follow the formatting instructions.
-            
-            Respond using valid JSON format, which can be parsed by python json.loads(), with keys:
-            - context (containing the action)
-            - natural_language_description
-            - finished (boolean: IMPORTANT - must be False if content field contains an action.
-                    Only set to True when NO more actions are needed and content field is empty)
-            
-            Example response format:
-            {{
-                "content": "action here",
-                "natural_language_description": "description here",
-                "finished": false  # Must be false because content contains an action
-            }}
-            
-            # Rules for finished field:
-            - If content field contains any action: finished MUST be False
-            - Only set finished to True when:
-                1. The goal is completely achieved
-                2. No more actions are needed
-                3. Content field is empty
-            
-            Previous actions and action results are: {trajectory}
-            
-            Provide ONLY ONE action. Do not suggest multiple actions or a sequence of actions.
-            
-            # Goal:
-            {goal}
-            """
-        messages = [{"role": "system", "content": system_msg}]
     else:
         print("using images as well")
-        system_msg = f"""
-            # Instructions
-            Review the current state of the page and all other information to find the best
-            possible next action and a natural language description of the action (example of natural language description is like)
-            "click the navbar button" or "select the portrait option" etc) to accomplish your goal.
-            Your answer will be interpreted and executed by a program, make sure to follow the formatting instructions.
-            
-            Respond using JSON format, with keys:
-            - context (containing the action)
-            - natural_language_description
-            - finished (boolean: IMPORTANT - must be False if content field contains an action.
-                    Only set to True when NO more actions are needed and content field is empty)
-            
-            Example response format:
-            {{
-                "content": "action here",
-                "natural_language_description": "description here",
-                "finished": false  # Must be false because content contains an action
-            }}
-            
-            # Rules for finished field:
-            - If content field contains any action: finished MUST be False
-            - Only set finished to True when:
-                1. The goal is completely achieved
-                2. No more actions are needed
-                3. Content field is empty
-            
-            Previous actions and action results are: {trajectory}
-            
-            Provide ONLY ONE action. Do not suggest multiple actions or a sequence of actions.
-            
-            # Goal:
-            {goal}, and here are the input images
-            """
-        messages = [{"role": "system", "content": system_msg}]
-        content = []
         for image_i, image in enumerate(images):
-            content.extend(
+            goal_image_content.extend(
                 [
                     {
                         "type": "text",
@@ -118,23 +50,15 @@ async def extract_top_actions(trajectory, goal, images, page_info, action_set, o
                     },
                 ]
             )
-        messages.append({"role": "user", "content": content})
 
-    prompt = prepare_prompt(page_info, action_set, features, elements_filter, log_folder, fullpage)
+    # the action space is part of the stable system message, only the page features are volatile
+    prompt = prepare_prompt(page_info, action_set, features, elements_filter, log_folder, fullpage,
+                            with_action_space=False, axtree_max_tokens=axtree_max_tokens)
     # base64_image = encode_image(page_info['screenshot'])
     base64_image = base64.b64encode(page_info['screenshot_som']).decode('utf-8')
+    messages = build_action_generation_messages(action_set, goal, trajectory, prompt, base64_image,
+                                                goal_image_content=goal_image_content)
     print("action generation model is: {}".format(action_generation_model))
-    messages.append({"role": "user",
-             "content": [
-                 {"type": "text", "text": prompt},
-                 {"type": "image_url",
-                  "image_url": {
-                      "url": f"data:image/jpeg;base64,{base64_image}",
-                      "detail": "high"
-                  }
-                  }
-             ]
-             })
 
     response = openai_client.chat.completions.create(
         model=action_generation_model,
@@ -143,6 +67,9 @@ async def extract_top_actions(trajectory, goal, images, page_info, action_set, o
         logprobs=True,
         n=min(branching_factor * 2, 20),
     )
+    # totals served by get_prompt_cache_stats()
+    record_prompt_cache_usage(response)
+    system_msg = messages[0]["content"]
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
     filename = f"action_gen_sys_prompt_{timestamp}.txt"
     file_path = os.path.join(log_folder, 'prompt', filename)
@@ -271,96 +198,22 @@ async def extract_top_actions(trajectory, goal, images, page_info, action_set, o
     # [{'action': "fill('113', 'dining table')", 'prob': 1.0}]
     return updated_actions
 
-SYSTEM_PROMPT_TEMPLATE = \
-"""
-# Instructions
-Review the current state of the page and all other information to find the best
-possible next action and a natural language description of the action (example of natural language description is like)
-"click the navbar button" or "select the portrait option" etc) to accomplish your goal.
-Your answer will be interpreted and executed by a program, make sure to follow the formatting instructions.
-
-Respond using valid JSON format, which can be parsed by python json.loads(), with keys:
-- context (containing the action)
-- natural_language_description
-- finished (boolean: IMPORTANT - must be False if content field contains an action.
-        Only set to True when NO more actions are needed and content field is empty)
-
-Example response format:
-{{
-    "content": "action here",
-    "natural_language_description": "description here",
-    "finished": false  # Must be false because content contains an action
-}}
-
-# Rules for finished field:
-- If content field contains any action: finished MUST be False
-- Only set finished to True when:
-    1. The goal is completely achieved
-    2. No more actions are needed
-    3. Content field is empty
-
-Previous actions and action results are: {trajectory}
-
-Provide ONLY ONE action. Do not suggest multiple actions or a sequence of actions.
-
-# Goal:
-{goal}
-"""
-
-SYSTEM_PROMPT_TEMPLATE_WITH_IMAGES = \
-"""
-{SYSTEM_PROMPT_TEMPLATE}, and here are the input images
-"""
-
-USER_PROMPT_TEMPLATE = \
-"""
-{feature_text}
-
-# Action Space
-{action_set_description}
-
-# Screenshot
-The image provided is a screenshot of the current application state, corresponding to the Accessibility Tree above.
-
-Here is an example with chain of thought of a valid action when clicking on a button:
-"
-In order to accomplish my goal I need to click on the button with bid 12
-```click('12')```
-"
-
-Please analyze the screenshot and the Accessibility Tree to determine the next appropriate action. Refer to visual elements from the screenshot if relevant to your decision.
-Provide ONLY ONE action. Do not suggest multiple actions or a sequence of actions.
-"""
-
 async def generate_actions_with_observation(trajectory, goal, goal_images, openai_client: OpenAI, action_set, feature_text, screenshot,
                         branching_factor, log_folder, action_generation_model):
     
-    if len(goal_images) == 0:
-        system_msg = SYSTEM_PROMPT_TEMPLATE.format(trajectory=trajectory, goal=goal)
-        messages = [{"role": "system", "content": system_msg}]
-    else:
-        system_msg = SYSTEM_PROMPT_TEMPLATE_WITH_IMAGES.format(trajectory=trajectory, goal=goal)
-        messages = [{"role": "system", "content": system_msg}]
-        content = []
-        for image_i, image in enumerate(goal_images):
-            image_base64 = base64.b64encode(image).decode('utf-8')
-            content.extend([
-                {"type": "text", "text": f"input image {image_i+1}: "},
-                {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image_base64}", "detail": "high"}},
-            ])
-        messages.append({"role": "user", "content": content})
-    
-    action_set_description = action_set.describe(with_long_description=False, with_examples=True)
-    user_prompt = USER_PROMPT_TEMPLATE.format(
-        feature_text=feature_text, 
-        action_set_description=action_set_description
-    )
+    goal_image_content = []
+    for image_i, image in enumerate(goal_images):
+        image_base64 = base64.b64encode(image).decode('utf-8')
+        goal_image_content.extend([
+            {"type": "text", "text": f"input image {image_i+1}: "},
+            {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image_base64}", "detail": "high"}},
+        ])
 
     screenshot_base64 = base64.b64encode(screenshot).decode('utf-8')
-    messages.append({"role": "user", "content": [
-        {"type": "text", "text": user_prompt},
-        {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{screenshot_base64}", "detail": "high"}}
-    ]})
+    messages = build_action_generation_messages(action_set, goal, trajectory, feature_text, screenshot_base64,
+                                                goal_image_content=goal_image_content)
+    system_msg = messages[0]["content"]
+    user_prompt = messages[-1]["content"][0]["text"]
 
     response = openai_client.chat.completions.create(
         model=action_generation_model,
@@ -369,6 +222,7 @@ async def generate_actions_with_observation(trajectory, goal, goal_images, opena
         logprobs=True,
         n=min(branching_factor * 2, 20),
     )
+    record_prompt_cache_usage(response)
 
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     filename = f"action_gen_prompt_{timestamp}.txt"
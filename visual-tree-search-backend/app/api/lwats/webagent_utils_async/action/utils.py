@@ -1,10 +1,10 @@
 import os
-from ..browser_env.extract_elements import remove_highlights
 from .base import execute_python_code
 import ast
 import pyparsing as pp
 from ..browser_env.extract_elements import flatten_interactive_elements_to_str
 from ..browser_env.obs import flatten_axtree_to_str, flatten_dom_to_str
+from ..browser_env.observation_diff import flatten_page_axtree
 
 from ..utils.utils import parse_function_args, append_to_steps_json, locate_element
 import logging
@@ -27,7 +27,6 @@ async def execute_action(action, action_set, page, context, task_description, in
         logger.info(result)
 
     logger.info("Executing action script")
-    await remove_highlights(page)
     await execute_python_code(
         code,
         page,
@@ -170,7 +169,8 @@ def build_highlevel_action_parser() -> pp.ParserElement:
 #     return prompt
 
 
-def prepare_prompt(page_info, action_set, features, elements_filter, log_folder, fullpage=True):
+def prepare_prompt(page_info, action_set, features, elements_filter, log_folder, fullpage=True, with_action_space=True,
+                   axtree_max_tokens=None):
     logger.info("features used: {}".format(features))
     logger.info(f"elements_filter: {elements_filter}")
 
@@ -184,7 +184,7 @@ def prepare_prompt(page_info, action_set, features, elements_filter, log_folder,
     prompt = f"""
     """
     if "axtree" in features:
-        axtree_str = flatten_axtree_to_str(page_info.get('axtree', ''), extra_properties=page_info['extra_properties'], filter_som_only=filter_som_only, filter_visible_only=filter_visible_only)
+        axtree_str = flatten_page_axtree(page_info, filter_som_only=filter_som_only, filter_visible_only=filter_visible_only, max_tokens=axtree_max_tokens)
         prompt += f"""
         # Current Accessibility Tree:
         {axtree_str}
@@ -224,6 +224,10 @@ def prepare_prompt(page_info, action_set, features, elements_filter, log_folder,
         with open(file_path, 'w', encoding='utf8') as file:
             file.write(dom_str)
 
+    if not with_action_space:
+        # the caller puts the action space in its stable prompt prefix
+        return prompt
+
     prompt += f"""
         # Action Space
         {action_set.describe(with_long_description=False, with_examples=True)}
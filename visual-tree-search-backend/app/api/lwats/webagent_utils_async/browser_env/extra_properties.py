@@ -0,0 +1,214 @@
+"""Vectorized extraction of the browsergym extra properties from a DOMSnapshot.
+
+The DOMSnapshot returned by CDP is already columnar (one array per node attribute, one
+array per layout entry), so the properties are computed with NumPy array operations and
+kept columnar as well. BidProperties exposes them through the same read-only mapping
+interface as the dict of dicts it replaces: extra_properties[bid]["visibility"].
+"""
+
+import itertools
+import logging
+from collections import Counter
+from collections.abc import Mapping
+
+import numpy as np
+
+from .constants import BROWSERGYM_ID_ATTRIBUTE as BID_ATTR
+from .constants import BROWSERGYM_SETOFMARKS_ATTRIBUTE as SOM_ATTR
+from .constants import BROWSERGYM_VISIBILITY_ATTRIBUTE as VIS_ATTR
+
+logger = logging.getLogger(__name__)
+
+# set_of_marks column values, the attribute may be missing
+_SOM_MISSING = -1
+
+
+class BidProperties(Mapping):
+    """
+    Extra properties of the elements with a bid, stored column-wise.
+
+    Each row is one bid. Missing values are NaN for visibility and bbox, and -1 for
+    set_of_marks. Lookups return the same dicts as the previous implementation:
+    {"visibility": float | None, "bbox": [x, y, w, h] | None, "clickable": bool,
+    "set_of_marks": bool | None}.
+    """
+
+    def __init__(self, bids: list[str], visibility: np.ndarray, bbox: np.ndarray,
+                 clickable: np.ndarray, set_of_marks: np.ndarray):
+        self.bids = bids
+        self.visibility = visibility
+        self.bbox = bbox
+        self.clickable = clickable
+        self.set_of_marks = set_of_marks
+        # like the dict it replaces, a duplicated bid keeps its first position and its last value
+        self._row = {}
+        for row, bid in enumerate(bids):
+            self._row[bid] = row
+        self._cache = {}
+
+    def __getitem__(self, bid):
+        properties = self._cache.get(bid)
+        if properties is None:
+            row = self._row[bid]
+            visibility = self.visibility[row]
+            bbox = self.bbox[row]
+            som = self.set_of_marks[row]
+            properties = {
+                "visibility": None if np.isnan(visibility) else float(visibility),
+                "bbox": None if np.isnan(bbox[0]) else bbox.tolist(),
+                "clickable": bool(self.clickable[row]),
+                "set_of_marks": None if som == _SOM_MISSING else bool(som),
+            }
+            self._cache[bid] = properties
+        return properties
+
+    def __contains__(self, bid):
+        return bid in self._row
+
+    def __iter__(self):
+        return iter(self._row)
+
+    def __len__(self):
+        return len(self._row)
+
+    def to_dict(self) -> dict:
+        """Plain dict of dicts, e.g. for json serialization."""
+        return {bid: dict(self[bid]) for bid in self._row}
+
+    @classmethod
+    def from_dict(cls, properties: dict) -> "BidProperties":
+        """Inverse of to_dict."""
+        bids = list(properties)
+        values = [properties[bid] for bid in bids]
+        return cls(
+            bids,
+            np.array([np.nan if v["visibility"] is None else v["visibility"] for v in values], dtype=np.float64),
+            np.array([[np.nan] * 4 if v["bbox"] is None else v["bbox"] for v in values], dtype=np.float64).reshape(-1, 4),
+            np.array([v["clickable"] for v in values], dtype=bool),
+            np.array([_SOM_MISSING if v["set_of_marks"] is None else v["set_of_marks"] for v in values], dtype=np.int8),
+        )
+
+
+def _string_id(strings: list[str], value: str) -> int:
+    try:
+        return strings.index(value)
+    except ValueError:
+        return -1
+
+
+def _attribute_columns(node_attributes: list[list[int]], num_nodes: int):
+    """Flatten the per-node [name, value, name, value, ...] lists into name, value and owner arrays."""
+    lengths = np.fromiter(map(len, node_attributes), dtype=np.int64, count=num_nodes)
+    flat = np.fromiter(itertools.chain.from_iterable(node_attributes), dtype=np.int64, count=int(lengths.sum()))
+    owners = np.repeat(np.arange(num_nodes), lengths // 2)
+    return flat[0::2], flat[1::2], owners
+
+
+def _string_column(strings: list[str], value_ids: np.ndarray, convert, dtype):
+    """Convert string ids to values, converting each distinct string only once."""
+    unique_ids, inverse = np.unique(value_ids, return_inverse=True)
+    converted = np.array([convert(strings[i]) for i in unique_ids.tolist()], dtype=dtype)
+    return converted[inverse.reshape(-1)]
+
+
+def extract_dom_extra_properties(dom_snapshot) -> BidProperties:
+    strings = dom_snapshot["strings"]
+    documents = dom_snapshot["documents"]
+    bid_string_id = _string_id(strings, BID_ATTR)
+    vis_string_id = _string_id(strings, VIS_ATTR)
+    som_string_id = _string_id(strings, SOM_ATTR)
+
+    # (x, y) of each document's origin in the top document, and the first layout entry of its nodes
+    abs_pos = {}
+    first_layout = {}
+    parents = {0: None}
+
+    columns = {}
+    docs_to_process = [0]
+    while docs_to_process:
+        doc = docs_to_process.pop(-1)
+        document = documents[doc]
+        nodes = document["nodes"]
+        layout = document["layout"]
+
+        children = nodes["contentDocumentIndex"]
+        for node, child_doc in zip(children["index"], children["value"]):
+            parents[child_doc] = (doc, node)
+            docs_to_process.append(child_doc)
+
+        layout_node_index = np.asarray(layout["nodeIndex"], dtype=np.int64)
+        layout_bounds = np.asarray(layout["bounds"], dtype=np.float64).reshape(-1, 4)
+
+        parent = parents[doc]
+        parent_x = parent_y = 0.0
+        if parent is not None:
+            parent_doc, parent_node = parent
+            layout_idx = int(first_layout[parent_doc][parent_node])
+            if layout_idx >= 0:
+                parent_bounds = np.asarray(documents[parent_doc]["layout"]["bounds"][layout_idx], dtype=np.float64)
+                parent_x = abs_pos[parent_doc][0] + parent_bounds[0]
+                parent_y = abs_pos[parent_doc][1] + parent_bounds[1]
+        abs_pos[doc] = (parent_x - document["scrollOffsetX"], parent_y - document["scrollOffsetY"])
+
+        num_nodes = len(nodes["parentIndex"])
+        if len(children["index"]):
+            # replaces a list.index lookup per child document, reversed so the first entry wins
+            node_layout = np.full(num_nodes, -1, dtype=np.int64)
+            node_layout[layout_node_index[::-1]] = np.arange(len(layout_node_index) - 1, -1, -1)
+            first_layout[doc] = node_layout
+
+        names, values, owners = _attribute_columns(nodes["attributes"], num_nodes)
+
+        bid_ids = np.full(num_nodes, -1, dtype=np.int64)
+        mask = names == bid_string_id
+        bid_ids[owners[mask]] = values[mask]
+
+        visibility = np.full(num_nodes, np.nan)
+        mask = names == vis_string_id
+        if mask.any():
+            visibility[owners[mask]] = _string_column(strings, values[mask], float, np.float64)
+
+        set_of_marks = np.full(num_nodes, _SOM_MISSING, dtype=np.int8)
+        mask = names == som_string_id
+        if mask.any():
+            set_of_marks[owners[mask]] = _string_column(strings, values[mask], lambda s: s == "1", np.int8)
+
+        clickable = np.zeros(num_nodes, dtype=bool)
+        clickable[np.asarray(nodes["isClickable"]["index"], dtype=np.int64)] = True
+
+        # one row per layout entry, NaN when the node has no client rect, the last entry of a node wins
+        bbox = np.full((num_nodes, 4), np.nan)
+        has_rect = np.fromiter(map(len, layout["clientRects"]), dtype=np.int64, count=len(layout_node_index)) > 0
+        layout_bbox = np.where(has_rect[:, None], layout_bounds, np.nan)
+        layout_bbox[:, 0] += abs_pos[doc][0]
+        layout_bbox[:, 1] += abs_pos[doc][1]
+        bbox[layout_node_index] = layout_bbox
+
+        # nodes with a non-empty bid
+        rows = np.flatnonzero(bid_ids >= 0)
+        bids = [strings[i] for i in bid_ids[rows].tolist()]
+        keep = [i for i, bid in enumerate(bids) if bid]
+        rows = rows[keep]
+        columns[doc] = (
+            [bids[i] for i in keep],
+            visibility[rows],
+            bbox[rows],
+            clickable[rows],
+            set_of_marks[rows],
+        )
+
+    # documents in the order they were discovered, like the dict of the previous implementation
+    order = list(parents)
+    bids = []
+    for doc in order:
+        bids.extend(columns[doc][0])
+    for bid, count in Counter(bids).items():
+        for _ in range(count - 1):
+            logger.warning(f"duplicate {BID_ATTR}={repr(bid)} attribute detected")
+    return BidProperties(
+        bids,
+        np.concatenate([columns[doc][1] for doc in order]),
+        np.concatenate([columns[doc][2] for doc in order]).reshape(-1, 4),
+        np.concatenate([columns[doc][3] for doc in order]),
+        np.concatenate([columns[doc][4] for doc in order]),
+    )
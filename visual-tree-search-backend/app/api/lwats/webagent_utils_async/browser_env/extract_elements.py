@@ -1,4 +1,5 @@
 import logging
+import pkgutil
 from .constants import BROWSERGYM_ID_ATTRIBUTE as BID_ATTR
 
 logger = logging.getLogger(__name__)
@@ -9,142 +10,10 @@ class MarkingError(Exception):
 
 
 async def extract_interactive_elements(page):
-    js_code = """
-    (browsergymIdAttribute) => {
-        const customCSS = `
-            ::-webkit-scrollbar {
-                width: 10px;
-            }
-            ::-webkit-scrollbar-track {
-                background: #27272a;
-            }
-            ::-webkit-scrollbar-thumb {
-                background: #888;
-                border-radius: 0.375rem;
-            }
-            ::-webkit-scrollbar-thumb:hover {
-                background: #555;
-            }
-        `;
-
-        const styleTag = document.createElement("style");
-        styleTag.textContent = customCSS;
-        document.head.append(styleTag);
-
-        function generateSelector(element) {
-            let selector = element.tagName.toLowerCase();
-            if (element.id) {
-                selector += `#${element.id}`;
-            } else {
-                if (typeof element.className === 'string' && element.className.trim()) {
-                    selector += `.${element.className.trim().split(/\\s+/).join('.')}`;
-                }
-                let sibling = element;
-                let nth = 1;
-                while (sibling = sibling && sibling.previousElementSibling) {
-                    if (sibling.tagName.toLowerCase() === selector.split('.')[0]) nth++;
-                }
-                if (nth > 1) {
-                    selector += `:nth-of-type(${nth})`;
-                }
-            }
-            return selector;
-        }
-
-        function isInteractive(element) {
-            const interactiveTags = [
-                'a', 'button', 'input', 'select', 'textarea', 'summary', 'video', 'audio',
-                'iframe', 'embed', 'object', 'menu', 'label', 'fieldset', 'datalist', 'output',
-                'details', 'dialog', 'option'
-            ];
-            const interactiveRoles = [
-                'button', 'link', 'checkbox', 'radio', 'menuitem', 'menuitemcheckbox', 'menuitemradio',
-                'option', 'listbox', 'textbox', 'combobox', 'slider', 'spinbutton', 'scrollbar',
-                'tabpanel', 'treeitem', 'switch', 'searchbox', 'grid', 'gridcell', 'row',
-                'rowgroup', 'rowheader', 'columnheader', 'tab', 'tooltip', 'application', 
-                'dialog', 'alertdialog', 'progressbar'
-            ];
-
-            return interactiveTags.includes(element.tagName.toLowerCase()) ||
-                   interactiveRoles.includes(element.getAttribute('role')) ||
-                   element.onclick != null ||
-                   element.onkeydown != null ||
-                   element.onkeyup != null ||
-                   element.onkeypress != null ||
-                   element.onchange != null ||
-                   element.onfocus != null ||
-                   element.onblur != null ||
-                   element.getAttribute('tabindex') !== null ||
-                   element.getAttribute('contenteditable') === 'true';
-        }
-
-        var vw = Math.max(document.documentElement.clientWidth || 0, window.innerWidth || 0);
-        var vh = Math.max(document.documentElement.clientHeight || 0, window.innerHeight || 0);
-
-        var items = Array.prototype.slice
-            .call(document.querySelectorAll("*"))
-            .map(function (element) {
-                var bid = element.getAttribute(browsergymIdAttribute) || "";
-
-                // Only process elements with a non-empty browsergymIdAttribute AND that are interactive
-                if (bid === "" || !isInteractive(element)) {
-                    return null;
-                }
-
-                var textualContent = element.textContent.trim().replace(/\\s{2,}/g, " ");
-                var elementType = element.tagName.toLowerCase();
-                var ariaLabel = element.getAttribute("aria-label") || "";
-
-                var rects = [...element.getClientRects()]
-                    .filter((bb) => {
-                        var center_x = bb.left + bb.width / 2;
-                        var center_y = bb.top + bb.height / 2;
-                        var elAtCenter = document.elementFromPoint(center_x, center_y);
-                        return elAtCenter === element || element.contains(elAtCenter);
-                    })
-                    .map((bb) => {
-                        const rect = {
-                            left: Math.max(0, bb.left),
-                            top: Math.max(0, bb.top),
-                            right: Math.min(vw, bb.right),
-                            bottom: Math.min(vh, bb.bottom),
-                        };
-                        return {
-                            ...rect,
-                            width: rect.right - rect.left,
-                            height: rect.bottom - rect.top,
-                        };
-                    });
-
-                var area = rects.reduce((acc, rect) => acc + rect.width * rect.height, 0);
-
-                return {
-                    include: true,
-                    area: area,
-                    rects: rects,
-                    text: textualContent,
-                    type: elementType,
-                    ariaLabel: ariaLabel,
-                    bid: bid,
-                    tag: elementType,
-                    id: element.id || null,
-                    class: typeof element.className === 'string' ? element.className : null,
-                    href: element.getAttribute("href") || null,
-                    title: element.getAttribute("title") || null
-                };
-            })
-            .filter((item) => item !== null && item.area >= 20);
-
-        // Only keep inner clickable items
-        items = items.filter(
-            (x) => !items.some((y) => x !== y && document.querySelector(`[id="${y.bid}"]`) && document.querySelector(`[id="${y.bid}"]`).contains(document.querySelector(`[id="${x.bid}"]`)))
-        );
-
-        return items;
-    }
-    """
-
-    return await page.evaluate(js_code, BID_ATTR)
+    js_extract_interactive_elements = pkgutil.get_data(
+        __name__, "javascript/extract_interactive_elements.js"
+    ).decode("utf-8")
+    return await page.evaluate(js_extract_interactive_elements, BID_ATTR)
 
 
 async def highlight_elements(page, elements, max_retries=3, retry_delay=1000):
@@ -0,0 +1,131 @@
+/**
+ * Collect the interactive elements of the frame that carry a bid, with their visible rects.
+ *
+ * All layout reads (client rects) happen first and all hit tests (elementFromPoint) after, so
+ * the page is laid out once. Nested items are resolved with one ancestor walk per element
+ * through a bid -> element map instead of comparing every pair of items.
+ */
+(browsergymIdAttribute) => {
+    const customCSS = `
+        ::-webkit-scrollbar {
+            width: 10px;
+        }
+        ::-webkit-scrollbar-track {
+            background: #27272a;
+        }
+        ::-webkit-scrollbar-thumb {
+            background: #888;
+            border-radius: 0.375rem;
+        }
+        ::-webkit-scrollbar-thumb:hover {
+            background: #555;
+        }
+    `;
+
+    // inject the scrollbar style once, and before any layout read
+    if (!document.getElementById("litewebagent-scrollbar-style")) {
+        const styleTag = document.createElement("style");
+        styleTag.id = "litewebagent-scrollbar-style";
+        styleTag.textContent = customCSS;
+        document.head.append(styleTag);
+    }
+
+    const interactiveTags = new Set([
+        'a', 'button', 'input', 'select', 'textarea', 'summary', 'video', 'audio',
+        'iframe', 'embed', 'object', 'menu', 'label', 'fieldset', 'datalist', 'output',
+        'details', 'dialog', 'option'
+    ]);
+    const interactiveRoles = new Set([
+        'button', 'link', 'checkbox', 'radio', 'menuitem', 'menuitemcheckbox', 'menuitemradio',
+        'option', 'listbox', 'textbox', 'combobox', 'slider', 'spinbutton', 'scrollbar',
+        'tabpanel', 'treeitem', 'switch', 'searchbox', 'grid', 'gridcell', 'row',
+        'rowgroup', 'rowheader', 'columnheader', 'tab', 'tooltip', 'application',
+        'dialog', 'alertdialog', 'progressbar'
+    ]);
+
+    function isInteractive(element) {
+        return interactiveTags.has(element.tagName.toLowerCase()) ||
+               interactiveRoles.has(element.getAttribute('role')) ||
+               element.onclick != null ||
+               element.onkeydown != null ||
+               element.onkeyup != null ||
+               element.onkeypress != null ||
+               element.onchange != null ||
+               element.onfocus != null ||
+               element.onblur != null ||
+               element.getAttribute('tabindex') !== null ||
+               element.getAttribute('contenteditable') === 'true';
+    }
+
+    const vw = Math.max(document.documentElement.clientWidth || 0, window.innerWidth || 0);
+    const vh = Math.max(document.documentElement.clientHeight || 0, window.innerHeight || 0);
+
+    // elements with a non-empty bid, in document order, the selector engine does the filtering
+    const selector = `[${CSS.escape(browsergymIdAttribute)}]:not([${CSS.escape(browsergymIdAttribute)}=""])`;
+    const candidates = [];
+    for (const element of document.querySelectorAll(selector)) {
+        if (isInteractive(element)) {
+            candidates.push({ element: element, clientRects: element.getClientRects() });
+        }
+    }
+
+    // hit test the center of every rect, after all the layout reads
+    const items = [];
+    const elementByBid = new Map();
+    for (const { element, clientRects } of candidates) {
+        const rects = [];
+        let area = 0;
+        for (const bb of clientRects) {
+            const elAtCenter = document.elementFromPoint(bb.left + bb.width / 2, bb.top + bb.height / 2);
+            if (elAtCenter !== element && !element.contains(elAtCenter)) {
+                continue;
+            }
+            const left = Math.max(0, bb.left);
+            const top = Math.max(0, bb.top);
+            const right = Math.min(vw, bb.right);
+            const bottom = Math.min(vh, bb.bottom);
+            const rect = { left: left, top: top, right: right, bottom: bottom, width: right - left, height: bottom - top };
+            area += rect.width * rect.height;
+            rects.push(rect);
+        }
+        if (area < 20) {
+            continue;
+        }
+        const bid = element.getAttribute(browsergymIdAttribute);
+        const elementType = element.tagName.toLowerCase();
+        elementByBid.set(bid, element);
+        items.push({
+            include: true,
+            area: area,
+            rects: rects,
+            text: element.textContent.trim().replace(/\s{2,}/g, " "),
+            type: elementType,
+            ariaLabel: element.getAttribute("aria-label") || "",
+            bid: bid,
+            tag: elementType,
+            id: element.id || null,
+            class: typeof element.className === 'string' ? element.className : null,
+            href: element.getAttribute("href") || null,
+            title: element.getAttribute("title") || null
+        });
+    }
+
+    // Only keep inner clickable items: drop every item that contains another item
+    const itemElements = new Set(elementByBid.values());
+    const outerElements = new Set();
+    const visited = new Set();
+    for (const element of itemElements) {
+        for (let ancestor = element.parentElement; ancestor !== null; ancestor = ancestor.parentElement) {
+            if (visited.has(ancestor)) {
+                // an earlier walk went up from here already
+                break;
+            }
+            visited.add(ancestor);
+            if (itemElements.has(ancestor)) {
+                outerElements.add(ancestor);
+            }
+        }
+    }
+
+    return items.filter((item) => !outerElements.has(elementByBid.get(item.bid)));
+}
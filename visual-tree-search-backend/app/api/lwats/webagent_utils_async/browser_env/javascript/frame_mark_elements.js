@@ -1,8 +1,8 @@
 /**
  * Go through all DOM elements in the frame (including shadowDOMs), give them unique browsergym
- * identifiers (bid), and store custom data in the aria-roledescription attribute.
+ * identifiers (bid), and optionally store custom data in the aria-roledescription attribute.
  */
-async ([parent_bid, bid_attr_name]) => {
+async ([parent_bid, bid_attr_name, store_temp_data = true]) => {
 
     // standard html tags
     // https://www.w3schools.com/tags/
@@ -134,13 +134,15 @@ async ([parent_bid, bid_attr_name]) => {
 
         // Hack: store custom data inside the aria-roledescription attribute (will be available in DOM and AXTree)
         //  - elem_global_bid: global element identifier (unique over multiple frames)
-        // TODO: add more data if needed (x, y coordinates, bounding box, is_visible, is_clickable etc.)
-        let original_content = "";
-        if (elem.hasAttribute("aria-roledescription")) {
-            original_content = elem.getAttribute("aria-roledescription");
+        // Skipped when the bids are matched to the AXTree through backend node ids instead.
+        if (store_temp_data) {
+            let original_content = "";
+            if (elem.hasAttribute("aria-roledescription")) {
+                original_content = elem.getAttribute("aria-roledescription");
+            }
+            let new_content = `${elem_global_bid}_${original_content}`
+            elem.setAttribute("aria-roledescription", new_content);
         }
-        let new_content = `${elem_global_bid}_${original_content}`
-        elem.setAttribute("aria-roledescription", new_content);
 
         // set-of-marks flag (He et al. 2024)
         // https://github.com/MinorJerry/WebVoyager/blob/main/utils.py
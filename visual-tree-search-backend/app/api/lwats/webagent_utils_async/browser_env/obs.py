@@ -17,6 +17,29 @@ logger = logging.getLogger(__name__)
 
 IGNORED_AXTREE_ROLES = ["LineBreak"]
 
+# roles kept first when the accessibility tree is cut down to a token budget
+INTERACTIVE_AXTREE_ROLES = frozenset((
+    "button",
+    "checkbox",
+    "combobox",
+    "link",
+    "listbox",
+    "menuitem",
+    "menuitemcheckbox",
+    "menuitemradio",
+    "option",
+    "radio",
+    "searchbox",
+    "slider",
+    "spinbutton",
+    "switch",
+    "tab",
+    "textbox",
+    "treeitem",
+))
+
+AXTREE_ELISION_MARKER = "{indent}... {count} nodes elided"
+
 IGNORED_AXTREE_PROPERTIES = (
     "editable",
     "readonly",
@@ -181,19 +204,6 @@ def flatten_dom_to_str(
     return html
 
 
-def _remove_redundant_static_text(ax_tree: str) -> str:
-    """Removes redundant `StaticText` from the accessibility tree"""
-    new_lines = []
-    lines = ax_tree.split("\n")
-    for line in lines:
-        if line.strip().startswith("StaticText"):
-            content = line.split("StaticText")[1].strip().strip("'")
-            if content in "\n".join(new_lines[-3:]):
-                continue
-        new_lines.append(line)
-    return "\n".join(new_lines)
-
-
 def _get_coord_str(coord, decimals):
     if isinstance(coord, str):
         coord = list(map(float, ast.literal_eval(coord)))
@@ -259,10 +269,11 @@ def _process_bid(
     # parse extra browsergym properties, if node has a bid
     else:
         if bid in extra_properties:
-            node_vis = extra_properties[bid]["visibility"]
-            node_bbox = extra_properties[bid]["bbox"]
-            node_is_clickable = extra_properties[bid]["clickable"]
-            node_in_som = extra_properties[bid]["set_of_marks"]
+            properties = extra_properties[bid]
+            node_vis = properties["visibility"]
+            node_bbox = properties["bbox"]
+            node_is_clickable = properties["clickable"]
+            node_in_som = properties["set_of_marks"]
             node_is_visible = node_vis >= 0.5
             # skip non-visible nodes (if requested)
             if filter_visible_only and not node_is_visible:
@@ -288,6 +299,65 @@ def _process_bid(
     return skip_element, attributes_to_print
 
 
+def _is_redundant_static_text(line: str, previous_lines: list[str]) -> bool:
+    """Whether the line is a StaticText whose content already is in one of the last 3 lines kept"""
+    if not line.strip().startswith("StaticText"):
+        return False
+    content = line.split("StaticText")[1].strip().strip("'")
+    return content in "\n".join(previous_lines[-3:])
+
+
+def _estimate_tokens(text: str) -> int:
+    """Rough token count of a prompt line (about 4 characters per token, plus the newline)"""
+    return len(text) // 4 + 1
+
+
+def _budget_axtree_lines(lines: list[str], parents: list[int], tiers: list[int], depths: list[int], max_tokens: int) -> str:
+    """
+    Keeps the highest priority lines that fit in max_tokens, in document order.
+
+    Lines are picked by (tier, depth below the nearest interactive or visible ancestor, document order),
+    each together with its not yet kept ancestors so the indentation stays meaningful. Every run of
+    dropped lines is replaced by a single elision marker, whose cost is reserved up front.
+    """
+    marker_tokens = _estimate_tokens(AXTREE_ELISION_MARKER.format(indent="\t" * 8, count=99999))
+    used = marker_tokens  # marker before the first kept line
+    kept = [False] * len(lines)
+    for idx in sorted(range(len(lines)), key=lambda i: (tiers[i], depths[i], i)):
+        if kept[idx]:
+            continue
+        # the line and its ancestors that are not kept yet, each may be followed by a marker
+        chain = []
+        cost = 0
+        ancestor = idx
+        while ancestor >= 0 and not kept[ancestor]:
+            chain.append(ancestor)
+            cost += _estimate_tokens(lines[ancestor]) + marker_tokens
+            ancestor = parents[ancestor]
+        if used + cost > max_tokens:
+            continue
+        used += cost
+        for ancestor in chain:
+            kept[ancestor] = True
+
+    out = []
+    elided = 0
+    elided_indent = ""
+    for idx, line in enumerate(lines):
+        if kept[idx]:
+            if elided:
+                out.append(AXTREE_ELISION_MARKER.format(indent=elided_indent, count=elided))
+                elided = 0
+            out.append(line)
+        else:
+            if not elided:
+                elided_indent = line[:len(line) - len(line.lstrip("\t"))]
+            elided += 1
+    if elided:
+        out.append(AXTREE_ELISION_MARKER.format(indent=elided_indent, count=elided))
+    return "\n".join(out)
+
+
 def flatten_axtree_to_str(
     AX_tree,
     extra_properties: dict = None,
@@ -305,26 +375,47 @@ def flatten_axtree_to_str(
     remove_redundant_static_text: bool = True,
     hide_bid_if_invisible: bool = False,
     hide_all_children: bool = False,
+    max_tokens: int = None,
 ) -> str:
-    """Formats the accessibility tree into a string text"""
+    """
+    Formats the accessibility tree into a string text
+
+    The tree is walked iteratively and the lines are joined once, so the cost is linear in the
+    number of nodes and deep pages do not hit the recursion limit. With max_tokens, the output is
+    cut down to the budget, keeping interactive and visible nodes first and eliding deep static
+    subtrees.
+    """
+    nodes = AX_tree["nodes"]
     node_id_to_idx = {}
-    for idx, node in enumerate(AX_tree["nodes"]):
+    for idx, node in enumerate(nodes):
         node_id_to_idx[node["nodeId"]] = idx
-
-    def dfs(node_idx: int, depth: int, parent_node_filtered: bool) -> str:
-        tree_str = ""
-        node = AX_tree["nodes"][node_idx]
-        indent = "\t" * depth
+    if extra_properties is None:
+        extra_properties_or_empty = {}
+    else:
+        extra_properties_or_empty = extra_properties
+
+    lines = []
+    # per line, only needed for the token budget
+    parents = []  # index of the closest printed ancestor line, -1 for none
+    tiers = []  # 0 interactive, 1 visible, 2 other, 3 invisible
+    depths = []  # printed levels below the closest interactive or visible ancestor
+
+    # (node index, depth, parent_node_filtered, parent line, parent tier, parent static depth)
+    stack = [(0, 0, False, -1, 0, 0)]
+    while stack:
+        node_idx, depth, parent_node_filtered, parent_line, parent_tier, parent_static_depth = stack.pop()
+        node = nodes[node_idx]
         skip_node = False
         filter_node = False
         node_role = node["role"]["value"]
+        line_idx = parent_line
+        line_tier = parent_tier
+        line_static_depth = parent_static_depth
 
         if node_role in ignored_roles:
             skip_node = True
-            pass
         elif "name" not in node:
             skip_node = True
-            pass
         else:
             node_name = node["name"]["value"]
             if "value" in node and "value" in node["value"]:
@@ -399,128 +490,41 @@ def flatten_axtree_to_str(
                 if attributes:
                     node_str += ", ".join([""] + attributes)
 
-                tree_str += f"{indent}{node_str}"
-
-        for child_node_id in node["childIds"]:
-            if child_node_id not in node_id_to_idx or child_node_id == node["nodeId"]:
-                continue
-            # mark this to save some tokens
-            child_depth = depth if skip_node else (depth + 1)
-            child_str = dfs(
-                node_id_to_idx[child_node_id], child_depth, parent_node_filtered=filter_node
-            )
-            if child_str:
-                if tree_str:
-                    tree_str += "\n"
-                tree_str += child_str
-
-        return tree_str
-
-    tree_str = dfs(0, 0, False)
-    if remove_redundant_static_text:
-        tree_str = _remove_redundant_static_text(tree_str)
-    return tree_str
-
-
-# def overlay_som(
-#     screenshot: np.typing.ArrayLike,
-#     extra_properties: dict,
-#     fontsize: int = 12,
-#     linewidth: int = 2,
-#     tag_margin: int = 2,
-# ):
-#     img = PIL.Image.fromarray(screenshot).copy()  # make a copy
-#     img = img.convert(mode="RGBA")
-#     draw = PIL.ImageDraw.Draw(img)
-#
-#     font = PIL.ImageFont.load_default(size=fontsize)
-#
-#     # https://stackoverflow.com/questions/51908563/dotted-or-dashed-line-with-python-pillow/58885306#58885306
-#     import math  # math has the fastest sqrt
-#
-#     def linedashed(draw: PIL.ImageDraw.Draw, x0, y0, x1, y1, fill, width, dashlen=4, ratio=3):
-#         dx = x1 - x0  # delta x
-#         dy = y1 - y0  # delta y
-#         # check whether we can avoid sqrt
-#         if dy == 0:
-#             vlen = dx
-#         elif dx == 0:
-#             vlen = dy
-#         else:
-#             vlen = math.sqrt(dx * dx + dy * dy)  # length of line
-#         xa = dx / vlen  # x add for 1px line length
-#         ya = dy / vlen  # y add for 1px line length
-#         step = dashlen * ratio  # step to the next dash
-#         a0 = 0
-#         while a0 < vlen:
-#             a1 = a0 + dashlen
-#             if a1 > vlen:
-#                 a1 = vlen
-#             draw.line(
-#                 (x0 + xa * a0, y0 + ya * a0, x0 + xa * a1, y0 + ya * a1), fill=fill, width=width
-#             )
-#             a0 += step
-#
-#     for bid, properties in extra_properties.items():
-#         if properties["set_of_marks"] and properties["bbox"]:
-#             x, y, width, height = properties["bbox"]
-#             x0, y0 = x, y
-#             x1, y1 = x + width, y + height
-#
-#             # skip small boxes
-#             area = (x1 - x0) * (y1 - y0)
-#             if area < 20:
-#                 logger.warning(
-#                     f'som overlay: skipping bid "{bid}" due to bbox too small (area={area})'
-#                 )
-#                 continue
-#
-#             # draw bounding box with dashed lines
-#             linedashed(draw, x0, y0, x1, y0, fill=(0, 0, 0, 255), width=linewidth)
-#             linedashed(draw, x1, y0, x1, y1, fill=(0, 0, 0, 255), width=linewidth)
-#             linedashed(draw, x1, y1, x0, y1, fill=(0, 0, 0, 255), width=linewidth)
-#             linedashed(draw, x0, y1, x0, y0, fill=(0, 0, 0, 255), width=linewidth)
-#
-#             # get text box size (left, top, right, bottom)
-#             tag_box = font.getbbox(
-#                 bid,
-#             )
-#
-#             # set tag size, including margins
-#             tag_size = (
-#                 (tag_box[2] - tag_box[0] + 2 * (tag_margin + 1)),
-#                 (tag_box[3] - tag_box[1] + 2 * (tag_margin + 1)),
-#             )
-#
-#             # create tag image with correct size and black background
-#             tag_img = PIL.Image.new("RGBA", tag_size, "black")
-#             tag_draw = PIL.ImageDraw.Draw(tag_img)
-#             # write text with 1px horizontal margin
-#             tag_draw.text(
-#                 (-tag_box[0] + tag_margin + 1, -tag_box[1] + tag_margin + 1),
-#                 bid,
-#                 font=font,
-#                 fill=(255, 255, 255, 255),
-#                 spacing=0,
-#             )
-#             tag_draw.rectangle(
-#                 (0, 0, tag_size[0] - 1, tag_size[1] - 1),
-#                 fill=None,
-#                 outline=(255, 255, 255, 255),
-#                 width=1,
-#             )
-#
-#             # draw tag in the source image, upper left of the bounding box
-#             tag_pos = (x + 0, y - tag_size[1] / 2 + 4)
-#             tag_pos = list(map(round, tag_pos))
-#             img.paste(tag_img, tag_pos)
-#
-#     # convert to RGB (3 channels)
-#     img = img.convert(mode="RGB")
-#     # convert to a numpy array
-#     img = np.array(img)
-#
-#     return img
+                line = "\t" * depth + node_str
+                if not (
+                    remove_redundant_static_text
+                    and node_str.startswith("StaticText")
+                    and _is_redundant_static_text(line, lines)
+                ):
+                    line_idx = len(lines)
+                    lines.append(line)
+                    if max_tokens is not None:
+                        properties = extra_properties_or_empty.get(bid) if bid is not None else None
+                        if properties and properties.get("visibility", 0) < 0.5:
+                            line_tier = 3
+                        elif node_role in INTERACTIVE_AXTREE_ROLES or (properties and properties.get("clickable")):
+                            line_tier = 0
+                        elif bid is not None and node_role != "StaticText":
+                            line_tier = 1
+                        else:
+                            line_tier = max(parent_tier, 2)
+                        line_static_depth = parent_static_depth + 1 if line_tier >= 2 else 0
+                        parents.append(parent_line)
+                        tiers.append(line_tier)
+                        depths.append(line_static_depth)
+
+        # mark this to save some tokens
+        child_depth = depth if skip_node else (depth + 1)
+        node_id = node["nodeId"]
+        stack.extend(
+            (node_id_to_idx[child_node_id], child_depth, filter_node, line_idx, line_tier, line_static_depth)
+            for child_node_id in reversed(node["childIds"])
+            if child_node_id in node_id_to_idx and child_node_id != node_id
+        )
+
+    if max_tokens is None or sum(_estimate_tokens(line) for line in lines) <= max_tokens:
+        return "\n".join(lines)
+    return _budget_axtree_lines(lines, parents, tiers, depths, max_tokens)
 
 
 def prune_html(html):
@@ -16,85 +16,151 @@ import pkgutil
 import re
 import base64
 import asyncio
+import weakref
 from datetime import datetime
+from typing import Optional
+import numpy as np
 from .obs import flatten_axtree_to_str, flatten_dom_to_str
+from .observation_diff import flatten_page_axtree
+from .extra_properties import extract_dom_extra_properties
+from .temp_data import (
+    assign_axtree_bids,
+    bids_by_backend_node_id,
+    cleanup_axtree_temp_data,
+    cleanup_dom_snapshot_temp_data,
+    extract_data_items_from_aria,
+)
 from .extract_elements import flatten_interactive_elements_to_str
 
 MARK_FRAMES_MAX_TRIES = 3
 
+# store the bids in aria-roledescription for the AXTree (and strip them again after extraction),
+# instead of matching AXTree nodes to their bids through the backend node ids of the DOM snapshot
+STORE_TEMP_DATA = False
+
 logger = logging.getLogger(__name__)
 
-from .extract_elements import extract_interactive_elements, highlight_elements
+from .extract_elements import extract_interactive_elements
+from .som import overlay_som
 
 class MarkingError(Exception):
     pass
 
-async def _pre_extract(page: playwright.async_api.Page):
+# loaded once, the marking scripts are evaluated in every frame of every observation
+_FRAME_MARK_ELEMENTS_JS = pkgutil.get_data(__name__, "javascript/frame_mark_elements.js").decode("utf-8")
+_FRAME_UNMARK_ELEMENTS_JS = pkgutil.get_data(__name__, "javascript/frame_unmark_elements.js").decode("utf-8")
+
+# the marking function is defined in every new document of the context by an init script
+# (Page.addScriptToEvaluateOnNewDocument), so an observation only sends a short call per frame.
+# It runs in the main world, like the original script, since it reads page-set handlers like onclick.
+_MARK_FUNCTION_NAME = "browsergym_mark_frame"
+_FRAME_MARK_INIT_SCRIPT = f"""(() => {{
+window.{_MARK_FUNCTION_NAME} = {_FRAME_MARK_ELEMENTS_JS};
+}})();"""
+# null when the document was loaded before the init script was registered
+_FRAME_MARK_CALL_JS = f"""(args) => window.{_MARK_FUNCTION_NAME} === undefined ? null : window.{_MARK_FUNCTION_NAME}(args)"""
+
+_contexts_with_mark_script = weakref.WeakSet()
+
+
+async def _register_mark_script(context: playwright.async_api.BrowserContext):
+    if context in _contexts_with_mark_script:
+        return
+    # only marked once registered, a failed registration is tried again on the next observation
+    await context.add_init_script(script=_FRAME_MARK_INIT_SCRIPT)
+    _contexts_with_mark_script.add(context)
+
+
+async def _markable_frame_element(frame: playwright.async_api.Frame, action: str):
+    """The iframe element of a child frame, or None if the frame cannot run the marking scripts."""
+    frame_elem = await frame.frame_element()
+    if not await frame_elem.content_frame() == frame:
+        logger.warning(f"Skipping frame '{frame.name}' for {action}, seems problematic.")
+        return None
+    return frame_elem
+
+
+async def _pre_extract(page: playwright.async_api.Page, store_temp_data: Optional[bool] = None):
     """
     pre-extraction routine, marks dom elements (set bid and dynamic attributes like value and checked)
     """
-    js_frame_mark_elements = pkgutil.get_data(__name__, "javascript/frame_mark_elements.js").decode(
-        "utf-8"
-    )
+    # read when called, so that changing STORE_TEMP_DATA takes effect
+    if store_temp_data is None:
+        store_temp_data = STORE_TEMP_DATA
+    await _register_mark_script(page.context)
+
+    async def child_frame_bid(child_frame):
+        if child_frame.is_detached():
+            return None
+        child_frame_elem = await _markable_frame_element(child_frame, "marking")
+        if child_frame_elem is None:
+            return None
+        # both attributes in one round trip
+        sandbox_attr, child_frame_bid = await child_frame_elem.evaluate(
+            "(elem, bid_attr) => [elem.getAttribute('sandbox'), elem.getAttribute(bid_attr)]", BID_ATTR
+        )
+        if sandbox_attr is not None and "allow-scripts" not in sandbox_attr.split():
+            return None
+        if child_frame_bid is None:
+            logger.info("Cannot mark a child frame without a bid.")
+        return child_frame_bid
 
     async def mark_frames_recursive(frame, frame_bid: str):
         assert frame_bid == "" or (frame_bid.islower() and frame_bid.isalpha())
 
-        warning_msgs = await frame.evaluate(
-            js_frame_mark_elements,
-            [frame_bid, BID_ATTR],
-        )
+        args = [frame_bid, BID_ATTR, store_temp_data]
+        warning_msgs = await frame.evaluate(_FRAME_MARK_CALL_JS, args)
+        if warning_msgs is None:
+            warning_msgs = await frame.evaluate(_FRAME_MARK_ELEMENTS_JS, args)
         for msg in warning_msgs:
             logger.warning(msg)
 
-        for child_frame in frame.child_frames:
-            if child_frame.is_detached():
-                continue
-            child_frame_elem = await child_frame.frame_element()
-            if not await child_frame_elem.content_frame() == child_frame:
-                logger.warning(
-                    f"Skipping frame '{child_frame.name}' for marking, seems problematic."
-                )
-                continue
-            sandbox_attr = await child_frame_elem.get_attribute("sandbox")
-            if sandbox_attr is not None and "allow-scripts" not in sandbox_attr.split():
-                continue
-            child_frame_bid = await child_frame_elem.get_attribute(BID_ATTR)
-            if child_frame_bid is None:
-                logger.info("Cannot mark a child frame without a bid.")
-            else:
-                await mark_frames_recursive(child_frame, frame_bid=child_frame_bid)
+        # the child frame bids are set by the marking above, the child frames are then marked concurrently
+        child_frames = frame.child_frames
+        child_frame_bids = await asyncio.gather(*(child_frame_bid(child_frame) for child_frame in child_frames))
+        await asyncio.gather(*(
+            mark_frames_recursive(child_frame, frame_bid=child_bid)
+            for child_frame, child_bid in zip(child_frames, child_frame_bids)
+            if child_bid is not None
+        ))
 
     await mark_frames_recursive(page.main_frame, frame_bid="")
 
 
+def _screenshot_scale(page, screenshot_bytes) -> float:
+    """Screenshot pixels per CSS pixel, 1 when the viewport size is unknown (e.g. remote browsers)."""
+    viewport = page.viewport_size
+    if not viewport:
+        return 1.0
+    width = PIL.Image.open(io.BytesIO(screenshot_bytes)).width
+    return round(width / viewport["width"], 2)
+
+
 async def extract_page_info(page, fullpage, log_folder):
     page_info = {}
     await _pre_extract(page)
+    # Wait for 3 seconds (if this wait is necessary)
+    await asyncio.sleep(3)
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
     filename = f"screenshot_{timestamp}.png"
     screenshot_path = os.path.join(log_folder, 'screenshots', filename)
-    await page.screenshot(path=screenshot_path, full_page=fullpage)
-    # Capture screenshot as bytes
-    # Wait for 3 seconds (if this wait is necessary)
-    await asyncio.sleep(3)
-    screenshot_bytes = await page.screenshot(full_page=fullpage)
+    # saved to the log folder and returned as bytes by the same capture
+    screenshot_bytes = await page.screenshot(path=screenshot_path, full_page=fullpage)
 
     # Store the bytes directly in page_info
     page_info['screenshot'] = screenshot_bytes
     page_info['dom'] = await extract_dom_snapshot(page)
-    page_info['axtree'] = await extract_merged_axtree(page)
+    page_info['axtree'] = await extract_merged_axtree(page, dom_snapshot=None if STORE_TEMP_DATA else page_info['dom'])
     page_info['focused_element'] = await extract_focused_element_bid(page)
     page_info['extra_properties'] = extract_dom_extra_properties(page_info.get('dom'))
     page_info['interactive_elements'] = await extract_interactive_elements(page)
-    await highlight_elements(page, page_info['interactive_elements'])
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    # set-of-marks drawn onto the screenshot above, the page itself is left untouched
+    page_info['screenshot_som'] = overlay_som(
+        screenshot_bytes, page_info['interactive_elements'], scale=_screenshot_scale(page, screenshot_bytes)
+    )
     filename = f"screenshot_som_{timestamp}.png"
-    screenshot_path = os.path.join(log_folder, 'screenshots', filename)
-    await page.screenshot(path=screenshot_path, full_page=fullpage)
-    await asyncio.sleep(3)
-    screenshot_bytes = await page.screenshot(full_page=fullpage)
-    page_info['screenshot_som'] = screenshot_bytes
+    with open(os.path.join(log_folder, 'screenshots', filename), 'wb') as f:
+        f.write(page_info['screenshot_som'])
     await _post_extract(page)
     return page_info
 
@@ -124,88 +190,105 @@ async def extract_page_info(page, fullpage, log_folder):
 #     await _post_extract(page)
 #     return page_info
 
-async def _post_extract(page: playwright.async_api.Page):
-    js_frame_unmark_elements = pkgutil.get_data(
-        __name__, "javascript/frame_unmark_elements.js"
-    ).decode("utf-8")
+async def _post_extract(page: playwright.async_api.Page, temp_data_cleanup: Optional[bool] = None):
+    if temp_data_cleanup is None:
+        temp_data_cleanup = STORE_TEMP_DATA
+    if not temp_data_cleanup:
+        return
 
-    for frame in page.frames:
+    async def unmark_frame(frame):
         if not frame == page.main_frame:
-            frame_element = await frame.frame_element()
-            if not await frame_element.content_frame() == frame:
-                logger.warning(f"Skipping frame '{frame.name}' for unmarking, seems problematic.")
-                continue
+            frame_element = await _markable_frame_element(frame, "unmarking")
+            if frame_element is None:
+                return
             sandbox_attr = await frame_element.get_attribute("sandbox")
             if sandbox_attr is not None and "allow-scripts" not in sandbox_attr.split():
-                continue
+                return
 
         try:
-            await frame.evaluate(js_frame_unmark_elements)
+            await frame.evaluate(_FRAME_UNMARK_ELEMENTS_JS)
         except playwright.async_api.Error as e:
             if "Frame was detached" in str(e):
                 pass
             else:
                 raise e
 
+    await asyncio.gather(*(unmark_frame(frame) for frame in page.frames))
+
 from PIL import Image
 import base64
 import io
 
-async def extract_screenshot(page):
+SCREENSHOT_FORMATS = ("png", "jpeg")
+
+
+def decode_screenshot(image_bytes: bytes, grayscale: bool = False, downsample: int = 1) -> np.ndarray:
     """
-    Extracts the screenshot image of a Playwright page using Chrome DevTools Protocol.
+    Decodes PNG or JPEG screenshot bytes into a uint8 array, (height, width, 3) RGB or (height, width) grayscale.
+    Downsampling averages downsample x downsample pixel blocks, JPEG is decoded at the reduced size directly.
+    The array shares the decoded image buffer and is read-only, copy it before drawing on it.
     """
-    cdp = await page.context.new_cdp_session(page)
-    cdp_answer = await cdp.send(
-        "Page.captureScreenshot",
-        {
-            "format": "png",
-        },
-    )
-    await cdp.detach()
-
-    png_base64 = cdp_answer["data"]
-    png_bytes = base64.b64decode(png_base64)
-    with io.BytesIO(png_bytes) as f:
+    if downsample < 1:
+        raise ValueError(f"downsample must be >= 1, got {downsample}")
+    mode = "L" if grayscale else "RGB"
+    with io.BytesIO(image_bytes) as f:
         img = Image.open(f)
-        img = img.convert(mode="RGB")
-        width, height = img.size
-        pixels = list(img.getdata())
-        img_list = [pixels[i * width:(i + 1) * width] for i in range(height)]
-
-    return img_list
-
-__BID_EXPR = r"([a-z0-9]+)"
-__FLOAT_EXPR = r"([+-]?(?:[0-9]*[.])?[0-9]+)"
-__BOOL_EXPR = r"([01])"
-__DATA_REGEXP = re.compile(__BID_EXPR + r"_" + r"(.*)")
-
-def extract_data_items_from_aria(string):
+        target = (max(img.width // downsample, 1), max(img.height // downsample, 1))
+        if downsample > 1:
+            # JPEG only: let the decoder scale the DCT blocks instead of decoding the full frame
+            img.draft(mode, target)
+        img = img.convert(mode=mode)
+        if img.size != target:
+            img = img.resize(target, Image.BOX)
+        pixels = np.asarray(img)
+    # Pillow versions that hand out a writable copy would otherwise differ from the zero-copy view
+    pixels.flags.writeable = False
+    return pixels
+
+
+async def extract_screenshot(page, grayscale: bool = False, downsample: int = 1, format: str = "png",
+                             quality: Optional[int] = None, clip: Optional[dict] = None) -> np.ndarray:
     """
-    Utility function to extract temporary data stored in the "aria-roledescription" attribute of a node
+    Extracts the screenshot image of a Playwright page using Chrome DevTools Protocol, as a uint8 array.
+
+    Args:
+        page: The Playwright page
+        grayscale: Return a (height, width) luminance array instead of (height, width, 3) RGB
+        downsample: Integer factor the image is shrunk by, e.g. 4 for visual diffing or hashing
+        format: "png" or "jpeg", jpeg is cheaper to encode in the browser and to decode
+        quality: JPEG quality from 0 to 100
+        clip: Region to capture, {"x", "y", "width", "height"} in CSS pixels
+
+    Returns:
+        np.ndarray: The screenshot pixels, read-only
     """
-    match = __DATA_REGEXP.fullmatch(string)
-    if not match:
-        logger.warning(
-            f'Data items could not be extracted from "aria-roledescription" attribute: {string}'
-        )
-        return [], string
+    if format not in SCREENSHOT_FORMATS:
+        raise ValueError(f"format must be one of {SCREENSHOT_FORMATS}, got {format!r}")
+    params = {"format": format}
+    if format == "jpeg" and quality is not None:
+        params["quality"] = quality
+    if clip is not None:
+        params["clip"] = {"scale": 1, **clip}
 
-    groups = match.groups()
-    data_items = groups[:-1]
-    original_aria = groups[-1]
-    return data_items, original_aria
+    cdp = await page.context.new_cdp_session(page)
+    cdp_answer = await cdp.send("Page.captureScreenshot", params)
+    await cdp.detach()
+
+    return decode_screenshot(base64.b64decode(cdp_answer["data"]), grayscale=grayscale, downsample=downsample)
 
 async def extract_dom_snapshot(
     page: playwright.async_api.Page,
     computed_styles=[],
     include_dom_rects: bool = True,
     include_paint_order: bool = True,
-    temp_data_cleanup: bool = True,
+    temp_data_cleanup: Optional[bool] = None,
 ):
     """
     Extracts the DOM snapshot of a Playwright page using Chrome DevTools Protocol.
+    The temp data is stripped if temp_data_cleanup, by default if STORE_TEMP_DATA.
     """
+    if temp_data_cleanup is None:
+        temp_data_cleanup = STORE_TEMP_DATA
     cdp = await page.context.new_cdp_session(page)
     dom_snapshot = await cdp.send(
         "DOMSnapshot.captureSnapshot",
@@ -218,165 +301,34 @@ async def extract_dom_snapshot(
     await cdp.detach()
 
     if temp_data_cleanup:
-        try:
-            target_attr_name_id = dom_snapshot["strings"].index("aria-roledescription")
-        except ValueError:
-            target_attr_name_id = -1
-        if target_attr_name_id > -1:
-            processed_string_ids = set()
-            for document in dom_snapshot["documents"]:
-                for node_attributes in document["nodes"]["attributes"]:
-                    i = 0
-                    for i in range(0, len(node_attributes), 2):
-                        attr_name_id = node_attributes[i]
-                        attr_value_id = node_attributes[i + 1]
-                        if attr_name_id == target_attr_name_id:
-                            attr_value = dom_snapshot["strings"][attr_value_id]
-                            if attr_value_id not in processed_string_ids:
-                                _, new_attr_value = extract_data_items_from_aria(attr_value)
-                                dom_snapshot["strings"][attr_value_id] = new_attr_value
-                                processed_string_ids.add(attr_value_id)
-                                attr_value = new_attr_value
-                            if attr_value == "":
-                                del node_attributes[i : i + 2]
-                            break
+        cleanup_dom_snapshot_temp_data(dom_snapshot)
 
     return dom_snapshot
 
-def extract_dom_extra_properties(dom_snapshot):
-    def to_string(idx):
-        if idx == -1:
-            return None
-        else:
-            return dom_snapshot["strings"][idx]
-
-    try:
-        bid_string_id = dom_snapshot["strings"].index(BID_ATTR)
-    except ValueError:
-        bid_string_id = -1
-    try:
-        vis_string_id = dom_snapshot["strings"].index(VIS_ATTR)
-    except ValueError:
-        vis_string_id = -1
-    try:
-        som_string_id = dom_snapshot["strings"].index(SOM_ATTR)
-    except ValueError:
-        som_string_id = -1
-
-    doc_properties = {
-        0: {
-            "parent": None,
-        }
-    }
-
-    docs_to_process = [0]
-    while docs_to_process:
-        doc = docs_to_process.pop(-1)
-
-        children = dom_snapshot["documents"][doc]["nodes"]["contentDocumentIndex"]
-        for node, child_doc in zip(children["index"], children["value"]):
-            doc_properties[child_doc] = {
-                "parent": {
-                    "doc": doc,
-                    "node": node,
-                }
-            }
-            docs_to_process.append(child_doc)
-
-        parent = doc_properties[doc]["parent"]
-        if parent:
-            parent_doc = parent["doc"]
-            parent_node = parent["node"]
-            try:
-                node_layout_idx = dom_snapshot["documents"][parent_doc]["layout"][
-                    "nodeIndex"
-                ].index(parent_node)
-            except ValueError:
-                node_layout_idx = -1
-            if node_layout_idx >= 0:
-                node_bounds = dom_snapshot["documents"][parent_doc]["layout"]["bounds"][
-                    node_layout_idx
-                ]
-                parent_node_abs_x = doc_properties[parent_doc]["abs_pos"]["x"] + node_bounds[0]
-                parent_node_abs_y = doc_properties[parent_doc]["abs_pos"]["y"] + node_bounds[1]
-            else:
-                parent_node_abs_x = 0
-                parent_node_abs_y = 0
-        else:
-            parent_node_abs_x = 0
-            parent_node_abs_y = 0
-
-        doc_properties[doc]["abs_pos"] = {
-            "x": parent_node_abs_x - dom_snapshot["documents"][doc]["scrollOffsetX"],
-            "y": parent_node_abs_y - dom_snapshot["documents"][doc]["scrollOffsetY"],
-        }
-
-        document = dom_snapshot["documents"][doc]
-        doc_properties[doc]["nodes"] = [
-            {
-                "bid": None,
-                "visibility": None,
-                "bbox": None,
-                "clickable": False,
-                "set_of_marks": None,
-            }
-            for _ in enumerate(document["nodes"]["parentIndex"])
-        ]
-
-        for node_idx in document["nodes"]["isClickable"]["index"]:
-            doc_properties[doc]["nodes"][node_idx]["clickable"] = True
-
-        for node_idx, node_attrs in enumerate(document["nodes"]["attributes"]):
-            i = 0
-            for i in range(0, len(node_attrs), 2):
-                name_string_id = node_attrs[i]
-                value_string_id = node_attrs[i + 1]
-                if name_string_id == bid_string_id:
-                    doc_properties[doc]["nodes"][node_idx]["bid"] = to_string(value_string_id)
-                if name_string_id == vis_string_id:
-                    doc_properties[doc]["nodes"][node_idx]["visibility"] = float(
-                        to_string(value_string_id)
-                    )
-                if name_string_id == som_string_id:
-                    doc_properties[doc]["nodes"][node_idx]["set_of_marks"] = (
-                        to_string(value_string_id) == "1"
-                    )
-
-        for node_idx, bounds, client_rect in zip(
-            document["layout"]["nodeIndex"],
-            document["layout"]["bounds"],
-            document["layout"]["clientRects"],
-        ):
-            if not client_rect:
-                doc_properties[doc]["nodes"][node_idx]["bbox"] = None
-            else:
-                doc_properties[doc]["nodes"][node_idx]["bbox"] = bounds.copy()
-                doc_properties[doc]["nodes"][node_idx]["bbox"][0] += doc_properties[doc]["abs_pos"][
-                    "x"
-                ]
-                doc_properties[doc]["nodes"][node_idx]["bbox"][1] += doc_properties[doc]["abs_pos"][
-                    "y"
-                ]
-
-    extra_properties = {}
-    for doc in doc_properties.keys():
-        for node in doc_properties[doc]["nodes"]:
-            bid = node["bid"]
-            if bid:
-                if bid in extra_properties:
-                    logger.warning(f"duplicate {BID_ATTR}={repr(bid)} attribute detected")
-                extra_properties[bid] = {
-                    extra_prop: node[extra_prop]
-                    for extra_prop in ("visibility", "bbox", "clickable", "set_of_marks")
-                }
-
-    return extra_properties
-
-async def extract_all_frame_axtrees(page: playwright.async_api.Page):
+def _frame_ids_by_backend_node_id(dom_snapshot) -> dict:
+    """Map the backend node id of every (i)frame element in the DOM snapshot to the id of its content frame."""
+    strings = dom_snapshot["strings"]
+    documents = dom_snapshot["documents"]
+    frame_ids = {}
+    for document in documents:
+        nodes = document["nodes"]
+        content_documents = nodes.get("contentDocumentIndex", {"index": [], "value": []})
+        for node_index, document_index in zip(content_documents["index"], content_documents["value"]):
+            frame_id = documents[document_index].get("frameId")
+            if frame_id is not None and "backendNodeId" in nodes:
+                frame_ids[nodes["backendNodeId"][node_index]] = strings[frame_id]
+    return frame_ids
+
+
+async def extract_all_frame_axtrees(page: playwright.async_api.Page, dom_snapshot=None, cdp=None):
     """
     Extracts the AXTree of all frames (main document and iframes) of a Playwright page using Chrome DevTools Protocol.
+    The bids are taken from dom_snapshot when given, from the temporary aria-roledescription data otherwise.
+    The frame AXTrees are requested concurrently, over cdp when given, over a new session otherwise.
     """
-    cdp = await page.context.new_cdp_session(page)
+    own_session = cdp is None
+    if own_session:
+        cdp = await page.context.new_cdp_session(page)
 
     frame_tree = await cdp.send(
         "Page.getFrameTree",
@@ -392,63 +344,57 @@ async def extract_all_frame_axtrees(page: playwright.async_api.Page):
         frame_id = frame["frame"]["id"]
         frame_ids.append(frame_id)
 
-    frame_axtrees = {
-        frame_id: await cdp.send(
-            "Accessibility.getFullAXTree",
-            {"frameId": frame_id},
-        )
+    ax_trees = await asyncio.gather(*(
+        cdp.send("Accessibility.getFullAXTree", {"frameId": frame_id})
         for frame_id in frame_ids
-    }
-
-    await cdp.detach()
-
-    for ax_tree in frame_axtrees.values():
-        for node in ax_tree["nodes"]:
-            if "properties" in node:
-                for i, prop in enumerate(node["properties"]):
-                    if prop["name"] == "roledescription":
-                        data_items, new_value = extract_data_items_from_aria(prop["value"]["value"])
-                        prop["value"]["value"] = new_value
-                        if new_value == "":
-                            del node["properties"][i]
-                        if data_items:
-                            (browsergym_id,) = data_items
-                            node["properties"].append(
-                                {
-                                    "name": "browsergym_id",
-                                    "value": {
-                                        "type": "string",
-                                        "value": browsergym_id,
-                                    },
-                                }
-                            )
+    ))
+    frame_axtrees = dict(zip(frame_ids, ax_trees))
+
+    if own_session:
+        await cdp.detach()
+
+    if dom_snapshot is not None:
+        bids = bids_by_backend_node_id(dom_snapshot)
+        for ax_tree in frame_axtrees.values():
+            assign_axtree_bids(ax_tree, bids)
+    else:
+        for ax_tree in frame_axtrees.values():
+            cleanup_axtree_temp_data(ax_tree)
     return frame_axtrees
 
-async def extract_merged_axtree(page: playwright.async_api.Page):
+async def extract_merged_axtree(page: playwright.async_api.Page, dom_snapshot=None):
     """
     Extracts the merged AXTree of a Playwright page (main document and iframes AXTrees merged) using Chrome DevTools Protocol.
     """
-    frame_axtrees = await extract_all_frame_axtrees(page)
-
     cdp = await page.context.new_cdp_session(page)
+    frame_axtrees = await extract_all_frame_axtrees(page, dom_snapshot=dom_snapshot, cdp=cdp)
 
     merged_axtree = {"nodes": []}
+    iframe_nodes = []
     for ax_tree in frame_axtrees.values():
         merged_axtree["nodes"].extend(ax_tree["nodes"])
-        for node in ax_tree["nodes"]:
-            if node["role"]["value"] == "Iframe":
-                frame_id = (await cdp.send(
-                    "DOM.describeNode", {"backendNodeId": node["backendDOMNodeId"]}
-                ))["node"]["frameId"]
-                if frame_id in frame_axtrees:
-                    frame_root_node = frame_axtrees[frame_id]["nodes"][0]
-                    assert frame_root_node["frameId"] == frame_id
-                    node["childIds"].append(frame_root_node["nodeId"])
-                else:
-                    logger.warning(f"Extracted AXTree does not contain frameId '{frame_id}'")
+        iframe_nodes.extend(node for node in ax_tree["nodes"] if node["role"]["value"] == "Iframe")
+
+    # iframe element -> content frame, from the DOM snapshot, the rest (e.g. out-of-process iframes) resolved concurrently
+    frame_ids = _frame_ids_by_backend_node_id(dom_snapshot) if dom_snapshot is not None else {}
+    unresolved = list({node["backendDOMNodeId"] for node in iframe_nodes} - frame_ids.keys())
+    described = await asyncio.gather(*(
+        cdp.send("DOM.describeNode", {"backendNodeId": backend_node_id})
+        for backend_node_id in unresolved
+    ))
+    frame_ids.update((backend_node_id, answer["node"]["frameId"]) for backend_node_id, answer in zip(unresolved, described))
 
     await cdp.detach()
 
+    for node in iframe_nodes:
+        frame_id = frame_ids[node["backendDOMNodeId"]]
+        if frame_id in frame_axtrees:
+            frame_root_node = frame_axtrees[frame_id]["nodes"][0]
+            assert frame_root_node["frameId"] == frame_id
+            node["childIds"].append(frame_root_node["nodeId"])
+        else:
+            logger.warning(f"Extracted AXTree does not contain frameId '{frame_id}'")
+
     return merged_axtree
 
 async def extract_focused_element_bid(page: playwright.async_api.Page):
@@ -500,13 +446,13 @@ DOM_FEATURE_TEMPLATE = \
 {dom_str}
 """
 
-async def observe_features(page_info, features, elements_filter, log_folder, fullpage=True):
+async def observe_features(page_info, features, elements_filter, log_folder, fullpage=True, axtree_max_tokens=None):
     filter_som_only = False if fullpage else elements_filter == "som"
     filter_visible_only = elements_filter == "visibility"
 
     feature_texts = []
     if "axtree" in features:
-        axtree_str = flatten_axtree_to_str(page_info.get('axtree', ''), extra_properties=page_info['extra_properties'], filter_som_only=filter_som_only, filter_visible_only=filter_visible_only)
+        axtree_str = flatten_page_axtree(page_info, filter_som_only=filter_som_only, filter_visible_only=filter_visible_only, max_tokens=axtree_max_tokens)
         feature_texts.append(ACCESSIBILITY_FEATURE_TEMPLATE.format(axtree_str=axtree_str))
 
     if "interactive_elements" in features:
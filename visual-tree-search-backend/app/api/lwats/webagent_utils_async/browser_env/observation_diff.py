@@ -0,0 +1,219 @@
+"""Differences between consecutive observations, and reuse of flattened accessibility trees.
+
+Bids are stable across observations of the same page (the marking script keeps the bids it
+already assigned), so two AXTrees are compared node by node through their bids: nodes that
+appeared, disappeared, or whose role, name, value or properties changed. The delta gives
+prompts a compact "what changed since the last step" next to (or instead of) the full tree.
+
+Tree search replays the path from the root for every expansion, so the same page states
+are observed over and over. Flattened trees are cached by a digest of the page content and
+reused when the AXTree and its extra properties are unchanged.
+"""
+
+import hashlib
+import marshal
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional
+
+from .extra_properties import BidProperties
+from .obs import flatten_axtree_to_str
+from ..utils.metrics import record_cache_lookup
+
+# properties that change on their own (focus moves, live regions) and are left out of the delta
+VOLATILE_PROPERTIES = frozenset(("focused", "live", "atomic", "relevant", "busy"))
+
+FLATTEN_CACHE_SIZE = 16
+# AXTree nodes serialized at once when hashing a page
+DIGEST_CHUNK_NODES = 1024
+
+_flatten_cache_lock = threading.Lock()
+# (page digest, flatten options) -> flattened tree, the pages themselves are not kept
+_flatten_cache = OrderedDict()
+
+
+def _node_properties(node):
+    properties = []
+    bid = None
+    for prop in node.get("properties", []):
+        value = prop.get("value", {}).get("value")
+        if prop["name"] == "browsergym_id":
+            bid = value
+        else:
+            properties.append((prop["name"], value))
+    return bid, tuple(properties)
+
+
+def axtree_nodes_by_bid(axtree) -> dict:
+    """Map each bid of the AXTree to (role, name, value, properties) of its node."""
+    nodes = {}
+    for node in axtree.get("nodes", []):
+        bid, properties = _node_properties(node)
+        if bid is None:
+            continue
+        nodes[bid] = (
+            node.get("role", {}).get("value"),
+            node.get("name", {}).get("value"),
+            node.get("value", {}).get("value"),
+            properties,
+        )
+    return nodes
+
+
+def axtree_state_hash(page_info) -> str:
+    """
+    Hash of what the elements of the page show, in document order: role, name, value, bid and
+    properties of every AXTree node, without the volatile properties and the node ids (they are
+    renumbered on every load). Observations with the same hash have an empty diff.
+    """
+    nodes = []
+    for node in (page_info.get("axtree") or {}).get("nodes", []):
+        bid, properties = _node_properties(node)
+        nodes.append((
+            node.get("role", {}).get("value"),
+            node.get("name", {}).get("value"),
+            node.get("value", {}).get("value"),
+            bid,
+            tuple(sorted((p for p in properties if p[0] not in VOLATILE_PROPERTIES), key=lambda p: p[0])),
+        ))
+    return hashlib.sha1(repr(nodes).encode("utf8")).hexdigest()
+
+
+def _describe(bid, node) -> str:
+    role, name, value, _ = node
+    text = f"[{bid}] {role} {repr(name or '')}"
+    if value not in (None, ""):
+        text += f" value={repr(value)}"
+    return text
+
+
+def _changed_fields(old, new) -> list[str]:
+    changes = []
+    for label, old_value, new_value in (("role", old[0], new[0]), ("name", old[1], new[1]), ("value", old[2], new[2])):
+        if old_value != new_value:
+            changes.append(f"{label}: {repr(old_value)} -> {repr(new_value)}")
+    old_properties = {k: v for k, v in old[3] if k not in VOLATILE_PROPERTIES}
+    new_properties = {k: v for k, v in new[3] if k not in VOLATILE_PROPERTIES}
+    for name in sorted(old_properties.keys() | new_properties.keys()):
+        if old_properties.get(name) != new_properties.get(name):
+            changes.append(f"{name}: {repr(old_properties.get(name))} -> {repr(new_properties.get(name))}")
+    return changes
+
+
+@dataclass
+class ObservationDiff:
+    """Nodes added, removed and changed between two observations, keyed by bid."""
+    added: dict = field(default_factory=dict)
+    removed: dict = field(default_factory=dict)
+    changed: dict = field(default_factory=dict)
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.added or self.removed or self.changed)
+
+    def to_prompt_str(self, max_items: int = 20) -> str:
+        """Compact description of the delta, at most max_items lines per section."""
+        if self.is_empty:
+            return "No elements of the page changed."
+        sections = []
+        for title, items in (
+            ("Added elements", [_describe(bid, node) for bid, node in self.added.items()]),
+            ("Removed elements", [_describe(bid, node) for bid, node in self.removed.items()]),
+            ("Changed elements", [f"{_describe(bid, new)}: {', '.join(changes)}"
+                                  for bid, (new, changes) in self.changed.items()]),
+        ):
+            if not items:
+                continue
+            lines = items[:max_items]
+            if len(items) > max_items:
+                lines.append(f"... and {len(items) - max_items} more")
+            sections.append(f"{title} ({len(items)}):\n" + "\n".join(lines))
+        return "\n".join(sections)
+
+
+def diff_axtrees(previous: dict, current: dict) -> ObservationDiff:
+    """Diff two results of axtree_nodes_by_bid."""
+    diff = ObservationDiff()
+    for bid, node in current.items():
+        old = previous.get(bid)
+        if old is None:
+            diff.added[bid] = node
+        elif old != node:
+            changes = _changed_fields(old, node)
+            if changes:
+                diff.changed[bid] = (node, changes)
+    for bid, node in previous.items():
+        if bid not in current:
+            diff.removed[bid] = node
+    return diff
+
+
+class ObservationDiffer:
+    """
+    Keeps the previous observation of a browser session, keyed by bid, and computes the
+    delta of each new observation against it. Reset it whenever the session starts over
+    from a new page.
+    """
+
+    def __init__(self):
+        self.previous = None
+
+    def reset(self) -> None:
+        self.previous = None
+
+    def observe(self, page_info) -> Optional[ObservationDiff]:
+        """Record page_info as the latest observation, returns the delta to the previous one if any."""
+        current = axtree_nodes_by_bid(page_info.get("axtree") or {})
+        diff = diff_axtrees(self.previous, current) if self.previous is not None else None
+        self.previous = current
+        return diff
+
+
+def _extra_properties_bytes(extra_properties) -> bytes:
+    if isinstance(extra_properties, BidProperties):
+        # the columns as they are, no per-bid dicts
+        return b"".join((marshal.dumps(extra_properties.bids), extra_properties.visibility.tobytes(),
+                         extra_properties.bbox.tobytes(), extra_properties.clickable.tobytes(),
+                         extra_properties.set_of_marks.tobytes()))
+    try:
+        return marshal.dumps(dict(extra_properties))
+    except ValueError:
+        # values marshal does not know, e.g. NumPy scalars
+        return repr(extra_properties).encode("utf8")
+
+
+def _page_digest(page_info) -> bytes:
+    """
+    blake2b digest of the AXTree nodes and extra properties of the page.
+
+    The nodes are serialized with marshal a chunk at a time, so hashing a large page costs a
+    fraction of flattening it and holds no second copy of its tree.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    nodes = (page_info.get("axtree") or {}).get("nodes", [])
+    for start in range(0, len(nodes), DIGEST_CHUNK_NODES):
+        digest.update(marshal.dumps(nodes[start:start + DIGEST_CHUNK_NODES]))
+    digest.update(_extra_properties_bytes(page_info.get("extra_properties") or {}))
+    return digest.digest()
+
+
+def flatten_page_axtree(page_info, **kwargs) -> str:
+    """flatten_axtree_to_str of page_info, reusing the result of an earlier observation of the same page."""
+    # a 128 bit digest, a collision between two pages is negligible
+    key = (_page_digest(page_info), tuple(sorted(kwargs.items())))
+    with _flatten_cache_lock:
+        axtree_str = _flatten_cache.get(key)
+        if axtree_str is not None:
+            _flatten_cache.move_to_end(key)
+    record_cache_lookup("axtree_flatten", axtree_str is not None)
+    if axtree_str is not None:
+        return axtree_str
+    axtree_str = flatten_axtree_to_str(
+        page_info.get("axtree", ""), extra_properties=page_info["extra_properties"], **kwargs
+    )
+    with _flatten_cache_lock:
+        _flatten_cache[key] = axtree_str
+        if len(_flatten_cache) > FLATTEN_CACHE_SIZE:
+            _flatten_cache.popitem(last=False)
+    return axtree_str
@@ -0,0 +1,42 @@
+"""Perceptual hashes of observation screenshots.
+
+A difference hash (dHash) shrinks the grayscale screenshot to a (hash_size, hash_size + 1)
+grid and keeps one bit per horizontally adjacent pair of cells, set when the brightness
+increases. Screenshots that look the same hash to the same or nearby values, which lets the
+search notice actions that left the page visually unchanged without comparing full frames.
+"""
+
+import numpy as np
+import PIL.Image
+
+from .observation import decode_screenshot
+
+HASH_SIZE = 16
+# the screenshot is box-averaged by this factor while decoding, before the final resize
+DECODE_DOWNSAMPLE = 4
+
+
+def dhash(pixels: np.ndarray, hash_size: int = HASH_SIZE) -> int:
+    """
+    Difference hash of a grayscale (height, width) uint8 array.
+
+    Args:
+        pixels: Grayscale image
+        hash_size: Rows of the grid, the hash has hash_size * hash_size bits
+
+    Returns:
+        int: The hash bits, row by row
+    """
+    grid = np.asarray(PIL.Image.fromarray(pixels).resize((hash_size + 1, hash_size), PIL.Image.BOX), dtype=np.int16)
+    bits = (grid[:, 1:] > grid[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def screenshot_dhash(screenshot: bytes, hash_size: int = HASH_SIZE) -> int:
+    """Difference hash of PNG or JPEG screenshot bytes, as stored in page_info['screenshot']."""
+    return dhash(decode_screenshot(screenshot, grayscale=True, downsample=DECODE_DOWNSAMPLE), hash_size=hash_size)
+
+
+def hamming_distance(hash_a: int, hash_b: int) -> int:
+    """Number of differing bits between two hashes."""
+    return (hash_a ^ hash_b).bit_count()
@@ -0,0 +1,134 @@
+"""Set-of-marks overlay drawn onto the observation screenshot.
+
+Instead of injecting a highlight div per rect into the live page and taking a second
+screenshot, the boxes and bid labels of the interactive elements are drawn onto the
+screenshot that was already taken. The box outlines are written into the pixel array with
+NumPy slicing, only the labels go through PIL. Results are cached by screenshot and
+elements, since tree search observes the same page states many times.
+"""
+
+import hashlib
+import io
+import threading
+import zlib
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+import PIL.Image
+import PIL.ImageDraw
+import PIL.ImageFont
+
+from ..utils.metrics import record_cache_lookup
+
+SOM_CACHE_SIZE = 32
+# box and label colors, picked per bid so the same element keeps its color across steps
+SOM_PALETTE = np.array([
+    (230, 25, 75), (60, 180, 75), (0, 130, 200), (245, 130, 48), (145, 30, 180),
+    (70, 140, 140), (240, 50, 230), (128, 128, 0), (170, 110, 40), (0, 0, 128),
+], dtype=np.uint8)
+
+_som_cache_lock = threading.Lock()
+_som_cache = OrderedDict()
+
+
+@lru_cache(maxsize=4)
+def _label_font(fontsize: int):
+    return PIL.ImageFont.load_default(size=fontsize)
+
+
+def _bid_color(bid: str) -> np.ndarray:
+    return SOM_PALETTE[zlib.crc32(bid.encode("utf-8")) % len(SOM_PALETTE)]
+
+
+def _draw_dashed_box(pixels: np.ndarray, x0: int, y0: int, x1: int, y1: int, color, linewidth: int, dash: int):
+    """Dashed outline of [x0, x1) x [y0, y1) written directly into an (h, w, 3) array."""
+    height, width = pixels.shape[:2]
+    x0, x1 = max(x0, 0), min(x1, width)
+    y0, y1 = max(y0, 0), min(y1, height)
+    if x1 <= x0 or y1 <= y0:
+        return
+    # dash on, dash off along each edge
+    xs = np.arange(x0, x1)
+    xs = xs[((xs - x0) // dash) % 2 == 0]
+    ys = np.arange(y0, y1)
+    ys = ys[((ys - y0) // dash) % 2 == 0]
+    pixels[y0:min(y0 + linewidth, y1), xs] = color
+    pixels[max(y1 - linewidth, y0):y1, xs] = color
+    pixels[ys, x0:min(x0 + linewidth, x1)] = color
+    pixels[ys, max(x1 - linewidth, x0):x1] = color
+
+
+def _cache_key(screenshot: bytes, elements, scale: float, fontsize: int):
+    rects = tuple(
+        (element["bid"], tuple((r["left"], r["top"], r["width"], r["height"]) for r in element.get("rects", [])))
+        for element in elements
+    )
+    return hashlib.sha1(screenshot).digest(), rects, scale, fontsize
+
+
+def overlay_som(
+    screenshot: bytes,
+    interactive_elements: list[dict],
+    scale: float = 1.0,
+    fontsize: int = 12,
+    linewidth: int = 2,
+    dash: int = 4,
+) -> bytes:
+    """
+    Draw the set-of-marks boxes and bid labels of the interactive elements onto a screenshot.
+
+    Args:
+        screenshot: PNG bytes of the page, as returned by page.screenshot()
+        interactive_elements: Output of extract_interactive_elements, rects in CSS pixels
+        scale: Screenshot pixels per CSS pixel (the device scale factor)
+        fontsize: Label font size in screenshot pixels
+        linewidth: Box outline width in screenshot pixels
+        dash: Length of the outline dashes and gaps
+
+    Returns:
+        bytes: PNG bytes of the annotated screenshot
+    """
+    key = _cache_key(screenshot, interactive_elements, scale, fontsize)
+    with _som_cache_lock:
+        cached = _som_cache.get(key)
+        if cached is not None:
+            _som_cache.move_to_end(key)
+    record_cache_lookup("set_of_marks", cached is not None)
+    if cached is not None:
+        return cached
+
+    image = PIL.Image.open(io.BytesIO(screenshot)).convert("RGB")
+    pixels = np.array(image)
+    labels = []
+    for element in interactive_elements:
+        bid = element["bid"]
+        color = _bid_color(bid)
+        for rect in element.get("rects", []):
+            x0 = int(round(rect["left"] * scale))
+            y0 = int(round(rect["top"] * scale))
+            x1 = int(round((rect["left"] + rect["width"]) * scale))
+            y1 = int(round((rect["top"] + rect["height"]) * scale))
+            _draw_dashed_box(pixels, x0, y0, x1, y1, color, linewidth, dash)
+            labels.append((bid, x0, y0, tuple(int(c) for c in color)))
+
+    image = PIL.Image.fromarray(pixels)
+    draw = PIL.ImageDraw.Draw(image)
+    font = _label_font(fontsize)
+    for bid, x0, y0, color in labels:
+        # label above the upper left corner of the box, like the in-page highlights
+        left, top, right, bottom = font.getbbox(bid)
+        label_height = bottom - top + 4
+        label_y = max(y0 - label_height - 2, 0)
+        draw.rectangle((x0, label_y, x0 + right - left + 8, label_y + label_height), fill=color)
+        draw.text((x0 + 4 - left, label_y + 2 - top), bid, font=font, fill=(255, 255, 255))
+
+    output = io.BytesIO()
+    image.save(output, format="PNG", compress_level=1)
+    annotated = output.getvalue()
+
+    with _som_cache_lock:
+        _som_cache[key] = annotated
+        if len(_som_cache) > SOM_CACHE_SIZE:
+            _som_cache.popitem(last=False)
+    return annotated
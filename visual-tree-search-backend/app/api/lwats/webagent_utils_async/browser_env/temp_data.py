@@ -0,0 +1,126 @@
+"""Bids of the AXTree nodes, and cleanup of the temporary data used to transport them.
+
+The AXTree does not expose DOM attributes, so frame_mark_elements.js used to store
+"<bid>_<original aria-roledescription>" on every element for the bid to show up as the
+roledescription property, which both extractions then had to strip again. By default the
+marking script now leaves aria-roledescription alone and the AXTree nodes are matched to
+their bids through the backend node ids of the DOM snapshot. The cleanup functions below
+remain for pages marked with store_temp_data=True.
+"""
+
+import logging
+from typing import Optional, Tuple
+
+import numpy as np
+
+from .constants import BROWSERGYM_ID_ATTRIBUTE as BID_ATTR
+from .extra_properties import _attribute_columns
+
+logger = logging.getLogger(__name__)
+
+TEMP_DATA_ATTRIBUTE = "aria-roledescription"
+TEMP_DATA_AX_PROPERTY = "roledescription"
+
+
+def _is_bid(string: str) -> bool:
+    # same as the [a-z0-9]+ pattern the marking script produces
+    return string.isascii() and string.isalnum() and string == string.lower()
+
+
+def parse_temp_data(string: str) -> Tuple[Optional[str], str]:
+    """Split a marked aria-roledescription value into (bid, original value), bid is None if unmarked."""
+    bid, sep, original_aria = string.partition("_")
+    if not sep or not _is_bid(bid):
+        logger.warning(
+            f'Data items could not be extracted from "{TEMP_DATA_ATTRIBUTE}" attribute: {string}'
+        )
+        return None, string
+    return bid, original_aria
+
+
+def extract_data_items_from_aria(string):
+    """
+    Utility function to extract temporary data stored in the "aria-roledescription" attribute of a node
+    """
+    bid, original_aria = parse_temp_data(string)
+    return ([bid] if bid is not None else []), original_aria
+
+
+def cleanup_dom_snapshot_temp_data(dom_snapshot) -> None:
+    """Restore the original aria-roledescription values of a DOMSnapshot in place.
+
+    Only the string table entries used as values of the attribute are rewritten, and
+    attributes left empty are removed from the nodes that carry them.
+    """
+    strings = dom_snapshot["strings"]
+    try:
+        target_attr_name_id = strings.index(TEMP_DATA_ATTRIBUTE)
+    except ValueError:
+        return
+
+    processed_string_ids = set()
+    for document in dom_snapshot["documents"]:
+        node_attributes = document["nodes"]["attributes"]
+        names, values, owners = _attribute_columns(node_attributes, len(node_attributes))
+        matches = np.flatnonzero(names == target_attr_name_id)
+        if not len(matches):
+            continue
+        # first occurrence per node, and its position within the node's [name, value, ...] list
+        nodes, first = np.unique(owners[matches], return_index=True)
+        matches = matches[first]
+        positions = (matches - np.searchsorted(owners, nodes)) * 2
+        for node, position, value_id in zip(nodes.tolist(), positions.tolist(), values[matches].tolist()):
+            if value_id not in processed_string_ids:
+                strings[value_id] = parse_temp_data(strings[value_id])[1]
+                processed_string_ids.add(value_id)
+            if strings[value_id] == "":
+                del node_attributes[node][position : position + 2]
+
+
+def cleanup_axtree_temp_data(ax_tree) -> None:
+    """Restore the original roledescription properties of an AXTree in place and add browsergym_id."""
+    for node in ax_tree["nodes"]:
+        properties = node.get("properties")
+        if not properties:
+            continue
+        for i, prop in enumerate(properties):
+            if prop["name"] == TEMP_DATA_AX_PROPERTY:
+                break
+        else:
+            continue
+        bid, original_aria = parse_temp_data(prop["value"]["value"])
+        prop["value"]["value"] = original_aria
+        if original_aria == "":
+            properties.pop(i)
+        if bid is not None:
+            properties.append({"name": "browsergym_id", "value": {"type": "string", "value": bid}})
+
+
+def bids_by_backend_node_id(dom_snapshot) -> dict:
+    """Map the backend node id of every element with a bid to that bid."""
+    strings = dom_snapshot["strings"]
+    try:
+        bid_string_id = strings.index(BID_ATTR)
+    except ValueError:
+        return {}
+
+    bids = {}
+    for document in dom_snapshot["documents"]:
+        nodes = document["nodes"]
+        names, values, owners = _attribute_columns(nodes["attributes"], len(nodes["attributes"]))
+        mask = names == bid_string_id
+        backend_node_ids = np.asarray(nodes["backendNodeId"], dtype=np.int64)[owners[mask]]
+        bids.update(zip(backend_node_ids.tolist(), (strings[i] for i in values[mask].tolist())))
+    return bids
+
+
+def assign_axtree_bids(ax_tree, bids: dict) -> None:
+    """Add the browsergym_id property to the AXTree nodes of elements with a bid, in place."""
+    for node in ax_tree["nodes"]:
+        if node.get("ignored"):
+            continue
+        bid = bids.get(node.get("backendDOMNodeId"))
+        if bid:
+            node.setdefault("properties", []).append(
+                {"name": "browsergym_id", "value": {"type": "string", "value": bid}}
+            )
@@ -4,21 +4,29 @@ import logging
 from openai import OpenAI
 import base64
 from ..utils.utils import encode_image
+from ..utils.metrics import instrument_openai_client
 from pydantic import BaseModel
 
 logger = logging.getLogger(__name__)
-openai_client = OpenAI()
+openai_client = instrument_openai_client(OpenAI())
 
 
-async def capture_post_action_feedback(page, action, goal, log_folder):
+async def capture_post_action_feedback(page, action, goal, log_folder, observation_delta=None,
+                                       openai_client=openai_client, settle_seconds=3):
     # screenshot_path_post = os.path.join(log_folder, 'screenshots', 'screenshot_post.png')
-    time.sleep(3)
+    time.sleep(settle_seconds)
     # page.screenshot(path=screenshot_path_post)
     # base64_image = encode_image(screenshot_path_post)
     screenshot_bytes = await page.screenshot()
 
     # Encode the bytes to base64
     base64_image = base64.b64encode(screenshot_bytes).decode('utf-8')
+    delta_section = ""
+    if observation_delta is not None:
+        delta_section = f"""
+    # What changed on the page (elements of the Accessibility Tree, by bid):
+    {observation_delta}
+"""
     prompt = f"""
     After we take action {action}, a screenshot was captured.
 
@@ -27,7 +35,7 @@ async def capture_post_action_feedback(page, action, goal, log_folder):
 
     # The original goal:
     {goal}
-
+{delta_section}
     Based on the screenshot and the updated Accessibility Tree, is the goal finished now? Provide an answer and explanation, referring to visual elements from the screenshot if relevant.
     """
 
@@ -1,16 +1,17 @@
 import time
 import logging
 from openai import OpenAI
-from ..action.highlevel import HighLevelActionSet
+from ..action.highlevel import get_action_set
 from collections import defaultdict
 from ..utils.utils import query_openai_model
+from ..utils.metrics import instrument_openai_client
 from ..action.utils import prepare_prompt, execute_action
 from ..action.utils import build_highlevel_action_parser
 from ..browser_env.observation import extract_page_info
 from ..evaluation.feedback import capture_post_action_feedback
 
 logger = logging.getLogger(__name__)
-openai_client = OpenAI()
+openai_client = instrument_openai_client(OpenAI())
 
 
 def get_action_probability(responses, branching_factor):
@@ -42,7 +43,7 @@ async def take_action(task_description, agent_type, features=None, branching_fac
     try:
         context = await playwright_manager.get_context()
         page = await playwright_manager.get_page()
-        action_set = HighLevelActionSet(
+        action_set = get_action_set(
             subsets=agent_type,
             strict=False,
             multiaction=True,
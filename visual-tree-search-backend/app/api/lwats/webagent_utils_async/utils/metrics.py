@@ -0,0 +1,400 @@
+"""Counters, gauges and histograms of the backend, in the Prometheus text format.
+
+Metrics are registered once at import time in the module recording them and updated from
+any thread. Values that already live elsewhere (running sessions, subscriber queues) are
+read when /metrics is scraped, by collectors registered with add_collector.
+
+LLM calls are recorded by wrapping the OpenAI clients with instrument_openai_client: latency,
+outcome and tokens by model and call site. The call site is the innermost tracing span the
+call runs in (extract_top_actions, scoring, feedback, goal_check, reflection, ...), "other"
+outside of spans. Streamed requests are recorded once their stream is exhausted or closed, with
+the usage of the last chunk if the request asked for it (stream_options include_usage).
+
+The search job workers are separate processes with registries of their own. They send what
+they recorded since the last time (drain_process_metrics) to the server, which adds it to its
+registry (merge_process_metrics), so /metrics covers the searches of every process.
+"""
+
+import math
+import threading
+import time
+from typing import Callable, Iterable, Optional
+
+from .tracing import current_phase, global_phase_stats
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# seconds, from a cached short completion to a slow multimodal one
+LLM_LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        # label values -> value
+        self._values: dict[tuple, object] = {}
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes the labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> list[tuple[str, dict, float]]:
+        with self._lock:
+            return [(self.name, dict(zip(self.labelnames, key)), value) for key, value in self._values.items()]
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for name, labels, value in self._samples():
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+    def drain(self) -> dict:
+        """Values recorded since the last drain, label values -> value, and start over from zero."""
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge(self, values: dict):
+        """Add values drained from the same metric of another process."""
+        with self._lock:
+            for key, value in values.items():
+                self._values[key] = self._values.get(key, 0) + value
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """Merged by adding, so gauges recorded in worker processes should only be inc() and dec()."""
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = ()):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # per bucket counts (not cumulative), sum, count
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def merge(self, values: dict):
+        with self._lock:
+            for key, (counts, total, count) in values.items():
+                state = self._values.get(key)
+                if state is None:
+                    self._values[key] = [list(counts), total, count]
+                    continue
+                state[0] = [a + b for a, b in zip(state[0], counts)]
+                state[1] += total
+                state[2] += count
+
+    def _samples(self) -> list[tuple[str, dict, float]]:
+        samples = []
+        with self._lock:
+            states = [(key, list(counts), total, count) for key, (counts, total, count) in self._values.items()]
+        for key, counts, total, count in states:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                samples.append((f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, count))
+        return samples
+
+
+class MetricFamily:
+    """Samples of one metric read by a collector at scrape time."""
+
+    def __init__(self, name: str, type: str, help: str, samples: Optional[list[tuple[dict, float]]] = None,
+                 suffixed_samples: Optional[list[tuple[str, dict, float]]] = None):
+        self.name = name
+        self.type = type
+        self.help = help
+        self.samples = [(name, labels, value) for labels, value in samples or []] + list(suffixed_samples or [])
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for name, labels, value in self.samples:
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: dict[str, _Metric] = {}
+        self._collectors: list[Callable[[], Iterable[MetricFamily]]] = []
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = ()) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], Iterable[MetricFamily]]):
+        """Register a function returning MetricFamily objects, called on every scrape."""
+        with self._lock:
+            if collector not in self._collectors:
+                self._collectors.append(collector)
+
+    def drain(self) -> dict:
+        """Values of every metric recorded since the last drain, metric name -> values."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        drained = {}
+        for metric in metrics:
+            values = metric.drain()
+            if values:
+                drained[metric.name] = values
+        return drained
+
+    def merge(self, drained: dict):
+        """Add what the registry of another process drained, to the metrics of the same name."""
+        for name, values in drained.items():
+            with self._lock:
+                metric = self._metrics.get(name)
+            if metric is not None:
+                metric.merge(values)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for collector in collectors:
+            for family in collector():
+                lines.extend(family.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+llm_request_seconds = registry.histogram(
+    "llm_request_duration_seconds", "Latency of LLM requests",
+    ("model", "call_site"), LLM_LATENCY_BUCKETS,
+)
+llm_requests = registry.counter(
+    "llm_requests_total", "LLM requests by outcome (ok or error)", ("model", "call_site", "outcome"),
+)
+llm_tokens = registry.counter(
+    "llm_tokens_total", "Tokens of LLM requests by kind (prompt, completion, or cached, the prompt tokens served from the provider's prompt cache)",
+    ("model", "call_site", "kind"),
+)
+cache_requests = registry.counter(
+    "cache_requests_total", "Lookups of the in-process caches by result (hit or miss)", ("cache", "result"),
+)
+browsers_open = registry.gauge("browser_instances_open", "Browsers launched or connected by this process", ("mode",))
+browser_launches = registry.counter(
+    "browser_launches_total", "Browser launches and connections by outcome (ok or error)", ("mode", "outcome"),
+)
+replay_steps = registry.counter(
+    "replay_steps_total",
+    "Actions replayed on the browser by outcome (ok, wait_failed when the element never became visible, action_failed)",
+    ("outcome",),
+)
+
+
+def record_cache_lookup(cache: str, hit: bool):
+    cache_requests.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def record_llm_response(model: str, call_site: str, seconds: float, response=None):
+    """Record the latency of a successful LLM request and the token usage of its response, if it has one."""
+    llm_request_seconds.observe(seconds, model=model, call_site=call_site)
+    llm_requests.inc(model=model, call_site=call_site, outcome="ok")
+    # streamed responses only have usage with stream_options include_usage
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    details = getattr(usage, "prompt_tokens_details", None)
+    for kind, tokens in (
+        ("prompt", getattr(usage, "prompt_tokens", None)),
+        ("completion", getattr(usage, "completion_tokens", None)),
+        ("cached", getattr(details, "cached_tokens", None)),
+    ):
+        if tokens:
+            llm_tokens.inc(tokens, model=model, call_site=call_site, kind=kind)
+
+
+class _InstrumentedStream:
+    """Chunks of a streamed LLM response, the request is recorded when the stream is exhausted or closed."""
+
+    def __init__(self, stream, model: str, call_site: str, start: float):
+        self._stream = stream
+        self._iterator = iter(stream)
+        self._model = model
+        self._call_site = call_site
+        self._start = start
+        # the chunk with the usage, the last one when stream_options include_usage
+        self._usage_chunk = None
+        self._recorded = False
+
+    def _record(self, outcome: str):
+        if self._recorded:
+            return
+        self._recorded = True
+        if outcome == "ok":
+            record_llm_response(self._model, self._call_site, time.perf_counter() - self._start, self._usage_chunk)
+        else:
+            llm_requests.inc(model=self._model, call_site=self._call_site, outcome=outcome)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            chunk = next(self._iterator)
+        except StopIteration:
+            self._record("ok")
+            raise
+        except Exception:
+            self._record("error")
+            raise
+        if getattr(chunk, "usage", None) is not None:
+            self._usage_chunk = chunk
+        return chunk
+
+    def close(self):
+        # closing early, e.g. once the score was parsed, still is a successful request
+        self._record("ok")
+        close = getattr(self._stream, "close", None)
+        if close is not None:
+            close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+def _instrumented_call(call):
+    def wrapper(*args, **kwargs):
+        model = str(kwargs.get("model", "unknown"))
+        call_site = current_phase() or "other"
+        start = time.perf_counter()
+        try:
+            response = call(*args, **kwargs)
+        except Exception:
+            llm_requests.inc(model=model, call_site=call_site, outcome="error")
+            raise
+        if kwargs.get("stream"):
+            return _InstrumentedStream(response, model, call_site, start)
+        record_llm_response(model, call_site, time.perf_counter() - start, response)
+        return response
+
+    wrapper.instrumented = True
+    return wrapper
+
+
+def instrument_openai_client(client):
+    """Record the chat completion requests of an OpenAI client in the LLM metrics. Returns the client."""
+    for completions in (client.chat.completions, client.beta.chat.completions):
+        for method in ("create", "parse"):
+            call = getattr(completions, method, None)
+            if call is not None and not getattr(call, "instrumented", False):
+                setattr(completions, method, _instrumented_call(call))
+    return client
+
+
+def _collect_phases() -> list[MetricFamily]:
+    phases = global_phase_stats.as_dict()
+    samples = []
+    for phase, stats in phases.items():
+        samples.append(("search_phase_seconds_sum", {"phase": phase}, stats["total_seconds"]))
+        samples.append(("search_phase_seconds_count", {"phase": phase}, stats["count"]))
+    return [MetricFamily("search_phase_seconds", "summary", "Time spent per search phase, spans nest",
+                         suffixed_samples=samples)]
+
+
+registry.add_collector(_collect_phases)
+
+
+def drain_process_metrics() -> dict:
+    """Metrics and search phase totals recorded by this process since the last drain."""
+    return {"metrics": registry.drain(), "phases": global_phase_stats.drain()}
+
+
+def merge_process_metrics(drained: dict):
+    """Add the result of drain_process_metrics in another process to the metrics of this one."""
+    registry.merge(drained["metrics"])
+    global_phase_stats.merge(drained["phases"])
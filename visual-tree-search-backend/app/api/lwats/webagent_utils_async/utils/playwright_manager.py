@@ -7,11 +7,14 @@ from browserbase import Browserbase
 import aiohttp
 import boto3
 
+from .metrics import browsers_open, browser_launches
+
 # Load environment variables from .env file
 load_dotenv()
 
-API_KEY = os.environ["BROWSERBASE_API_KEY"]
-PROJECT_ID = os.environ["BROWSERBASE_PROJECT_ID"]
+# only needed in browserbase mode
+API_KEY = os.getenv("BROWSERBASE_API_KEY")
+PROJECT_ID = os.getenv("BROWSERBASE_PROJECT_ID")
 
 SITE_URL = "http://xwebarena.pathonai.org:7770"
 SITE_LOGIN_URL = f"{SITE_URL}/customer/account/login/"
@@ -200,7 +203,7 @@ class AsyncPlaywrightManager:
                         },
                     )
                     self.session_id = session.id
-                    self.browser = await self.playwright.chromium.connect_over_cdp(session.connectUrl)
+                    self.browser = await self._launch(self.playwright.chromium.connect_over_cdp(session.connectUrl))
                 
                     print(f"Connected to Browserbase. {self.browser.browser_type.name} v{self.browser.version}")
                     await debug_browser_state(self.browser)
@@ -209,37 +212,46 @@ class AsyncPlaywrightManager:
                     # First try to restore cookies
                     self.context = self.browser.contexts[0]
                     self.page = self.context.pages[0]
-                    cookies_restored = await restore_cookies(self.page, self.storage_state)
-                    
-                    if cookies_restored and await check_login_status(self.page):
-                        print("Using existing session cookies\n")
-                    else:
-                        print("Need to authenticate\n")
-                        # TODO: implement the authenticate function for browserbase
-                        success = await authenticate(self.page, self.storage_state)
-                        if not success:
-                            print("❌ Authentication didn't succeed fully.\n")
+                    # TODO: implement the authenticate function for browserbase
+                    await self._log_in()
 
                     
                     await debug_browser_state(self.browser)
                 
                 elif self.mode == "chromium":
-                    self.browser = await self.playwright.chromium.launch(headless=self.headless)
+                    self.browser = await self._launch(self.playwright.chromium.launch(headless=self.headless))
                     self.context = await self.browser.new_context()
                     self.page = await self.context.new_page()
-                    cookies_restored = await restore_cookies(self.page, self.storage_state)
-
-                    if cookies_restored and await check_login_status(self.page):
-                        print("Using existing session cookies\n")
-                    else:
-                        print("Need to authenticate\n")
-                        success = await authenticate(self.page, self.storage_state)
-                        if not success:
-                            print("❌ Authentication didn't succeed fully.\n")
+                    await self._log_in()
                     
                 else:
                     raise ValueError(f"Invalid mode: {self.mode}. Expected 'cdp', 'browserbase', or 'chromium'")
     
+    async def _log_in(self):
+        """Restore the cookies of the storage state file, authenticating if they are missing or expired. No storage state means no login, e.g. for local test sites."""
+        if self.storage_state is None:
+            return
+        cookies_restored = await restore_cookies(self.page, self.storage_state)
+
+        if cookies_restored and await check_login_status(self.page):
+            print("Using existing session cookies\n")
+        else:
+            print("Need to authenticate\n")
+            success = await authenticate(self.page, self.storage_state)
+            if not success:
+                print("❌ Authentication didn't succeed fully.\n")
+
+    async def _launch(self, launch):
+        """Await the launch or connection of the browser, counting it in the browser metrics."""
+        try:
+            browser = await launch
+        except Exception:
+            browser_launches.inc(mode=self.mode, outcome="error")
+            raise
+        browser_launches.inc(mode=self.mode, outcome="ok")
+        browsers_open.inc(mode=self.mode)
+        return browser
+
     async def get_live_browser_url(self):
         if self.mode == "browserbase":
             debug_info = self.bb.sessions.debug(self.session_id)
@@ -271,6 +283,7 @@ class AsyncPlaywrightManager:
             if self.context:
                 await self.context.close()
             if self.browser:
+                browsers_open.dec(mode=self.mode)
                 await self.browser.close()
             if self.playwright:
                 await self.playwright.stop()
@@ -0,0 +1,214 @@
+"""Per-phase timing spans of a search run.
+
+Each agent has a Tracer. Phases of the search (browser reset, path replay, page extraction,
+action generation, grounding, scoring, websocket sends, ...) run inside tracer.span(name),
+which times them with a monotonic clock. A run's breakdown is sent with search_complete,
+and the totals of all runs are served on /metrics. Spans nest, so the time of a phase
+includes the time of the phases inside it.
+
+Export (environment variables):
+    TRACING_FILE: append every span as a JSON line to this file
+    TRACING_OTEL: set to 1 to also emit the spans through the OpenTelemetry API, exported
+        by whatever SDK and exporter the process is configured with (e.g. an OTLP exporter
+        to a local collector, with opentelemetry-instrument)
+"""
+
+import asyncio
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Optional
+
+# breakdowns of the most recent finished runs, served on /metrics
+RECENT_RUNS = 20
+
+
+class PhaseStats:
+    """Count, total and maximum duration per phase name, safe to update from several threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._phases: dict[str, list] = {}
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            stats = self._phases.get(name)
+            if stats is None:
+                self._phases[name] = [1, seconds, seconds]
+            else:
+                stats[0] += 1
+                stats[1] += seconds
+                stats[2] = max(stats[2], seconds)
+
+    def drain(self) -> dict:
+        """Stats recorded since the last drain, phase -> [count, total, max], and start over."""
+        with self._lock:
+            phases, self._phases = self._phases, {}
+        return phases
+
+    def merge(self, phases: dict):
+        """Add stats drained from another process."""
+        with self._lock:
+            for name, (count, total, longest) in phases.items():
+                stats = self._phases.get(name)
+                if stats is None:
+                    self._phases[name] = [count, total, longest]
+                else:
+                    stats[0] += count
+                    stats[1] += total
+                    stats[2] = max(stats[2], longest)
+
+    def as_dict(self, wall_seconds: Optional[float] = None) -> dict:
+        """Phases by decreasing total time, with their share of wall_seconds if given."""
+        with self._lock:
+            phases = sorted(self._phases.items(), key=lambda item: item[1][1], reverse=True)
+        result = {}
+        for name, (count, total, longest) in phases:
+            result[name] = {
+                "count": count,
+                "total_seconds": round(total, 6),
+                "mean_seconds": round(total / count, 6),
+                "max_seconds": round(longest, 6),
+            }
+            if wall_seconds:
+                result[name]["share"] = round(total / wall_seconds, 4)
+        return result
+
+
+# totals of all the runs of this process
+global_phase_stats = PhaseStats()
+recent_runs: deque = deque(maxlen=RECENT_RUNS)
+
+_span_file_lock = threading.Lock()
+
+# innermost phase of the running task, the call site label of the LLM metrics
+_current_phase: ContextVar[Optional[str]] = ContextVar("current_phase", default=None)
+
+
+def current_phase() -> Optional[str]:
+    """Name of the innermost span the caller runs in, None outside of spans."""
+    return _current_phase.get()
+
+
+def _write_span(record: dict):
+    path = os.getenv("TRACING_FILE")
+    if not path:
+        return
+    line = json.dumps(record, default=str)
+    with _span_file_lock, open(path, "a", encoding="utf-8") as f:
+        f.write(line + "\n")
+
+
+def _otel_tracer():
+    if os.getenv("TRACING_OTEL") != "1":
+        return None
+    from opentelemetry import trace
+    return trace.get_tracer("visual-tree-search")
+
+
+class Tracer:
+    """Timing spans of one search run."""
+
+    def __init__(self, name: str = "search"):
+        self.run_id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.started_at = datetime.utcnow().isoformat()
+        self._start = time.perf_counter()
+        self.stats = PhaseStats()
+        self.finished: Optional[dict] = None
+        self._export_file = bool(os.getenv("TRACING_FILE"))
+        self._otel = _otel_tracer()
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Time the block as one occurrence of the phase `name`."""
+        otel_span = self._otel.start_as_current_span(name, attributes=attributes) if self._otel else None
+        if otel_span is not None:
+            otel_span.__enter__()
+        phase_token = _current_phase.set(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            _current_phase.reset(phase_token)
+            self.stats.add(name, seconds)
+            global_phase_stats.add(name, seconds)
+            if otel_span is not None:
+                otel_span.__exit__(None, None, None)
+            if self._export_file:
+                _write_span({
+                    "run_id": self.run_id,
+                    "name": name,
+                    "start": time.time() - seconds,
+                    "duration_seconds": seconds,
+                    "thread": threading.get_ident(),
+                    "attributes": attributes,
+                })
+
+    def wall_seconds(self) -> float:
+        return time.perf_counter() - self._start
+
+    def breakdown(self) -> dict:
+        """Time per phase of this run so far."""
+        wall = self.wall_seconds()
+        return {
+            "run_id": self.run_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "wall_seconds": round(wall, 6),
+            "phases": self.stats.as_dict(wall),
+        }
+
+    def finish(self) -> dict:
+        """Breakdown of the finished run, kept with the recent runs served on /metrics. Idempotent."""
+        if self.finished is None:
+            self.finished = self.breakdown()
+            recent_runs.append(self.finished)
+        return self.finished
+
+
+def traced(name: str):
+    """Run a method of an object with a `tracer` attribute inside a span of the phase `name`."""
+    def decorate(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(self, *args, **kwargs):
+                with self.tracer.span(name):
+                    return await func(self, *args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            with self.tracer.span(name):
+                return func(self, *args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class TracedWebSocket:
+    """Websocket wrapper timing every message sent as the websocket_send phase."""
+
+    def __init__(self, websocket, tracer: Tracer):
+        self.websocket = websocket
+        self.tracer = tracer
+
+    async def send_json(self, data):
+        with self.tracer.span("websocket_send"):
+            await self.websocket.send_json(data)
+
+
+def metrics_snapshot() -> dict:
+    """Totals per phase over all runs of the process, and the breakdowns of the recent runs."""
+    return {
+        "phases": global_phase_stats.as_dict(),
+        "recent_runs": list(recent_runs),
+        "timestamp": datetime.utcnow().isoformat(),
+    }
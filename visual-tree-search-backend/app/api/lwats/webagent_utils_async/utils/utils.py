@@ -3,6 +3,7 @@ import os
 import json
 import logging
 from openai import OpenAI
+from .metrics import instrument_openai_client
 from dotenv import load_dotenv
 from PIL import Image
 from io import BytesIO
@@ -10,7 +11,7 @@ import requests
 _ = load_dotenv()
 
 logger = logging.getLogger(__name__)
-openai_client = OpenAI()
+openai_client = instrument_openai_client(OpenAI())
 
 
 def setup_logger():
@@ -0,0 +1,58 @@
+from collections import Counter
+
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from ..lwats.webagent_utils_async.utils.metrics import CONTENT_TYPE, MetricFamily, registry
+from ..lwats.webagent_utils_async.utils.tracing import metrics_snapshot
+from ..services.event_hub import event_hub
+from ..services.search_jobs import job_manager
+from ..services.search_sessions import session_manager, QUEUED, RUNNING, PAUSED
+
+router = APIRouter()
+
+
+def collect_services() -> list[MetricFamily]:
+    """Searches, their slots and the client queues, read from the services at scrape time"""
+    statuses = Counter(session.info()["status"] for session in list(session_manager.sessions.values()))
+    families = [
+        MetricFamily("tree_search_sessions", "gauge", "Websocket search sessions by status",
+                     [({"status": status}, statuses[status]) for status in (QUEUED, RUNNING, PAUSED)]),
+        # every running session holds one browser
+        MetricFamily("tree_search_session_slots", "gauge", "Search sessions that can run at once, each with its own browser",
+                     [({}, session_manager.max_sessions)]),
+    ]
+    if job_manager.started:
+        families.append(MetricFamily(
+            "tree_search_jobs", "gauge", "Jobs of /api/tree-search/run by status",
+            [({"status": status}, count) for status, count in job_manager.store.count_by_status().items()],
+        ))
+        families.append(MetricFamily("tree_search_job_workers", "gauge", "Worker processes running the jobs",
+                                     [({}, job_manager.max_concurrent)]))
+    depths = [subscriber.queue.qsize() for subscriber in list(event_hub.subscribers)]
+    families.extend([
+        MetricFamily("event_hub_subscribers", "gauge", "SSE and websocket clients", [({}, len(depths))]),
+        MetricFamily("event_hub_queued_events", "gauge", "Events waiting in the queues of all clients",
+                     [({}, sum(depths))]),
+        MetricFamily("event_hub_max_queued_events", "gauge", "Events waiting in the longest client queue",
+                     [({}, max(depths, default=0))]),
+        MetricFamily("event_hub_streams", "gauge", "Search event streams by state",
+                     [({"state": "closed"}, sum(1 for s in event_hub.streams.values() if s.closed)),
+                      ({"state": "open"}, sum(1 for s in event_hub.streams.values() if not s.closed))]),
+    ])
+    return families
+
+
+registry.add_collector(collect_services)
+
+
+@router.get("")
+async def get_metrics():
+    """Counters, gauges and histograms of this process in the Prometheus text format"""
+    return Response(registry.render(), media_type=CONTENT_TYPE)
+
+
+@router.get("/phases")
+async def get_phase_timings():
+    """Time per search phase, over all the searches run by this process and for the most recent ones"""
+    return metrics_snapshot()
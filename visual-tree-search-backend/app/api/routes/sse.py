@@ -1,7 +1,4 @@
-import asyncio
-import json
-from datetime import datetime
-from typing import Dict, List, Any
+from typing import Dict, Any, Optional
 import logging
 
 # Configure basic logging
@@ -13,77 +10,54 @@ logging.basicConfig(
 from fastapi import APIRouter, Request
 from fastapi.responses import StreamingResponse
 
-router = APIRouter()
-
-# Store active SSE connections (using a simple list for the example)
-clients: List[asyncio.Queue] = []
+from ..services.event_hub import event_hub, search_topic, SSE_TOPIC
 
-# Track the ping task
-ping_task = None
+router = APIRouter()
 
 async def send_event_to_all(event_data: Dict[str, Any]):
     """Send an event to all connected clients"""
-    for queue in clients:
-        await queue.put(event_data)
-
-async def ping_clients():
-    """Send a ping to all clients every second"""
-    while True:
-        if clients:
-            event_data = {
-                "type": "ping",
-                "message": "Server heartbeat",
-                "timestamp": datetime.utcnow().isoformat()
-            }
-            await send_event_to_all(event_data)
-            logging.info(f"Sent ping to {len(clients)} clients")
-        await asyncio.sleep(1)
+    event_hub.publish(SSE_TOPIC, event_data)
 
-async def sse_generator(request: Request, client_queue: asyncio.Queue):
+async def sse_generator(request: Request, subscriber):
     """Generate SSE events"""
     try:
         while True:
             if await request.is_disconnected():
                 break
             
-            # Get message from the queue
-            message = await client_queue.get()
-            
-            # Convert message to string if it's a dict
-            if isinstance(message, dict):
-                message = json.dumps(message)
+            # Get the next serialized message of this client
+            message = await subscriber.get()
+            if message is None:
+                # dropped by the hub for falling behind
+                break
             
             # Send the event
             yield f"data: {message}\n\n"
     finally:
         # Remove client when disconnected
-        if client_queue in clients:
-            clients.remove(client_queue)
-        logging.info(f"Client disconnected - remaining clients: {len(clients)}")
+        subscriber.close()
+        logging.info(f"Client disconnected - remaining clients: {event_hub.count(SSE_TOPIC)}")
 
 @router.get("/events")
-async def sse_endpoint(request: Request):
-    """SSE endpoint that sends events to clients"""
-    # Client connection queue
-    client_queue = asyncio.Queue()
-    clients.append(client_queue)
-    
-    # Start ping task if not already running
-    global ping_task
-    if ping_task is None or ping_task.done():
-        ping_task = asyncio.create_task(ping_clients())
+async def sse_endpoint(request: Request, search_id: Optional[str] = None, after: int = 0):
+    """SSE endpoint that sends events to clients, and the events of a tree search (from seq `after`) if search_id is given"""
+    # Client connection queue, with a heartbeat while idle
+    subscriber = event_hub.subscribe([SSE_TOPIC], heartbeat="Server heartbeat")
     
-    logging.info(f"Client connected - total clients: {len(clients)}")
+    logging.info(f"Client connected - total clients: {event_hub.count(SSE_TOPIC)}")
     
     # Initial connection message
-    await client_queue.put({
+    await subscriber.send_json({
         "type": "connection",
         "message": "Connected to SSE"
     })
+    if search_id and event_hub.observe(subscriber, search_topic(search_id), after) is None:
+        # not started yet, or already dropped by the hub
+        subscriber.subscribe(search_topic(search_id))
 
     # Use StreamingResponse for SSE
     return StreamingResponse(
-        sse_generator(request, client_queue),
+        sse_generator(request, subscriber),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
@@ -95,6 +69,6 @@ async def sse_endpoint(request: Request):
 async def sse_status():
     """Get SSE connection status"""
     return {
-        "active": len(clients),
+        "active": event_hub.count(SSE_TOPIC),
         "status": "running"
-    }
\ No newline at end of file
+    }
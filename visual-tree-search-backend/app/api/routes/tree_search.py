@@ -1,95 +1,16 @@
-import asyncio
-from typing import List, Optional
-from fastapi import APIRouter, BackgroundTasks, HTTPException
-import json
+from typing import Optional
+from fastapi import APIRouter, HTTPException
 import os
-import threading
-import multiprocessing
-from datetime import datetime
 import logging
 
-import argparse
 from dotenv import load_dotenv
-import json
-import logging
-
-from ..lwats.core_async.config import AgentConfig, add_agent_config_arguments, filter_valid_config_args
 load_dotenv()
-from ..lwats.core_async.agent_factory import setup_search_agent
-
-def run_tree_search(args):
-    # Log the arguments to help debug
-    logging.info(f"Running tree search with args: {args.__dict__}")
-    
-    # Ensure starting_url is set correctly
-    if not hasattr(args, 'starting_url') or not args.starting_url:
-        logging.error("starting_url is not set or is empty")
-        return {"error": "starting_url is required"}
-    
-    logging.info(f"Using starting URL: {args.starting_url}")
-    
-    agent_config = AgentConfig(**filter_valid_config_args(args.__dict__))
-    agent, playwright_manager = setup_search_agent(
-        agent_type=args.agent_type,
-        starting_url=args.starting_url,
-        goal=args.goal,
-        images=args.images,
-        agent_config=agent_config
-    )
-    print(agent_config)
-    
-    # Run the search
-    results = agent.run()
-    
-    # Close the playwright_manager when done
-    playwright_manager.close()
-    
-    return results
-from ..lwats.core_async.config import AgentConfig, filter_valid_config_args
+from ..services.search_jobs import job_manager, QueueFullError, CANCELLED, CANCELLING
 
 router = APIRouter()
 
-# Store results of tree search runs
-search_results = {}
-# Store process objects
-search_processes = {}
-
-def run_search_in_process(search_id: str, args_dict):
-    """Run the tree search in a separate process"""
-    try:
-        # Create an args object similar to what argparse would create
-        class Args:
-            pass
-        
-        args = Args()
-        for key, value in args_dict.items():
-            setattr(args, key, value)
-        
-        # Update status to running
-        search_results[search_id]["status"] = "running"
-        
-        # Debug: Print current working directory and storage_state path
-        logging.info(f"Current working directory: {os.getcwd()}")
-        logging.info(f"Storage state path: {args.storage_state}")
-        logging.info(f"Storage state exists: {os.path.exists(args.storage_state)}")
-        logging.info(f"Starting URL: {args.starting_url}")  # Log the starting URL
-        
-        # Run the search
-        results = run_tree_search(args)
-        
-        # Update results
-        search_results[search_id]["results"] = results
-        search_results[search_id]["status"] = "completed"
-        search_results[search_id]["completed_at"] = datetime.utcnow().isoformat()
-        
-    except Exception as e:
-        logging.error(f"Error in search process: {str(e)}")
-        search_results[search_id]["status"] = "failed"
-        search_results[search_id]["error"] = str(e)
-
 @router.post("/run")
 async def start_tree_search(
-    background_tasks: BackgroundTasks,
     agent_type: str = "SimpleSearchAgent",
     starting_url: str = "http://xwebarena.pathonai.org:7770/",
     goal: str = "search running shoes, click on the first result",
@@ -104,10 +25,7 @@ async def start_tree_search(
     max_depth: int = 3,
     iterations: int = 3
 ):
-    """Start a tree search with the given parameters"""
-    # Create a unique ID for this search
-    search_id = f"search_{datetime.utcnow().strftime('%Y%m%d_%H%M%S_%f')}"
-    
+    """Queue a tree search with the given parameters"""
     # Parse images
     image_list = [img.strip() for img in images.split(',')] if images else []
     
@@ -160,75 +78,38 @@ async def start_tree_search(
         "iterations": iterations
     }
     
-    # Initialize the results entry
-    search_results[search_id] = {
-        "id": search_id,
-        "status": "pending",
-        "created_at": datetime.utcnow().isoformat(),
-        "config": args_dict
-    }
-    
-    # Start the search in a separate process
-    process = threading.Thread(
-        target=run_search_in_process,
-        args=(search_id, args_dict),
-        daemon=True
-    )
-    search_processes[search_id] = process
-    process.start()
+    try:
+        job = job_manager.submit(args_dict)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
     
     return {
-        "search_id": search_id,
-        "status": "pending",
-        "message": "Tree search started in the background"
+        "search_id": job["id"],
+        "status": job["status"],
+        "message": "Tree search queued, it starts when a worker is free"
     }
 
 @router.get("/status/{search_id}")
 async def get_search_status(search_id: str):
     """Get the status of a tree search"""
-    if search_id not in search_results:
+    job = job_manager.store.get(search_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Search ID not found")
-    
-    # Check if process is still alive
-    if search_id in search_processes:
-        process = search_processes[search_id]
-        if process.is_alive():
-            search_results[search_id]["status"] = "running"
-        elif search_results[search_id]["status"] == "pending":
-            # Process ended but status wasn't updated
-            search_results[search_id]["status"] = "failed"
-            search_results[search_id]["error"] = "Process terminated unexpectedly"
-    
-    return search_results[search_id]
+    return job
 
 @router.get("/list")
 async def list_searches():
     """List all tree searches"""
-    return {
-        "searches": [
-            {
-                "id": search_id,
-                "status": search_results[search_id]["status"],
-                "created_at": search_results[search_id]["created_at"],
-                "completed_at": search_results[search_id].get("completed_at")
-            }
-            for search_id in search_results
-        ]
-    }
+    return {"searches": job_manager.store.list_jobs()}
 
 @router.post("/cancel/{search_id}")
 async def cancel_search(search_id: str):
-    """Cancel a running search"""
-    if search_id not in search_results:
+    """Cancel a queued or running search"""
+    status = job_manager.cancel(search_id)
+    if status is None:
         raise HTTPException(status_code=404, detail="Search ID not found")
-    
-    if search_id in search_processes:
-        process = search_processes[search_id]
-        if process.is_alive():
-            # We can't directly terminate a thread, but we can mark it as cancelled
-            search_results[search_id]["status"] = "cancelled"
-            return {"message": f"Search {search_id} has been marked for cancellation"}
-        else:
-            return {"message": f"Search {search_id} is not running"}
-    
-    return {"message": f"Search {search_id} process not found"} 
\ No newline at end of file
+    if status == CANCELLED:
+        return {"message": f"Search {search_id} has been cancelled", "status": status}
+    if status == CANCELLING:
+        return {"message": f"Search {search_id} is being cancelled", "status": status}
+    return {"message": f"Search {search_id} is not running", "status": status}
@@ -1,5 +1,6 @@
 import asyncio
 import json
+import os
 from datetime import datetime
 from typing import Dict, Any, List, Set
 import logging
@@ -19,6 +20,12 @@ from ..lwats.core_async.config import AgentConfig
 from ..lwats.core_async.agent_factory import setup_search_agent
 from ..lwats.agents_async.SearchAgents.tree_vis import collect_all_nodes
 from ..lwats.agents_async.SearchAgents.trajectory_score import create_llm_prompt, score_trajectory_with_openai
+from ..lwats.webagent_utils_async.utils.tracing import TracedWebSocket
+from ..lwats.agents_async.SearchAgents.checkpoint import SearchCheckpointer, RecordingWebSocket, load_checkpoint, read_events
+from ..services.search_sessions import (
+    session_manager, checkpoint_path, new_search_id, parse_budget, parse_int, CapacityError, QUEUED,
+)
+from ..services.event_hub import event_hub, pump_websocket, search_topic
 
 router = APIRouter()
 
@@ -31,12 +38,16 @@ async def tree_search_websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
     connection_id = str(id(websocket))
     active_connections[connection_id] = websocket
+    # Messages to this client go through its queue, written by its own task; the client
+    # subscribes to the events of the searches it starts
+    client = event_hub.subscribe([])
+    writer = asyncio.create_task(pump_websocket(websocket, client))
     
     logging.info(f"WebSocket connection established with ID: {connection_id}")
     
     try:
         # Send initial connection confirmation
-        await websocket.send_json({
+        await client.send_json({
             "type": "connection_established",
             "connection_id": connection_id,
             "timestamp": datetime.utcnow().isoformat()
@@ -49,27 +60,197 @@ async def tree_search_websocket_endpoint(websocket: WebSocket):
             
             # Handle different message types
             if message["type"] == "ping":
-                await websocket.send_json({
+                await client.send_json({
                     "type": "pong", 
                     "timestamp": datetime.utcnow().isoformat()
                 })
             
             elif message["type"] == "start_search":
-                # Start the search process
-                await handle_search_request(websocket, message)
+                # Start the search as a session, the loop keeps handling messages while it runs
+                await start_search_session(client, connection_id, message)
+
+            elif message["type"] == "resume_checkpoint":
+                # Continue an earlier search of this or a previous connection from its checkpoint
+                await resume_search_session(client, connection_id, message)
+
+            elif message["type"] == "replay_events":
+                await replay_search_events(client, message)
+
+            elif message["type"] == "observe_search":
+                # Follow a search started by another (or an earlier) connection
+                await observe_search(client, connection_id, message)
+
+            elif message["type"] in SEARCH_CONTROL_MESSAGES:
+                await handle_search_control(client, connection_id, message)
                 
     except WebSocketDisconnect:
         logging.info(f"WebSocket disconnected with ID: {connection_id}")
     except Exception as e:
         logging.error(f"Error in WebSocket connection: {e}")
     finally:
-        # Clean up connection
+        # Clean up connection, its searches have nobody left to report to
+        session_manager.cancel_connection(connection_id)
+        client.close()
+        await writer
         if connection_id in active_connections:
             del active_connections[connection_id]
 
-async def handle_search_request(websocket: WebSocket, message: Dict[str, Any]):
-    """Handle a search request from the client"""
+SEARCH_CONTROL_MESSAGES = ("pause_search", "resume_search", "cancel_search", "set_budget")
+
+async def start_search_session(client, connection_id: str, message: Dict[str, Any], search_id: str = None, first_seq: int = 0):
+    """Start a search session, or tell the client why it was not started"""
+    search_id = search_id or new_search_id()
+    try:
+        budget = parse_budget(message.get("budget", {}))
+    except ValueError as e:
+        await send_error(client, f"Search rejected: {str(e)}")
+        return
+    # the search publishes its events as a stream, any number of clients can observe it
+    stream = event_hub.stream(search_topic(search_id), first_seq=first_seq)
+    try:
+        session = session_manager.submit(stream, connection_id, message, handle_search_request, search_id=search_id)
+    except (CapacityError, ValueError) as e:
+        await client.send_json({
+            "type": "error",
+            "message": f"Search rejected: {str(e)}",
+            "timestamp": datetime.utcnow().isoformat()
+        })
+        return
+    event_hub.add_stream(stream)
+    session.task.add_done_callback(lambda _: event_hub.close_stream(stream))
+    client.subscribe(stream.topic)
+    if budget:
+        session.set_budget(budget)
+    await client.send_json({
+        "type": "status_update",
+        "status": session.status,
+        "search_id": session.id,
+        "message": "Search queued, waiting for a free slot" if session.status == QUEUED else "Search started",
+        "timestamp": datetime.utcnow().isoformat()
+    })
+
+async def send_error(client, text: str):
+    await client.send_json({
+        "type": "error",
+        "message": text,
+        "timestamp": datetime.utcnow().isoformat()
+    })
+
+async def send_missing_checkpoint(client, search_id):
+    await send_error(client, f"No checkpoint for search {search_id}")
+
+async def resume_search_session(client, connection_id: str, message: Dict[str, Any]):
+    """Resume a search from its checkpoint with a fresh browser, under the same search id"""
+    search_id = message.get("search_id")
+    path = checkpoint_path(search_id)
+    if path is None or not os.path.exists(path):
+        await send_missing_checkpoint(client, search_id)
+        return
+    # the events of the resumed search are numbered on from the recorded ones
+    first_seq = len(await asyncio.to_thread(read_events, path))
+    await start_search_session(client, connection_id, message, search_id=search_id, first_seq=first_seq)
+
+async def observe_search(client, connection_id: str, message: Dict[str, Any]):
+    """Subscribe to the event stream of a search, starting with its buffered events from seq `after`"""
+    search_id = message.get("search_id")
     try:
+        after = parse_int(message.get("after", 0), "after")
+    except ValueError as e:
+        await send_error(client, str(e))
+        return
+    info = event_hub.observe(client, search_topic(search_id), after)
+    if info is None:
+        await client.send_json({
+            "type": "error",
+            "message": f"No search {search_id} to observe",
+            "timestamp": datetime.utcnow().isoformat()
+        })
+        return
+    session = session_manager.get(search_id)
+    if session is not None and session.connection_id not in active_connections:
+        # the connection that started the search is gone, this one takes over its controls
+        session.connection_id = connection_id
+    await client.send_json({
+        "type": "observing",
+        "search_id": search_id,
+        "status": session.info()["status"] if session is not None else "finished",
+        **info,
+        "timestamp": datetime.utcnow().isoformat()
+    })
+
+async def replay_search_events(client, message: Dict[str, Any]):
+    """Send the recorded events of a search again, e.g. to a client that reconnected"""
+    search_id = message.get("search_id")
+    path = checkpoint_path(search_id)
+    if path is None or not os.path.exists(path):
+        await send_missing_checkpoint(client, search_id)
+        return
+    try:
+        after = parse_int(message.get("after", 0), "after")
+    except ValueError as e:
+        await send_error(client, str(e))
+        return
+    events = await asyncio.to_thread(read_events, path, after)
+    for event in events:
+        await client.send_json(event)
+    await client.send_json({
+        "type": "replay_complete",
+        "search_id": search_id,
+        "events": len(events),
+        # pass as "after" to only get the events recorded since this replay
+        "next": after + len(events),
+        "timestamp": datetime.utcnow().isoformat()
+    })
+
+async def handle_search_control(client, connection_id: str, message: Dict[str, Any]):
+    """Pause, resume, cancel or change the budget of a search of this connection"""
+    search_id = message.get("search_id")
+    session = session_manager.get(search_id) if search_id else session_manager.latest(connection_id)
+    if session is None or session.connection_id != connection_id:
+        await client.send_json({
+            "type": "error",
+            "message": f"No search {search_id} to {message['type']}" if search_id else f"No search to {message['type']}",
+            "timestamp": datetime.utcnow().isoformat()
+        })
+        return
+
+    response = {"type": "search_control", "action": message["type"]}
+    if message["type"] == "pause_search":
+        session.control.pause()
+    elif message["type"] == "resume_search":
+        session.control.resume()
+    elif message["type"] == "cancel_search":
+        session_manager.cancel(session)
+    elif message["type"] == "set_budget":
+        try:
+            response["applied"] = session.set_budget(message.get("budget", {}))
+        except ValueError as e:
+            # the search goes on with its budget unchanged
+            await send_error(client, f"Budget not changed: {str(e)}")
+            return
+    response.update(session.info())
+    response["timestamp"] = datetime.utcnow().isoformat()
+    await client.send_json(response)
+
+async def handle_search_request(websocket: WebSocket, message: Dict[str, Any], session=None):
+    """Handle a search request from the client, in the thread of its search session"""
+    agent = None
+    checkpointer = None
+    checkpoint = None
+    try:
+        if session is not None:
+            # the tree and the events of the session go to its checkpoint file
+            path = checkpoint_path(session.id)
+            if message.get("type") == "resume_checkpoint":
+                checkpoint = load_checkpoint(path)
+                message = checkpoint.header["message"]
+                checkpointer = SearchCheckpointer(path, written=checkpoint.records)
+            else:
+                checkpointer = SearchCheckpointer(path)
+                checkpointer.write_header(message)
+            websocket = RecordingWebSocket(websocket, checkpointer,
+                                           first_seq=checkpoint.event_count if checkpoint is not None else 0)
+
         # Extract parameters from the message
         agent_type = message.get("agent_type", "SimpleSearchAgent")
         starting_url = message.get("starting_url", "http://xwebarena.pathonai.org:7770/")
@@ -117,6 +298,16 @@ async def handle_search_request(websocket: WebSocket, message: Dict[str, Any]):
             images=[],  # No initial images
             agent_config=config
         )
+        # time spent sending the search events counts as a phase of the search
+        websocket = TracedWebSocket(websocket, agent.tracer)
+        if session is not None:
+            agent.control = session.control
+            agent.checkpointer = checkpointer
+            if checkpoint is not None:
+                # the browser starts fresh, the search replays the path to the next node it selects
+                agent.resume_from_checkpoint(checkpoint)
+            session.agent = agent
+            session.set_budget(session.budget)
         
         # Send status update
         await websocket.send_json({
@@ -144,9 +335,11 @@ async def handle_search_request(websocket: WebSocket, message: Dict[str, Any]):
                 "timestamp": datetime.utcnow().isoformat()
             })
         
-        # Clean up
-        await playwright_manager.close()
-        
+    except asyncio.CancelledError:
+        if session is not None:
+            # recorded in the checkpoint, which is closed below
+            await session.report_cancelled(websocket)
+        raise
     except Exception as e:
         logging.error(f"Error handling search request: {e}")
         await websocket.send_json({
@@ -154,6 +347,16 @@ async def handle_search_request(websocket: WebSocket, message: Dict[str, Any]):
             "message": f"Error during search: {str(e)}",
             "timestamp": datetime.utcnow().isoformat()
         })
+    finally:
+        # Clean up, also when the search is cancelled. The agent replaces its playwright manager on every browser reset
+        try:
+            if agent is not None:
+                # the tree as the search left it, to resume from
+                agent.save_checkpoint()
+                await agent.playwright_manager.close()
+        finally:
+            if checkpointer is not None:
+                checkpointer.close()
 
 async def send_tree_update(websocket: WebSocket, root_node):
     """Send a tree update to the client"""
@@ -165,8 +368,8 @@ async def send_tree_update(websocket: WebSocket, root_node):
         tree_data = []
         for node in nodes:
             node_data = {
-                "id": id(node),
-                "parent_id": id(node.parent) if node.parent else None,
+                "id": node.node_id,
+                "parent_id": node.parent.node_id if node.parent else None,
                 "action": node.action if node.action else "ROOT",
                 "description": node.natural_language_description,
                 "depth": node.depth,
@@ -201,7 +404,7 @@ async def send_trajectory_update(websocket: WebSocket, node, status: str):
                 continue
                 
             node_data = {
-                "id": id(node),
+                "id": node.node_id,
                 "action": node.action,
                 "description": node.natural_language_description,
                 "feedback": node.feedback if hasattr(node, "feedback") else None,
@@ -223,5 +426,7 @@ async def tree_search_websocket_status():
     """Get Tree Search WebSocket connection status"""
     return {
         "active_connections": len(active_connections),
+        "searches": [session.info() for session in session_manager.sessions.values()],
+        "streams": [stream.info() for stream in event_hub.streams.values()],
         "status": "running"
     }
\ No newline at end of file
@@ -1,7 +1,7 @@
 import asyncio
 import json
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import Dict, Any
 import logging
 
 # Configure basic logging
@@ -15,51 +15,26 @@ from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 # Import the tree traversal handler
 from app.api.routes.tree_traversal import bfs_traversal
 
-router = APIRouter()
-
-# Track active WebSocket connections for tree visualization
-active_tree_connections: List[WebSocket] = []
+from ..services.event_hub import event_hub, pump_websocket, TREE_WS_TOPIC
 
-# Track the ping task
-tree_ping_task = None
+router = APIRouter()
 
 async def send_to_all_tree_clients(data: Dict[str, Any]):
     """Send a message to all connected tree visualization clients"""
-    message = json.dumps(data)
-    for connection in active_tree_connections:
-        try:
-            await connection.send_text(message)
-        except Exception as e:
-            logging.error(f"Error sending message to tree client: {e}")
-
-async def ping_tree_clients():
-    """Send a ping to all tree visualization clients every second"""
-    while True:
-        if active_tree_connections:
-            data = {
-                "type": "ping",
-                "message": "Tree server heartbeat",
-                "timestamp": datetime.utcnow().isoformat()
-            }
-            await send_to_all_tree_clients(data)
-            logging.info(f"Sent ping to {len(active_tree_connections)} tree websocket clients")
-        await asyncio.sleep(1)
+    event_hub.publish(TREE_WS_TOPIC, data)
 
 # Define the WebSocket endpoint for tree visualization
 async def tree_websocket_endpoint(websocket: WebSocket):
     """Handle WebSocket connections for tree visualization"""
     await websocket.accept()
-    active_tree_connections.append(websocket)
-    
-    # Start ping task if not already running
-    global tree_ping_task
-    if tree_ping_task is None or tree_ping_task.done():
-        tree_ping_task = asyncio.create_task(ping_tree_clients())
+    # Messages to this client go through its queue, written by its own task, with a heartbeat while idle
+    client = event_hub.subscribe([TREE_WS_TOPIC], heartbeat="Tree server heartbeat")
+    writer = asyncio.create_task(pump_websocket(websocket, client))
     
-    logging.info(f"Tree WebSocket client connected - total clients: {len(active_tree_connections)}")
+    logging.info(f"Tree WebSocket client connected - total clients: {event_hub.count(TREE_WS_TOPIC)}")
     
     # Send initial connection message
-    await websocket.send_json({
+    await client.send_json({
         "type": "connection",
         "message": "Connected to Tree WebSocket server"
     })
@@ -82,14 +57,14 @@ async def tree_websocket_endpoint(websocket: WebSocket):
                     logging.info(f"Received tree data: {json.dumps(tree_data)[:100]}...")
                     
                     # Send acknowledgment
-                    await websocket.send_json({
+                    await client.send_json({
                         "type": "info",
                         "message": "Tree data received",
                         "timestamp": datetime.utcnow().isoformat()
                     })
                     
                     # Start BFS traversal
-                    await bfs_traversal(websocket, tree_data)
+                    await bfs_traversal(client, tree_data)
                     
                 # Handle traversal request
                 elif parsed_data.get("type") == "traversal_request":
@@ -98,45 +73,45 @@ async def tree_websocket_endpoint(websocket: WebSocket):
                     
                     if tree_data:
                         if algorithm == "bfs":
-                            await bfs_traversal(websocket, tree_data)
+                            await bfs_traversal(client, tree_data)
                         else:
-                            await websocket.send_json({
+                            await client.send_json({
                                 "type": "error",
                                 "message": f"Unsupported algorithm: {algorithm}"
                             })
                     else:
-                        await websocket.send_json({
+                        await client.send_json({
                             "type": "error",
                             "message": "No tree data provided for traversal"
                         })
                 else:
                     # Echo back other message types
-                    await websocket.send_json({
+                    await client.send_json({
                         "type": "echo",
                         "message": parsed_data,
                         "timestamp": datetime.utcnow().isoformat()
                     })
             except json.JSONDecodeError as e:
                 logging.error(f"Error parsing tree message: {e}")
-                await websocket.send_json({
+                await client.send_json({
                     "type": "error",
                     "message": f"Invalid JSON: {str(e)}"
                 })
     except WebSocketDisconnect:
-        # Remove connection when client disconnects
-        if websocket in active_tree_connections:
-            active_tree_connections.remove(websocket)
-        logging.info(f"Tree WebSocket client disconnected - remaining clients: {len(active_tree_connections)}")
+        pass
     except Exception as e:
         logging.error(f"Tree WebSocket error: {e}")
-        if websocket in active_tree_connections:
-            active_tree_connections.remove(websocket)
+    finally:
+        # Remove the client, its writer stops
+        client.close()
+        await writer
+        logging.info(f"Tree WebSocket client disconnected - remaining clients: {event_hub.count(TREE_WS_TOPIC)}")
 
 # Add a route for testing Tree WebSocket functionality via HTTP
 @router.get("/status")
 async def tree_websocket_status():
     """Get Tree WebSocket connection status"""
     return {
-        "active": len(active_tree_connections),
+        "active": event_hub.count(TREE_WS_TOPIC),
         "status": "running"
     } 
\ No newline at end of file
@@ -1,7 +1,7 @@
 import asyncio
 import json
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import Dict, Any
 import logging
 
 # Configure basic logging
@@ -12,51 +12,26 @@ logging.basicConfig(
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 
-router = APIRouter()
-
-# Track active WebSocket connections
-active_connections: List[WebSocket] = []
+from ..services.event_hub import event_hub, pump_websocket, WS_TOPIC
 
-# Track the ping task
-ping_task = None
+router = APIRouter()
 
 async def send_to_all(data: Dict[str, Any]):
     """Send a message to all connected clients"""
-    message = json.dumps(data)
-    for connection in active_connections:
-        try:
-            await connection.send_text(message)
-        except Exception as e:
-            logging.error(f"Error sending message: {e}")
-
-async def ping_clients():
-    """Send a ping to all clients every second"""
-    while True:
-        if active_connections:
-            data = {
-                "type": "ping",
-                "message": "Server heartbeat",
-                "timestamp": datetime.utcnow().isoformat()
-            }
-            await send_to_all(data)
-            logging.info(f"Sent ping to {len(active_connections)} websocket clients")
-        await asyncio.sleep(1)
+    event_hub.publish(WS_TOPIC, data)
 
 # Define the WebSocket endpoint that will be used in main.py
 async def websocket_endpoint(websocket: WebSocket):
     """Handle WebSocket connections"""
     await websocket.accept()
-    active_connections.append(websocket)
-    
-    # Start ping task if not already running
-    global ping_task
-    if ping_task is None or ping_task.done():
-        ping_task = asyncio.create_task(ping_clients())
+    # Messages to this client go through its queue, written by its own task, with a heartbeat while idle
+    client = event_hub.subscribe([WS_TOPIC], heartbeat="Server heartbeat")
+    writer = asyncio.create_task(pump_websocket(websocket, client))
     
-    logging.info(f"WebSocket client connected - total clients: {len(active_connections)}")
+    logging.info(f"WebSocket client connected - total clients: {event_hub.count(WS_TOPIC)}")
     
     # Send initial connection message
-    await websocket.send_json({
+    await client.send_json({
         "type": "connection",
         "message": "Connected to WebSocket server"
     })
@@ -72,32 +47,32 @@ async def websocket_endpoint(websocket: WebSocket):
                 logging.info(f"Received message: {parsed_data}")
                 
                 # Echo back the message
-                await websocket.send_json({
+                await client.send_json({
                     "type": "echo",
                     "message": parsed_data,
                     "timestamp": datetime.utcnow().isoformat()
                 })
             except json.JSONDecodeError as e:
                 logging.error(f"Error parsing message: {e}")
-                await websocket.send_json({
+                await client.send_json({
                     "type": "error",
                     "message": f"Invalid JSON: {str(e)}"
                 })
     except WebSocketDisconnect:
-        # Remove connection when client disconnects
-        if websocket in active_connections:
-            active_connections.remove(websocket)
-        logging.info(f"WebSocket client disconnected - remaining clients: {len(active_connections)}")
+        pass
     except Exception as e:
         logging.error(f"WebSocket error: {e}")
-        if websocket in active_connections:
-            active_connections.remove(websocket)
+    finally:
+        # Remove the client, its writer stops
+        client.close()
+        await writer
+        logging.info(f"WebSocket client disconnected - remaining clients: {event_hub.count(WS_TOPIC)}")
 
 # Add a route for testing WebSocket functionality via HTTP
 @router.get("/status")
 async def websocket_status():
     """Get WebSocket connection status"""
     return {
-        "active": len(active_connections),
+        "active": event_hub.count(WS_TOPIC),
         "status": "running"
     }
\ No newline at end of file
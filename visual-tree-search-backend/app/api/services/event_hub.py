@@ -0,0 +1,300 @@
+"""Publish/subscribe hub for the events sent to SSE and websocket clients.
+
+Publishers send an event to a topic (an endpoint, a connection or a search id) and every
+subscriber of the topic gets it in its own bounded queue, from which a task per client
+writes to that client. Publishing never waits for a client, so one slow client neither
+delays the others nor grows memory without bound: when its queue is full the oldest event
+is dropped, or the client is disconnected, depending on the overflow policy. Events are
+serialized once per publish, not once per subscriber.
+
+Idle subscribers that ask for it get a heartbeat every heartbeat interval.
+
+A stream is a topic whose events are numbered with a "seq" field and kept in a ring buffer,
+so observers joining late (or reconnecting) catch up on the recent events before the live
+ones. Tree searches publish their events as streams.
+
+Configuration (environment variables):
+    EVENT_HUB_QUEUE_SIZE: events buffered per subscriber, default 1000
+    EVENT_HUB_OVERFLOW: drop_oldest or disconnect, default drop_oldest
+    EVENT_HUB_HEARTBEAT_SECONDS: seconds between heartbeats, default 1
+    EVENT_HUB_STREAM_BUFFER: recent events kept per stream, default 256
+    EVENT_HUB_MAX_STREAMS: streams of finished searches kept for catch-up, default 32
+"""
+
+import asyncio
+import json
+import logging
+import os
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Iterable, Optional
+
+from ..lwats.webagent_utils_async.utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+DROP_OLDEST = "drop_oldest"
+DISCONNECT = "disconnect"
+OVERFLOW_POLICIES = (DROP_OLDEST, DISCONNECT)
+
+# topics of the endpoints broadcasting to all their clients
+SSE_TOPIC = "sse"
+WS_TOPIC = "ws"
+TREE_WS_TOPIC = "tree-ws"
+
+events_dropped = registry.counter(
+    "event_hub_events_dropped_total", "Events dropped from the queue of a client that fell behind",
+)
+subscribers_overflowed = registry.counter(
+    "event_hub_overflow_disconnects_total", "Clients disconnected for falling behind",
+)
+
+
+def search_topic(search_id: str) -> str:
+    """Topic of the events of one tree search."""
+    return f"search:{search_id}"
+
+
+def _serialize(event) -> str:
+    return event if isinstance(event, str) else json.dumps(event, default=str)
+
+
+class Subscriber:
+    """A client's subscription: its topics and the bounded queue of serialized events waiting for it."""
+
+    def __init__(self, hub: "EventHub", topics: Iterable[str], max_queue: int, overflow: str,
+                 heartbeat: Optional[str] = None):
+        self.hub = hub
+        self.topics = set(topics)
+        self.overflow = overflow
+        # message of the heartbeat events, None for no heartbeats
+        self.heartbeat = heartbeat
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.closed = False
+        # closed by the hub for falling behind
+        self.overflowed = False
+
+    def offer(self, text: str) -> bool:
+        """Queue a serialized event without waiting. Returns False if the event was not queued."""
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait(text)
+            return True
+        except asyncio.QueueFull:
+            pass
+        if self.overflow == DISCONNECT:
+            logger.warning(f"Disconnecting a subscriber of {sorted(self.topics)}, {self.queue.maxsize} events behind")
+            self.overflowed = True
+            subscribers_overflowed.inc()
+            self.close()
+            return False
+        self.queue.get_nowait()
+        self.dropped += 1
+        events_dropped.inc()
+        self.queue.put_nowait(text)
+        return True
+
+    async def send_json(self, data):
+        """Send an event to this subscriber only, waiting for space in its queue instead of dropping."""
+        if not self.closed:
+            await self.queue.put(_serialize(data))
+
+    def subscribe(self, topic: str):
+        self.topics.add(topic)
+
+    def close(self):
+        """Stop the subscription, the client's writer sees None after the events already queued are dropped."""
+        if self.closed:
+            return
+        self.closed = True
+        self.hub.unsubscribe(self)
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+    async def get(self) -> Optional[str]:
+        """Next serialized event, None once the subscription is closed."""
+        if self.closed and self.queue.empty():
+            return None
+        return await self.queue.get()
+
+    def info(self) -> dict:
+        return {"topics": sorted(self.topics), "queued": self.queue.qsize(), "dropped": self.dropped}
+
+
+class EventStream:
+    """
+    Numbered events of one topic, with a ring buffer of the most recent ones for catch-up.
+
+    Websocket-like, so code written against websocket.send_json can publish to it.
+    """
+
+    def __init__(self, hub: "EventHub", topic: str, buffer_size: int, first_seq: int = 0):
+        self.hub = hub
+        self.topic = topic
+        # (seq, serialized event)
+        self.buffer: deque = deque(maxlen=buffer_size)
+        self.next_seq = first_seq
+        self.closed = False
+
+    async def send_text(self, text: str):
+        """Publish an event already serialized with "seq" set to next_seq."""
+        self.buffer.append((self.next_seq, text))
+        self.next_seq += 1
+        self.hub.publish(self.topic, text)
+
+    async def send_json(self, data):
+        await self.send_text(_serialize({**data, "seq": self.next_seq}))
+
+    def events_after(self, after: int) -> list[str]:
+        """The buffered events with a seq of at least `after`."""
+        return [text for seq, text in self.buffer if seq >= after]
+
+    def info(self) -> dict:
+        return {
+            "topic": self.topic,
+            "next_seq": self.next_seq,
+            # events before this one are only in the search checkpoint
+            "first_buffered_seq": self.buffer[0][0] if self.buffer else self.next_seq,
+            "observers": self.hub.count(self.topic),
+            "closed": self.closed,
+        }
+
+
+class EventHub:
+    """Fans published events out to the bounded queues of the subscribers of their topic."""
+
+    def __init__(self, max_queue: int = 1000, overflow: str = DROP_OLDEST, heartbeat_seconds: float = 1.0,
+                 stream_buffer: int = 256, max_streams: int = 32):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {OVERFLOW_POLICIES}, got {overflow!r}")
+        self.max_queue = max_queue
+        self.overflow = overflow
+        self.heartbeat_seconds = heartbeat_seconds
+        self.stream_buffer = stream_buffer
+        self.max_streams = max_streams
+        self.subscribers: list[Subscriber] = []
+        self.streams: "OrderedDict[str, EventStream]" = OrderedDict()
+        self._heartbeat_task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_env(cls) -> "EventHub":
+        return cls(
+            max_queue=int(os.getenv("EVENT_HUB_QUEUE_SIZE", 1000)),
+            overflow=os.getenv("EVENT_HUB_OVERFLOW", DROP_OLDEST),
+            heartbeat_seconds=float(os.getenv("EVENT_HUB_HEARTBEAT_SECONDS", 1)),
+            stream_buffer=int(os.getenv("EVENT_HUB_STREAM_BUFFER", 256)),
+            max_streams=int(os.getenv("EVENT_HUB_MAX_STREAMS", 32)),
+        )
+
+    def subscribe(self, topics: Iterable[str], heartbeat: Optional[str] = None, max_queue: Optional[int] = None,
+                  overflow: Optional[str] = None) -> Subscriber:
+        """
+        Subscribe a client, from the server's event loop.
+
+        Args:
+            topics: Topics to receive the events of, more can be added with Subscriber.subscribe
+            heartbeat: Message of the heartbeat events sent while the client is idle, None for no heartbeats
+            max_queue: Queue size of this subscriber, the hub's by default
+            overflow: Overflow policy of this subscriber, the hub's by default
+        """
+        subscriber = Subscriber(self, topics, max_queue or self.max_queue, overflow or self.overflow, heartbeat)
+        self.subscribers.append(subscriber)
+        task = self._heartbeat_task
+        if heartbeat is not None and (task is None or task.done() or task.get_loop() is not asyncio.get_running_loop()):
+            self._heartbeat_task = asyncio.create_task(self._send_heartbeats())
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        if subscriber in self.subscribers:
+            self.subscribers.remove(subscriber)
+
+    def publish(self, topic: str, event) -> int:
+        """
+        Queue an event for every subscriber of the topic, from the server's event loop. Never waits.
+
+        Returns:
+            int: Number of subscribers the event was queued for
+        """
+        text = None
+        delivered = 0
+        for subscriber in list(self.subscribers):
+            if topic in subscriber.topics:
+                if text is None:
+                    text = _serialize(event)
+                delivered += subscriber.offer(text)
+        return delivered
+
+    def stream(self, topic: str, first_seq: int = 0) -> EventStream:
+        """A new stream on the topic, observable once added with add_stream."""
+        return EventStream(self, topic, self.stream_buffer, first_seq=first_seq)
+
+    def add_stream(self, stream: EventStream):
+        """Make the stream observable, replacing a finished stream of the same topic."""
+        self.streams.pop(stream.topic, None)
+        self.streams[stream.topic] = stream
+
+    def close_stream(self, stream: EventStream):
+        """Mark the stream finished, it stays available for catch-up until max_streams newer ones finished."""
+        stream.closed = True
+        closed = [topic for topic, other in self.streams.items() if other.closed]
+        for topic in closed[:max(len(closed) - self.max_streams, 0)]:
+            del self.streams[topic]
+
+    def observe(self, subscriber: Subscriber, topic: str, after: int = 0) -> Optional[dict]:
+        """
+        Subscribe to a stream, first queueing its buffered events with a seq of at least `after`.
+
+        Catch-up and subscription happen without yielding to the event loop, so no event is
+        missed or queued twice between them.
+
+        Returns:
+            Optional[dict]: Info of the stream, None if there is no such stream
+        """
+        stream = self.streams.get(topic)
+        if stream is None:
+            return None
+        for text in stream.events_after(after):
+            subscriber.offer(text)
+        subscriber.subscribe(topic)
+        return stream.info()
+
+    def count(self, topic: str) -> int:
+        return sum(1 for subscriber in self.subscribers if topic in subscriber.topics)
+
+    async def _send_heartbeats(self):
+        while any(subscriber.heartbeat is not None for subscriber in self.subscribers):
+            await asyncio.sleep(self.heartbeat_seconds)
+            timestamp = datetime.utcnow().isoformat()
+            sent = 0
+            for subscriber in list(self.subscribers):
+                # a client with events waiting knows the server is alive
+                if subscriber.heartbeat is not None and subscriber.queue.empty():
+                    sent += subscriber.offer(_serialize({
+                        "type": "ping",
+                        "message": subscriber.heartbeat,
+                        "timestamp": timestamp
+                    }))
+            logger.debug(f"Sent heartbeat to {sent} clients")
+
+
+async def pump_websocket(websocket, subscriber: Subscriber):
+    """Write the events of a subscriber to its websocket until the subscription ends, closing the socket if the hub dropped it."""
+    try:
+        while True:
+            text = await subscriber.get()
+            if text is None:
+                if subscriber.overflowed:
+                    # try again later, a tree search client can replay what it missed
+                    await websocket.close(code=1013)
+                return
+            await websocket.send_text(text)
+    except Exception as e:
+        logger.info(f"Stopped sending to a websocket client: {e}")
+    finally:
+        subscriber.close()
+
+
+event_hub = EventHub.from_env()
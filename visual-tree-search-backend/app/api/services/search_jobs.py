@@ -0,0 +1,424 @@
+"""Job queue for the tree searches started with /api/tree-search/run.
+
+Searches run in a fixed pool of worker processes, each with its own event loop and browser
+sessions, so the number of concurrent searches (and browsers) is bounded. Submitted jobs
+wait in a bounded queue, and submissions beyond it are rejected. Job status, config and
+results are kept in SQLite, so they survive restarts of the server. A worker process that
+dies (crash, out of memory, killed) fails its running job and is replaced. The workers send the
+metrics they record (LLM requests, browsers, search phases) to the server every few seconds,
+which serves them on /metrics with its own.
+
+Configuration (environment variables):
+    TREE_SEARCH_MAX_CONCURRENT: number of worker processes, default 2
+    TREE_SEARCH_MAX_QUEUED: number of jobs waiting for a worker, default 16
+    TREE_SEARCH_DB_PATH: SQLite database file, default tree_search_jobs.db
+"""
+
+import asyncio
+import importlib
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from ..lwats.webagent_utils_async.utils.metrics import drain_process_metrics, merge_process_metrics
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+RUNNING = "running"
+CANCELLING = "cancelling"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+DEFAULT_RUNNER = "app.api.services.search_jobs:run_tree_search"
+# how often a worker checks whether its running job was cancelled
+CANCEL_POLL_SECONDS = 0.5
+STOP_TIMEOUT_SECONDS = 10
+# how often the server checks that the worker processes are alive
+WORKER_CHECK_SECONDS = 1
+# how often a worker sends the metrics of its running job to the server
+METRICS_FLUSH_SECONDS = 5
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class SearchJobStore:
+    """Tree search jobs in a SQLite table, shared by the server and the worker processes."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS search_jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    config TEXT NOT NULL,
+                    results TEXT,
+                    error TEXT,
+                    worker INTEGER,
+                    created_at TEXT NOT NULL,
+                    started_at TEXT,
+                    completed_at TEXT
+                )
+            """)
+
+    def close(self):
+        self._conn.close()
+
+    def _execute(self, sql: str, params=()) -> int:
+        with self._lock, self._conn:
+            return self._conn.execute(sql, params).rowcount
+
+    def _fetchall(self, sql: str, params=()) -> list:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    @staticmethod
+    def _to_dict(row) -> dict:
+        job = dict(row)
+        job["config"] = json.loads(job["config"])
+        job["results"] = json.loads(job["results"]) if job["results"] is not None else None
+        return job
+
+    def create(self, job_id: str, config: dict) -> dict:
+        self._execute(
+            "INSERT INTO search_jobs (id, status, config, created_at) VALUES (?, ?, ?, ?)",
+            (job_id, PENDING, json.dumps(config), datetime.now(timezone.utc).isoformat()),
+        )
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        rows = self._fetchall("SELECT * FROM search_jobs WHERE id = ?", (job_id,))
+        return self._to_dict(rows[0]) if rows else None
+
+    def status(self, job_id: str) -> Optional[str]:
+        rows = self._fetchall("SELECT status FROM search_jobs WHERE id = ?", (job_id,))
+        return rows[0]["status"] if rows else None
+
+    def list_jobs(self) -> list[dict]:
+        rows = self._fetchall(
+            "SELECT id, status, created_at, started_at, completed_at FROM search_jobs ORDER BY created_at"
+        )
+        return [dict(row) for row in rows]
+
+    def count_by_status(self) -> dict[str, int]:
+        rows = self._fetchall("SELECT status, COUNT(*) AS jobs FROM search_jobs GROUP BY status")
+        return {row["status"]: row["jobs"] for row in rows}
+
+    def transition(self, job_id: str, from_status: str, to_status: str, **columns) -> bool:
+        """Set the status (and other columns) of the job, only if it currently has from_status."""
+        assignments = ", ".join(f"{name} = ?" for name in ["status", *columns])
+        return self._execute(
+            f"UPDATE search_jobs SET {assignments} WHERE id = ? AND status = ?",
+            (to_status, *columns.values(), job_id, from_status),
+        ) == 1
+
+    def finish(self, job_id: str, status: str, results=None, error: Optional[str] = None):
+        self._execute(
+            "UPDATE search_jobs SET status = ?, results = ?, error = ?, completed_at = ? WHERE id = ?",
+            (
+                status,
+                json.dumps(results, default=str) if results is not None else None,
+                error,
+                datetime.now(timezone.utc).isoformat(),
+                job_id,
+            ),
+        )
+
+    def fail_worker_jobs(self, worker_id: int, error: str) -> int:
+        """Fail the jobs a worker was running when it died. Returns the number of jobs failed."""
+        return self._execute(
+            "UPDATE search_jobs SET status = ?, error = ?, completed_at = ? WHERE worker = ? AND status IN (?, ?)",
+            (FAILED, error, datetime.now(timezone.utc).isoformat(), worker_id, RUNNING, CANCELLING),
+        )
+
+    def recover(self) -> list[str]:
+        """
+        Fail the jobs that were running when the server stopped.
+
+        Returns:
+            list[str]: Ids of the jobs that were still queued, in submission order
+        """
+        self._execute(
+            "UPDATE search_jobs SET status = ?, error = ?, completed_at = ? WHERE status IN (?, ?)",
+            (FAILED, "Interrupted by a server restart", datetime.now(timezone.utc).isoformat(), RUNNING, CANCELLING),
+        )
+        rows = self._fetchall("SELECT id FROM search_jobs WHERE status = ? ORDER BY created_at", (PENDING,))
+        return [row["id"] for row in rows]
+
+
+def serialize_results(results):
+    """JSON friendly form of what agent.run() returns (a node, a list of nodes or plain data)."""
+    if hasattr(results, "get_trajectory"):
+        return {
+            "trajectory": results.get_trajectory(),
+            "value": results.value,
+            "depth": results.depth,
+        }
+    if isinstance(results, (list, tuple)):
+        return [serialize_results(item) for item in results]
+    return results
+
+
+async def run_tree_search(args_dict: dict):
+    """Run one tree search to completion, in the worker's event loop."""
+    from ..lwats.core_async.agent_factory import setup_search_agent
+    from ..lwats.core_async.config import AgentConfig, filter_valid_config_args
+
+    logger.info(f"Running tree search with args: {args_dict}")
+    if not args_dict.get("starting_url"):
+        raise ValueError("starting_url is required")
+
+    agent_config = AgentConfig(**filter_valid_config_args(args_dict))
+    setup = await setup_search_agent(
+        agent_type=args_dict["agent_type"],
+        starting_url=args_dict["starting_url"],
+        goal=args_dict["goal"],
+        images=args_dict.get("images", []),
+        agent_config=agent_config
+    )
+    if isinstance(setup, dict):
+        raise ValueError(setup["error"])
+    agent, _ = setup
+    try:
+        return serialize_results(await agent.run())
+    finally:
+        # the agent replaces its playwright manager on every browser reset
+        await agent.playwright_manager.close()
+
+
+def _load_runner(runner: str):
+    module_name, function_name = runner.split(":")
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def _send_metrics(metrics_queue):
+    drained = drain_process_metrics()
+    if drained["metrics"] or drained["phases"]:
+        metrics_queue.put(drained)
+
+
+async def _run_job(store: SearchJobStore, job: dict, runner, cancel_event, metrics_queue) -> tuple:
+    """Run the job, cancelling it when the server asks to. Returns (status, results, error)."""
+    task = asyncio.ensure_future(runner(job["config"]))
+    flushed_at = time.monotonic()
+    while not task.done():
+        await asyncio.wait({task}, timeout=CANCEL_POLL_SECONDS)
+        if time.monotonic() - flushed_at >= METRICS_FLUSH_SECONDS:
+            _send_metrics(metrics_queue)
+            flushed_at = time.monotonic()
+        if cancel_event.is_set():
+            cancel_event.clear()
+            # the event may be left over from a job that finished before it was noticed
+            if store.status(job["id"]) == CANCELLING:
+                task.cancel()
+    try:
+        return COMPLETED, task.result(), None
+    except asyncio.CancelledError:
+        return CANCELLED, None, None
+    except Exception as e:
+        logger.exception(f"Search job {job['id']} failed")
+        return FAILED, None, str(e)
+
+
+def _worker_main(worker_id: int, db_path: str, runner: str, job_queue, cancel_event, stop_event, metrics_queue):
+    """Worker process: runs the queued jobs one at a time in its own event loop, until the server stops."""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    store = SearchJobStore(db_path)
+    run = _load_runner(runner)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        while True:
+            job_id = job_queue.get()
+            # a job taken while stopping stays pending, it is queued again on the next start
+            if job_id is None or stop_event.is_set():
+                break
+            cancel_event.clear()
+            # skips the jobs cancelled while they were queued
+            if not store.transition(job_id, PENDING, RUNNING, worker=worker_id,
+                                    started_at=datetime.now(timezone.utc).isoformat()):
+                continue
+            logger.info(f"Worker {worker_id} running search job {job_id}")
+            status, results, error = loop.run_until_complete(
+                _run_job(store, store.get(job_id), run, cancel_event, metrics_queue)
+            )
+            store.finish(job_id, status, results=results, error=error)
+            _send_metrics(metrics_queue)
+            logger.info(f"Worker {worker_id} finished search job {job_id}: {status}")
+    finally:
+        loop.close()
+        store.close()
+
+
+class SearchJobManager:
+    """Bounded job queue served by a pool of worker processes."""
+
+    def __init__(self, db_path: str, max_concurrent: int = 2, max_queued: int = 16, runner: str = DEFAULT_RUNNER):
+        self.db_path = db_path
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.runner = runner
+        self._ctx = multiprocessing.get_context("spawn")
+        self._store = None
+        self._job_queue = None
+        self._metrics_queue = None
+        self._metrics_thread = None
+        self._monitor_thread = None
+        self._stopping = threading.Event()
+        # tells the workers to take no new job, shared with them
+        self._stop_event = None
+        self._cancel_events = []
+        self._workers = []
+
+    @classmethod
+    def from_env(cls) -> "SearchJobManager":
+        return cls(
+            db_path=os.getenv("TREE_SEARCH_DB_PATH", "tree_search_jobs.db"),
+            max_concurrent=int(os.getenv("TREE_SEARCH_MAX_CONCURRENT", 2)),
+            max_queued=int(os.getenv("TREE_SEARCH_MAX_QUEUED", 16)),
+        )
+
+    @property
+    def store(self) -> SearchJobStore:
+        if self._store is None:
+            self._store = SearchJobStore(self.db_path)
+        return self._store
+
+    @property
+    def started(self) -> bool:
+        return bool(self._workers)
+
+    def start(self):
+        if self.started:
+            return
+        self._job_queue = self._ctx.Queue(maxsize=self.max_queued)
+        for job_id in self.store.recover():
+            try:
+                self._job_queue.put_nowait(job_id)
+            except queue.Full:
+                self.store.finish(job_id, FAILED, error="Job queue full after a server restart")
+        self._metrics_queue = self._ctx.Queue()
+        self._metrics_thread = threading.Thread(target=self._merge_worker_metrics, args=(self._metrics_queue,),
+                                                name="tree-search-worker-metrics", daemon=True)
+        self._metrics_thread.start()
+        self._stopping.clear()
+        self._stop_event = self._ctx.Event()
+        for worker_id in range(self.max_concurrent):
+            self._cancel_events.append(self._ctx.Event())
+            self._workers.append(self._start_worker(worker_id))
+        self._monitor_thread = threading.Thread(target=self._monitor_workers, name="tree-search-worker-monitor",
+                                                daemon=True)
+        self._monitor_thread.start()
+        logger.info(f"Started {self.max_concurrent} tree search workers, up to {self.max_queued} queued jobs")
+
+    def _start_worker(self, worker_id: int):
+        worker = self._ctx.Process(
+            target=_worker_main,
+            args=(worker_id, self.db_path, self.runner, self._job_queue, self._cancel_events[worker_id],
+                  self._stop_event, self._metrics_queue),
+            name=f"tree-search-worker-{worker_id}",
+            daemon=True,
+        )
+        worker.start()
+        return worker
+
+    def _monitor_workers(self):
+        """Fail the job of a worker that died and start a replacement, until stop()."""
+        while not self._stopping.wait(WORKER_CHECK_SECONDS):
+            for worker_id, worker in enumerate(self._workers):
+                if worker.is_alive() or self._stopping.is_set():
+                    continue
+                failed = self.store.fail_worker_jobs(worker_id, f"Worker process exited with code {worker.exitcode}")
+                logger.error(f"Tree search worker {worker_id} exited with code {worker.exitcode}, "
+                             f"failed {failed} running job(s), starting a replacement")
+                self._cancel_events[worker_id].clear()
+                self._workers[worker_id] = self._start_worker(worker_id)
+
+    @staticmethod
+    def _merge_worker_metrics(metrics_queue):
+        """Add the metrics sent by the workers to the registry of the server, until stop()."""
+        while True:
+            drained = metrics_queue.get()
+            if drained is None:
+                break
+            merge_process_metrics(drained)
+
+    def stop(self, timeout: float = STOP_TIMEOUT_SECONDS):
+        """
+        Stop the workers after their current job, running jobs left after the timeout are killed.
+
+        Queued jobs are not started, they stay pending and run after the next start().
+        """
+        if not self.started:
+            return
+        self._stopping.set()
+        self._stop_event.set()
+        self._monitor_thread.join()
+        for _ in self._workers:
+            try:
+                self._job_queue.put(None, timeout=timeout)
+            except queue.Full:
+                break
+        for worker in self._workers:
+            worker.join(timeout)
+            if worker.is_alive():
+                worker.terminate()
+                worker.join()
+        self._job_queue.close()
+        self._metrics_queue.put(None)
+        self._metrics_thread.join(timeout)
+        self._metrics_queue.close()
+        self._workers = []
+        self._cancel_events = []
+
+    def submit(self, config: dict) -> dict:
+        """
+        Queue a tree search.
+
+        Raises:
+            QueueFullError: max_queued jobs are already waiting for a worker
+        """
+        self.start()
+        job_id = f"search_{datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S_%f')}"
+        job = self.store.create(job_id, config)
+        try:
+            self._job_queue.put_nowait(job_id)
+        except queue.Full:
+            self.store.finish(job_id, FAILED, error="Job queue full")
+            raise QueueFullError(f"{self.max_queued} searches are already queued, try again later")
+        return job
+
+    def cancel(self, job_id: str) -> Optional[str]:
+        """
+        Cancel a queued or running search.
+
+        Returns:
+            Optional[str]: The status of the job afterwards, None if there is no such job
+        """
+        if self.store.status(job_id) is None:
+            return None
+        if self.store.transition(job_id, PENDING, CANCELLED, completed_at=datetime.now(timezone.utc).isoformat()):
+            return CANCELLED
+        if self.started and self.store.transition(job_id, RUNNING, CANCELLING):
+            # picked up by the worker on its next poll, the job then ends as cancelled
+            self._cancel_events[self.store.get(job_id)["worker"]].set()
+            return CANCELLING
+        return self.store.status(job_id)
+
+
+job_manager = SearchJobManager.from_env()
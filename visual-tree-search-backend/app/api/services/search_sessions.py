@@ -0,0 +1,319 @@
+"""Search sessions for the /tree-search-ws websocket.
+
+Every search started over the websocket becomes a session. It runs in its own thread and
+event loop, so the blocking LLM calls and sleeps in the agents never stall the websocket,
+which keeps answering pings and control messages (pause, resume, cancel, budget changes).
+A session uses one browser and has at most one LLM request in flight. The number of
+sessions running at once is bounded, further searches wait in a bounded queue or are
+rejected. Each session checkpoints its search tree and events to a file named after the
+session, so it can be resumed and its events replayed under the same search id.
+
+Configuration (environment variables):
+    TREE_SEARCH_WS_MAX_SESSIONS: searches running at the same time, default 2
+    TREE_SEARCH_WS_MAX_QUEUED: searches waiting for a free slot, default 4
+    TREE_SEARCH_CHECKPOINT_DIR: directory of the search checkpoints, default checkpoints
+"""
+
+import asyncio
+import logging
+import os
+import re
+import threading
+import uuid
+from datetime import datetime
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+PAUSED = "paused"
+CANCELLED = "cancelled"
+FINISHED = "finished"
+
+# config fields a client may change while its search runs
+BUDGET_FIELDS = ("iterations", "max_depth", "num_simulations", "branching_factor")
+
+
+SEARCH_ID_PATTERN = re.compile(r"session_[0-9a-f]{12}")
+
+
+class CapacityError(Exception):
+    pass
+
+
+def new_search_id() -> str:
+    return f"session_{uuid.uuid4().hex[:12]}"
+
+
+def parse_int(value, name: str, minimum: int = 0) -> int:
+    """
+    An integer field of a client message.
+
+    Raises:
+        ValueError: value is not an integer (bools and fractions included) or is below minimum
+    """
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError(f"{name} must be an integer, got {value!r}")
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be an integer, got {value!r}") from None
+    if number < minimum:
+        raise ValueError(f"{name} must be at least {minimum}, got {number}")
+    return number
+
+
+def parse_budget(budget) -> dict:
+    """
+    The budget fields of a client message, e.g. {"iterations": 5}, other fields are ignored.
+
+    Raises:
+        ValueError: budget is not an object, or one of its fields is not a positive integer
+    """
+    if not isinstance(budget, dict):
+        raise ValueError(f"budget must be an object, got {budget!r}")
+    return {k: parse_int(v, k, minimum=1) for k, v in budget.items() if k in BUDGET_FIELDS}
+
+
+def checkpoint_path(search_id: str) -> Optional[str]:
+    """Checkpoint file of a search, None if search_id is not a valid search id."""
+    if not isinstance(search_id, str) or not SEARCH_ID_PATTERN.fullmatch(search_id):
+        return None
+    return os.path.join(os.getenv("TREE_SEARCH_CHECKPOINT_DIR", "checkpoints"), f"{search_id}.jsonl")
+
+
+class ThreadSafeWebSocket:
+    """Sends the messages of a search running in another thread over the websocket, on the server loop."""
+
+    def __init__(self, websocket, loop: asyncio.AbstractEventLoop):
+        self.websocket = websocket
+        self.loop = loop
+
+    async def send_json(self, data):
+        await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self.websocket.send_json(data), self.loop))
+
+    async def send_text(self, text: str):
+        await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self.websocket.send_text(text), self.loop))
+
+
+class SearchControl:
+    """
+    Pause, resume and cancel of one search, callable from any thread.
+
+    The agent waits in wait_if_paused between search steps, cancel interrupts the search at its next await.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop = None
+        self._task = None
+        self._resume = None
+        self.paused = False
+        self.cancelled = False
+
+    def bind(self, task: asyncio.Task):
+        """Attach the search task, from the search thread."""
+        with self._lock:
+            self._loop = task.get_loop()
+            self._task = task
+            self._resume = asyncio.Event()
+            if not self.paused:
+                self._resume.set()
+            if self.cancelled:
+                task.cancel()
+
+    def _call_in_search_loop(self, callback):
+        with self._lock:
+            if self._loop is not None and not self._loop.is_closed():
+                self._loop.call_soon_threadsafe(callback)
+
+    async def wait_if_paused(self):
+        await self._resume.wait()
+
+    def pause(self):
+        self.paused = True
+        self._call_in_search_loop(lambda: self._resume.clear())
+
+    def resume(self):
+        self.paused = False
+        self._call_in_search_loop(lambda: self._resume.set())
+
+    def cancel(self):
+        self.cancelled = True
+        self._call_in_search_loop(lambda: self._task.cancel())
+
+
+class SearchSession:
+    def __init__(self, connection_id: str, message: dict, search_id: Optional[str] = None):
+        # a resumed search keeps the id, and so the checkpoint file, of the search it continues
+        self.id = search_id or new_search_id()
+        self.connection_id = connection_id
+        self.message = message
+        self.control = SearchControl()
+        self.status = QUEUED
+        self.created_at = datetime.utcnow().isoformat()
+        self.agent = None
+        # set when the session gets a slot
+        self.slot = asyncio.Event()
+        # budget changes made before the agent exists
+        self.budget = {}
+        self.task: Optional[asyncio.Task] = None
+        # keeps running when its connection closes, for observers and a reconnecting client
+        self.keep_running = bool(message.get("keep_running", False))
+        self.cancel_reported = False
+
+    def set_budget(self, budget: dict) -> dict:
+        """
+        Change the search budget, e.g. {"iterations": 5}. Returns the fields that were applied.
+
+        Raises:
+            ValueError: The budget is invalid, nothing is applied then
+        """
+        applied = parse_budget(budget)
+        self.budget.update(applied)
+        if self.agent is not None:
+            # plain attribute writes, read by the agent at its next iteration
+            for field_name, value in applied.items():
+                setattr(self.agent.config, field_name, value)
+        return applied
+
+    async def report_cancelled(self, websocket):
+        """
+        Tell the client the search was cancelled, once.
+
+        run_search calls it with the websocket that records its events, before closing the checkpoint,
+        so the notice is numbered and replayed like the other events.
+        """
+        if self.cancel_reported:
+            return
+        self.cancel_reported = True
+        await websocket.send_json({
+            "type": "status_update",
+            "status": "cancelled",
+            "search_id": self.id,
+            "message": "Search cancelled",
+            "timestamp": datetime.utcnow().isoformat()
+        })
+
+    def info(self) -> dict:
+        status = self.status
+        if self.control.cancelled:
+            status = CANCELLED
+        elif status == RUNNING and self.control.paused:
+            status = PAUSED
+        return {
+            "search_id": self.id,
+            "status": status,
+            "created_at": self.created_at,
+            "budget": self.budget,
+        }
+
+
+class SearchSessionManager:
+    """Runs searches as tracked sessions, with a bound on running and queued sessions."""
+
+    def __init__(self, max_sessions: int = 2, max_queued: int = 4):
+        self.max_sessions = max_sessions
+        self.max_queued = max_queued
+        self.sessions: dict[str, SearchSession] = {}
+
+    @classmethod
+    def from_env(cls) -> "SearchSessionManager":
+        return cls(
+            max_sessions=int(os.getenv("TREE_SEARCH_WS_MAX_SESSIONS", 2)),
+            max_queued=int(os.getenv("TREE_SEARCH_WS_MAX_QUEUED", 4)),
+        )
+
+    def count(self, status: str) -> int:
+        return sum(1 for session in self.sessions.values() if session.status == status)
+
+    def submit(self, websocket, connection_id: str, message: dict, run_search,
+               search_id: Optional[str] = None) -> SearchSession:
+        """
+        Start a search session, or queue it when all slots are taken.
+
+        Args:
+            websocket: Where the search messages are sent, anything with an async send_json
+            connection_id: Id of the websocket connection, its sessions are cancelled when it closes
+            message: The start_search message
+            run_search: Coroutine function (websocket, message, session) running the search
+            search_id: Id of an earlier search to continue, a new id by default
+
+        Raises:
+            CapacityError: All slots are taken and the queue is full
+            ValueError: The search with this search_id is still running
+        """
+        if search_id is not None and search_id in self.sessions:
+            raise ValueError(f"Search {search_id} is still running")
+        if self.count(RUNNING) >= self.max_sessions and self.count(QUEUED) >= self.max_queued:
+            raise CapacityError(
+                f"{self.max_sessions} searches running and {self.max_queued} queued, try again later"
+            )
+        session = SearchSession(connection_id, message, search_id=search_id)
+        self.sessions[session.id] = session
+        self._start_queued()
+        session.task = asyncio.create_task(self._run(session, websocket, run_search))
+        return session
+
+    def _start_queued(self):
+        """Give the free slots to the queued sessions, oldest first."""
+        free = self.max_sessions - self.count(RUNNING)
+        for session in list(self.sessions.values()):
+            if free <= 0:
+                break
+            if session.status == QUEUED:
+                session.status = RUNNING
+                session.slot.set()
+                free -= 1
+
+    async def _run(self, session: SearchSession, websocket, run_search):
+        proxy = ThreadSafeWebSocket(websocket, asyncio.get_running_loop())
+        try:
+            await session.slot.wait()
+            if not session.control.cancelled:
+                await asyncio.to_thread(self._run_in_thread, session, proxy, run_search)
+        finally:
+            session.status = CANCELLED if session.control.cancelled else FINISHED
+            self.sessions.pop(session.id, None)
+            self._start_queued()
+
+    @staticmethod
+    def _run_in_thread(session: SearchSession, websocket: ThreadSafeWebSocket, run_search):
+        async def main():
+            session.control.bind(asyncio.current_task())
+            try:
+                await run_search(websocket, session.message, session)
+            except asyncio.CancelledError:
+                logger.info(f"Search session {session.id} cancelled")
+                try:
+                    # unless run_search already reported it
+                    await session.report_cancelled(websocket)
+                except Exception:
+                    pass
+
+        asyncio.run(main())
+
+    def get(self, search_id: str) -> Optional[SearchSession]:
+        return self.sessions.get(search_id)
+
+    def latest(self, connection_id: str) -> Optional[SearchSession]:
+        """The most recent session of the connection, for control messages without a search_id."""
+        for session in reversed(list(self.sessions.values())):
+            if session.connection_id == connection_id:
+                return session
+        return None
+
+    def cancel(self, session: SearchSession):
+        session.control.cancel()
+        if session.status == QUEUED and session.task is not None:
+            # never got a slot, no search thread to interrupt
+            session.task.cancel()
+
+    def cancel_connection(self, connection_id: str):
+        for session in list(self.sessions.values()):
+            if session.connection_id == connection_id and not session.keep_running:
+                self.cancel(session)
+
+
+session_manager = SearchSessionManager.from_env()
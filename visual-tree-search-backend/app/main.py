@@ -42,6 +42,7 @@ from app.api.routes.tree_websocket import router as tree_ws_router
 from app.api.routes.tree_search import router as tree_search_router
 from app.api.routes.tree_search_websocket import router as tree_search_ws_router
 from app.api.routes.terminate_session import router as terminate_session_router
+from app.api.routes.metrics import router as metrics_router
 # Include routers from different modules
 app.include_router(hello_router, prefix="/api/hello", tags=["hello"])
 app.include_router(sse_router, prefix="/api/sse", tags=["sse"])
@@ -50,6 +51,18 @@ app.include_router(tree_ws_router, prefix="/api/tree", tags=["tree"])
 app.include_router(tree_search_router, prefix="/api/tree-search", tags=["tree-search"])
 app.include_router(tree_search_ws_router, prefix="/api/tree-search-ws", tags=["tree-search-ws"])
 app.include_router(terminate_session_router, prefix="/api/terminate-session", tags=["terminate-session"])
+app.include_router(metrics_router, prefix="/metrics", tags=["metrics"])
+# Tree search job workers, queued jobs left from a previous run are picked up again
+from app.api.services.search_jobs import job_manager
+
+@app.on_event("startup")
+async def start_search_job_workers():
+    job_manager.start()
+
+@app.on_event("shutdown")
+async def stop_search_job_workers():
+    job_manager.stop()
+
 # Import the WebSocket endpoint handlers
 from app.api.routes.websocket import websocket_endpoint
 from app.api.routes.tree_websocket import tree_websocket_endpoint
@@ -0,0 +1,33 @@
+import sys
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.api.lwats.webagent_utils_async.action.highlevel import HighLevelActionSet, get_action_set
+
+
+def test_action_sets_are_shared_per_configuration():
+    action_set = get_action_set(subsets=["bid"], strict=False, multiaction=False, demo_mode="default")
+    assert get_action_set(subsets="bid", strict=False, multiaction=False, demo_mode="default") is action_set
+    assert get_action_set(subsets=["bid"], strict=False, multiaction=True, demo_mode="default") is not action_set
+    assert get_action_set(subsets=["bid", "nav"], strict=False, multiaction=False, demo_mode="default") is not action_set
+
+    # built once even when agents start at the same time
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        shared = list(pool.map(lambda _: get_action_set(subsets=["bid", "nav"], demo_mode="all_blue"), range(16)))
+    assert all(s is shared[0] for s in shared)
+
+
+def test_cached_descriptions_match_a_fresh_action_set():
+    action_set = get_action_set(subsets=["bid"], strict=False, multiaction=False, demo_mode="default")
+    fresh = HighLevelActionSet(subsets=["bid"], strict=False, multiaction=False, demo_mode="default")
+
+    description = action_set.describe(with_long_description=False, with_examples=True)
+    assert action_set.describe(with_long_description=False, with_examples=True) is description
+    assert description == fresh.describe(with_long_description=False, with_examples=True)
+    assert action_set.describe(with_long_description=True, with_examples=False) == \
+        fresh.describe(with_long_description=True, with_examples=False)
+    assert action_set.example_action(abstract=False) == fresh.example_action(abstract=False)
+    assert action_set.example_action(abstract=True) != action_set.example_action(abstract=False)
@@ -0,0 +1,112 @@
+import json
+import sys
+import os
+from types import SimpleNamespace
+
+import pytest
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.api.lwats.agents_async.SearchAgents.trajectory_score import parse_batch_scores, score_trajectories_batch
+
+
+class FakeCompletions:
+    def __init__(self, contents):
+        self.contents = list(contents)
+        self.calls = []
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=self.contents.pop(0)))])
+
+
+def fake_client(*contents):
+    return SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions(contents)))
+
+
+def batch(*entries):
+    return {"scores": [{"candidate": candidate, "overall_score": score} for candidate, score in entries]}
+
+
+def trajectories(count):
+    return [[{"natural_language_description": "Search shoes", "action": "fill('1', 'shoes')"},
+             {"natural_language_description": f"Open result {i}", "action": f"click('{i}')"}] for i in range(count)]
+
+
+def test_scores_are_returned_in_candidate_order():
+    assert parse_batch_scores(batch((2, 3), (1, 10), (3, 0)), 3) == [1.0, 0.3, 0.0]
+    assert parse_batch_scores(batch((1, 7.5)), 1) == [0.75]
+
+
+@pytest.mark.parametrize("evaluation", [
+    batch((1, 5)),  # too few scores
+    batch((1, 5), (2, 5), (3, 5)),  # too many scores
+    {"scores": {"1": 5, "2": 5}},  # not a list
+    {"overall_score": 5},  # a single evaluation
+    batch((1, 5), (1, 6)),  # duplicate candidate
+    batch((1, 5), (3, 6)),  # missing candidate 2, unknown candidate 3
+    batch((0, 5), (1, 6)),  # candidates are numbered from 1
+    batch(("2", 5), (1, 6)),  # candidate id as a string
+    {"scores": [{"candidate": 1, "overall_score": 5}, "2: 6"]},  # entry that is not an object
+    batch((1, 11), (2, 5)),  # above the 0-10 range
+    batch((1, -1), (2, 5)),  # below the 0-10 range
+    batch((1, "7"), (2, 5)),  # score as a string
+    batch((1, True), (2, 5)),  # score as a bool
+    {"scores": [{"candidate": 1}, {"candidate": 2, "overall_score": 5}]},  # missing score
+])
+def test_inconsistent_batches_are_rejected(evaluation):
+    with pytest.raises(ValueError):
+        parse_batch_scores(evaluation, 2)
+
+
+@pytest.mark.parametrize("content", [
+    "Candidate 1: 8/10, candidate 2: 3/10",  # not JSON
+    json.dumps(batch((1, 8))),  # fails the consistency checks
+])
+def test_failed_batch_returns_none(content):
+    client = fake_client(content)
+    assert score_trajectories_batch(trajectories(2), "Buy shoes", client) is None
+    assert len(client.chat.completions.calls) == 1
+
+
+def test_batch_is_one_request():
+    client = fake_client(json.dumps(batch((1, 8), (2, 3))))
+    assert score_trajectories_batch(trajectories(2), "Buy shoes", client, model="test-model") == [0.8, 0.3]
+    call, = client.chat.completions.calls
+    assert call["model"] == "test-model" and call["response_format"] == {"type": "json_object"}
+    assert "Candidate 2:" in call["messages"][1]["content"]
+
+
+@pytest.mark.parametrize("content,batch_scores", [
+    ("not json", None),
+    (json.dumps(batch((1, 8), (1, 3))), None),
+    (json.dumps(batch((1, 8), (2, 3))), [0.8, 0.3]),
+])
+def test_agent_falls_back_to_one_call_per_child(tmp_path, content, batch_scores):
+    from app.api.lwats.agents_async.SearchAgents.cassette import ReplayPlaywrightManager
+    from app.api.lwats.agents_async.SearchAgents.lats_node import LATSNode
+    from app.api.lwats.agents_async.SearchAgents.simple_search_agent import SimpleSearchAgent
+    from app.api.lwats.core_async.config import AgentConfig
+
+    agent = SimpleSearchAgent(starting_url="http://shop.test", messages=[], goal="Buy shoes", images=[],
+                              playwright_manager=ReplayPlaywrightManager(),
+                              config=AgentConfig(storage_state=None, batch_evaluation=True, log_folder=str(tmp_path)))
+    agent.llm_client = fake_client(content)
+    scored = []
+    agent.score_trajectory = lambda trajectory: scored.append(trajectory) or {"overall_score": 0.1 * len(scored)}
+    root = LATSNode(natural_language_description=None, action=None, prob=None, element=None, goal="Buy shoes")
+    children = []
+    for i in (1, 2):
+        child = LATSNode(natural_language_description=f"Open result {i}", action=f"click('{i}')", prob=0.5,
+                         element=None, goal="Buy shoes", parent=root)
+        root.add_child(child)
+        children.append(child)
+
+    scores = agent.score_children(children)
+    assert len(agent.llm_client.chat.completions.calls) == 1
+    if batch_scores is not None:
+        assert scores == batch_scores and scored == []
+    else:
+        assert scored == [child.get_trajectory() for child in children]
+        assert scores == pytest.approx([0.1, 0.2])
@@ -0,0 +1,95 @@
+import sys
+import os
+import urllib.error
+import urllib.request
+
+import pytest
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.api.benchmarks.fixture_site import serve_fixture_site
+from app.api.benchmarks.mock_llm import MockLLMClient, ScriptedTask
+from app.api.lwats.agents_async.SearchAgents.trajectory_score import (
+    create_llm_prompt, score_trajectories_batch, score_trajectory_lean, score_trajectory_with_openai,
+)
+from app.api.lwats.evaluation_async.evaluators import goal_finished_evaluator
+from app.api.lwats.webagent_utils_async.action.highlevel import get_action_set
+from app.api.lwats.webagent_utils_async.action.prompt_assembly import build_action_generation_messages
+from app.api.lwats.webagent_utils_async.action.prompt_functions import is_goal_finished, parse_actions_from_response
+
+GOAL = "Add the trail running shoes to the shopping cart"
+MILESTONES = ["Shoes", "Trail Running Shoes", "Add to Cart"]
+AXTREE = """
+# Current Accessibility Tree:
+RootWebArea 'Home - Fixture Shop'
+    [12] link 'Shoes'
+    [13] link 'Bags'
+    [14] link 'Jackets'
+"""
+
+
+def step(description, action):
+    return {"natural_language_description": description, "action": action}
+
+
+@pytest.mark.asyncio
+async def test_mock_client_drives_the_agents_parsers():
+    client = MockLLMClient(ScriptedTask(MILESTONES))
+    action_set = get_action_set(subsets=["bid"], strict=False, multiaction=False, demo_mode="default")
+
+    messages = build_action_generation_messages(action_set, GOAL, [], AXTREE, "")
+    response = client.chat.completions.create(model="gpt-4o", response_format={"type": "json_object"},
+                                              messages=messages, logprobs=True, n=4)
+    actions = await parse_actions_from_response(response, action_set, branching_factor=2)
+    assert actions[0]["action"] == "click('12')"
+    assert actions[0]["natural_language_description"] == "Click the link 'Shoes'"
+    assert actions[0]["prob"] > actions[1]["prob"]
+
+    good = [step("Click the link 'Shoes'", "click('12')")]
+    bad = [step("Click the link 'Bags'", "click('13')")]
+    assert score_trajectory_lean(create_llm_prompt(good, GOAL), client)["overall_score"] == pytest.approx(0.33)
+    assert score_trajectories_batch([good, bad], GOAL, client) == [pytest.approx(0.33), 0.0]
+    done = good + [step("Click the link 'Trail Running Shoes'", "click('31')"), step("Click the button 'Add to Cart'", "click('40')")]
+    evaluation = score_trajectory_with_openai(create_llm_prompt(done, GOAL), client)
+    assert evaluation["overall_score"] == 1.0 and "error" not in evaluation["metadata"]
+
+    # the goal checks after a rollout only list the actions, the client remembers what they were
+    finished, confidence = goal_finished_evaluator([{"role": "user", "content": "Action is: click('12')"}], client, GOAL, b"")
+    assert not finished and confidence == pytest.approx(0.95)
+    feedback = [{"role": "user", "content": f"action feedback is: {s['natural_language_description']}"} for s in done]
+    assert await is_goal_finished(feedback, client)
+
+    assert client.calls == {"action_generation": 1, "scoring": 1, "batch_scoring": 1, "verbose_scoring": 1, "goal_check": 2}
+
+
+def test_recorded_responses_replay_before_the_script():
+    client = MockLLMClient(responses={"scoring": ['{"overall_score": 4}']})
+    prompt = create_llm_prompt([step("Click the link 'Shoes'", "click('12')")], GOAL)
+    assert score_trajectory_lean(prompt, client)["overall_score"] == 0.4
+    # no recording left and no scripted task
+    assert "error" in score_trajectory_lean(prompt, client)["metadata"]
+
+
+def test_truncated_reason_keeps_the_streamed_score():
+    client = MockLLMClient(responses={"scoring": [
+        '{"overall_score": 7.5, "reason": "Search results for the \\"trail\\" shoes are sh',
+        '{"overall_score": 6, "reason": "Opened the product page."}',
+        '{"overall_score": 5',
+    ]})
+    prompt = create_llm_prompt([step("Click the link 'Shoes'", "click('12')")], GOAL)
+
+    evaluation = score_trajectory_lean(prompt, client, with_reason=True)
+    assert evaluation["overall_score"] == 0.75 and "error" not in evaluation["metadata"]
+    assert evaluation["reason"] == 'Search results for the "trail" shoes are sh'
+    assert score_trajectory_lean(prompt, client, with_reason=True)["reason"] == "Opened the product page."
+    # without a complete score there is nothing to keep
+    assert "error" in score_trajectory_lean(prompt, client, with_reason=True)["metadata"]
+
+
+def test_fixture_site_serves_the_shop():
+    with serve_fixture_site("shop") as base_url:
+        with urllib.request.urlopen(base_url + "shoes.html") as response:
+            assert "Trail Running Shoes" in response.read().decode()
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(base_url + "missing.html")
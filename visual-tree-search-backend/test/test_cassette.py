@@ -0,0 +1,155 @@
+import io
+import json
+import sys
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.api.benchmarks.mock_llm import MockLLMClient, ScriptedTask
+from app.api.lwats.agents_async.SearchAgents.cassette import (
+    REPLAY, Cassette, CassetteMiss, ReplayPlaywrightManager, attach_cassette,
+)
+from app.api.lwats.agents_async.SearchAgents.simple_search_agent import SimpleSearchAgent
+from app.api.lwats.agents_async.SearchAgents.tree_vis import collect_all_nodes
+from app.api.lwats.core_async.config import AgentConfig
+from app.api.lwats.webagent_utils_async.browser_env.extra_properties import BidProperties, extract_dom_extra_properties
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+GOAL = "Add the trail running shoes to the shopping cart"
+# page -> links on it, and the page each of them leads to
+SHOP = {
+    "Home": [("Shoes", "Shoes"), ("Bags", "Bags")],
+    "Shoes": [("Trail Running Shoes", "Trail Running Shoes"), ("Home", "Home")],
+    "Bags": [("Leather Backpack", "Leather Backpack"), ("Home", "Home")],
+    "Trail Running Shoes": [("Add to Cart", "Cart")],
+    "Leather Backpack": [("Add to Cart", "Cart")],
+    "Cart": [("Home", "Home")],
+}
+
+
+def shop_page_info(page):
+    nodes = [{"nodeId": "0", "role": {"value": "RootWebArea"}, "name": {"value": page}, "childIds": [], "properties": []}]
+    bids = []
+    for i, (name, _) in enumerate(SHOP[page], start=1):
+        bid = str(i)
+        bids.append(bid)
+        nodes[0]["childIds"].append(bid)
+        nodes.append({"nodeId": bid, "role": {"value": "link"}, "name": {"value": name}, "childIds": [],
+                      "properties": [{"name": "browsergym_id", "value": {"value": bid}}]})
+    # columnar, as extract_page_info returns them
+    extra_properties = BidProperties(
+        bids,
+        np.ones(len(bids)),
+        np.array([[0, 40 * i, 120, 40] for i in range(1, len(bids) + 1)], dtype=np.float64).reshape(-1, 4),
+        np.ones(len(bids), dtype=bool),
+        np.ones(len(bids), dtype=np.int8),
+    )
+    image = io.BytesIO()
+    Image.new("RGB", (32, 32), (len(page) * 7 % 256, 80, 160)).save(image, format="PNG")
+    return {"axtree": {"nodes": nodes}, "extra_properties": extra_properties, "interactive_elements": [],
+            "screenshot": image.getvalue(), "screenshot_som": image.getvalue()}
+
+
+class ShopBackend:
+    """Browser backend of the SHOP pages, following the clicked links."""
+
+    def __init__(self):
+        self.page = "Home"
+        self.observations = 0
+
+    async def launch(self, storage_state, headless, mode):
+        self.page = "Home"
+        return ReplayPlaywrightManager()
+
+    async def replay_step(self, node, goal, playwright_manager, log_folder):
+        self.follow(node.action)
+        return True
+
+    async def observe(self, page, fullpage, log_folder):
+        self.observations += 1
+        page.url = f"http://shop.test/{self.page}"
+        return shop_page_info(self.page)
+
+    async def locate(self, page, bid):
+        return {"unique_selector": f"#link-{bid}"}
+
+    async def execute(self, action, action_set, page, context, goal, interactive_elements, log_folder):
+        self.follow(action["action"])
+
+    def follow(self, action):
+        self.page = SHOP[self.page][int(action.split("'")[1]) - 1][1]
+
+
+def search_config(tmp_path, **kwargs):
+    return AgentConfig(max_depth=3, branching_factor=2, search_algorithm="bfs", storage_state=None,
+                       account_reset=False, page_settle_seconds=0, log_folder=str(tmp_path), **kwargs)
+
+
+def search_agent(config):
+    return SimpleSearchAgent(starting_url="http://shop.test/Home", messages=[], goal=GOAL, images=[],
+                             playwright_manager=ReplayPlaywrightManager(), config=config)
+
+
+def tree(agent):
+    return [(node.depth, node.action, node.value, node.feedback) for node in collect_all_nodes(agent.root_node)]
+
+
+@pytest.mark.asyncio
+async def test_replayed_search_matches_the_recording(tmp_path):
+    path = str(tmp_path / "shop.jsonl")
+    recorded = search_agent(search_config(tmp_path))
+    recorded.llm_client = MockLLMClient(ScriptedTask(["Shoes", "Trail Running Shoes", "Add to Cart"]))
+    recorded.browser_backend = backend = ShopBackend()
+    cassette = attach_cassette(recorded, path)
+    recorded_result = await recorded.bfs()
+    cassette.close()
+    assert backend.observations > 0
+
+    # replayed from the config, without the scripted LLM or the shop
+    replayed = search_agent(search_config(tmp_path, cassette=path, cassette_mode=REPLAY))
+    replayed_result = await replayed.bfs()
+
+    assert tree(replayed) == tree(recorded)
+    assert recorded_result.value == 1.0
+    assert [n.action for n in replayed.get_path_to_root(replayed_result)] == \
+        [n.action for n in recorded.get_path_to_root(recorded_result)]
+    assert replayed.cassette.header["agent_type"] == "SimpleSearchAgent"
+
+
+def test_cassette_replays_in_order_and_raises_on_a_miss(tmp_path):
+    path = str(tmp_path / "unit.jsonl")
+    cassette = Cassette(path)
+    cassette.write_header("SimpleSearchAgent", GOAL, "http://shop.test/Home", {})
+    cassette.record("step", [[], "click('1')"], success=False)
+    cassette.record("step", [[], "click('1')"], success=True)
+    cassette.record("observation", [], url="http://shop.test/Home", **cassette.save_page_info(shop_page_info("Home")))
+    cassette.close()
+
+    cassette = Cassette(path, REPLAY)
+    assert [cassette.take("step", [[], "click('1')"])["success"] for _ in range(3)] == [False, True, True]
+    assert cassette.load_page_info(cassette.take("observation", [])) == shop_page_info("Home")
+    with pytest.raises(CassetteMiss):
+        cassette.take("step", [[], "click('2')"])
+
+
+def test_page_info_keeps_its_extra_properties(tmp_path):
+    with open(os.path.join(FIXTURES, "dom_snapshot_iframe.json"), encoding="utf8") as f:
+        dom = json.load(f)
+    page_info = {**shop_page_info("Home"), "dom": dom, "extra_properties": extract_dom_extra_properties(dom)}
+    cassette = Cassette(str(tmp_path / "page.jsonl"))
+    record = cassette.save_page_info({**page_info, "_axtree_signature": ("cached",)})
+
+    loaded = cassette.load_page_info(record)
+    assert isinstance(loaded["extra_properties"], BidProperties)
+    assert loaded["extra_properties"].to_dict() == page_info["extra_properties"].to_dict()
+    assert loaded["extra_properties"].get("missing", {}).get("visibility", 0) == 0
+    assert "_axtree_signature" not in loaded
+    # anything else that is not JSON fails the recording instead of being stored as its repr
+    with pytest.raises(TypeError):
+        cassette.save_page_info({**page_info, "focused_element": object()})
@@ -0,0 +1,175 @@
+import asyncio
+import json
+import sys
+import os
+
+import pytest
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("numpy")
+
+from app.api.lwats.agents_async.SearchAgents import checkpoint as checkpoint_module
+from app.api.lwats.agents_async.SearchAgents.checkpoint import (
+    RecordingWebSocket, SearchCheckpointer, load_checkpoint, read_events,
+)
+from app.api.lwats.agents_async.SearchAgents.lats_node import LATSNode, Observation
+from app.api.lwats.webagent_utils_async.evaluation.feedback import Feedback
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.messages = []
+
+    async def send_text(self, text):
+        self.messages.append(json.loads(text))
+
+
+def make_tree():
+    root = LATSNode("Root Node", "ROOT", 1.0, None, "buy shoes")
+    for i in range(2):
+        child = LATSNode(f"click {i}", f"click('{i}')", 0.5, {"bid": str(i)}, "buy shoes", parent=root)
+        root.add_child(child)
+    return root
+
+
+def test_checkpoint_round_trip(tmp_path):
+    path = str(tmp_path / "session_0123456789ab.jsonl")
+    root = make_tree()
+    first, second = root.children
+    first.observation = Observation(text="page", image=b"\x89PNG fake")
+
+    checkpointer = SearchCheckpointer(path)
+    checkpointer.write_header({"type": "start_search", "goal": "buy shoes"})
+    assert checkpointer.save(root, completed_iterations=1) == 3
+
+    first.value, first.visits, first.evaluated = 0.8, 2, True
+    first.goal_finish_feedback = Feedback(is_done=False, explanation="not yet")
+    second.value = float("-inf")
+    assert checkpointer.save(root, completed_iterations=2) == 2
+    # nothing changed, only progress is written
+    assert checkpointer.save(root, completed_iterations=2) == 0
+    checkpointer.close()
+
+    checkpoint = load_checkpoint(path)
+    assert checkpoint.header["message"]["goal"] == "buy shoes"
+    assert checkpoint.completed_iterations == 2
+    loaded_first, loaded_second = checkpoint.root.children
+    assert [c.node_id for c in checkpoint.root.children] == [first.node_id, second.node_id]
+    assert (loaded_first.value, loaded_first.visits, loaded_first.evaluated) == (0.8, 2, True)
+    assert loaded_first.element == {"bid": "0"} and loaded_first.depth == 1
+    assert loaded_first.goal_finish_feedback.explanation == "not yet"
+    assert loaded_first.observation.image == b"\x89PNG fake"
+    assert loaded_second.value == float("-inf") and not loaded_second.evaluated
+
+    # a resumed search appends only what changes after the checkpoint
+    checkpointer = SearchCheckpointer(path, written=checkpoint.records)
+    assert checkpointer.save(checkpoint.root, completed_iterations=2) == 0
+    checkpointer.close()
+
+
+def test_recorded_events_replay(tmp_path):
+    path = str(tmp_path / "session_0123456789ab.jsonl")
+    checkpointer = SearchCheckpointer(path)
+    checkpointer.write_header({"type": "start_search"})
+    websocket = FakeWebSocket()
+    recording = RecordingWebSocket(websocket, checkpointer)
+    for i in range(3):
+        asyncio.run(recording.send_json({"type": "iteration_start", "iteration": i}))
+    checkpointer.save(make_tree())
+    checkpointer.close()
+
+    assert read_events(path) == websocket.messages
+    assert [event["seq"] for event in websocket.messages] == [0, 1, 2]
+    assert [event["iteration"] for event in read_events(path, after=2)] == [2]
+    assert load_checkpoint(path).event_count == 3
+
+
+def test_unchanged_nodes_are_not_hashed_or_synced_again(tmp_path, monkeypatch):
+    hashed, synced = [], []
+    save_blob = checkpoint_module._save_blob
+    monkeypatch.setattr(checkpoint_module, "_save_blob", lambda blob_dir, data: hashed.append(data) or save_blob(blob_dir, data))
+    monkeypatch.setattr(checkpoint_module.os, "fsync", synced.append)
+    root = make_tree()
+    first, second = root.children
+    first.observation = Observation(text="page", image=b"\x89PNG first")
+    second.observation = Observation(text="page", image_base64="iVBORyBzZWNvbmQ=")
+
+    checkpointer = SearchCheckpointer(str(tmp_path / "session.jsonl"))
+    checkpointer.write_header({"type": "start_search"})
+    assert checkpointer.save(root, completed_iterations=1) == 3
+    assert len(hashed) == 2 and len(synced) == 1
+    # a progress-only save hashes nothing and is not synced
+    assert checkpointer.save(root, completed_iterations=2) == 0
+    assert len(hashed) == 2 and len(synced) == 1
+
+    first.visits += 1
+    assert checkpointer.save(root, completed_iterations=3) == 1
+    assert len(hashed) == 2 and len(synced) == 2
+    # a new screenshot is hashed and written
+    first.observation = Observation(text="page", image=b"\x89PNG again")
+    assert checkpointer.save(root, completed_iterations=4) == 1
+    assert hashed[-1] == b"\x89PNG again"
+    checkpointer.close()
+
+    checkpoint = load_checkpoint(str(tmp_path / "session.jsonl"))
+    assert checkpoint.completed_iterations == 4
+    assert [c.observation.image for c in checkpoint.root.children] == [b"\x89PNG again", b"\x89PNG second"]
+
+
+EVENT_NODE_FIELDS = ("id", "node_id", "parent_id", "terminal_node_id", "terminal_node_parent_id")
+
+
+def event_node_ids(events):
+    ids = set()
+    for event in events:
+        nodes = [event] + event.get("tree", []) + event.get("trajectory", [])
+        ids.update(node[name] for node in nodes for name in EVENT_NODE_FIELDS if node.get(name) is not None)
+    return ids
+
+
+@pytest.mark.asyncio
+async def test_resumed_search_events_name_the_same_nodes(tmp_path):
+    from app.api.benchmarks.mock_llm import MockLLMClient, ScriptedTask
+    from app.api.lwats.agents_async.SearchAgents.cassette import ReplayPlaywrightManager
+    from app.api.lwats.agents_async.SearchAgents.lats_agent import LATSAgent
+    from app.api.lwats.agents_async.SearchAgents.simulator import SimulatorBackend, synthetic_shop
+    from app.api.lwats.core_async.config import AgentConfig
+
+    shop, goal = synthetic_shop(categories=3, products=3, seed=0)
+    path = str(tmp_path / "session.jsonl")
+
+    async def search(iterations, checkpoint=None):
+        agent = LATSAgent(starting_url=shop.states[shop.start].url, messages=[], goal=goal, images=[],
+                          playwright_manager=ReplayPlaywrightManager(),
+                          config=AgentConfig(branching_factor=2, max_depth=3, iterations=iterations, storage_state=None,
+                                             account_reset=False, page_settle_seconds=0, log_folder=str(tmp_path)))
+        agent.browser_backend = SimulatorBackend(shop)
+        agent.llm_client = MockLLMClient(ScriptedTask(shop.milestones(), seed=0))
+        agent.checkpointer = SearchCheckpointer(path, written=checkpoint.records if checkpoint is not None else None)
+        if checkpoint is None:
+            agent.checkpointer.write_header({"type": "start_search", "goal": goal})
+        else:
+            agent.resume_from_checkpoint(checkpoint)
+        websocket = RecordingWebSocket(FakeWebSocket(), agent.checkpointer,
+                                       first_seq=checkpoint.event_count if checkpoint is not None else 0)
+        await agent.run(websocket)
+        agent.save_checkpoint()
+        agent.checkpointer.close()
+
+    await search(iterations=1)
+    checkpoint = load_checkpoint(path)
+    replayed = read_events(path)
+    await search(iterations=3, checkpoint=checkpoint)
+    resumed = read_events(path, after=len(replayed))
+
+    assert [event["seq"] for event in replayed + resumed] == list(range(len(replayed) + len(resumed)))
+    # the resumed search goes on from the nodes of the replayed events, under their ids
+    replayed_tree = {node["id"] for node in [event for event in replayed if "tree" in event][-1]["tree"]}
+    resumed_trees = [{node["id"] for node in event["tree"]} for event in resumed if "tree" in event]
+    assert replayed_tree <= {node.node_id for node in checkpoint_module.collect_all_nodes(checkpoint.root)}
+    assert resumed_trees and all(replayed_tree <= tree for tree in resumed_trees)
+    replayed_ids, resumed_ids = event_node_ids(replayed), event_node_ids(resumed)
+    assert {event["node_id"] for event in resumed if event["type"] == "node_selected"} <= replayed_ids | resumed_ids
+    assert {event["parent_id"] for event in resumed if event["type"] == "node_created"} & replayed_tree
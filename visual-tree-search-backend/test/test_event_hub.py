@@ -0,0 +1,110 @@
+import asyncio
+import json
+import sys
+import os
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.api.services.event_hub import EventHub, pump_websocket, search_topic
+
+
+class SlowWebSocket:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.texts = []
+        self.close_code = None
+
+    async def send_text(self, text):
+        await asyncio.sleep(self.delay)
+        self.texts.append(json.loads(text))
+
+    async def close(self, code=1000):
+        self.close_code = code
+
+
+def drain(subscriber):
+    texts = []
+    while not subscriber.queue.empty():
+        text = subscriber.queue.get_nowait()
+        texts.append(None if text is None else json.loads(text))
+    return texts
+
+
+def test_publish_to_topics_with_overflow_policies():
+    async def scenario():
+        hub = EventHub(max_queue=3)
+        search = hub.subscribe([search_topic("a")])
+        other = hub.subscribe([search_topic("b")])
+        strict = hub.subscribe([search_topic("a")], overflow="disconnect")
+
+        for i in range(5):
+            hub.publish(search_topic("a"), {"i": i})
+        assert [event["i"] for event in drain(search)] == [2, 3, 4]
+        assert search.dropped == 2
+        assert drain(other) == []
+        # disconnected on the first event that did not fit
+        assert strict.closed and strict.overflowed and drain(strict) == [None]
+        assert hub.count(search_topic("a")) == 1
+
+    asyncio.run(scenario())
+
+
+def test_slow_client_does_not_delay_others():
+    async def scenario():
+        hub = EventHub(max_queue=100)
+        slow, fast = SlowWebSocket(delay=0.05), SlowWebSocket()
+        slow_subscriber, fast_subscriber = hub.subscribe(["tree-ws"]), hub.subscribe(["tree-ws"])
+        writers = [
+            asyncio.create_task(pump_websocket(slow, slow_subscriber)),
+            asyncio.create_task(pump_websocket(fast, fast_subscriber)),
+        ]
+        for i in range(10):
+            hub.publish("tree-ws", {"i": i})
+        await asyncio.sleep(0.02)
+        assert len(fast.texts) == 10 and len(slow.texts) < 10
+
+        slow_subscriber.close()
+        fast_subscriber.close()
+        await asyncio.gather(*writers)
+        assert slow.close_code is None
+
+    asyncio.run(scenario())
+
+
+def test_heartbeat_only_to_idle_subscribers():
+    async def scenario():
+        hub = EventHub(heartbeat_seconds=0.01)
+        idle = hub.subscribe(["sse"], heartbeat="Server heartbeat")
+        busy = hub.subscribe(["sse"], heartbeat="Server heartbeat")
+        quiet = hub.subscribe(["sse"])
+        await busy.send_json({"type": "connection"})
+        await asyncio.sleep(0.03)
+        pings = drain(idle)
+        assert pings and all(event["type"] == "ping" and event["message"] == "Server heartbeat" for event in pings)
+        assert [event["type"] for event in drain(busy)] == ["connection"]
+        assert drain(quiet) == []
+        for subscriber in (idle, busy, quiet):
+            subscriber.close()
+
+    asyncio.run(scenario())
+
+
+def test_observers_catch_up_from_the_stream_buffer():
+    async def scenario():
+        hub = EventHub(stream_buffer=3)
+        stream = hub.stream(search_topic("a"), first_seq=10)
+        hub.add_stream(stream)
+        starter = hub.subscribe([search_topic("a")])
+        for i in range(5):
+            await stream.send_json({"type": "iteration_start", "iteration": i})
+
+        observer = hub.subscribe([])
+        info = hub.observe(observer, search_topic("a"), after=13)
+        assert info["next_seq"] == 15 and info["first_buffered_seq"] == 12
+        await stream.send_json({"type": "search_complete"})
+        assert [event["seq"] for event in drain(observer)] == [13, 14, 15]
+        assert [event["seq"] for event in drain(starter)] == list(range(10, 16))
+        assert hub.observe(observer, search_topic("b")) is None
+
+    asyncio.run(scenario())
@@ -0,0 +1,72 @@
+import json
+import sys
+import os
+
+import pytest
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+np = pytest.importorskip("numpy")
+
+from app.api.lwats.webagent_utils_async.browser_env.extra_properties import (
+    BidProperties,
+    extract_dom_extra_properties,
+)
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf8") as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def dom_snapshot():
+    # top document with an iframe, scroll offsets, a bid duplicated in the frame,
+    # an empty bid, a node without client rects and a node with two layout entries
+    return load_fixture("dom_snapshot_iframe.json")
+
+
+def test_matches_previous_implementation(dom_snapshot):
+    # generated with the dict-based implementation this module replaced
+    expected = load_fixture("dom_snapshot_iframe_extra_properties.json")
+    extra_properties = extract_dom_extra_properties(dom_snapshot)
+
+    assert isinstance(extra_properties, BidProperties)
+    assert list(extra_properties) == list(expected)
+    assert extra_properties.to_dict() == expected
+    assert extra_properties == expected
+
+
+def test_lookup_types(dom_snapshot):
+    extra_properties = extract_dom_extra_properties(dom_snapshot)
+
+    assert "a1" in extra_properties
+    assert "missing" not in extra_properties
+    assert extra_properties.get("missing", {}).get("visibility", 0) == 0
+    assert extra_properties["a5"]["bbox"] is None
+    assert extra_properties["a1"]["visibility"] is None
+    assert extra_properties["a2"]["set_of_marks"] is False
+    assert type(extra_properties["a3"]["visibility"]) is float
+    assert type(extra_properties["a3"]["clickable"]) is bool
+    json.dumps(extra_properties.to_dict())
+
+
+def test_snapshot_without_bids():
+    snapshot = {
+        "strings": ["html"],
+        "documents": [{
+            "nodes": {
+                "parentIndex": [-1],
+                "attributes": [[]],
+                "isClickable": {"index": []},
+                "contentDocumentIndex": {"index": [], "value": []},
+            },
+            "layout": {"nodeIndex": [], "bounds": [], "clientRects": []},
+            "scrollOffsetX": 0,
+            "scrollOffsetY": 0,
+        }],
+    }
+    assert len(extract_dom_extra_properties(snapshot)) == 0
@@ -0,0 +1,91 @@
+import sys
+import os
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.api.lwats.webagent_utils_async.browser_env.obs import (
+    AXTREE_ELISION_MARKER, _estimate_tokens, flatten_axtree_to_str,
+)
+
+
+def ax_node(node_id, role, name, bid=None, children=()):
+    node = {"nodeId": node_id, "role": {"value": role}, "name": {"value": name}, "childIds": list(children),
+            "properties": []}
+    if bid is not None:
+        node["properties"].append({"name": "browsergym_id", "value": {"value": bid}})
+    return node
+
+
+def make_page():
+    axtree = {"nodes": [
+        ax_node("1", "RootWebArea", "Shop", bid="0", children=["2", "3", "7"]),
+        ax_node("2", "link", "Shoes", bid="1"),
+        ax_node("3", "paragraph", "About", bid="2", children=["4", "5", "6"]),
+        ax_node("4", "StaticText", "We sell shoes for trail running, hiking and the city since 1987."),
+        ax_node("5", "StaticText", "Free shipping on orders over fifty dollars, returns within thirty days."),
+        ax_node("6", "StaticText", "Our stores are open every day from nine in the morning to six."),
+        ax_node("7", "button", "Checkout", bid="3"),
+    ]}
+    extra_properties = {
+        "0": {"visibility": 1.0, "bbox": None, "clickable": False, "set_of_marks": None},
+        "1": {"visibility": 1.0, "bbox": None, "clickable": True, "set_of_marks": None},
+        "2": {"visibility": 1.0, "bbox": None, "clickable": False, "set_of_marks": None},
+        "3": {"visibility": 0.0, "bbox": None, "clickable": True, "set_of_marks": None},
+    }
+    return axtree, extra_properties
+
+
+def budget_of(*lines):
+    """Tokens needed to keep these lines: each may be followed by a marker, plus the leading one."""
+    marker = _estimate_tokens(AXTREE_ELISION_MARKER.format(indent="\t" * 8, count=99999))
+    return marker + sum(_estimate_tokens(line) + marker for line in lines)
+
+
+def test_budget_at_and_above_the_full_size_changes_nothing():
+    axtree, extra_properties = make_page()
+    full = flatten_axtree_to_str(axtree, extra_properties=extra_properties)
+    lines = full.split("\n")
+    total = sum(_estimate_tokens(line) for line in lines)
+
+    assert flatten_axtree_to_str(axtree, extra_properties=extra_properties, max_tokens=total) == full
+    assert flatten_axtree_to_str(axtree, extra_properties=extra_properties, max_tokens=total * 10) == full
+    # one token short, something is elided
+    assert "nodes elided" in flatten_axtree_to_str(axtree, extra_properties=extra_properties, max_tokens=total - 1)
+
+
+def test_budget_below_one_line_elides_everything():
+    axtree, extra_properties = make_page()
+    lines = flatten_axtree_to_str(axtree, extra_properties=extra_properties).split("\n")
+    for max_tokens in (0, 1, budget_of(lines[0]) - 1):
+        assert flatten_axtree_to_str(axtree, extra_properties=extra_properties, max_tokens=max_tokens) == \
+            f"... {len(lines)} nodes elided"
+
+
+def test_interactive_lines_are_kept_first_with_their_ancestors():
+    axtree, extra_properties = make_page()
+    lines = flatten_axtree_to_str(axtree, extra_properties=extra_properties).split("\n")
+    root, link = lines[0], lines[1]
+    assert link == "\t[1] link 'Shoes'"
+
+    exact = budget_of(root, link)
+    assert flatten_axtree_to_str(axtree, extra_properties=extra_properties, max_tokens=exact).split("\n") == \
+        [root, link, f"\t... {len(lines) - 2} nodes elided"]
+    # one token short of the link and its root, only the visible root fits
+    assert flatten_axtree_to_str(axtree, extra_properties=extra_properties, max_tokens=exact - 1).split("\n") == \
+        [root, f"\t... {len(lines) - 1} nodes elided"]
+
+    # visible nodes come next, the invisible checkout button last
+    kept = flatten_axtree_to_str(axtree, extra_properties=extra_properties,
+                                 max_tokens=budget_of(root, link, lines[2])).split("\n")
+    assert kept[:3] == lines[:3] and "Checkout" not in "\n".join(kept)
+
+
+def test_deep_tree_does_not_recurse():
+    depth = 5000
+    nodes = [ax_node(str(i), "group" if i else "RootWebArea", f"level {i}", bid=str(i),
+                     children=[str(i + 1)] if i + 1 < depth else []) for i in range(depth)]
+    flat = flatten_axtree_to_str({"nodes": nodes})
+    assert flat.count("\n") == depth - 1
+    assert flat.split("\n")[-1] == "\t" * (depth - 1) + f"[{depth - 1}] group 'level {depth - 1}'"
+    assert len(flatten_axtree_to_str({"nodes": nodes}, max_tokens=200)) < len(flat)
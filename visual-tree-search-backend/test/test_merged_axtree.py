@@ -0,0 +1,120 @@
+import asyncio
+import sys
+import os
+
+import pytest
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("numpy")
+
+from app.api.lwats.webagent_utils_async.browser_env.observation import _register_mark_script, extract_merged_axtree
+
+
+def ax_node(node_id, role, backend_node_id, frame_id=None):
+    node = {"nodeId": node_id, "role": {"value": role}, "backendDOMNodeId": backend_node_id, "childIds": []}
+    if frame_id is not None:
+        node["frameId"] = frame_id
+    return node
+
+
+AXTREES = {
+    "main": {"nodes": [ax_node("1", "RootWebArea", 1, "main"), ax_node("2", "Iframe", 2), ax_node("3", "Iframe", 3)]},
+    "same-origin": {"nodes": [ax_node("10", "RootWebArea", 20, "same-origin")]},
+    "cross-origin": {"nodes": [ax_node("30", "RootWebArea", 40, "cross-origin")]},
+}
+
+# the cross-origin frame document is not part of the DOM snapshot
+DOM_SNAPSHOT = {
+    "strings": ["main", "same-origin"],
+    "documents": [
+        {"frameId": 0, "nodes": {"backendNodeId": [1, 2, 3], "attributes": [[], [], []],
+                                  "contentDocumentIndex": {"index": [1], "value": [1]}}},
+        {"frameId": 1, "nodes": {"backendNodeId": [20], "attributes": [[]],
+                                  "contentDocumentIndex": {"index": [], "value": []}}},
+    ],
+}
+
+
+class FakeCDPSession:
+    def __init__(self):
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def send(self, method, params=None):
+        self.calls.append((method, params))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        if method == "Page.getFrameTree":
+            return {"frameTree": {"frame": {"id": "main"}, "childFrames": [
+                {"frame": {"id": "same-origin"}}, {"frame": {"id": "cross-origin"}}]}}
+        if method == "Accessibility.getFullAXTree":
+            return AXTREES[params["frameId"]]
+        if method == "DOM.describeNode":
+            return {"node": {"frameId": {3: "cross-origin"}[params["backendNodeId"]]}}
+        raise AssertionError(method)
+
+    async def detach(self):
+        pass
+
+
+class FakePage:
+    def __init__(self):
+        self.sessions = []
+        self.context = self
+
+    async def new_cdp_session(self, page):
+        self.sessions.append(FakeCDPSession())
+        return self.sessions[-1]
+
+
+def test_extract_merged_axtree_one_session_concurrent_requests():
+    page = FakePage()
+    merged = asyncio.run(extract_merged_axtree(page, dom_snapshot=DOM_SNAPSHOT))
+
+    assert len(page.sessions) == 1
+    cdp = page.sessions[0]
+    # all frame AXTrees in flight at once, only the frame missing from the snapshot is described
+    assert cdp.max_in_flight == 3
+    assert [params for method, params in cdp.calls if method == "DOM.describeNode"] == [{"backendNodeId": 3}]
+
+    nodes = {node["nodeId"]: node for node in merged["nodes"]}
+    assert len(nodes) == 5
+    assert nodes["2"]["childIds"] == ["10"]
+    assert nodes["3"]["childIds"] == ["30"]
+
+
+class FakeContext:
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.scripts = []
+
+    async def add_init_script(self, script):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("Target closed")
+        self.scripts.append(script)
+
+
+def test_mark_script_registered_once_per_context():
+    context = FakeContext()
+    for _ in range(3):
+        asyncio.run(_register_mark_script(context))
+    assert len(context.scripts) == 1
+    other = FakeContext()
+    asyncio.run(_register_mark_script(other))
+    assert len(other.scripts) == 1
+
+
+def test_mark_script_registration_retried_after_a_failure():
+    context = FakeContext(failures=1)
+    with pytest.raises(RuntimeError):
+        asyncio.run(_register_mark_script(context))
+    assert context.scripts == []
+    asyncio.run(_register_mark_script(context))
+    asyncio.run(_register_mark_script(context))
+    assert len(context.scripts) == 1
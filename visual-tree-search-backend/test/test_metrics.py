@@ -0,0 +1,143 @@
+import sys
+import os
+from types import SimpleNamespace
+
+import pytest
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.api.lwats.webagent_utils_async.utils.metrics import (
+    MetricsRegistry, instrument_openai_client, llm_request_seconds, llm_requests, llm_tokens,
+)
+from app.api.lwats.webagent_utils_async.utils.tracing import PhaseStats, Tracer
+
+
+class FakeStream:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.closed = False
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+
+    def close(self):
+        self.closed = True
+
+
+class FakeCompletions:
+    def __init__(self, fail=False, chunks=()):
+        self.fail = fail
+        self.chunks = list(chunks)
+
+    def create(self, **kwargs):
+        if self.fail:
+            raise RuntimeError("rate limited")
+        usage = SimpleNamespace(prompt_tokens=120, completion_tokens=30,
+                                prompt_tokens_details=SimpleNamespace(cached_tokens=100))
+        if kwargs.get("stream"):
+            return FakeStream(self.chunks)
+        return SimpleNamespace(usage=usage)
+
+
+def fake_client(fail=False, chunks=()):
+    return SimpleNamespace(
+        chat=SimpleNamespace(completions=FakeCompletions(fail, chunks)),
+        beta=SimpleNamespace(chat=SimpleNamespace(completions=FakeCompletions(fail))),
+    )
+
+
+def test_render_text_format():
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "Requests", ("route",))
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1))
+    requests.inc(route='say "hi"')
+    for seconds in (0.05, 0.5, 5):
+        latency.observe(seconds)
+
+    lines = registry.render().splitlines()
+    assert "# TYPE requests_total counter" in lines
+    assert 'requests_total{route="say \\"hi\\""} 1.0' in lines
+    assert 'latency_seconds_bucket{le="0.1"} 1.0' in lines
+    assert 'latency_seconds_bucket{le="1.0"} 2.0' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 3.0' in lines
+    assert "latency_seconds_count 3.0" in lines
+    with pytest.raises(ValueError):
+        requests.inc(path="/")
+
+
+def test_llm_calls_labelled_by_model_and_phase():
+    client = instrument_openai_client(fake_client())
+    # wrapping twice records each call once
+    instrument_openai_client(client)
+    tracer = Tracer()
+    with tracer.span("node_expansion"), tracer.span("extract_top_actions"):
+        client.chat.completions.create(model="test-model", messages=[])
+    client.beta.chat.completions.create(model="test-model", messages=[])
+
+    labels = {"model": "test-model", "call_site": "extract_top_actions"}
+    assert llm_requests.value(outcome="ok", **labels) == 1
+    assert llm_tokens.value(kind="prompt", **labels) == 120
+    assert llm_tokens.value(kind="cached", **labels) == 100
+    assert llm_requests.value(model="test-model", call_site="other", outcome="ok") == 1
+    assert "llm_request_duration_seconds_count" in "\n".join(llm_request_seconds.render())
+
+    failing = instrument_openai_client(fake_client(fail=True))
+    with pytest.raises(RuntimeError):
+        failing.chat.completions.create(model="test-model", messages=[])
+    assert llm_requests.value(model="test-model", call_site="other", outcome="error") == 1
+
+
+def test_streamed_calls_recorded_when_consumed():
+    usage = SimpleNamespace(prompt_tokens=50, completion_tokens=5, prompt_tokens_details=None)
+    chunks = [SimpleNamespace(usage=None), SimpleNamespace(usage=None), SimpleNamespace(usage=usage)]
+    client = instrument_openai_client(fake_client(chunks=chunks))
+    labels = {"model": "stream-model", "call_site": "other"}
+
+    stream = client.chat.completions.create(model="stream-model", messages=[], stream=True)
+    assert llm_requests.value(outcome="ok", **labels) == 0
+    assert len(list(stream)) == 3
+    assert llm_requests.value(outcome="ok", **labels) == 1
+    assert llm_tokens.value(kind="prompt", **labels) == 50 and llm_tokens.value(kind="completion", **labels) == 5
+
+    # closed once the score was parsed, recorded once
+    stream = client.chat.completions.create(model="stream-model", messages=[], stream=True)
+    next(stream)
+    stream.close()
+    stream.close()
+    assert stream.closed
+    assert llm_requests.value(outcome="ok", **labels) == 2
+
+    client = instrument_openai_client(fake_client(chunks=[SimpleNamespace(usage=None), RuntimeError("reset")]))
+    with pytest.raises(RuntimeError):
+        list(client.chat.completions.create(model="stream-model", messages=[], stream=True))
+    assert llm_requests.value(outcome="error", **labels) == 1
+
+
+def test_drained_metrics_merge_into_another_registry():
+    def make_registry():
+        registry = MetricsRegistry()
+        return (registry, registry.counter("jobs_total", "Jobs", ("status",)),
+                registry.histogram("job_seconds", "Job time", buckets=(1, 10)))
+
+    worker, worker_jobs, worker_seconds = make_registry()
+    server, server_jobs, server_seconds = make_registry()
+    server_jobs.inc(status="ok")
+    for _ in range(2):
+        worker_jobs.inc(status="ok")
+        worker_seconds.observe(5)
+        server.merge(worker.drain())
+    assert worker.drain() == {}
+
+    assert server_jobs.value(status="ok") == 3
+    lines = server.render().splitlines()
+    assert 'job_seconds_bucket{le="10.0"} 2.0' in lines and "job_seconds_sum 10.0" in lines
+
+    worker_phases, server_phases = PhaseStats(), PhaseStats()
+    worker_phases.add("scoring", 2.0)
+    server_phases.add("scoring", 1.0)
+    server_phases.merge(worker_phases.drain())
+    assert server_phases.as_dict()["scoring"] == {"count": 2, "total_seconds": 3.0, "mean_seconds": 1.5, "max_seconds": 2.0}
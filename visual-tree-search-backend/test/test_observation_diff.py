@@ -0,0 +1,114 @@
+import copy
+import gc
+import sys
+import weakref
+import os
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.api.lwats.webagent_utils_async.browser_env.extra_properties import BidProperties
+from app.api.lwats.webagent_utils_async.browser_env.obs import flatten_axtree_to_str
+from app.api.lwats.webagent_utils_async.browser_env import observation_diff
+from app.api.lwats.webagent_utils_async.browser_env.observation_diff import (
+    ObservationDiffer,
+    flatten_page_axtree,
+)
+
+
+def ax_node(node_id, role, name, bid=None, children=(), properties=()):
+    node = {
+        "nodeId": node_id,
+        "role": {"value": role},
+        "name": {"value": name},
+        "childIds": list(children),
+        "properties": [{"name": k, "value": {"value": v}} for k, v in properties],
+    }
+    if bid is not None:
+        node["properties"].append({"name": "browsergym_id", "value": {"value": bid}})
+    return node
+
+
+def make_page_info():
+    axtree = {"nodes": [
+        ax_node("1", "RootWebArea", "Shop", bid="0", children=["2", "3", "4"]),
+        ax_node("2", "combobox", "Color", bid="1", properties=[("expanded", False), ("focused", True)]),
+        ax_node("3", "link", "Sign in", bid="2"),
+        ax_node("4", "StaticText", "Free shipping"),
+    ]}
+    extra_properties = {
+        bid: {"visibility": 1.0, "bbox": [0, 0, 10, 10], "clickable": True, "set_of_marks": True}
+        for bid in ("0", "1", "2")
+    }
+    return {"axtree": axtree, "extra_properties": extra_properties}
+
+
+def test_observation_differ_reports_added_removed_and_changed_nodes():
+    differ = ObservationDiffer()
+    before = make_page_info()
+    assert differ.observe(before) is None
+
+    after = copy.deepcopy(before)
+    nodes = after["axtree"]["nodes"]
+    nodes[1]["properties"] = [{"name": "expanded", "value": {"value": True}},
+                              {"name": "browsergym_id", "value": {"value": "1"}}]
+    del nodes[2]
+    nodes.append(ax_node("5", "option", "Red", bid="3"))
+    diff = differ.observe(after)
+
+    assert list(diff.added) == ["3"]
+    assert list(diff.removed) == ["2"]
+    # focused only disappeared, expanded is the real change
+    assert diff.changed["1"][1] == ["expanded: False -> True"]
+    text = diff.to_prompt_str()
+    assert "Added elements (1):\n[3] option 'Red'" in text
+    assert "Removed elements (1):\n[2] link 'Sign in'" in text
+    assert "[1] combobox 'Color': expanded: False -> True" in text
+
+    assert differ.observe(copy.deepcopy(after)).is_empty
+    differ.reset()
+    assert differ.observe(after) is None
+
+
+def test_flatten_page_axtree_reuses_identical_pages():
+    observation_diff._flatten_cache.clear()
+    page_info = make_page_info()
+    expected = flatten_axtree_to_str(page_info["axtree"], extra_properties=page_info["extra_properties"])
+    assert flatten_page_axtree(page_info) == expected
+
+    same_page = make_page_info()
+    assert flatten_page_axtree(same_page) == expected
+    assert len(observation_diff._flatten_cache) == 1
+
+    scrolled = make_page_info()
+    scrolled["extra_properties"]["2"]["visibility"] = 0.0
+    flatten_page_axtree(scrolled, filter_visible_only=True)
+    assert len(observation_diff._flatten_cache) == 2
+
+
+def test_flatten_cache_keeps_digests_not_pages():
+    observation_diff._flatten_cache.clear()
+    page_info = make_page_info()
+    page_info["extra_properties"] = BidProperties.from_dict(page_info["extra_properties"])
+    expected = flatten_axtree_to_str(page_info["axtree"], extra_properties=page_info["extra_properties"])
+    assert flatten_page_axtree(page_info) == expected
+    assert set(page_info) == {"axtree", "extra_properties"}
+
+    (digest, options), = observation_diff._flatten_cache
+    assert isinstance(digest, bytes) and len(digest) == 16 and options == ()
+    # the cache does not keep the page alive
+    extra_properties = weakref.ref(page_info["extra_properties"])
+    del page_info
+    gc.collect()
+    assert extra_properties() is None
+
+    # the same page observed again hits, a changed column misses
+    same_page = make_page_info()
+    same_page["extra_properties"] = BidProperties.from_dict(same_page["extra_properties"])
+    assert flatten_page_axtree(same_page) == expected
+    assert len(observation_diff._flatten_cache) == 1
+    same_page["extra_properties"].visibility[2] = 0.0
+    assert flatten_page_axtree(same_page, filter_visible_only=True) != expected
+    assert flatten_page_axtree(same_page) == flatten_axtree_to_str(
+        same_page["axtree"], extra_properties=same_page["extra_properties"])
+    assert len(observation_diff._flatten_cache) == 3
@@ -0,0 +1,140 @@
+import asyncio
+import base64
+import io
+import sys
+import os
+
+import pytest
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+np = pytest.importorskip("numpy")
+PIL_Image = pytest.importorskip("PIL.Image")
+
+from app.api.lwats.webagent_utils_async.browser_env.observation import decode_screenshot, extract_screenshot
+from app.api.lwats.webagent_utils_async.browser_env.perceptual_hash import dhash, hamming_distance, screenshot_dhash
+
+
+def encode(pixels, format="PNG"):
+    output = io.BytesIO()
+    PIL_Image.fromarray(pixels).save(output, format=format)
+    return output.getvalue()
+
+
+def make_page(button_color=(0, 120, 255), width=640, height=400):
+    pixels = np.full((height, width, 3), 255, dtype=np.uint8)
+    pixels[:60] = (40, 40, 40)  # header
+    pixels[120:360:40, 40:600] = (120, 120, 120)  # text lines
+    pixels[300:340, 440:600] = button_color
+    return pixels
+
+
+def test_decode_screenshot_shapes():
+    pixels = make_page()
+    png = encode(pixels)
+
+    rgb = decode_screenshot(png)
+    assert rgb.dtype == np.uint8 and rgb.shape == (400, 640, 3)
+    assert (rgb == pixels).all()
+    assert decode_screenshot(png, grayscale=True).shape == (400, 640)
+    assert decode_screenshot(png, grayscale=True, downsample=4).shape == (100, 160)
+    assert decode_screenshot(encode(pixels, "JPEG"), downsample=3).shape == (133, 213, 3)
+    with pytest.raises(ValueError):
+        decode_screenshot(png, downsample=0)
+
+
+class FakeCDPSession:
+    def __init__(self, data):
+        self.data = data
+        self.sent = []
+
+    async def send(self, method, params):
+        self.sent.append((method, params))
+        return {"data": base64.b64encode(self.data).decode()}
+
+    async def detach(self):
+        pass
+
+
+class FakeScreenshotPage:
+    def __init__(self, data):
+        self.cdp = FakeCDPSession(data)
+        self.context = self
+
+    async def new_cdp_session(self, page):
+        return self.cdp
+
+
+def test_screenshots_are_read_only_arrays():
+    pixels = make_page()
+    for array, shape in (
+        (decode_screenshot(encode(pixels)), (400, 640, 3)),
+        (decode_screenshot(encode(pixels), grayscale=True, downsample=4), (100, 160)),
+        (decode_screenshot(encode(pixels, "JPEG"), downsample=2), (200, 320, 3)),
+    ):
+        assert array.dtype == np.uint8 and array.shape == shape
+        assert not array.flags.writeable
+        with pytest.raises(ValueError):
+            array[0, 0] = 0
+
+    page = FakeScreenshotPage(encode(pixels, "JPEG"))
+    clip = {"x": 0, "y": 0, "width": 640, "height": 400}
+    gray = asyncio.run(extract_screenshot(page, grayscale=True, downsample=4, format="jpeg", quality=80, clip=clip))
+    assert gray.dtype == np.uint8 and gray.shape == (100, 160) and not gray.flags.writeable
+    assert page.cdp.sent == [("Page.captureScreenshot", {"format": "jpeg", "quality": 80, "clip": {"scale": 1, **clip}})]
+
+    # hashing reads the array, drawing on it needs a copy
+    assert dhash(gray) == screenshot_dhash(encode(pixels, "JPEG"))
+    marked = gray.copy()
+    marked[:5, :5] = 0
+    assert marked.flags.writeable and gray[0, 0] != 0
+
+
+def test_screenshot_dhash_detects_visual_changes():
+    page = screenshot_dhash(encode(make_page()))
+
+    # re-encoding the same page, e.g. after hovering a link without a hover style
+    assert hamming_distance(page, screenshot_dhash(encode(make_page(), "JPEG"))) <= 2
+    assert hamming_distance(page, screenshot_dhash(encode(make_page()))) == 0
+    # a different button color, and a different page
+    assert hamming_distance(page, screenshot_dhash(encode(make_page(button_color=(255, 255, 255))))) > 0
+    other_page = np.random.default_rng(0).integers(0, 256, (400, 640, 3), dtype=np.uint8)
+    assert hamming_distance(page, screenshot_dhash(encode(other_page))) > 64
+
+
+def checkbox_page_info(checked, screenshot):
+    nodes = [
+        {"nodeId": "1", "role": {"value": "RootWebArea"}, "name": {"value": "Newsletter"}, "childIds": ["2"]},
+        {"nodeId": "2", "role": {"value": "checkbox"}, "name": {"value": "Subscribe"}, "childIds": [],
+         "properties": [{"name": "browsergym_id", "value": {"value": "12"}},
+                        {"name": "checked", "value": {"value": checked}}]},
+    ]
+    return {"axtree": {"nodes": nodes}, "screenshot": screenshot}
+
+
+def test_small_visual_change_is_not_a_noop(tmp_path):
+    from app.api.lwats.agents_async.SearchAgents.cassette import ReplayPlaywrightManager
+    from app.api.lwats.agents_async.SearchAgents.lats_node import LATSNode
+    from app.api.lwats.agents_async.SearchAgents.simple_search_agent import SimpleSearchAgent
+    from app.api.lwats.core_async.config import AgentConfig
+
+    agent = SimpleSearchAgent(starting_url="http://shop.test", messages=[], goal="Subscribe", images=[],
+                              playwright_manager=ReplayPlaywrightManager(),
+                              config=AgentConfig(storage_state=None, log_folder=str(tmp_path)))
+    unchecked = make_page()
+    checked = unchecked.copy()
+    checked[200:205, 20:25] = (90, 90, 90)  # the tick of a small checkbox
+    assert hamming_distance(screenshot_dhash(encode(unchecked)), screenshot_dhash(encode(checked))) == 0
+
+    root = LATSNode(natural_language_description=None, action=None, prob=None, element=None, goal="Subscribe")
+    agent.observe_page_state(root, "http://shop.test", checkbox_page_info("false", encode(unchecked)))
+    toggle = LATSNode(natural_language_description="Check Subscribe", action="click('12')", prob=0.5,
+                      element=None, goal="Subscribe", parent=root)
+    assert not agent.observe_page_state(toggle, "http://shop.test", checkbox_page_info("true", encode(checked)))
+    assert not toggle.likely_noop
+
+    hover = LATSNode(natural_language_description="Hover Subscribe", action="hover('12')", prob=0.5,
+                     element=None, goal="Subscribe", parent=toggle)
+    assert agent.observe_page_state(hover, "http://shop.test", checkbox_page_info("true", encode(checked)))
+    assert hover.likely_noop
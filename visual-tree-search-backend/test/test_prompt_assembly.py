@@ -0,0 +1,26 @@
+import json
+import sys
+import os
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.api.lwats.webagent_utils_async.action.highlevel import get_action_set
+from app.api.lwats.webagent_utils_async.action.prompt_assembly import build_action_generation_messages
+
+GOAL = "Add the trail running shoes to the shopping cart"
+
+
+def test_static_prefix_is_identical_across_calls():
+    action_set = get_action_set(subsets=["bid"], strict=False, multiaction=False, demo_mode="default")
+    first = build_action_generation_messages(action_set, GOAL, [], "[12] link 'Shoes'", "aGVsbG8=")
+    second = build_action_generation_messages(
+        get_action_set(subsets=["bid"], strict=False, multiaction=False, demo_mode="default"), GOAL,
+        [{"action": "click('12')", "feedback": "opened the shoes"}], "[31] link 'Trail Running Shoes'", "d29ybGQ=",
+    )
+
+    # everything before the observation is byte for byte the same, so providers can cache it
+    assert json.dumps(first[:2]) == json.dumps(second[:2])
+    assert first[2] != second[2]
+    assert "Trail Running Shoes" not in json.dumps(second[:2])
+    assert "Trail Running Shoes" in json.dumps(second[2])
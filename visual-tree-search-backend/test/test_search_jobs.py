@@ -0,0 +1,142 @@
+import asyncio
+import sys
+import os
+import time
+
+import pytest
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.api.lwats.webagent_utils_async.utils.metrics import llm_requests
+from app.api.lwats.webagent_utils_async.utils.tracing import Tracer
+from app.api.services.search_jobs import QueueFullError, SearchJobManager, SearchJobStore
+
+
+async def sleep_job(config):
+    """Stands in for run_tree_search in the worker processes."""
+    await asyncio.sleep(config.get("seconds", 0))
+    return {"echo": config["value"]}
+
+
+async def metrics_job(config):
+    """Records metrics in the worker process, like the LLM calls of a search."""
+    with Tracer().span("worker_job_test"):
+        llm_requests.inc(model="worker-model", call_site="worker_job_test", outcome="ok")
+    return {"echo": config["value"]}
+
+
+async def crashing_job(config):
+    """Kills its worker process, like an out of memory kill, when asked to."""
+    if config.get("crash"):
+        os._exit(3)
+    return {"echo": config["value"]}
+
+
+def wait_for_status(store, job_id, status, timeout=20):
+    deadline = time.time() + timeout
+    while store.status(job_id) != status:
+        assert time.time() < deadline, f"{job_id} is {store.status(job_id)}, expected {status}"
+        time.sleep(0.05)
+
+
+def test_store_recovers_after_restart(tmp_path):
+    db_path = str(tmp_path / "jobs.db")
+    store = SearchJobStore(db_path)
+    store.create("a", {"value": 1})
+    store.create("b", {"value": 2})
+    store.create("c", {"value": 3})
+    assert store.transition("a", "pending", "running", worker=0)
+    assert not store.transition("a", "pending", "running", worker=1)
+    store.finish("c", "completed", results={"echo": 3})
+    store.close()
+
+    store = SearchJobStore(db_path)
+    assert store.recover() == ["b"]
+    assert store.get("a")["status"] == "failed"
+    assert store.get("c")["results"] == {"echo": 3}
+    assert [job["id"] for job in store.list_jobs()] == ["a", "b", "c"]
+
+
+def test_manager_admission_and_cancellation(tmp_path):
+    manager = SearchJobManager(str(tmp_path / "jobs.db"), max_concurrent=1, max_queued=1,
+                               runner="test.test_search_jobs:sleep_job")
+    store = manager.store
+    try:
+        running = manager.submit({"value": "running", "seconds": 60})["id"]
+        wait_for_status(store, running, "running")
+        queued = manager.submit({"value": "queued"})["id"]
+        with pytest.raises(QueueFullError):
+            manager.submit({"value": "rejected"})
+
+        assert manager.cancel(queued) == "cancelled"
+        assert manager.cancel(running) == "cancelling"
+        wait_for_status(store, running, "cancelled")
+
+        # the cancelled job may still occupy the queue until the worker skips it
+        deadline = time.time() + 20
+        while True:
+            try:
+                done = manager.submit({"value": "done"})["id"]
+                break
+            except QueueFullError:
+                assert time.time() < deadline
+                time.sleep(0.05)
+        wait_for_status(store, done, "completed")
+        assert store.get(done)["results"] == {"echo": "done"}
+        assert store.get(queued)["started_at"] is None
+    finally:
+        manager.stop()
+
+
+def test_worker_metrics_reach_the_server(tmp_path):
+    manager = SearchJobManager(str(tmp_path / "jobs.db"), max_concurrent=1, max_queued=2,
+                               runner="test.test_search_jobs:metrics_job")
+    try:
+        for value in (1, 2):
+            wait_for_status(manager.store, manager.submit({"value": value})["id"], "completed")
+        deadline = time.time() + 20
+        while llm_requests.value(model="worker-model", call_site="worker_job_test", outcome="ok") < 2:
+            assert time.time() < deadline
+            time.sleep(0.05)
+    finally:
+        manager.stop()
+    from app.api.lwats.webagent_utils_async.utils.tracing import global_phase_stats
+    assert global_phase_stats.as_dict()["worker_job_test"]["count"] == 2
+
+
+def test_dead_worker_fails_its_job_and_is_replaced(tmp_path):
+    manager = SearchJobManager(str(tmp_path / "jobs.db"), max_concurrent=1, max_queued=2,
+                               runner="test.test_search_jobs:crashing_job")
+    store = manager.store
+    try:
+        crashed = manager.submit({"value": "crashed", "crash": True})["id"]
+        wait_for_status(store, crashed, "failed")
+        assert store.get(crashed)["error"] == "Worker process exited with code 3"
+        # the only worker died, its replacement runs the next job
+        done = manager.submit({"value": "done"})["id"]
+        wait_for_status(store, done, "completed")
+        assert store.get(done)["results"] == {"echo": "done"}
+        assert store.get(done)["completed_at"].endswith("+00:00")
+    finally:
+        manager.stop()
+
+
+def test_stop_keeps_queued_jobs_for_the_next_start(tmp_path):
+    manager = SearchJobManager(str(tmp_path / "jobs.db"), max_concurrent=1, max_queued=2,
+                               runner="test.test_search_jobs:sleep_job")
+    store = manager.store
+    try:
+        running = manager.submit({"value": "running", "seconds": 1})["id"]
+        wait_for_status(store, running, "running")
+        queued = manager.submit({"value": "queued"})["id"]
+        # the worker finishes its job, and leaves the queued one to the next start
+        manager.stop()
+        assert store.status(running) == "completed"
+        assert store.status(queued) == "pending"
+
+        manager.start()
+        wait_for_status(store, queued, "completed")
+        assert store.get(queued)["results"] == {"echo": "queued"}
+    finally:
+        manager.stop()
@@ -0,0 +1,159 @@
+import asyncio
+import json
+import sys
+import os
+import threading
+
+import pytest
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.api.services.search_sessions import CapacityError, SearchSessionManager
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.messages = []
+
+    async def send_json(self, data):
+        self.messages.append(data)
+
+
+async def fake_search(websocket, message, session):
+    """Counts steps until cancelled, pausing between steps like the agents do."""
+    while True:
+        await session.control.wait_if_paused()
+        message["steps"] += 1
+        message["thread"] = threading.get_ident()
+        await asyncio.sleep(0.01)
+        if message["steps"] >= message.get("max_steps", 10 ** 9):
+            return
+
+
+async def wait_until(condition, timeout=5):
+    async with asyncio.timeout(timeout):
+        while not condition():
+            await asyncio.sleep(0.01)
+
+
+def test_sessions_run_in_threads_with_limits_and_controls():
+    async def scenario():
+        manager = SearchSessionManager(max_sessions=1, max_queued=1)
+        websocket = FakeWebSocket()
+        first_message, second_message = {"steps": 0}, {"steps": 0, "max_steps": 3}
+
+        first = manager.submit(websocket, "conn", first_message, fake_search)
+        second = manager.submit(websocket, "conn", second_message, fake_search)
+        assert (first.status, second.status) == ("running", "queued")
+        with pytest.raises(CapacityError):
+            manager.submit(websocket, "conn", {"steps": 0}, fake_search)
+
+        await wait_until(lambda: first_message["steps"] > 0)
+        assert first_message["thread"] != threading.get_ident()
+
+        first.control.pause()
+        await asyncio.sleep(0.1)
+        paused_steps = first_message["steps"]
+        await asyncio.sleep(0.1)
+        assert first_message["steps"] == paused_steps
+        assert first.info()["status"] == "paused"
+        first.control.resume()
+        await wait_until(lambda: first_message["steps"] > paused_steps)
+
+        manager.cancel(first)
+        await wait_until(lambda: first.task.done())
+        assert first.status == "cancelled"
+        assert websocket.messages[-1]["status"] == "cancelled"
+
+        # the queued search gets the slot and runs to the end
+        await wait_until(lambda: second.task.done())
+        assert second.status == "finished" and second_message["steps"] == 3
+        assert manager.sessions == {}
+
+    asyncio.run(scenario())
+
+
+def test_bad_budget_is_rejected_and_the_search_goes_on(monkeypatch):
+    from app.api.routes import tree_search_websocket
+
+    async def scenario():
+        manager = SearchSessionManager(max_sessions=1, max_queued=1)
+        monkeypatch.setattr(tree_search_websocket, "session_manager", manager)
+        websocket, client = FakeWebSocket(), FakeWebSocket()
+        message = {"steps": 0}
+        session = manager.submit(websocket, "conn", message, fake_search)
+        await wait_until(lambda: message["steps"] > 0)
+
+        for budget in ({"iterations": "many"}, {"iterations": 0}, {"max_depth": -2}, {"iterations": 2.5},
+                       {"iterations": True}, {"iterations": None}, ["iterations", 5], "5"):
+            await tree_search_websocket.handle_search_control(
+                client, "conn", {"type": "set_budget", "search_id": session.id, "budget": budget})
+            assert client.messages[-1]["type"] == "error", budget
+            assert client.messages[-1]["message"].startswith("Budget not changed")
+        # nothing of a partly valid budget is applied
+        await tree_search_websocket.handle_search_control(
+            client, "conn", {"type": "set_budget", "budget": {"iterations": 5, "max_depth": "deep"}})
+        assert client.messages[-1]["type"] == "error" and session.budget == {}
+
+        await tree_search_websocket.observe_search(client, "conn", {"search_id": session.id, "after": -1})
+        assert client.messages[-1]["type"] == "error"
+
+        steps = message["steps"]
+        await wait_until(lambda: message["steps"] > steps)
+        assert not session.task.done()
+        await tree_search_websocket.handle_search_control(
+            client, "conn", {"type": "set_budget", "budget": {"iterations": "5", "max_depth": 3}})
+        assert client.messages[-1]["applied"] == {"iterations": 5, "max_depth": 3}
+
+        manager.cancel(session)
+        await wait_until(lambda: session.task.done())
+
+    asyncio.run(scenario())
+
+
+class FakeStream(FakeWebSocket):
+    async def send_text(self, text):
+        self.messages.append(json.loads(text))
+
+
+def test_cancel_notice_is_recorded_with_its_seq(tmp_path, monkeypatch):
+    from app.api.benchmarks.mock_llm import MockLLMClient, ScriptedTask
+    from app.api.lwats.agents_async.SearchAgents.cassette import ReplayPlaywrightManager
+    from app.api.lwats.agents_async.SearchAgents.checkpoint import read_events
+    from app.api.lwats.agents_async.SearchAgents.lats_agent import LATSAgent
+    from app.api.lwats.agents_async.SearchAgents.simulator import SimulatorBackend, synthetic_shop
+    from app.api.routes import tree_search_websocket
+    from app.api.services.search_sessions import checkpoint_path
+
+    shop, goal = synthetic_shop(categories=3, products=3, seed=0)
+
+    async def setup_simulated_agent(agent_type, starting_url, goal, images, agent_config):
+        agent_config.storage_state, agent_config.account_reset, agent_config.page_settle_seconds = None, False, 0
+        agent_config.log_folder = str(tmp_path)
+        agent = LATSAgent(starting_url=shop.states[shop.start].url, messages=[], goal=goal, images=[],
+                          playwright_manager=ReplayPlaywrightManager(), config=agent_config)
+        agent.browser_backend = SimulatorBackend(shop)
+        agent.llm_client = MockLLMClient(ScriptedTask(shop.milestones(), seed=0))
+        return agent, agent.playwright_manager
+
+    monkeypatch.setenv("TREE_SEARCH_CHECKPOINT_DIR", str(tmp_path))
+    monkeypatch.setattr(tree_search_websocket, "setup_search_agent", setup_simulated_agent)
+
+    async def scenario():
+        manager = SearchSessionManager(max_sessions=1, max_queued=1)
+        stream = FakeStream()
+        message = {"type": "start_search", "search_algorithm": "lats", "goal": goal, "iterations": 100}
+        session = manager.submit(stream, "conn", message, tree_search_websocket.handle_search_request)
+        await wait_until(lambda: any(event["type"] == "iteration_start" for event in stream.messages))
+        session.control.pause()
+        manager.cancel(session)
+        await wait_until(lambda: session.task.done())
+        return session, stream.messages
+
+    session, sent = asyncio.run(scenario())
+    recorded = read_events(checkpoint_path(session.id))
+    # one cancel notice, the last event of both the stream and the checkpoint, under the same seq
+    assert [event["status"] for event in sent if event.get("status") == "cancelled"] == ["cancelled"]
+    assert sent[-1] == recorded[-1] and sent[-1]["status"] == "cancelled"
+    assert [event["seq"] for event in sent] == list(range(len(recorded)))
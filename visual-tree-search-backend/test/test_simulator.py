@@ -0,0 +1,87 @@
+import sys
+import os
+
+import pytest
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.api.benchmarks.mock_llm import MockLLMClient, ScriptedTask
+from app.api.lwats.agents_async.SearchAgents.cassette import ReplayPlaywrightManager, attach_cassette
+from app.api.lwats.agents_async.SearchAgents.lats_agent import LATSAgent
+from app.api.lwats.agents_async.SearchAgents.mcts_agent import MCTSAgent
+from app.api.lwats.agents_async.SearchAgents.simple_search_agent import SimpleSearchAgent
+from app.api.lwats.agents_async.SearchAgents.simulator import (
+    SimulatorBackend, StateGraph, run_episode, synthetic_shop,
+)
+from app.api.lwats.core_async.config import AgentConfig
+from app.api.lwats.webagent_utils_async.browser_env.extra_properties import BidProperties
+
+
+def search_config(tmp_path, max_depth=3):
+    return AgentConfig(branching_factor=2, max_depth=max_depth, iterations=6, storage_state=None, account_reset=False,
+                       page_settle_seconds=0, log_folder=str(tmp_path))
+
+
+def test_synthetic_shop_graph():
+    graph, goal = synthetic_shop(categories=2, products=2, seed=0)
+    assert goal == "Add Product 1-1 to the shopping cart"
+    assert graph.shortest_path() == ["click('2')", "click('2')", "click('1')"]
+    assert graph.milestones() == ["Category 1", "Product 1-1", "Add to Cart"]
+    assert graph.solves(graph.shortest_path())
+    # an element without an edge stays on the page, a missing element fails
+    assert graph.step("Home", "hover('1')") == "Home"
+    assert graph.step("Home", "click('9')") is None
+    assert not graph.solves(["click('2')", "click('1')", "click('1')"])
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("agent_class", [SimpleSearchAgent, LATSAgent, MCTSAgent])
+async def test_agents_solve_the_simulated_shop(tmp_path, agent_class):
+    graph, goal = synthetic_shop(categories=2, products=2, seed=0)
+    client = MockLLMClient(ScriptedTask(graph.milestones(), seed=0))
+    episode = await run_episode(agent_class, graph, goal, search_config(tmp_path), client)
+    assert episode["error"] is None
+    assert episode["solved"], episode["actions"]
+    assert episode["browser_launches"] > 0 and client.calls["action_generation"] > 0
+
+
+async def record_search(tmp_path, shop, goal):
+    path = str(tmp_path / "shop.jsonl")
+    # one level deeper than the cart, the leaves of the tree are not observed
+    agent = SimpleSearchAgent(starting_url="https://simulated.test/home", messages=[], goal=goal, images=[],
+                              playwright_manager=ReplayPlaywrightManager(), config=search_config(tmp_path, max_depth=4))
+    agent.browser_backend = SimulatorBackend(shop)
+    agent.llm_client = MockLLMClient(ScriptedTask(shop.milestones(), seed=0))
+    cassette = attach_cassette(agent, path)
+    await agent.run()
+    cassette.close()
+    return path
+
+
+@pytest.mark.asyncio
+async def test_graph_from_a_recorded_search(tmp_path):
+    shop, goal = synthetic_shop(categories=2, products=2, seed=0)
+    path = await record_search(tmp_path, shop, goal)
+
+    graph = StateGraph.from_cassette(path, goal_url="cart-with-product-1-1")
+    assert graph.states[graph.start].url == "https://simulated.test/home"
+    assert graph.shortest_path() == shop.shortest_path()
+    assert not graph.solves(["click('1')", "click('1')", "click('1')"])
+    assert graph.milestones() == shop.milestones()
+
+
+@pytest.mark.asyncio
+async def test_search_over_a_recorded_cassette(tmp_path):
+    shop, goal = synthetic_shop(categories=2, products=2, seed=0)
+    path = await record_search(tmp_path / "record", shop, goal)
+    graph = StateGraph.from_cassette(path, goal_url="cart-with-product-1-1")
+
+    # the states hold the page infos as the search observed them
+    home = graph.states[graph.start].page_info
+    assert isinstance(home["extra_properties"], BidProperties)
+    assert home["extra_properties"].to_dict() == shop.states[shop.start].page_info["extra_properties"].to_dict()
+    client = MockLLMClient(ScriptedTask(graph.milestones(), seed=1))
+    episode = await run_episode(LATSAgent, graph, goal, search_config(tmp_path / "replay"), client)
+    assert episode["error"] is None
+    assert episode["solved"], episode["actions"]
@@ -0,0 +1,65 @@
+import io
+import sys
+import os
+
+import pytest
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+np = pytest.importorskip("numpy")
+PIL_Image = pytest.importorskip("PIL.Image")
+
+from app.api.lwats.webagent_utils_async.browser_env import som
+from app.api.lwats.webagent_utils_async.browser_env.som import overlay_som
+
+
+def make_screenshot(width=200, height=120):
+    output = io.BytesIO()
+    PIL_Image.new("RGB", (width, height), (255, 255, 255)).save(output, format="PNG")
+    return output.getvalue()
+
+
+def rect(left, top, width, height):
+    return {"left": left, "top": top, "right": left + width, "bottom": top + height, "width": width, "height": height}
+
+
+ELEMENTS = [
+    {"bid": "12", "rects": [rect(20, 40, 80, 30)]},
+    {"bid": "a3", "rects": [rect(150, 90, 100, 50)]},  # runs off the screenshot
+    {"bid": "7", "rects": []},
+]
+
+
+def decode(png):
+    return np.array(PIL_Image.open(io.BytesIO(png)).convert("RGB"))
+
+
+def test_overlay_som_draws_boxes_and_labels():
+    som._som_cache.clear()
+    screenshot = make_screenshot()
+    pixels = decode(overlay_som(screenshot, ELEMENTS))
+    color = som._bid_color("12")
+
+    assert pixels.shape == (120, 200, 3)
+    # dashed top edge, first dash drawn and first gap left blank
+    assert (pixels[40, 20:24] == color).all()
+    assert (pixels[40, 24:28] == 255).all()
+    # inside of the box untouched
+    assert (pixels[55, 40:80] == 255).all()
+    # label above the box in the box color
+    assert (pixels[25:38, 20:30] == color).all(axis=-1).any()
+    # clipped box drawn up to the border
+    assert (pixels[90:92, 150:154] == som._bid_color("a3")).all()
+
+
+def test_overlay_som_scales_and_caches():
+    som._som_cache.clear()
+    screenshot = make_screenshot(400, 240)
+    annotated = overlay_som(screenshot, ELEMENTS, scale=2.0)
+    pixels = decode(annotated)
+    assert (pixels[80, 40:44] == som._bid_color("12")).all()
+    assert (pixels[80, 44:48] == 255).all()
+
+    assert overlay_som(screenshot, ELEMENTS, scale=2.0) is annotated
+    assert overlay_som(screenshot, ELEMENTS[:1], scale=2.0) is not annotated
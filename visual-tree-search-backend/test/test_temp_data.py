@@ -0,0 +1,116 @@
+import asyncio
+import copy
+import sys
+import os
+from types import SimpleNamespace
+
+import pytest
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("numpy")
+
+from app.api.lwats.webagent_utils_async.browser_env import observation
+from app.api.lwats.webagent_utils_async.browser_env.constants import BROWSERGYM_ID_ATTRIBUTE as BID_ATTR
+from app.api.lwats.webagent_utils_async.browser_env.temp_data import (
+    assign_axtree_bids,
+    bids_by_backend_node_id,
+    cleanup_axtree_temp_data,
+    cleanup_dom_snapshot_temp_data,
+    parse_temp_data,
+)
+
+STRINGS = ["aria-roledescription", BID_ATTR, "class", "x", "a1_", "a2_slide", "Button", "a1", "a2", ""]
+
+
+def make_dom_snapshot():
+    return {
+        "strings": list(STRINGS),
+        "documents": [{
+            "nodes": {
+                "backendNodeId": [10, 11, 12, 13],
+                "attributes": [
+                    [2, 3, 1, 7, 0, 4],  # marked, empty original value
+                    [0, 5, 1, 8],        # marked, original value kept
+                    [0, 6],              # not marked
+                    [2, 3],
+                ],
+            },
+        }],
+    }
+
+
+def test_parse_temp_data():
+    assert parse_temp_data("a12_") == ("a12", "")
+    assert parse_temp_data("0_carousel_item") == ("0", "carousel_item")
+    assert parse_temp_data("Button") == (None, "Button")
+    assert parse_temp_data("A1_x") == (None, "A1_x")
+
+
+def test_cleanup_dom_snapshot_temp_data():
+    dom_snapshot = make_dom_snapshot()
+    cleanup_dom_snapshot_temp_data(dom_snapshot)
+    attributes = dom_snapshot["documents"][0]["nodes"]["attributes"]
+    assert attributes == [[2, 3, 1, 7], [0, 5, 1, 8], [0, 6], [2, 3]]
+    assert dom_snapshot["strings"][5] == "slide"
+    assert dom_snapshot["strings"][6] == "Button"
+
+
+def test_cleanup_axtree_temp_data():
+    ax_tree = {"nodes": [
+        {"nodeId": "1", "properties": [
+            {"name": "roledescription", "value": {"type": "string", "value": "a1_"}},
+            {"name": "focusable", "value": {"type": "booleanOrUndefined", "value": True}},
+        ]},
+        {"nodeId": "2", "properties": [{"name": "roledescription", "value": {"type": "string", "value": "a2_slide"}}]},
+        {"nodeId": "3"},
+    ]}
+    cleanup_axtree_temp_data(ax_tree)
+    assert [p["name"] for p in ax_tree["nodes"][0]["properties"]] == ["focusable", "browsergym_id"]
+    assert ax_tree["nodes"][1]["properties"] == [
+        {"name": "roledescription", "value": {"type": "string", "value": "slide"}},
+        {"name": "browsergym_id", "value": {"type": "string", "value": "a2"}},
+    ]
+    assert "properties" not in ax_tree["nodes"][2]
+
+
+def test_assign_axtree_bids_from_backend_node_ids():
+    bids = bids_by_backend_node_id(make_dom_snapshot())
+    assert bids == {10: "a1", 11: "a2"}
+    ax_tree = {"nodes": [
+        {"nodeId": "1", "backendDOMNodeId": 10},
+        {"nodeId": "2", "backendDOMNodeId": 11, "properties": [{"name": "focusable", "value": {"value": True}}]},
+        {"nodeId": "3", "backendDOMNodeId": 12},
+        {"nodeId": "4", "backendDOMNodeId": 11, "ignored": True},
+        {"nodeId": "5"},
+    ]}
+    assign_axtree_bids(ax_tree, bids)
+    assert ax_tree["nodes"][0]["properties"] == [{"name": "browsergym_id", "value": {"type": "string", "value": "a1"}}]
+    assert [p["name"] for p in ax_tree["nodes"][1]["properties"]] == ["focusable", "browsergym_id"]
+    assert all("properties" not in node for node in ax_tree["nodes"][2:])
+
+
+class FakeCDPSession:
+    def __init__(self, dom_snapshot):
+        self.dom_snapshot = dom_snapshot
+
+    async def send(self, method, params):
+        return copy.deepcopy(self.dom_snapshot)
+
+    async def detach(self):
+        pass
+
+
+def test_store_temp_data_is_read_at_call_time(monkeypatch):
+    async def new_cdp_session(page):
+        return FakeCDPSession(make_dom_snapshot())
+
+    page = SimpleNamespace(context=SimpleNamespace(new_cdp_session=new_cdp_session))
+    assert asyncio.run(observation.extract_dom_snapshot(page)) == make_dom_snapshot()
+
+    monkeypatch.setattr(observation, "STORE_TEMP_DATA", True)
+    cleaned = asyncio.run(observation.extract_dom_snapshot(page))
+    assert cleaned["documents"][0]["nodes"]["attributes"][0] == [2, 3, 1, 7]
+    # an explicit argument still wins
+    assert asyncio.run(observation.extract_dom_snapshot(page, temp_data_cleanup=False)) == make_dom_snapshot()
@@ -0,0 +1,69 @@
+import asyncio
+import json
+import sys
+import os
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.api.lwats.webagent_utils_async.utils import tracing
+from app.api.lwats.webagent_utils_async.utils.tracing import Tracer, traced
+
+
+class Agent:
+    def __init__(self):
+        self.tracer = Tracer(name="Agent")
+
+    @traced("node_expansion")
+    async def node_expansion(self):
+        with self.tracer.span("page_settle"):
+            await asyncio.sleep(0.02)
+        return self.score()
+
+    @traced("scoring")
+    def score(self):
+        return 0.5
+
+
+def test_spans_nest_and_aggregate(tmp_path, monkeypatch):
+    monkeypatch.setenv("TRACING_FILE", str(tmp_path / "spans.jsonl"))
+    agent = Agent()
+    for _ in range(2):
+        assert asyncio.run(agent.node_expansion()) == 0.5
+
+    breakdown = agent.tracer.finish()
+    phases = breakdown["phases"]
+    assert list(phases)[0] == "node_expansion"
+    assert phases["node_expansion"]["count"] == 2 and phases["scoring"]["count"] == 2
+    assert phases["page_settle"]["total_seconds"] >= 0.04
+    assert phases["node_expansion"]["total_seconds"] >= phases["page_settle"]["total_seconds"]
+    assert 0 < phases["node_expansion"]["share"] <= 1
+
+    # finishing twice registers the run once
+    assert agent.tracer.finish() is breakdown
+    assert [run["run_id"] for run in tracing.recent_runs].count(breakdown["run_id"]) == 1
+    assert tracing.metrics_snapshot()["phases"]["page_settle"]["count"] >= 2
+
+    with open(tmp_path / "spans.jsonl") as f:
+        spans = [json.loads(line) for line in f]
+    assert [span["name"] for span in spans[:3]] == ["page_settle", "scoring", "node_expansion"]
+    assert all(span["run_id"] == breakdown["run_id"] for span in spans)
+
+
+def test_logprob_evaluation_is_one_span(tmp_path):
+    from app.api.lwats.agents_async.SearchAgents.cassette import ReplayPlaywrightManager
+    from app.api.lwats.agents_async.SearchAgents.lats_node import LATSNode
+    from app.api.lwats.agents_async.SearchAgents.simple_search_agent import SimpleSearchAgent
+    from app.api.lwats.core_async.config import AgentConfig
+
+    agent = SimpleSearchAgent(starting_url="http://shop.test", messages=[], goal="Buy shoes", images=[],
+                              playwright_manager=ReplayPlaywrightManager(),
+                              config=AgentConfig(storage_state=None, value_function="logprob", log_folder=str(tmp_path)))
+    agent.score_children = lambda children: [0.8] * len(children)
+    root = LATSNode(natural_language_description=None, action=None, prob=None, element=None, goal="Buy shoes")
+    for action, prob in (("click('1')", 0.7), ("click('2')", 0.3)):
+        root.add_child(LATSNode(natural_language_description=action, action=action, prob=prob, element=None,
+                                goal="Buy shoes", parent=root))
+    asyncio.run(agent.node_children_evaluation(root))
+
+    assert agent.tracer.breakdown()["phases"]["node_children_evaluation"]["count"] == 1
@@ -0,0 +1,69 @@
+import asyncio
+import sys
+import os
+
+import pytest
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.api.lwats.agents_async.SearchAgents.value_function import (
+    normalized_entropy,
+    select_for_escalation,
+    prior_value,
+)
+
+
+def test_entropy_bounds():
+    assert normalized_entropy([1.0]) == 0.0
+    assert normalized_entropy([1.0, 0.0, 0.0]) == 0.0
+    assert normalized_entropy([0.25, 0.25, 0.25, 0.25]) == pytest.approx(1.0)
+    assert 0.0 < normalized_entropy([0.7, 0.2, 0.1]) < 1.0
+
+
+def test_escalates_top_k_only_when_confident():
+    assert select_for_escalation([0.1, 0.7, 0.2], top_k=1, margin=0.1) == [1]
+    assert select_for_escalation([0.1, 0.7, 0.2], top_k=2, margin=0.05) == [1, 2]
+
+
+def test_escalates_close_calls():
+    assert select_for_escalation([0.4, 0.35, 0.25], top_k=1, margin=0.1) == [0, 1]
+    assert select_for_escalation([0.25, 0.25, 0.25, 0.25], top_k=1, margin=0.0) == [0, 1, 2, 3]
+
+
+def test_escalation_edge_cases():
+    assert select_for_escalation([], top_k=1) == []
+    # the argmax child is the anchor of the others, it is always escalated
+    assert select_for_escalation([0.4, 0.6], top_k=0) == [1]
+    assert select_for_escalation([0.4, 0.6], top_k=-1, margin=0.0) == [1]
+    assert select_for_escalation([0.6, 0.4], top_k=5) == [0, 1]
+
+
+def test_prior_value_never_exceeds_anchor():
+    assert prior_value(0.1, 0.4, 0.8) == pytest.approx(0.2)
+    assert prior_value(0.5, 0.4, 0.8) == pytest.approx(0.8)
+    assert prior_value(0.1, 0.0, 0.8) == 0.0
+
+
+@pytest.mark.parametrize("top_k", [0, 1, 3])
+def test_logprob_evaluation_values_every_child(tmp_path, top_k):
+    from app.api.lwats.agents_async.SearchAgents.cassette import ReplayPlaywrightManager
+    from app.api.lwats.agents_async.SearchAgents.lats_node import LATSNode
+    from app.api.lwats.agents_async.SearchAgents.simple_search_agent import SimpleSearchAgent
+    from app.api.lwats.core_async.config import AgentConfig
+
+    config = AgentConfig(storage_state=None, value_function="logprob", value_escalation_top_k=top_k,
+                         value_escalation_margin=0.0, log_folder=str(tmp_path))
+    agent = SimpleSearchAgent(starting_url="http://shop.test", messages=[], goal="Buy shoes", images=[],
+                              playwright_manager=ReplayPlaywrightManager(), config=config)
+    scored = []
+    agent.score_children = lambda children: scored.extend(children) or [0.8] * len(children)
+    root = LATSNode(natural_language_description=None, action=None, prob=None, element=None, goal="Buy shoes")
+    for action, prob in (("click('1')", 0.2), ("click('2')", 0.5), ("click('3')", None)):
+        root.add_child(LATSNode(natural_language_description=action, action=action, prob=prob, element=None,
+                                goal="Buy shoes", parent=root))
+    asyncio.run(agent.node_children_evaluation(root))
+
+    assert all(child.value is not None for child in root.children)
+    assert scored[0].action == "click('2')" and len(scored) == min(max(top_k, 1), 3)
+    assert [child.value for child in root.children][:2] == [pytest.approx(0.8 * 0.2 / 0.5) if top_k < 2 else 0.8, 0.8]